@@ -22,13 +22,22 @@ import tempfile
 import threading
 import time
 import json
+import re
 import struct
 import base64
-from datetime import datetime
+import bisect
+import heapq
+import queue
+import random
+import uuid
+import zlib
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from urllib.parse import quote
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Add gpm to Python path for Linux compatibility
 current_dir = Path(__file__).parent
@@ -55,8 +64,11 @@ load_env_file()
 sys.path.insert(0, str(Path(__file__).parent / "gpm"))
 
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, RedirectResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from pydantic import BaseModel
 import uvicorn
 import requests
 
@@ -97,6 +109,8 @@ except ImportError as e:
             print("❌ All import attempts failed")
             raise ImportError("Could not import gpmc.Client - check gpm installation")
 
+from gpmc.db import Storage
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Google Photos API",
@@ -113,10 +127,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class ViewerSessionMiddleware:
+    """Give file API clients without a session header or cookie a session cookie
+
+    Pure ASGI: the cookie is added to the response start message and the body
+    passes straight through, where BaseHTTPMiddleware would relay every chunk
+    of a video stream through an extra task and memory stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api/files/'):
+            return await self.app(scope, receive, send)
+        connection = HTTPConnection(scope)
+        if connection.headers.get(SESSION_HEADER) or connection.cookies.get(SESSION_COOKIE):
+            return await self.app(scope, receive, send)
+
+        # Read back through request.state by get_session_id
+        session_id = uuid.uuid4().hex
+        scope.setdefault('state', {})['session_id'] = session_id
+        cookie = f"{SESSION_COOKIE}={session_id}; HttpOnly; Max-Age={24 * 3600}; Path=/; SameSite=lax"
+
+        async def send_with_cookie(message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append('set-cookie', cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+app.add_middleware(ViewerSessionMiddleware)
+
 # Global Google Photos client
 gp_client: Optional[Client] = None
 file_cache: Dict[str, dict] = {}
 cache_timestamp = 0
+known_file_ids: set = set()  # Every id seen by a refresh, to detect newly added titles
+content_aliases: Dict[str, List[str]] = {}  # dedup_key -> media keys holding that content
+
+def get_content_key(file_id: str) -> str:
+    """Content key of a media item: its dedup_key (the SHA-1), else the media key itself
+
+    Re-uploads of a video share one dedup_key, so every cache and metadata
+    store keyed by it serves all of them from the same bytes.
+    """
+    info = file_cache.get(file_id)
+    return (info and info.get('dedup_key')) or file_id
+
+def get_media_id(content_key: str) -> str:
+    """A media key (in the library) for a content key, for display and URL resolution"""
+    for file_id in content_aliases.get(content_key, ()):
+        if file_id in file_cache:
+            return file_id
+    return content_key
+
+def get_expected_sha1(file_id: str) -> Optional[bytes]:
+    """SHA-1 digest of a title's bytes, decoded from its dedup_key when it is one"""
+    dedup_key = (file_cache.get(file_id) or {}).get('dedup_key')
+    if not dedup_key:
+        return None
+    try:
+        digest = base64.urlsafe_b64decode(dedup_key + '=' * (-len(dedup_key) % 4))
+    except ValueError:
+        return None
+    return digest if len(digest) == hashlib.sha1().digest_size else None
 
 # Auto-refresh configuration
 AUTO_REFRESH_ENABLED = True
@@ -136,29 +211,160 @@ cache_dir.mkdir(exist_ok=True)
 metadata_cache_dir = Path(__file__).parent / "metadata_cache"
 metadata_cache_dir.mkdir(exist_ok=True)
 
-# Track download status for each file
-download_status: Dict[str, Dict] = defaultdict(lambda: {
-    'downloading': False,
-    'completed': False,
-    'file_path': None,
-    'download_start': 0,
-    'bytes_downloaded': 0,
-    'total_bytes': 0,
-    'download_speed_mbps': 0,
-    'last_access': 0,
-    'active_users': 0,  # Count of users currently watching
-    'user_sessions': set()  # Track unique user sessions
-})
-
-download_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
-
 # Cache cleanup configuration
 CACHE_CLEANUP_SECONDS = 20  # Clean cache after 20 seconds of no activity
-CLEANUP_CHECK_INTERVAL = 20 # Check for cleanup every 20 seconds
+CLEANUP_CHECK_INTERVAL = 20 # Longest sleep of the cleanup worker between expiry checks
+STATUS_REGISTRY_MAX_ENTRIES = 256  # Titles with download state kept at once
+CACHE_WRITE_ALIGNMENT = 4096  # Filesystem block size cache writes are aligned to
+CACHE_WRITE_BLOCK_BYTES = 16 * 1024 * 1024  # Write buffer per download (the first block is the metadata head)
+CACHE_PROGRESS_INTERVAL = 0.5  # Seconds between progress publications of a running download
+
+class DownloadStatus:
+    """Download state of one title - only titles with a download get a record"""
+
+    __slots__ = ('downloading', 'completed', 'file_path', 'download_start', 'bytes_downloaded',
+                 'total_bytes', 'download_speed_mbps', 'last_access', 'active_users',
+                 'user_sessions', 'lock', 'expiry_scheduled')
+
+    def __init__(self):
+        self.downloading = False
+        self.completed = False
+        self.file_path = None
+        self.download_start = 0
+        self.bytes_downloaded = 0
+        self.total_bytes = 0
+        self.download_speed_mbps = 0
+        self.last_access = time.time()
+        self.active_users = 0          # Count of users currently watching
+        self.user_sessions = set()     # Track unique user sessions
+        self.lock = threading.Lock()
+        self.expiry_scheduled = False  # True while the record has an entry in the expiry heap
+
+class DownloadStatusRegistry:
+    """Bounded registry of DownloadStatus records with heap-driven idle expiry
+
+    Records are keyed by content (see get_content_key), so every alias of a
+    video shares one download.
+
+    Each record has at most one entry in the expiry heap. An entry that comes
+    due for a record touched in the meantime is pushed back to its new
+    deadline, so finding idle titles costs O(expired) instead of a full scan.
+    """
+
+    def __init__(self, idle_seconds: int, max_entries: int):
+        self.idle_seconds = idle_seconds
+        self.max_entries = max_entries
+        self.records: Dict[str, DownloadStatus] = {}
+        self.expiry_heap: List[tuple] = []  # (deadline, file_id)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, file_id: str) -> bool:
+        return get_content_key(file_id) in self.records
+
+    def items(self) -> list:
+        with self.lock:
+            return list(self.records.items())
+
+    def get(self, file_id: str) -> Optional[DownloadStatus]:
+        """Look up a record without allocating one"""
+        return self.records.get(get_content_key(file_id))
+
+    def get_or_create(self, file_id: str) -> DownloadStatus:
+        file_id = get_content_key(file_id)
+        with self.lock:
+            status = self.records.get(file_id)
+            if status is None:
+                status = DownloadStatus()
+                self.records[file_id] = status
+                self._schedule(file_id, status)
+            return status
+
+    def _schedule(self, file_id: str, status: DownloadStatus):
+        if not status.expiry_scheduled:
+            status.expiry_scheduled = True
+            heapq.heappush(self.expiry_heap, (status.last_access + self.idle_seconds, file_id))
+
+    def touch(self, file_id: str, when: float = None):
+        """Record activity on a title (no-op for titles without a download)"""
+        status = self.records.get(get_content_key(file_id))
+        if status is not None:
+            status.last_access = when or time.time()
+
+    def defer(self, file_id: str):
+        """Check a busy title (downloading / pinned) again after another idle period"""
+        file_id = get_content_key(file_id)
+        with self.lock:
+            status = self.records.get(file_id)
+            if status is not None:
+                status.last_access = time.time()
+                self._schedule(file_id, status)
+
+    def pop_expired(self, now: float = None) -> List[str]:
+        """Ids idle for longer than idle_seconds, in deadline order"""
+        now = now or time.time()
+        expired = []
+        with self.lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                _, file_id = heapq.heappop(self.expiry_heap)
+                status = self.records.get(file_id)
+                if status is None:
+                    continue
+                status.expiry_scheduled = False
+                if status.last_access + self.idle_seconds > now:
+                    self._schedule(file_id, status)  # Touched since it was scheduled
+                else:
+                    expired.append(file_id)
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        with self.lock:
+            return self.expiry_heap[0][0] if self.expiry_heap else None
+
+    def idle_candidates(self) -> List[str]:
+        """Ids with no running download, least recently used first (for bounding)"""
+        with self.lock:
+            idle = [(status.last_access, file_id) for file_id, status in self.records.items() if not status.downloading]
+        return [file_id for _, file_id in sorted(idle)]
+
+    def remove(self, file_id: str):
+        """Drop a record and its lock (its heap entry is discarded lazily)"""
+        with self.lock:
+            self.records.pop(get_content_key(file_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+            self.expiry_heap.clear()
+
+# Track download status for files that have a download
+download_status = DownloadStatusRegistry(CACHE_CLEANUP_SECONDS, STATUS_REGISTRY_MAX_ENTRIES)
 
 # Background cleanup task
 cleanup_task_running = False
 
+# Pre-connect the client's pooled session to the Google hosts at startup (GP_WARM_UP=0 disables)
+UPSTREAM_WARM_UP = os.environ.get('GP_WARM_UP', '1') != '0'
+UPSTREAM_WARM_UP_CONNECTIONS = int(os.environ.get('GP_WARM_UP_CONNECTIONS', '2'))
+# Worker processes parsing library pages during a full cache rebuild (0 = parse inline)
+LIBRARY_PARSE_WORKERS = int(os.environ.get('GP_PARSE_WORKERS', str(min(os.cpu_count() or 1, 4))))
+
+def warm_up_upstream():
+    """Open keep-alive connections to the api hosts in the background"""
+    def run():
+        started = time.time()
+        try:
+            results = get_google_photos_client().api.warm_up(connections=UPSTREAM_WARM_UP_CONNECTIONS)
+        except Exception as e:
+            print(f"⚠️ Connection warm-up failed: {e}")
+            return
+        ready = [host for host, ok in results.items() if ok]
+        print(f"🔌 Pre-connected to {len(ready)}/{len(results)} Google hosts in {time.time() - started:.2f}s")
+
+    threading.Thread(target=run, daemon=True).start()
+
 def get_google_photos_client() -> Client:
     """Get or create Google Photos client"""
     global gp_client
@@ -176,6 +382,172 @@ def get_google_photos_client() -> Client:
             raise HTTPException(status_code=500, detail="Failed to initialize Google Photos client")
     return gp_client
 
+def get_download_url(file_id: str) -> str:
+    """Resolve the current Google download URL for a media item"""
+    client = get_google_photos_client()
+    download_data = client.api.get_download_urls(file_id)
+    try:
+        return download_data["1"]["5"]["3"]["5"]
+    except KeyError:
+        try:
+            return download_data["1"]["5"]["2"]["6"]
+        except KeyError:
+            try:
+                return download_data["1"]["5"]["2"]["5"]
+            except KeyError:
+                raise Exception("No download URL found")
+
+# ========================================
+# 🔁 RESILIENT UPSTREAM READER
+# ========================================
+
+UPSTREAM_MAX_RETRIES = 6        # Consecutive failures before a transfer gives up
+UPSTREAM_BACKOFF_BASE = 0.5     # Seconds, doubled per consecutive failure (full jitter)
+UPSTREAM_BACKOFF_MAX = 15
+UPSTREAM_TIMEOUT = 30
+
+class UpstreamError(Exception):
+    """An upstream transfer failed for good (retries exhausted or a non-retryable status)"""
+
+class UpstreamReader:
+    """Byte-range reader for a Google download URL that survives drops and URL expiry
+
+    Transient errors (connection resets, timeouts, 5xx, 429, short reads) are
+    retried with jittered exponential backoff, resuming from the last byte
+    received with a Range request. A 403/410 means the signed URL expired, so
+    the URL is re-resolved through get_download_urls before retrying.
+
+    status_code and headers describe the first response, so callers can use
+    the reader where they previously used a streaming requests.Response.
+    """
+
+    def __init__(self, file_id: str, download_url: str = None, start: int = 0, end: Optional[int] = None):
+        self.file_id = file_id
+        self.download_url = download_url
+        self.start = start
+        self.end = end                  # Inclusive, None = until the end of the file
+        self.position = start
+        self.total_size: Optional[int] = None
+        self.status_code = None
+        self.headers = {}
+        self.retries = 0
+        self.response = None
+
+    def _backoff(self, attempt: int, error: Exception):
+        if attempt > UPSTREAM_MAX_RETRIES:
+            raise UpstreamError(f"Upstream transfer of {self.file_id} failed after {UPSTREAM_MAX_RETRIES} retries: {error}")
+        delay = random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+        self.retries += 1
+        print(f"🔁 Upstream retry {attempt}/{UPSTREAM_MAX_RETRIES} for {self.file_id[:8]}... at {self.position/1024/1024:.1f}MB in {delay:.1f}s ({error})")
+        time.sleep(delay)
+
+    def _request(self):
+        """Issue one request from the current position, returns the response or raises"""
+        if not self.download_url:
+            self.download_url = get_download_url(self.file_id)
+        headers = {}
+        if self.position > 0 or self.end is not None:
+            headers['Range'] = f"bytes={self.position}-{'' if self.end is None else self.end}"
+        response = requests.get(self.download_url, headers=headers, stream=True, timeout=UPSTREAM_TIMEOUT)
+
+        if response.status_code in (403, 410):
+            response.close()
+            self.download_url = None  # Signed URL expired: re-resolve on the next attempt
+            raise requests.ConnectionError(f"download URL expired (HTTP {response.status_code})")
+        if response.status_code == 429 or response.status_code >= 500:
+            response.close()
+            raise requests.ConnectionError(f"HTTP {response.status_code}")
+        if response.status_code not in (200, 206) or (headers and response.status_code != 206):
+            response.close()
+            raise UpstreamError(f"Upstream returned HTTP {response.status_code} for {self.file_id}")
+
+        # Total size from Content-Range (partial) or Content-Length (full)
+        content_range = response.headers.get('Content-Range', '')
+        if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+            self.total_size = int(content_range.rsplit('/', 1)[1])
+        elif response.status_code == 200 and response.headers.get('Content-Length', '').isdigit():
+            self.total_size = int(response.headers['Content-Length'])
+        return response
+
+    def open(self) -> "UpstreamReader":
+        """Open the first response (with retries) so status and headers are known"""
+        attempt = 0
+        while self.response is None:
+            try:
+                self.response = self._request()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                attempt += 1
+                self._backoff(attempt, e)
+        self.status_code = self.response.status_code
+        self.headers = self.response.headers
+        return self
+
+    def expected_end(self) -> Optional[int]:
+        if self.end is not None:
+            return self.end if self.total_size is None else min(self.end, self.total_size - 1)
+        return None if self.total_size is None else self.total_size - 1
+
+    def iter_content(self, chunk_size: int = 8192):
+        """Yield the requested bytes, transparently resuming after failures"""
+        if self.response is None:
+            self.open()
+        attempt = 0
+        while True:
+            try:
+                if self.response is None:
+                    self.response = self._request()
+                for chunk in self.response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        self.position += len(chunk)
+                        attempt = 0
+                        yield chunk
+                self.response.close()
+                self.response = None
+
+                # Verify we got everything Content-Length / Content-Range promised
+                expected_end = self.expected_end()
+                if expected_end is not None and self.position <= expected_end:
+                    raise requests.ConnectionError(f"short read: {self.position - self.start} bytes, expected {expected_end - self.start + 1}")
+                return
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if self.response is not None:
+                    self.response.close()
+                    self.response = None
+                attempt += 1
+                self._backoff(attempt, e)
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+def open_upstream(file_id: str, download_url: str = None, start: int = 0, end: Optional[int] = None) -> UpstreamReader:
+    """Open a resilient upstream byte-range reader (see UpstreamReader)"""
+    return UpstreamReader(file_id, download_url, start, end).open()
+
+def make_catalog_entry(media: dict) -> dict:
+    """file_cache entry for a media row (library_state and cache formats)"""
+    file_id = media['media_key']
+    media_type = media.get('type', 1)
+    return {
+        'id': file_id,
+        'filename': media.get('file_name') or media.get('filename', 'Unknown'),
+        'size_bytes': media.get('size_bytes') or 0,
+        'duration_ms': media.get('duration') or 0,
+        'type': 'video' if media_type == 2 else 'image',
+        'timestamp': media.get('timestamp', 0) or media.get('utc_timestamp', 0),
+        'collection_id': media.get('collection_id') or '',
+        'dedup_key': media.get('dedup_key') or '',
+        'content_version': media.get('content_version') or 0,
+        'is_favorite': bool(media.get('is_favorite')),
+        'is_archived': bool(media.get('is_archived')),
+        'caption': media.get('caption') or ''
+    }
+
+# remote_media columns the file catalog is built from
+LIBRARY_CATALOG_COLUMNS = ('media_key', 'file_name', 'type', 'size_bytes', 'utc_timestamp', 'collection_id', 'duration',
+                           'dedup_key', 'content_version', 'is_favorite', 'is_archived', 'caption')
+
 def refresh_file_cache():
     """Refresh the file cache from Google Photos"""
     global file_cache, cache_timestamp
@@ -218,13 +590,13 @@ def refresh_file_cache():
         # Delete the existing database to force a fresh start
         if client.db_path.exists():
             print(f"🗑️ Removing existing cache database: {client.db_path}")
-            client.db_path.unlink()
+            client.reset_cache()
 
         # Force cache directory creation
         client.cache_dir.mkdir(parents=True, exist_ok=True)
 
         print("🔄 Updating cache with fresh start...")
-        client.update_cache(show_progress=True)
+        client.update_cache(show_progress=True, parse_workers=LIBRARY_PARSE_WORKERS)
 
         print("🔄 Listing from cache...")
 
@@ -320,45 +692,37 @@ def refresh_file_cache():
                     media_key, file_name, media_type, size_bytes, utc_timestamp, collection_id, duration, trash_timestamp = row
                     print(f"   Sample {i}: {file_name} - trash_timestamp: {trash_timestamp}")
 
-                # Now get all files (including those with trash_timestamp = 0 which might mean not trashed)
-                cursor.execute("""
-                    SELECT media_key, file_name, type, size_bytes, utc_timestamp, collection_id, duration
-                    FROM remote_media
-                    WHERE trash_timestamp IS NULL OR trash_timestamp = 0
-                    ORDER BY utc_timestamp DESC
-                """)
-
-                db_results = cursor.fetchall()
+            # Not-trashed items newest first, along the timeline index
+            with open_library_storage() as storage:
+                db_results = storage.list_media(columns=LIBRARY_CATALOG_COLUMNS)
                 print(f"📊 Files with NULL or 0 trash_timestamp: {len(db_results)} files")
 
                 # If still 0, let's just get ALL files and filter later
                 if len(db_results) == 0:
                     print("🔄 Getting ALL files regardless of trash status...")
-                    cursor.execute("""
-                        SELECT media_key, file_name, type, size_bytes, utc_timestamp, collection_id, duration
-                        FROM remote_media
-                        ORDER BY utc_timestamp DESC
-                    """)
-                    db_results = cursor.fetchall()
+                    db_results = storage.list_media(include_trashed=True, columns=LIBRARY_CATALOG_COLUMNS)
                     print(f"📊 ALL files retrieved: {len(db_results)} files")
 
-                # Convert to the format expected by our system
-                all_media = []
-                for row in db_results:
-                    media_key, file_name, media_type, size_bytes, utc_timestamp, collection_id, duration = row
-
-                    media_item = {
-                        'media_key': media_key,
-                        'file_name': file_name,
-                        'type': media_type,
-                        'size_bytes': size_bytes or 0,
-                        'timestamp': utc_timestamp or 0,
-                        'collection_id': collection_id or '',
-                        'duration': duration or 0
-                    }
-                    all_media.append(media_item)
+            # Convert to the format expected by our system
+            all_media = []
+            for row in db_results:
+                media_item = {
+                    'media_key': row['media_key'],
+                    'file_name': row['file_name'],
+                    'type': row['type'],
+                    'size_bytes': row['size_bytes'] or 0,
+                    'timestamp': row['utc_timestamp'] or 0,
+                    'collection_id': row['collection_id'] or '',
+                    'duration': row['duration'] or 0,
+                    'dedup_key': row['dedup_key'] or '',
+                    'content_version': row['content_version'] or 0,
+                    'is_favorite': bool(row['is_favorite']),
+                    'is_archived': bool(row['is_archived']),
+                    'caption': row['caption'] or ''
+                }
+                all_media.append(media_item)
 
-                print(f"✅ Successfully converted {len(all_media)} database records")
+            print(f"✅ Successfully converted {len(all_media)} database records")
 
         except Exception as db_error:
             print(f"❌ Direct database query failed: {db_error}")
@@ -373,158 +737,392 @@ def refresh_file_cache():
 
         print(f"📊 Total media items retrieved: {len(all_media)}")
 
+        previous_ids = set(file_cache) | known_file_ids
         file_cache.clear()
         for media in all_media:
-            file_id = media['media_key']
+            file_cache[media['media_key']] = make_catalog_entry(media)
 
-            # Handle different data formats (library_state vs cache)
-            filename = media.get('file_name') or media.get('filename', 'Unknown')
-            size_bytes = media.get('size_bytes', 0)
-            duration_ms = media.get('duration', 0)
-            media_type = media.get('type', 1)
-            timestamp = media.get('timestamp', 0) or media.get('utc_timestamp', 0)
-            collection_id = media.get('collection_id', '')
+        # Map content keys onto the media keys that hold them
+        content_aliases.clear()
+        for file_id in file_cache:
+            content_aliases.setdefault(get_content_key(file_id), []).append(file_id)
+        migrate_legacy_cache_files()
 
-            file_cache[file_id] = {
-                'id': file_id,
-                'filename': filename,
-                'size_bytes': size_bytes,
-                'duration_ms': duration_ms,
-                'type': 'video' if media_type == 2 else 'image',
-                'timestamp': timestamp,
-                'collection_id': collection_id
-            }
-        
         cache_timestamp = time.time()
-        print(f"✅ Cached {len(file_cache)} files")
+        shared = sum(len(ids) - 1 for ids in content_aliases.values())
+        print(f"✅ Cached {len(file_cache)} files ({shared} share content with another item)")
+
+        # Warm heads of titles added since the last refresh (not on the very first load)
+        new_ids = set(file_cache) - previous_ids
+        if previous_ids and new_ids:
+            plan_new_title_prefetch(new_ids)
+        known_file_ids.update(file_cache)
         
     except Exception as e:
         print(f"❌ Error refreshing cache: {e}")
         raise HTTPException(status_code=500, detail="Failed to refresh file cache")
 
 def get_cache_file_path(file_id: str) -> Path:
-    """Get the cache file path for a video"""
-    return cache_dir / f"{file_id}.mp4"
+    """Get the cache file path for a video (shared by every alias of its content)"""
+    return cache_dir / f"{get_content_key(file_id)}.mp4"
+
+def migrate_legacy_cache_files():
+    """Rename cache and metadata files still named by media key to their content key"""
+    for directory, suffix in ((cache_dir, '.mp4'), (metadata_cache_dir, '.meta')):
+        for path in directory.glob(f"*{suffix}"):
+            file_id = path.stem
+            content_key = get_content_key(file_id)
+            if content_key == file_id:
+                continue
+            target = directory / f"{content_key}{suffix}"
+            try:
+                if target.exists():
+                    path.unlink()  # Another alias already holds this content
+                else:
+                    path.rename(target)
+                    print(f"🔗 Re-keyed {path.name} → {target.name}")
+            except OSError as e:
+                print(f"⚠️ Could not re-key {path.name}: {e}")
+
+def get_cache_progress_path(file_id: str) -> Path:
+    """Sidecar holding the downloaded byte count of a preallocated cache file"""
+    return cache_dir / f"{get_content_key(file_id)}.progress"
+
+def get_cache_watermark(file_id: str) -> int:
+    """Bytes at the start of the cache file that hold downloaded data
+
+    A file still being written is preallocated to its full size, so its
+    size on disk says nothing; the progress sidecar does. Files without a
+    sidecar were truncated to their valid length when the writer stopped.
+    """
+    cache_file = get_cache_file_path(file_id)
+    try:
+        file_size = cache_file.stat().st_size
+    except FileNotFoundError:
+        return 0
+    try:
+        return min(int(get_cache_progress_path(file_id).read_text()), file_size)
+    except (OSError, ValueError):
+        return file_size
+
+def get_cached_bytes(file_id: str) -> int:
+    """Bytes of a title that can be served from disk right now"""
+    status = download_status.get(file_id)
+    if status is not None and status.downloading:
+        return status.bytes_downloaded if get_cache_file_path(file_id).exists() else 0
+    return get_cache_watermark(file_id)
+
+class CacheFileWriter:
+    """Sequential writer for a cache file
+
+    The file is preallocated with posix_fallocate, chunks are gathered in one
+    reusable buffer and written in large blocks aligned to CACHE_WRITE_ALIGNMENT.
+    written is the durable watermark: everything before it is on disk. On close
+    the file is truncated to the watermark so a partial file can be resumed.
+    A digest (e.g. hashlib.sha1()) is fed every byte as it is written.
+    """
+
+    def __init__(self, file_id: str, total_size: int, start: int = 0, on_block=None, digest=None):
+        self.file_id = file_id
+        self.digest = digest
+        self.cache_file = get_cache_file_path(file_id)
+        self.progress_file = get_cache_progress_path(file_id)
+        self.on_block = on_block
+        fd = os.open(self.cache_file, os.O_RDWR | os.O_CREAT, 0o644)
+        self.file = os.fdopen(fd, 'r+b', buffering=0)
+        if not start:
+            self.file.truncate(0)
+        if total_size > start and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, start, total_size - start)
+            except OSError as e:
+                print(f"⚠️ Could not preallocate cache file: {e}")
+        self.file.seek(start)
+        self.buffer = bytearray(CACHE_WRITE_BLOCK_BYTES)
+        self.view = memoryview(self.buffer)
+        self.block_start = start
+        # A resumed first block is shortened so every following block starts aligned
+        self.block_limit = CACHE_WRITE_BLOCK_BYTES - start % CACHE_WRITE_ALIGNMENT
+        self.fill = 0
+        self.flushed = 0  # Bytes of the current block already on disk
+        self.written = start
+        self.checkpoint()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def position(self) -> int:
+        """File offset of the next byte to write (buffered bytes included)"""
+        return self.block_start + self.fill
+
+    def write(self, chunk):
+        """Copy a chunk into the block buffer, writing out every block that fills up"""
+        offset = 0
+        while offset < len(chunk):
+            count = min(len(chunk) - offset, self.block_limit - self.fill)
+            self.view[self.fill:self.fill + count] = chunk[offset:offset + count]
+            self.fill += count
+            offset += count
+            if self.fill == self.block_limit:
+                self._finish_block()
+
+    def flush(self):
+        """Write out the aligned part of the current block (readers only see flushed bytes)"""
+        end = self.fill - (self.block_start + self.fill) % CACHE_WRITE_ALIGNMENT
+        self._write_through(end)
+
+    def checkpoint(self):
+        """Persist the watermark so a preallocated file can be resumed after a crash"""
+        try:
+            self.progress_file.write_text(str(self.written))
+        except OSError as e:
+            print(f"⚠️ Could not write download progress: {e}")
+
+    def close(self):
+        """Write out everything buffered and truncate the file to the watermark"""
+        if self.file.closed:
+            return
+        try:
+            if self.fill:
+                self._finish_block()
+            self.file.truncate(self.written)
+        finally:
+            self.view.release()
+            self.file.close()
+            self.progress_file.unlink(missing_ok=True)
+
+    def _write_through(self, end: int):
+        if end > self.flushed:
+            block = self.view[self.flushed:end]
+            # Unbuffered FileIO may write only part of the block per call
+            offset = 0
+            while offset < len(block):
+                offset += self.file.write(block[offset:])
+            if self.digest is not None:
+                self.digest.update(block)
+            self.written += end - self.flushed
+            self.flushed = end
+
+    def _finish_block(self):
+        self._write_through(self.fill)
+        if self.on_block:
+            # The block is handed out before the buffer is reused, without copying
+            self.on_block(self.block_start, self.view[:self.fill])
+        self.block_start += self.fill
+        self.block_limit = CACHE_WRITE_BLOCK_BYTES
+        self.fill = 0
+        self.flushed = 0
 
 def start_full_download(file_id: str, download_url: str, file_size: int):
     """Start downloading the complete file in background"""
-    with download_locks[file_id]:
+    if file_id not in download_status and len(download_status) >= STATUS_REGISTRY_MAX_ENTRIES:
+        # Bounded registry: release the least recently used idle title first
+        for idle_id in download_status.idle_candidates():
+            if not has_live_viewers(idle_id) and release_cached_file(idle_id):
+                break
+
+    status = download_status.get_or_create(file_id)
+    with status.lock:
         # Skip if already downloading or completed
-        if download_status[file_id]['downloading'] or download_status[file_id]['completed']:
+        if status.downloading or status.completed:
             print(f"📦 Download already in progress/completed for {file_id}")
             return
 
-        download_status[file_id]['downloading'] = True
-        download_status[file_id]['download_start'] = time.time()
-        download_status[file_id]['total_bytes'] = file_size
+        status.downloading = True
+        status.download_start = time.time()
+        status.total_bytes = file_size
+        # Readers keep seeing the bytes already on disk while the download resumes
+        status.bytes_downloaded = get_cache_watermark(file_id)
 
         print(f"🚀 Starting download for {file_id}")
 
-    def download_worker():
+    def download_worker(transfer):
         cache_file = get_cache_file_path(file_id)
 
         try:
-            # Get file size from download_status (already set above)
-            current_file_size = download_status[file_id]['total_bytes']
+            # Get file size from the status record (already set above)
+            current_file_size = status.total_bytes
             print(f"🚀 Starting full download: {current_file_size/1024/1024/1024:.1f}GB")
 
-            response = requests.get(download_url, stream=True)
-            if response.status_code == 200:
+            # Resume a partial file left by an earlier failed or cancelled run
+            resume_from = status.bytes_downloaded
+            if current_file_size and resume_from >= current_file_size:
+                resume_from = 0
+                status.bytes_downloaded = 0
+            if resume_from:
+                print(f"⏯️ Resuming download at {resume_from/1024/1024:.0f}MB")
+
+            filename = file_cache.get(file_id, {}).get('filename', 'unknown.mp4')
+
+            def extract_head_metadata(head, file_size):
+                # 🎬 METADATA EXTRACTION: the head block is parsed in place
+                try:
+                    if load_metadata_cache(file_id):
+                        print("📖 Metadata already cached, skipping extraction")
+                        return
+                    print(f"🎬 Extracting video metadata from first {len(head)/1024/1024:.1f}MB...")
+                    metadata = extract_media_metadata(head, file_size, filename, download_url, file_id, holds_slot=transfer.holding)
+                    save_metadata_cache(file_id, metadata)
+                    print("✅ Metadata extraction complete!")
+                except Exception as e:
+                    print(f"⚠️ Metadata extraction failed: {e}")
+
+            if resume_from and not load_metadata_cache(file_id):
+                # Metadata extraction needs the head, which is already on disk
+                head = bytearray(min(resume_from, CACHE_WRITE_BLOCK_BYTES))
+                with open(cache_file, 'rb') as head_file:
+                    head_length = head_file.readinto(head)
+                extract_head_metadata(memoryview(head)[:head_length], current_file_size)
+
+            response = open_upstream(file_id, download_url, start=resume_from)
+            if response.status_code in (200, 206):
                 # Get actual file size from response headers if available
-                actual_size = response.headers.get('Content-Length')
+                actual_size = response.total_size
                 if actual_size:
-                    actual_size = int(actual_size)
                     if actual_size != current_file_size:
                         print(f"⚠️ File size mismatch! Expected: {current_file_size/1024/1024:.0f}MB, Actual: {actual_size/1024/1024:.0f}MB")
                         current_file_size = actual_size  # Use the correct size
-                        download_status[file_id]['total_bytes'] = current_file_size
+                        status.total_bytes = current_file_size
                         print(f"✅ Updated file size to: {current_file_size/1024/1024:.0f}MB")
-                with open(cache_file, 'wb') as f:
-                    bytes_downloaded = 0
-                    start_time = time.time()
-                    metadata_extracted = False
-                    first_chunk_data = b''
 
-                    for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
-                        if chunk:
-                            f.write(chunk)
-                            bytes_downloaded += len(chunk)
-
-                            # 🎬 METADATA EXTRACTION: Extract from first 50MB
-                            if not metadata_extracted and bytes_downloaded <= 50 * 1024 * 1024:
-                                first_chunk_data += chunk
-
-                                # Try to extract metadata when we have enough data
-                                if len(first_chunk_data) >= 10 * 1024 * 1024:  # 10MB should be enough for metadata
-                                    try:
-                                        # Check if we already have metadata cached
-                                        existing_metadata = load_metadata_cache(file_id)
-                                        if not existing_metadata:
-                                            print(f"🎬 Extracting MP4 metadata from first {len(first_chunk_data)/1024/1024:.1f}MB...")
-                                            filename = file_cache.get(file_id, {}).get('filename', 'unknown.mp4')
-                                            metadata = extract_mp4_metadata(first_chunk_data, current_file_size, filename)
-                                            save_metadata_cache(file_id, metadata)
-                                            print(f"✅ Metadata extraction complete!")
-                                        else:
-                                            print(f"📖 Metadata already cached, skipping extraction")
-                                        metadata_extracted = True
-                                    except Exception as e:
-                                        print(f"⚠️ Metadata extraction failed: {e}")
-                                        metadata_extracted = True  # Don't try again
-
-                            # Update progress
-                            download_status[file_id]['bytes_downloaded'] = bytes_downloaded
-
-                            # Calculate speed every 1MB
-                            if bytes_downloaded % (10 * 1024 * 1024) == 0:  # Every 10MB
-                                elapsed = time.time() - start_time
-                                speed_mbps = (bytes_downloaded / 1024 / 1024) / max(elapsed, 0.1)
-                                download_status[file_id]['download_speed_mbps'] = speed_mbps
-
-                                # Calculate progress with safety checks - CAP AT 100%
-                                if current_file_size > 0:
-                                    progress = min((bytes_downloaded / current_file_size) * 100, 100.0)  # Never exceed 100%
-                                else:
-                                    progress = 0
-
-                                print(f"📥 Download progress: {progress:.1f}% ({speed_mbps:.0f} MB/s) [{bytes_downloaded/1024/1024:.0f}MB/{current_file_size/1024/1024:.0f}MB]")
+                def on_block(block_start, block):
+                    if block_start == 0:
+                        extract_head_metadata(block, current_file_size)
+
+                # The dedup_key is the SHA-1 of the content: hash while writing to verify the result
+                expected_sha1 = get_expected_sha1(file_id)
+                digest = None
+                if expected_sha1:
+                    digest = hashlib.sha1()
+                    if resume_from:
+                        with open(cache_file, 'rb') as prefix_file:
+                            remaining = resume_from
+                            while remaining > 0:
+                                block = prefix_file.read(min(remaining, CACHE_WRITE_BLOCK_BYTES))
+                                if not block:
+                                    break
+                                digest.update(block)
+                                remaining -= len(block)
+
+                start_time = time.time()
+                last_publish = start_time
+                last_report = start_time
+                with CacheFileWriter(file_id, current_file_size, resume_from, on_block, digest) as writer:
+                    while True:
+                        for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
+                            if not chunk:
+                                continue
+                            if not has_live_viewers(file_id):
+                                break
+
+                            transfer.consume(len(chunk))
+                            writer.write(chunk)
+
+                            # Publish progress at a fixed cadence, not per chunk
+                            current_time = time.time()
+                            if current_time - last_publish >= CACHE_PROGRESS_INTERVAL:
+                                writer.flush()
+                                writer.checkpoint()
+                                status.bytes_downloaded = writer.written
+                                elapsed = current_time - start_time
+                                status.download_speed_mbps = ((writer.written - resume_from) / 1024 / 1024) / max(elapsed, 0.1)
+                                last_publish = current_time
+
+                                if current_time - last_report >= 10:
+                                    # Calculate progress with safety checks - CAP AT 100%
+                                    if current_file_size > 0:
+                                        progress = min((writer.written / current_file_size) * 100, 100.0)  # Never exceed 100%
+                                    else:
+                                        progress = 0
+                                    print(f"📥 Download progress: {progress:.1f}% ({status.download_speed_mbps:.0f} MB/s) [{writer.written/1024/1024:.0f}MB/{current_file_size/1024/1024:.0f}MB]")
+                                    last_report = current_time
+                        else:
+                            break
+
+                        # 👥 Nobody is watching: give back the connection and the slot while paused,
+                        # cancel if they don't come back, else resume by Range where the writer stopped
+                        response.close()
+                        writer.flush()
+                        writer.checkpoint()
+                        status.bytes_downloaded = writer.written
+                        transfer.pause()
+                        if not wait_for_viewers(file_id):
+                            writer.close()
+                            status.bytes_downloaded = writer.written
+                            status.downloading = False
+                            return
+                        transfer.resume()
+                        response = open_upstream(file_id, response.download_url, start=writer.position)
+
+                # Everything buffered is on disk (and hashed) once the writer is closed
+                bytes_downloaded = writer.written
+                status.bytes_downloaded = bytes_downloaded
+
+                # Verify the final size before marking as completed
+                if current_file_size and bytes_downloaded != current_file_size:
+                    print(f"❌ Download size mismatch: {bytes_downloaded:,} of {current_file_size:,} bytes, keeping partial file for resume")
+                    status.downloading = False
+                    return
+
+                if digest is not None and digest.digest() != expected_sha1:
+                    print(f"❌ SHA-1 mismatch for {file_id[:8]}..., discarding the cached copy")
+                    status.downloading = False
+                    release_cached_file(file_id)
+                    return
 
                 # Mark as completed
-                download_status[file_id]['downloading'] = False
-                download_status[file_id]['completed'] = True
+                status.downloading = False
+                status.completed = True
 
                 elapsed = time.time() - start_time
-                final_speed = (current_file_size / 1024 / 1024) / max(elapsed, 0.1)
-                print(f"✅ Download completed: {current_file_size/1024/1024/1024:.1f}GB in {elapsed:.1f}s ({final_speed:.0f} MB/s)")
+                final_speed = ((current_file_size - resume_from) / 1024 / 1024) / max(elapsed, 0.1)
+                verified = " (SHA-1 verified)" if digest is not None else ""
+                print(f"✅ Download completed: {current_file_size/1024/1024/1024:.1f}GB in {elapsed:.1f}s ({final_speed:.0f} MB/s){verified}")
 
             else:
                 print(f"❌ Download failed: HTTP {response.status_code}")
-                download_status[file_id]['downloading'] = False
+                status.downloading = False
 
         except Exception as e:
-            print(f"❌ Download error: {e}")
-            download_status[file_id]['downloading'] = False
+            print(f"❌ Download error: {e} (partial file kept, the next viewer resumes it)")
+            status.downloading = False
+
+    def run_download():
+        with scheduled_transfer(PRIORITY_WINDOW_FILL, file_id) as transfer:
+            download_worker(transfer)
 
     # Start download in background thread
-    threading.Thread(target=download_worker, daemon=True).start()
+    threading.Thread(target=run_download, daemon=True).start()
     print(f"🎯 Background download started for {file_id}")
 
 def get_download_progress(file_id: str) -> dict:
     """Get download progress for a file"""
-    status = download_status[file_id]
+    status = download_status.get(file_id)
 
-    if status['completed']:
+    if status is None:
+        return {
+            'status': 'not_started',
+            'progress': 0,
+            'speed_mbps': 0,
+            'eta_seconds': 0
+        }
+    elif status.completed:
         return {
             'status': 'completed',
             'progress': 100.0,
             'speed_mbps': 0,
             'eta_seconds': 0
         }
-    elif status['downloading']:
-        if status['total_bytes'] > 0:
-            progress = min((status['bytes_downloaded'] / status['total_bytes']) * 100, 100.0)  # Cap at 100%
-            remaining_bytes = max(status['total_bytes'] - status['bytes_downloaded'], 0)  # Never negative
-            eta = remaining_bytes / max(status['download_speed_mbps'] * 1024 * 1024, 1)
+    elif status.downloading:
+        if status.total_bytes > 0:
+            progress = min((status.bytes_downloaded / status.total_bytes) * 100, 100.0)  # Cap at 100%
+            remaining_bytes = max(status.total_bytes - status.bytes_downloaded, 0)  # Never negative
+            eta = remaining_bytes / max(status.download_speed_mbps * 1024 * 1024, 1)
         else:
             progress = 0
             eta = 0
@@ -532,7 +1130,7 @@ def get_download_progress(file_id: str) -> dict:
         return {
             'status': 'downloading',
             'progress': progress,
-            'speed_mbps': status['download_speed_mbps'],
+            'speed_mbps': status.download_speed_mbps,
             'eta_seconds': eta
         }
     else:
@@ -543,137 +1141,1584 @@ def get_download_progress(file_id: str) -> dict:
             'eta_seconds': 0
         }
 
+def is_download_started(file_id: str) -> bool:
+    """Check if a title has a running or finished download"""
+    status = download_status.get(file_id)
+    return status is not None and (status.downloading or status.completed)
+
+def is_download_completed(file_id: str) -> bool:
+    status = download_status.get(file_id)
+    return status is not None and status.completed
+
 def is_file_cached(file_id: str) -> bool:
     """Check if file is fully cached"""
     cache_file = get_cache_file_path(file_id)
-    return cache_file.exists() and download_status[file_id]['completed']
+    status = download_status.get(file_id)
+    return status is not None and status.completed and cache_file.exists()
 
 def register_user_access(file_id: str, user_session: str = None):
-    """Register that a user is accessing a file - simplified version"""
-    with download_locks[file_id]:
-        download_status[file_id]['last_access'] = time.time()
-        # Don't track individual users, just update access time
-        print(f"👤 User access registered for {file_id} (last_access updated)")
+    """Register that a user is accessing a file (refreshes the session TTL and pins the file)"""
+    if user_session:
+        session_registry.touch(user_session, file_id)
+    status = download_status.get(file_id)
+    if status is not None:
+        status.last_access = time.time()
+        status.user_sessions = session_registry.live_sessions(file_id)
+        status.active_users = len(status.user_sessions)
 
 def unregister_user_access(file_id: str, user_session: str = None):
     """Unregister user access when they stop watching"""
-    # Not needed in simplified version
-    pass
+    if user_session:
+        session_registry.release(user_session, file_id)
+    status = download_status.get(file_id)
+    if status is not None:
+        status.user_sessions = session_registry.live_sessions(file_id)
+        status.active_users = len(status.user_sessions)
+
+def release_cached_file(file_id: str) -> bool:
+    """Delete a title's cache file, RAM entries and status record; returns False if the file is locked"""
+    cache_file = get_cache_file_path(file_id)
+    try:
+        file_size = cache_file.stat().st_size if cache_file.exists() else 0
+        cache_file.unlink(missing_ok=True)
+        get_cache_progress_path(file_id).unlink(missing_ok=True)
+    except PermissionError:
+        # File is being used by another process (could be antivirus, file explorer, etc.)
+        print(f"⏭️ Skipping cleanup for {file_id}: file locked by system")
+        return False
+    ram_cache.invalidate(file_id)
+    download_status.remove(file_id)
+    if file_size:
+        print(f"🧹 Cleaned up inactive cache: {file_id} ({file_size/1024/1024/1024:.1f}GB freed)")
+    return True
 
 def cleanup_inactive_cache():
-    """Clean up cache files that haven't been accessed recently"""
-    current_time = time.time()
-    files_to_cleanup = []
+    """Clean up cache files that haven't been accessed recently (only titles whose idle deadline passed)"""
+    for file_id in session_registry.expire():
+        status = download_status.get(file_id)
+        if status is not None:
+            status.user_sessions = set()
+            status.active_users = 0
+            print(f"👋 Last viewer of {file_id[:8]}... left")
+
+    for file_id in download_status.pop_expired():
+        status = download_status.get(file_id)
+        if status is None:
+            continue
+
+        # Don't cleanup files that are currently downloading or still have viewers
+        if status.downloading or has_live_viewers(file_id):
+            download_status.defer(file_id)
+            continue
 
-    print(f"🔍 Cleanup check: scanning {len(download_status)} files...")
+        try:
+            if not release_cached_file(file_id):
+                download_status.defer(file_id)
+        except Exception as e:
+            print(f"❌ Error cleaning up cache for {file_id}: {e}")
 
-    for file_id, status in download_status.items():
-        # Check if file has been inactive for more than CACHE_CLEANUP_SECONDS
-        time_since_access = current_time - status['last_access']
+def start_cleanup_task():
+    """Start the background cleanup task"""
+    global cleanup_task_running
 
-        # Don't cleanup files that are currently downloading or recently accessed
-        is_downloading = status['downloading']
-        is_recently_accessed = time_since_access <= CACHE_CLEANUP_SECONDS
-        has_no_access_time = status['last_access'] == 0
+    if cleanup_task_running:
+        return
 
-        print(f"📊 {file_id[:8]}... - downloading: {is_downloading}, completed: {status['completed']}, inactive: {time_since_access:.1f}s, threshold: {CACHE_CLEANUP_SECONDS}s")
+    cleanup_task_running = True
 
-        if not is_downloading and not is_recently_accessed and not has_no_access_time:
-            files_to_cleanup.append((file_id, time_since_access))
-            print(f"🗑️ Marked for cleanup: {file_id[:8]}... ({time_since_access:.1f}s inactive)")
+    def cleanup_worker():
+        while cleanup_task_running:
+            try:
+                cleanup_inactive_cache()
+            except Exception as e:
+                print(f"❌ Cleanup task error: {e}")
+            # Sleep until the next idle deadline (sessions are expired at least every CLEANUP_CHECK_INTERVAL)
+            next_deadline = download_status.next_deadline()
+            delay = CLEANUP_CHECK_INTERVAL if next_deadline is None else next_deadline - time.time()
+            time.sleep(min(max(delay, 0.5), CLEANUP_CHECK_INTERVAL))
 
-    if not files_to_cleanup:
-        print(f"✅ No files to cleanup")
+    threading.Thread(target=cleanup_worker, daemon=True).start()
+    print(f"🧹 Background cleanup task started (cleanup after {CACHE_CLEANUP_SECONDS}s idle)")
 
-    for file_id, time_since_access in files_to_cleanup:
-        cache_file = get_cache_file_path(file_id)
 
-        try:
-            if cache_file.exists():
-                # Double-check that file is not being downloaded
-                if download_status[file_id]['downloading']:
-                    print(f"⏭️ Skipping cleanup for {file_id}: still downloading")
+
+# ========================================
+# ⚡ RAM SEGMENT CACHE (in front of disk)
+# ========================================
+
+RAM_CACHE_MAX_BYTES = int(os.environ.get('RAM_CACHE_MAX_MB', '512')) * 1024 * 1024  # Total RAM budget
+RAM_CACHE_HEAD_BYTES = 16 * 1024 * 1024  # First N bytes of a title kept in RAM (start of playback)
+
+class FrequencySketch:
+    """Count-min sketch with periodic aging, used as the TinyLFU admission filter
+
+    Counters are halved every sample_size increments so old popularity fades.
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4, max_count: int = 15):
+        self.width = width
+        self.depth = depth
+        self.max_count = max_count
+        self.sample_size = width * 10
+        self.additions = 0
+        self.rows = [bytearray(width) for _ in range(depth)]
+
+    def _indexes(self, key) -> list:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[i * 4:i * 4 + 4], 'little') % self.width for i in range(self.depth)]
+
+    def increment(self, key):
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < self.max_count:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            # Aging: halve every counter
+            for row in self.rows:
+                row[:] = bytes(count >> 1 for count in row)
+            self.additions //= 2
+
+    def estimate(self, key) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+class RamSegmentCache:
+    """Byte-budgeted LRU of hot segments with TinyLFU admission
+
+    Keys are tuples whose second element is the file id, e.g. ('head', file_id)
+    or ('vheader', file_id), so every entry of a title can be invalidated at once.
+    File ids are mapped to their content key, so aliases share entries.
+    A new entry only evicts LRU victims that are less frequently requested than
+    itself, which keeps one-off scans from flushing popular titles.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries: OrderedDict = OrderedDict()
+        self.sketch = FrequencySketch()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _content_key(key) -> tuple:
+        return (key[0], get_content_key(key[1])) + tuple(key[2:])
+
+    def __contains__(self, key) -> bool:
+        """Membership test that does not count as a lookup"""
+        key = self._content_key(key)
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key) -> Optional[bytes]:
+        key = self._content_key(key)
+        with self.lock:
+            self.sketch.increment(key)
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: bytes, admit: bool = False) -> bool:
+        """Insert an entry if the admission filter accepts it, returns True when stored
+
+        admit=True skips the frequency check, for planned prefetches whose demand
+        the sketch has not seen yet.
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return False
+        key = self._content_key(key)
+        with self.lock:
+            # An existing entry for the key is replaced, so its bytes count as free;
+            # it stays cached if the new value is rejected
+            existing = self.entries.get(key)
+            freed = len(existing) if existing is not None else 0
+
+            # Pick LRU victims until the candidate fits; reject if any victim is hotter
+            candidate_frequency = self.sketch.estimate(key)
+            victims = []
+            for victim_key, victim_value in self.entries.items():
+                if self.current_bytes - freed + size <= self.max_bytes:
+                    break
+                if victim_key == key:
+                    continue
+                if not admit and self.sketch.estimate(victim_key) > candidate_frequency:
+                    self.rejected += 1
+                    return False
+                victims.append(victim_key)
+                freed += len(victim_value)
+
+            for victim_key in victims:
+                self.current_bytes -= len(self.entries.pop(victim_key))
+            if existing is not None:
+                self.current_bytes -= len(self.entries.pop(key))
+            self.entries[key] = value
+            self.current_bytes += size
+            return True
+
+    def find_segment(self, file_id: str, byte_offset: int) -> Optional[tuple]:
+        """Find a cached ('head', id) or ('segment', id, start) entry covering byte_offset
+
+        Returns (start, data) without counting as a lookup for admission.
+        """
+        file_id = get_content_key(file_id)
+        with self.lock:
+            for key, value in self.entries.items():
+                if key[1] != file_id or key[0] not in ('head', 'segment'):
                     continue
+                start = key[2] if key[0] == 'segment' else 0
+                if start <= byte_offset < start + len(value):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return start, value
+            return None
+
+    def invalidate(self, file_id: str):
+        """Drop every entry belonging to a file"""
+        file_id = get_content_key(file_id)
+        with self.lock:
+            for key in [key for key in self.entries if key[1] == file_id]:
+                self.current_bytes -= len(self.entries.pop(key))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "used_mb": round(self.current_bytes / 1024 / 1024, 1),
+                "budget_mb": round(self.max_bytes / 1024 / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0,
+                "rejected_admissions": self.rejected
+            }
+
+ram_cache = RamSegmentCache(RAM_CACHE_MAX_BYTES)
+
+def offer_head_to_ram_cache(file_id: str, head: bytes):
+    """Offer the first RAM_CACHE_HEAD_BYTES of a title to the RAM tier"""
+    head = bytes(head[:RAM_CACHE_HEAD_BYTES])
+    if ram_cache.put(('head', file_id), head):
+        print(f"⚡ RAM cache: stored head of {file_id[:8]}... ({len(head)/1024/1024:.1f}MB)")
+
+def get_head_from_ram_cache(file_id: str, cache_file: Path, bytes_available: int, file_size: int) -> Optional[bytes]:
+    """Head bytes of a title from RAM, loading them from the disk tier on a miss
+
+    Nothing is loaded until the disk tier holds the whole head, so a short
+    head from an early request never gets pinned in RAM.
+    """
+    head = ram_cache.get(('head', file_id))
+    if head is not None:
+        return head
+    head_size = min(RAM_CACHE_HEAD_BYTES, file_size)
+    if head_size <= 0 or bytes_available < head_size:
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            head = f.read(head_size)
+    except OSError:
+        return None
+    offer_head_to_ram_cache(file_id, head)
+    return head
+
+def get_virtual_mp4_header(file_id: str, metadata: dict) -> bytes:
+    """Virtual MP4 header for a title, decoded once and then served from RAM"""
+    header = ram_cache.get(('vheader', file_id))
+    if header is None:
+        header = create_virtual_mp4_header(metadata)
+        if header:
+            ram_cache.put(('vheader', file_id), header)
+    return header
+
+# ========================================
+# 👥 VIEWER SESSIONS
+# ========================================
+
+SESSION_HEADER = 'x-session-id'
+SESSION_COOKIE = 'gp_session'
+SESSION_TTL_SECONDS = 60                # A session without requests/heartbeats for this long is gone
+DOWNLOAD_CANCEL_AFTER_SECONDS = 60      # Paused downloads with no viewers are cancelled after this
+
+class SessionRegistry:
+    """Live viewer sessions and the titles each one holds
+
+    Every title a live session touches is refcounted by content key; a
+    referenced title is pinned against cache cleanup and keeps its background
+    download running.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl = ttl_seconds
+        self.lock = threading.Lock()
+        self.last_seen: Dict[str, float] = {}         # session_id -> last request time
+        self.session_files: Dict[str, set] = {}       # session_id -> file ids in use
+        self.file_sessions: Dict[str, set] = {}       # file_id -> session ids (the refcount)
+
+    def touch(self, session_id: str, file_id: str):
+        file_id = get_content_key(file_id)
+        with self.lock:
+            self.last_seen[session_id] = time.time()
+            self.session_files.setdefault(session_id, set()).add(file_id)
+            self.file_sessions.setdefault(file_id, set()).add(session_id)
+
+    def release(self, session_id: str, file_id: str):
+        with self.lock:
+            self._release(session_id, get_content_key(file_id))
+
+    def _release(self, session_id: str, file_id: str):
+        self.session_files.get(session_id, set()).discard(file_id)
+        sessions = self.file_sessions.get(file_id)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self.file_sessions[file_id]
+
+    def expire(self) -> list:
+        """Drop sessions past their TTL, returns the file ids left without viewers"""
+        deadline = time.time() - self.ttl
+        orphaned = []
+        with self.lock:
+            for session_id in [sid for sid, seen in self.last_seen.items() if seen < deadline]:
+                for file_id in self.session_files.pop(session_id, set()):
+                    self._release(session_id, file_id)
+                    if file_id not in self.file_sessions:
+                        orphaned.append(file_id)
+                del self.last_seen[session_id]
+        return orphaned
+
+    def live_sessions(self, file_id: str) -> set:
+        deadline = time.time() - self.ttl
+        with self.lock:
+            return {sid for sid in self.file_sessions.get(get_content_key(file_id), ()) if self.last_seen.get(sid, 0) >= deadline}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "sessions": len(self.last_seen),
+                "titles_in_use": len(self.file_sessions)
+            }
+
+session_registry = SessionRegistry(SESSION_TTL_SECONDS)
+
+def get_session_id(request: Request) -> Optional[str]:
+    """Session id of a request: explicit header, then the session cookie, then one just assigned"""
+    if request is None:
+        return None
+    return (request.headers.get(SESSION_HEADER)
+            or request.cookies.get(SESSION_COOKIE)
+            or getattr(request.state, 'session_id', None))
+
+def has_live_viewers(file_id: str) -> bool:
+    return bool(session_registry.live_sessions(file_id))
+
+def wait_for_viewers(file_id: str) -> bool:
+    """Pause a background download while its title has no live sessions
+
+    Returns False when nobody came back within DOWNLOAD_CANCEL_AFTER_SECONDS
+    and the download should be cancelled.
+    """
+    if has_live_viewers(file_id):
+        return True
+    print(f"⏸️ No live viewers for {file_id[:8]}..., pausing download")
+    paused_since = time.time()
+    while time.time() - paused_since < DOWNLOAD_CANCEL_AFTER_SECONDS:
+        time.sleep(1)
+        if has_live_viewers(file_id):
+            print(f"▶️ Viewer back for {file_id[:8]}..., resuming download")
+            return True
+    print(f"🛑 Download of {file_id[:8]}... cancelled: no viewers for {DOWNLOAD_CANCEL_AFTER_SECONDS}s")
+    return False
+
+# ========================================
+# 🚦 TRANSFER SCHEDULER
+# ========================================
+
+# Priority classes, lower value wins
+PRIORITY_INTERACTIVE = 0   # Viewer range requests (seek / passthrough)
+PRIORITY_WINDOW_FILL = 1   # Download-ahead of a title being watched
+PRIORITY_PREFETCH = 2      # Prefetch planner
+PRIORITY_METADATA = 3      # Metadata harvesting
+PRIORITY_NAMES = {0: 'interactive', 1: 'window_fill', 2: 'prefetch', 3: 'metadata'}
+
+TRANSFER_CAPACITY_MBPS = int(os.environ.get('TRANSFER_CAPACITY_MBPS', '100'))  # Uplink budget shared by all classes
+TRANSFER_MAX_CONCURRENT = 6      # Background transfers running at once
+TRANSFER_MAX_PER_TITLE = 2       # Background transfers per title
+TRANSFER_CLASS_MBPS = {          # Per-class ceilings (None = only the shared budget applies)
+    PRIORITY_INTERACTIVE: None,
+    PRIORITY_WINDOW_FILL: None,
+    PRIORITY_PREFETCH: 20,
+    PRIORITY_METADATA: 10,
+}
+
+class TokenBucket:
+    """Token bucket in bytes; the balance may go negative to record debt"""
+
+    def __init__(self, rate_bytes: float, burst_bytes: float):
+        self.rate = rate_bytes
+        self.burst = burst_bytes
+        self.tokens = burst_bytes
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, nbytes: int) -> float:
+        self.refill()
+        return 0.0 if self.tokens >= nbytes else (nbytes - self.tokens) / self.rate
+
+class TransferScheduler:
+    """Shares the upstream bandwidth between viewers and background work
+
+    Interactive transfers never wait: they draw from the shared bucket and may
+    push it into debt. Background classes wait until the shared bucket (and
+    their own ceiling) has tokens and no higher-priority class is waiting for
+    bandwidth, so they only use capacity viewers leave over. Background
+    transfers also hold a concurrency slot capped globally and per title.
+
+    Slot waiters are counted apart from bandwidth waiters: a transfer queued
+    for a slot must not throttle the lower-priority transfer holding the slot
+    it is waiting for, or neither would ever finish.
+    """
+
+    def __init__(self, capacity_mbps: int, max_concurrent: int, max_per_title: int):
+        capacity = capacity_mbps * 1024 * 1024
+        self.shared = TokenBucket(capacity, capacity)
+        self.class_buckets = {
+            priority: TokenBucket(mbps * 1024 * 1024, mbps * 1024 * 1024)
+            for priority, mbps in TRANSFER_CLASS_MBPS.items() if mbps
+        }
+        self.max_concurrent = max_concurrent
+        self.max_per_title = max_per_title
+        self.condition = threading.Condition()
+        self.active = defaultdict(int)          # priority -> running transfers
+        self.active_titles = defaultdict(int)   # file_id -> running background transfers
+        self.waiting = defaultdict(int)         # priority -> transfers waiting for bandwidth
+        self.waiting_for_slot = defaultdict(int)  # priority -> transfers waiting for a slot
+        self.bytes_by_class = defaultdict(int)
+
+    @staticmethod
+    def _higher_priority_in(waiting: dict, priority: int) -> bool:
+        return any(waiting[p] for p in range(PRIORITY_INTERACTIVE, priority))
+
+    def acquire_slot(self, priority: int, file_id: str):
+        with self.condition:
+            if priority != PRIORITY_INTERACTIVE:
+                self.waiting_for_slot[priority] += 1
+                try:
+                    # Freed slots go to the highest class queued for one
+                    while (sum(self.active[p] for p in self.active if p != PRIORITY_INTERACTIVE) >= self.max_concurrent
+                           or self.active_titles[file_id] >= self.max_per_title
+                           or self._higher_priority_in(self.waiting_for_slot, priority)):
+                        self.condition.wait(timeout=1.0)
+                finally:
+                    self.waiting_for_slot[priority] -= 1
+                self.active_titles[file_id] += 1
+            self.active[priority] += 1
+
+    def release_slot(self, priority: int, file_id: str):
+        with self.condition:
+            self.active[priority] -= 1
+            if priority != PRIORITY_INTERACTIVE:
+                self.active_titles[file_id] -= 1
+                if self.active_titles[file_id] <= 0:
+                    del self.active_titles[file_id]
+            self.condition.notify_all()
+
+    def consume(self, priority: int, nbytes: int):
+        """Account nbytes of transfer, blocking background classes until tokens are available"""
+        class_bucket = self.class_buckets.get(priority)
+        with self.condition:
+            if priority == PRIORITY_INTERACTIVE:
+                self.shared.refill()
+                self.shared.tokens -= nbytes
+                self.bytes_by_class[priority] += nbytes
+                return
+            self.waiting[priority] += 1
+        try:
+            while True:
+                with self.condition:
+                    delay = self.shared.wait_time(nbytes)
+                    if class_bucket:
+                        delay = max(delay, class_bucket.wait_time(nbytes))
+                    if delay == 0 and not self._higher_priority_in(self.waiting, priority):
+                        self.shared.tokens -= nbytes
+                        if class_bucket:
+                            class_bucket.tokens -= nbytes
+                        self.bytes_by_class[priority] += nbytes
+                        return
+                time.sleep(min(max(delay, 0.01), 0.5))
+        finally:
+            with self.condition:
+                self.waiting[priority] -= 1
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "capacity_mbps": TRANSFER_CAPACITY_MBPS,
+                "active": {PRIORITY_NAMES[p]: n for p, n in self.active.items() if n},
+                "waiting": {PRIORITY_NAMES[p]: n for p, n in self.waiting.items() if n},
+                "waiting_for_slot": {PRIORITY_NAMES[p]: n for p, n in self.waiting_for_slot.items() if n},
+                "transferred_mb": {PRIORITY_NAMES[p]: round(n / 1024 / 1024, 1) for p, n in self.bytes_by_class.items()}
+            }
+
+transfer_scheduler = TransferScheduler(TRANSFER_CAPACITY_MBPS, TRANSFER_MAX_CONCURRENT, TRANSFER_MAX_PER_TITLE)
+
+class scheduled_transfer:
+    """Context manager holding a scheduler slot for one upstream transfer"""
+
+    def __init__(self, priority: int, file_id: str):
+        self.priority = priority
+        self.file_id = file_id
+        self.holding = False
+
+    def __enter__(self):
+        self.resume()
+        return self
+
+    def consume(self, nbytes: int):
+        transfer_scheduler.consume(self.priority, nbytes)
+
+    def pause(self):
+        """Give the slot back while the transfer sits idle"""
+        if self.holding:
+            transfer_scheduler.release_slot(self.priority, self.file_id)
+            self.holding = False
+
+    def resume(self):
+        """Queue for a slot again after pause()"""
+        if not self.holding:
+            transfer_scheduler.acquire_slot(self.priority, self.file_id)
+            self.holding = True
+
+    def __exit__(self, *exc):
+        self.pause()
+        return False
+
+def scheduled_stream(chunks, priority: int, file_id: str):
+    """Wrap a streaming generator so every chunk goes through the transfer scheduler"""
+    with scheduled_transfer(priority, file_id) as transfer:
+        for chunk in chunks:
+            transfer.consume(len(chunk))
+            yield chunk
+
+# ========================================
+# 🔮 PREFETCH PLANNER
+# ========================================
+
+PREFETCH_ENABLED = True
+PREFETCH_HEAD_BYTES = 8 * 1024 * 1024      # Head warmed for new / popular titles
+PREFETCH_SEGMENT_BYTES = 8 * 1024 * 1024   # Segment warmed at a resume position
+PREFETCH_TOP_TITLES = 5                    # Most played titles kept warm
+PREFETCH_PLAY_WINDOW_SECONDS = 7 * 24 * 3600
+PREFETCH_PLAN_INTERVAL = 300               # Re-plan popular titles every 5 minutes
+
+prefetch_queue: OrderedDict = OrderedDict()  # Pending jobs (deduplicated), insertion ordered
+prefetch_condition = threading.Condition()
+prefetch_thread_running = False
+prefetch_stats = {'jobs_done': 0, 'jobs_failed': 0, 'jobs_rejected': 0, 'bytes_fetched': 0}
+
+play_history: Dict[str, List[float]] = defaultdict(list)  # file_id -> recent playback start times
+resume_positions: Dict[str, int] = {}                       # file_id -> byte offset of last heartbeat
+
+def enqueue_prefetch(job: tuple):
+    """Queue a ('head', file_id) or ('resume', file_id, byte_offset) job"""
+    if not PREFETCH_ENABLED:
+        return
+    with prefetch_condition:
+        # Resume jobs replace older resume jobs for the same title
+        for queued in [queued for queued in prefetch_queue if queued[0] == job[0] == 'resume' and queued[1] == job[1]]:
+            del prefetch_queue[queued]
+        prefetch_queue[job] = None
+        prefetch_condition.notify()
+
+def plan_new_title_prefetch(file_ids: set):
+    """Warm the heads of titles that just appeared in the catalog"""
+    videos = [fid for fid in file_ids if file_cache.get(fid, {}).get('type') == 'video'
+              and is_video_container(file_cache[fid]['filename'])]
+    for fid in videos:
+        enqueue_prefetch(('head', fid))
+    if videos:
+        print(f"🔮 Prefetch planned for {len(videos)} new titles")
+
+def record_playback_start(file_id: str):
+    """Count a playback start for the popular-titles plan"""
+    now = time.time()
+    history = play_history[file_id]
+    history.append(now)
+    while history and now - history[0] > PREFETCH_PLAY_WINDOW_SECONDS:
+        history.pop(0)
+
+def record_resume_position(file_id: str, position_seconds: float):
+    """Remember a viewer's position and warm the segment there for an instant resume"""
+    file_info = file_cache.get(file_id)
+    if not file_info:
+        return
+    metadata = load_metadata_cache(file_id)
+    byte_offset = None
+    if metadata and metadata.get('seek_index'):
+        byte_offset = seek_index_byte_for_time(metadata['seek_index'], int(position_seconds * 1000))
+    if byte_offset is None:
+        duration_ms = file_info['duration_ms'] or (metadata or {}).get('duration_ms', 0)
+        if not duration_ms or not file_info['size_bytes']:
+            return
+        byte_offset = int(file_info['size_bytes'] * min(position_seconds * 1000 / duration_ms, 1.0))
+    # Round down to 1MB so repeated heartbeats map to the same segment
+    byte_offset -= byte_offset % (1024 * 1024)
+    if resume_positions.get(file_id) != byte_offset:
+        resume_positions[file_id] = byte_offset
+        enqueue_prefetch(('resume', file_id, byte_offset))
+
+def plan_popular_prefetch():
+    """Warm the heads of the most played titles in the recent window"""
+    now = time.time()
+    counts = {
+        fid: sum(1 for started in history if now - started <= PREFETCH_PLAY_WINDOW_SECONDS)
+        for fid, history in play_history.items()
+    }
+    top_titles = sorted((fid for fid, count in counts.items() if count > 0 and fid in file_cache),
+                        key=lambda fid: counts[fid], reverse=True)[:PREFETCH_TOP_TITLES]
+    for fid in top_titles:
+        if ram_cache.find_segment(fid, 0) is None:
+            enqueue_prefetch(('head', fid))
+
+def fetch_prefetch_range(file_id: str, download_url: str, start: int, length: int) -> bytes:
+    """Fetch a byte range at prefetch priority (the scheduler holds it back behind viewers)"""
+    buffer = bytearray()
+    with scheduled_transfer(PRIORITY_PREFETCH, file_id) as transfer:
+        response = open_upstream(file_id, download_url, start, start + length - 1)
+        try:
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                transfer.consume(len(chunk))
+                buffer += chunk
+        finally:
+            response.close()
+    prefetch_stats['bytes_fetched'] += len(buffer)
+    return bytes(buffer)
+
+def run_prefetch_job(job: tuple):
+    """Fetch one planned segment into the RAM tier (and metadata cache for heads)"""
+    kind, file_id = job[0], job[1]
+    file_info = file_cache.get(file_id)
+    if not file_info:
+        return
+    file_size = file_info['size_bytes']
+
+    if kind == 'head':
+        if ram_cache.find_segment(file_id, 0) is not None:
+            return
+        download_url = get_download_url(file_id)
+        head_length = min(PREFETCH_HEAD_BYTES, file_size) if file_size else PREFETCH_HEAD_BYTES
+        head = fetch_prefetch_range(file_id, download_url, 0, head_length)
+        if not ram_cache.put(('head', file_id), head, admit=True):
+            prefetch_stats['jobs_rejected'] += 1
+            print(f"⚠️ Prefetched head of {file_info['filename']} did not fit in the RAM cache")
+        if not load_metadata_cache(file_id):
+            save_metadata_cache(file_id, extract_media_metadata(head, file_size, file_info['filename'], download_url, file_id))
+        print(f"🔮 Prefetched head of {file_info['filename']} ({len(head)/1024/1024:.1f}MB)")
+
+    elif kind == 'resume':
+        byte_offset = job[2]
+        if ram_cache.find_segment(file_id, byte_offset) is not None:
+            return
+        if file_size and byte_offset >= file_size:
+            return
+        length = min(PREFETCH_SEGMENT_BYTES, file_size - byte_offset) if file_size else PREFETCH_SEGMENT_BYTES
+        segment = fetch_prefetch_range(file_id, get_download_url(file_id), byte_offset, length)
+        if not ram_cache.put(('segment', file_id, byte_offset), segment, admit=True):
+            prefetch_stats['jobs_rejected'] += 1
+            print(f"⚠️ Prefetched resume segment of {file_info['filename']} did not fit in the RAM cache")
+            return
+        print(f"🔮 Prefetched resume segment of {file_info['filename']} at {byte_offset/1024/1024:.0f}MB")
+
+def start_prefetch_task():
+    """Start the background prefetcher"""
+    global prefetch_thread_running
+
+    if prefetch_thread_running or not PREFETCH_ENABLED:
+        return
 
-                # Check if file was accessed very recently (last 5 seconds)
-                very_recent_access = time.time() - download_status[file_id]['last_access'] < 5
-                if very_recent_access:
-                    print(f"⏭️ Skipping cleanup for {file_id}: accessed {time.time() - download_status[file_id]['last_access']:.1f}s ago")
+    prefetch_thread_running = True
+
+    def prefetch_worker():
+        last_plan = 0
+        while prefetch_thread_running:
+            if time.time() - last_plan >= PREFETCH_PLAN_INTERVAL:
+                plan_popular_prefetch()
+                last_plan = time.time()
+
+            with prefetch_condition:
+                if not prefetch_queue:
+                    prefetch_condition.wait(timeout=PREFETCH_PLAN_INTERVAL)
                     continue
+                # Resume jobs first: a viewer is waiting on them
+                job = next((queued for queued in prefetch_queue if queued[0] == 'resume'), next(iter(prefetch_queue)))
+                del prefetch_queue[job]
 
-                file_size = cache_file.stat().st_size
+            try:
+                run_prefetch_job(job)
+                prefetch_stats['jobs_done'] += 1
+            except Exception as e:
+                prefetch_stats['jobs_failed'] += 1
+                print(f"⚠️ Prefetch job {job[0]} for {job[1][:8]}... failed: {e}")
 
-                # Try to delete the file
-                cache_file.unlink()
+    threading.Thread(target=prefetch_worker, daemon=True).start()
+    print(f"🔮 Prefetch planner started (heads {PREFETCH_HEAD_BYTES/1024/1024:.0f}MB, segments {PREFETCH_SEGMENT_BYTES/1024/1024:.0f}MB)")
 
-                # Reset download status
-                download_status[file_id] = {
-                    'downloading': False,
-                    'completed': False,
-                    'file_path': None,
-                    'download_start': 0,
-                    'bytes_downloaded': 0,
-                    'total_bytes': 0,
-                    'download_speed_mbps': 0,
-                    'last_access': 0,
-                    'active_users': 0,
-                    'user_sessions': set()
-                }
+# ========================================
+# 🎯 RANGE & CONDITIONAL REQUESTS
+# ========================================
 
-                print(f"🧹 Cleaned up inactive cache: {file_id} ({file_size/1024/1024/1024:.1f}GB freed, {time_since_access:.1f}s inactive)")
+RANGE_MAX_PARTS = 16  # More ranges than this are ignored and answered with the full body
+RANGE_READ_CHUNK = 256 * 1024
+
+def get_known_file_size(file_id: str) -> int:
+    """Size of a title from the catalog or its cached metadata (0 if unknown), without upstream I/O"""
+    size = file_cache.get(file_id, {}).get('size_bytes') or 0
+    if size > 0:
+        return size
+    metadata = load_metadata_cache(file_id)
+    return (metadata or {}).get('file_size') or 0
+
+def get_title_etag(file_id: str, file_size: int) -> str:
+    """Strong validator: the content key (SHA-1 dedup_key when known) plus the size"""
+    return f'"{get_content_key(file_id)}-{file_size}"'
+
+def parse_byte_ranges(range_header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a Range header into sorted, coalesced inclusive (start, end) pairs
+
+    Handles open (500-), closed (0-499) and suffix (-500) specs. Returns None
+    when the header must be ignored (other unit, malformed, too many parts)
+    and [] when it is valid but no range overlaps the file (416).
+    """
+    unit, _, specs = range_header.strip().partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        match = re.fullmatch(r'\s*(\d*)\s*-\s*(\d*)\s*', spec)
+        if not match or not (match.group(1) or match.group(2)):
+            return None
+        if not match.group(1):
+            # Suffix range: the last N bytes
+            length = int(match.group(2))
+            if length > 0 and file_size > 0:
+                ranges.append((max(file_size - length, 0), file_size - 1))
+            continue
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else file_size - 1
+        if match.group(2) and end < start:
+            return None
+        if start < file_size:
+            ranges.append((start, min(end, file_size - 1)))
+    if len(ranges) > RANGE_MAX_PARTS:
+        return None
 
-        except PermissionError as e:
-            # File is being used by another process (could be antivirus, file explorer, etc.)
-            print(f"⏭️ Skipping cleanup for {file_id}: file locked by system")
+    coalesced = []
+    for start, end in sorted(ranges):
+        if coalesced and start <= coalesced[-1][1] + 1:
+            coalesced[-1] = (coalesced[-1][0], max(coalesced[-1][1], end))
+        else:
+            coalesced.append((start, end))
+    return coalesced
+
+def evaluate_range_request(request: Request, etag: str, file_size: int) -> tuple:
+    """Apply If-None-Match, If-Range and Range to a title of known size
+
+    Returns (status_code, ranges): 304 and 416 need no body, 206 comes with
+    one or more ranges, 200 means the full body.
+    """
+    headers = request.headers if request else {}
+    if_none_match = headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return 304, None
+
+    range_header = headers.get('range')
+    if not range_header or file_size <= 0:
+        return 200, None
+    if_range = headers.get('if-range')
+    if if_range and if_range.strip() != etag:
+        # The client's copy is stale (or dated): send the whole current representation
+        return 200, None
+    ranges = parse_byte_ranges(range_header, file_size)
+    if ranges is None:
+        return 200, None
+    if not ranges:
+        return 416, None
+    return 206, ranges
+
+def range_status_response(status_code: int, etag: str, file_size: int) -> Response:
+    """Bodyless 304 / 416 answer"""
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Access-Control-Allow-Origin": "*"}
+    if status_code == 416:
+        headers["Content-Range"] = f"bytes */{file_size}"
+    return Response(status_code=status_code, headers=headers)
+
+def read_title_range(file_id: str, download_url: Optional[str], start: int, end: int, priority: int = PRIORITY_INTERACTIVE):
+    """Yield the bytes start..end of a title: the cached prefix from disk, the rest from upstream
+
+    Only the upstream part goes through the transfer scheduler. With
+    download_url None the URL is only resolved if upstream is needed.
+    """
+    cached_bytes = get_cached_bytes(file_id)
+    if start < cached_bytes:
+        try:
+            with open(get_cache_file_path(file_id), 'rb') as f:
+                f.seek(start)
+                disk_end = min(end, cached_bytes - 1)
+                while start <= disk_end:
+                    chunk = f.read(min(RANGE_READ_CHUNK, disk_end - start + 1))
+                    if not chunk:
+                        break
+                    start += len(chunk)
+                    yield chunk
         except FileNotFoundError:
-            # File was already deleted
-            print(f"✅ File {file_id} already cleaned up")
-            # Reset download status anyway
-            download_status[file_id] = {
-                'downloading': False,
-                'completed': False,
-                'file_path': None,
-                'download_start': 0,
-                'bytes_downloaded': 0,
-                'total_bytes': 0,
-                'download_speed_mbps': 0,
-                'last_access': 0,
-                'active_users': 0,
-                'user_sessions': set()
-            }
+            pass  # Released while we were reading: the rest comes from upstream
+        if start > end:
+            return
+
+    response = open_upstream(file_id, download_url, start, end)
+    try:
+        yield from scheduled_stream((chunk for chunk in response.iter_content(chunk_size=RANGE_READ_CHUNK) if chunk), priority, file_id)
+    finally:
+        response.close()
+
+def build_multipart_byteranges(ranges: List[Tuple[int, int]], file_size: int, content_type: str, read_range) -> tuple:
+    """multipart/byteranges body for several ranges: (chunks, content_length, media_type)
+
+    read_range(start, end) yields the bytes of one part; the length is known
+    up front so the response carries a Content-Length.
+    """
+    boundary = uuid.uuid4().hex
+    prefixes = [
+        (b"\r\n" if index else b"") +
+        f"--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {start}-{end}/{file_size}\r\n\r\n".encode()
+        for index, (start, end) in enumerate(ranges)
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode()
+    content_length = sum(map(len, prefixes)) + sum(end - start + 1 for start, end in ranges) + len(closing)
+
+    def chunks():
+        for prefix, (start, end) in zip(prefixes, ranges):
+            yield prefix
+            yield from read_range(start, end)
+        yield closing
+
+    return chunks(), content_length, f"multipart/byteranges; boundary={boundary}"
+
+def get_attachment_disposition(filename: str) -> str:
+    """Content-Disposition for a download, RFC 5987-encoded for non-ASCII filenames"""
+    try:
+        # Try ASCII encoding first
+        filename_ascii = filename.encode('ascii').decode('ascii')
+        return f'attachment; filename="{filename_ascii}"'
+    except UnicodeEncodeError:
+        # Use RFC 5987 encoding for Unicode filenames
+        filename_encoded = quote(filename.encode('utf-8'))
+        return f"attachment; filename*=UTF-8''{filename_encoded}"
+
+def head_title_response(file_id: str, request: Request, content_disposition: str, content_type: str = None) -> Response:
+    """HEAD answered from the catalog and cached metadata, without resolving or opening upstream"""
+    refresh_file_cache()
+    if file_id not in file_cache:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    file_size = get_known_file_size(file_id)
+    etag = get_title_etag(file_id, file_size)
+    content_type = content_type or get_container_mime_type(file_cache[file_id]['filename'])
+    status_code, ranges = evaluate_range_request(request, etag, file_size)
+    if status_code in (304, 416):
+        return range_status_response(status_code, etag, file_size)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Type": content_type,
+        "Content-Disposition": content_disposition,
+        "Access-Control-Allow-Origin": "*"
+    }
+    if ranges and len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        headers["Content-Length"] = str(end - start + 1)
+    elif ranges:
+        _, content_length, media_type = build_multipart_byteranges(ranges, file_size, content_type, None)
+        headers["Content-Type"] = media_type
+        headers["Content-Length"] = str(content_length)
+    elif file_size:
+        headers["Content-Length"] = str(file_size)
+    return Response(status_code=status_code, headers=headers)
+
+# ========================================
+# 📦 ZIP EXPORT
+# ========================================
+
+EXPORT_MAX_ITEMS = 5000
+EXPORT_READ_AHEAD_MEMBERS = 8   # Members fetched concurrently ahead of the writer
+EXPORT_READ_AHEAD_CHUNKS = 8    # Chunks buffered per member (x RANGE_READ_CHUNK)
+EXPORT_CRC_CACHE_ENTRIES = 100000
+EXPORT_CRC_CHECKPOINTS = 256          # Running CRCs kept per title (one per chunk streamed)
+EXPORT_CRC_CHECKPOINT_TITLES = 256
+
+# CRC-32 of each title's bytes by content key, persisted so a resumed export
+# can rebuild data descriptors and the central directory without re-reading
+export_crc_file = metadata_cache_dir / "export_crc32.json"
+export_crc_cache: Optional[OrderedDict] = None
+export_crc_lock = threading.Lock()
+
+# Running CRC-32 of member data as it streams, by content key: [(bytes so far, crc)].
+# A download cut mid-member resumes a little before the last checkpoint sent, so its
+# CRC continues from the nearest checkpoint instead of re-reading the member
+export_crc_checkpoints: OrderedDict = OrderedDict()
+
+ZIP_FLAGS = 0x0808  # Bit 3: CRC in a data descriptor, bit 11: UTF-8 names
+ZIP_VERSION = 45    # ZIP64
+ZIP_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+ZIP_LOCAL_ZIP64_EXTRA = struct.Struct('<HHQQ')
+ZIP_DATA_DESCRIPTOR = struct.Struct('<IIQQ')
+ZIP_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+ZIP_CENTRAL_ZIP64_EXTRA = struct.Struct('<HHQQQ')
+ZIP64_END_RECORD = struct.Struct('<IQHHIIQQQQ')
+ZIP64_END_LOCATOR = struct.Struct('<IIQI')
+ZIP_END_RECORD = struct.Struct('<IHHHHIIH')
+
+def _load_export_crc_cache() -> OrderedDict:
+    global export_crc_cache
+    if export_crc_cache is None:
+        export_crc_cache = OrderedDict()
+        try:
+            export_crc_cache.update(json.loads(export_crc_file.read_text()))
+        except (OSError, ValueError):
+            pass
+    return export_crc_cache
+
+def get_cached_crc(file_id: str) -> Optional[int]:
+    with export_crc_lock:
+        return _load_export_crc_cache().get(get_content_key(file_id))
+
+def store_crc(file_id: str, crc: int):
+    with export_crc_lock:
+        cache = _load_export_crc_cache()
+        cache[get_content_key(file_id)] = crc
+        cache.move_to_end(get_content_key(file_id))
+        while len(cache) > EXPORT_CRC_CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+def store_crc_checkpoint(file_id: str, length: int, crc: int):
+    key = get_content_key(file_id)
+    with export_crc_lock:
+        checkpoints = export_crc_checkpoints.setdefault(key, deque(maxlen=EXPORT_CRC_CHECKPOINTS))
+        export_crc_checkpoints.move_to_end(key)
+        checkpoints.append((length, crc))
+        while len(export_crc_checkpoints) > EXPORT_CRC_CHECKPOINT_TITLES:
+            export_crc_checkpoints.popitem(last=False)
+
+def get_crc_checkpoint(file_id: str, limit: int) -> Tuple[int, int]:
+    """(length, crc) of the longest streamed prefix of a title not past `limit` (0, 0 if none)"""
+    with export_crc_lock:
+        checkpoints = export_crc_checkpoints.get(get_content_key(file_id), ())
+        return max((checkpoint for checkpoint in checkpoints if checkpoint[0] <= limit), default=(0, 0))
+
+def save_export_crc_cache():
+    with export_crc_lock:
+        if export_crc_cache is None:
+            return
+        try:
+            export_crc_file.write_text(json.dumps(export_crc_cache))
+        except OSError as e:
+            print(f"⚠️ Could not save export CRC cache: {e}")
+
+def _dos_datetime(timestamp: float) -> tuple:
+    """(time, date) fields of a ZIP header for a catalog timestamp (seconds or milliseconds)"""
+    if timestamp > 1e11:
+        timestamp /= 1000
+    try:
+        moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        moment = datetime(1980, 1, 1)
+    if moment.year < 1980:
+        moment = datetime(1980, 1, 1)
+    return ((moment.hour << 11) | (moment.minute << 5) | (moment.second // 2),
+            ((moment.year - 1980) << 9) | (moment.month << 4) | moment.day)
+
+class ZipExportArchive:
+    """Stored (uncompressed) ZIP64 archive over a list of titles, with a fixed layout
+
+    Every offset follows from names and sizes alone: local headers carry no
+    CRC (flag bit 3) and each member's CRC-32 goes in a data descriptor after
+    its data. The same selection always yields the same bytes, which is what
+    lets the archive be served with Range requests and resumed.
+    """
+
+    def __init__(self, members: List[dict]):
+        # members: {'file_id', 'name', 'size', 'timestamp'} in archive order
+        self.members = members
+        self.segments = []  # (offset, length, kind, member index)
+        offset = 0
+        for index, member in enumerate(members):
+            member['name_bytes'] = member['name'].encode('utf-8')
+            member['header_offset'] = offset
+            member['dos_time'], member['dos_date'] = _dos_datetime(member['timestamp'])
+            for kind, length in (('local', ZIP_LOCAL_HEADER.size + len(member['name_bytes']) + ZIP_LOCAL_ZIP64_EXTRA.size),
+                                 ('data', member['size']),
+                                 ('descriptor', ZIP_DATA_DESCRIPTOR.size)):
+                if length:
+                    self.segments.append((offset, length, kind, index))
+                offset += length
+        self.central_offset = offset
+        self.central_size = sum(ZIP_CENTRAL_HEADER.size + len(member['name_bytes']) + ZIP_CENTRAL_ZIP64_EXTRA.size
+                                for member in members)
+        self.segments.append((offset, self.central_size, 'central', None))
+        offset += self.central_size
+        trailer_size = ZIP64_END_RECORD.size + ZIP64_END_LOCATOR.size + ZIP_END_RECORD.size
+        self.segments.append((offset, trailer_size, 'trailer', None))
+        self.size = offset + trailer_size
+        self.segment_offsets = [segment[0] for segment in self.segments]
+
+        layout = json.dumps([(get_content_key(m['file_id']), m['name'], m['size'], m['timestamp']) for m in members])
+        self.etag = f'"zip-{hashlib.sha1(layout.encode()).hexdigest()}"'
+        self.crcs: Dict[int, int] = {}
+        self.head_crcs: Dict[tuple, int] = {}  # (member index, offset a range starts at) -> CRC of the bytes before it
+
+    def local_header(self, member: dict) -> bytes:
+        return ZIP_LOCAL_HEADER.pack(
+            0x04034b50, ZIP_VERSION, ZIP_FLAGS, 0, member['dos_time'], member['dos_date'],
+            0, 0xFFFFFFFF, 0xFFFFFFFF, len(member['name_bytes']), ZIP_LOCAL_ZIP64_EXTRA.size
+        ) + member['name_bytes'] + ZIP_LOCAL_ZIP64_EXTRA.pack(0x0001, 16, member['size'], member['size'])
+
+    def known_crc(self, index: int) -> Optional[int]:
+        if index not in self.crcs:
+            crc = get_cached_crc(self.members[index]['file_id']) if self.members[index]['size'] else 0
+            if crc is None:
+                return None
+            self.crcs[index] = crc
+        return self.crcs[index]
+
+    def member_crc(self, index: int) -> int:
+        """CRC-32 of a member, known from `prepare_crcs` or streamed earlier in this response"""
+        crc = self.known_crc(index)
+        if crc is None:
+            raise RuntimeError(f"CRC-32 of export member {self.members[index]['name']} is not known")
+        return crc
+
+    def _prefix_crc(self, index: int, length: int) -> int:
+        """CRC-32 of a member's first `length` bytes, from the nearest streamed checkpoint"""
+        file_id = self.members[index]['file_id']
+        done, crc = get_crc_checkpoint(file_id, length)
+        if done < length:
+            for chunk in read_title_range(file_id, None, done, length - 1):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+    def _whole_crc(self, index: int) -> int:
+        crc = self._prefix_crc(index, self.members[index]['size'])
+        store_crc(self.members[index]['file_id'], crc)
+        self.crcs[index] = crc
+        return crc
+
+    def prepare_crcs(self, ranges: List[Tuple[int, int]]):
+        """Make sure every CRC the ranges' descriptors and central directory need can be produced
+
+        A member whose data a range streams to its end gets its CRC while
+        streaming (continuing from a checkpoint when the range starts inside
+        it). Every other CRC needed is computed here, concurrently, before the
+        response starts, rather than member by member inside it.
+        """
+        missing, heads = set(), set()
+        for start, end in ranges:
+            streamed = set()
+            for offset, length, kind, index in self.segments:
+                if offset > end or offset + length <= start:
+                    continue
+                if kind == 'data':
+                    if offset + length - 1 <= end and self.known_crc(index) is None:
+                        streamed.add(index)
+                        if start > offset:
+                            heads.add((index, start - offset))
+                elif kind == 'descriptor' and index not in streamed and self.known_crc(index) is None:
+                    missing.add(index)
+                elif kind == 'central':
+                    missing.update(i for i in range(len(self.members)) if i not in streamed and self.known_crc(i) is None)
+
+        if not missing and not heads:
+            return
+        print(f"🧮 Resumed export: computing {len(missing)} member CRC-32(s) and {len(heads)} partial one(s)")
+        with ThreadPoolExecutor(max_workers=EXPORT_READ_AHEAD_MEMBERS) as executor:
+            self.head_crcs.update(zip(heads, executor.map(lambda head: self._prefix_crc(*head), heads)))
+            list(executor.map(self._whole_crc, missing))
+        save_export_crc_cache()
+
+    def descriptor(self, index: int) -> bytes:
+        size = self.members[index]['size']
+        return ZIP_DATA_DESCRIPTOR.pack(0x08074b50, self.member_crc(index), size, size)
+
+    def central_directory(self) -> bytes:
+        entries = []
+        for index, member in enumerate(self.members):
+            entries.append(ZIP_CENTRAL_HEADER.pack(
+                0x02014b50, ZIP_VERSION, ZIP_VERSION, ZIP_FLAGS, 0, member['dos_time'], member['dos_date'],
+                self.member_crc(index), 0xFFFFFFFF, 0xFFFFFFFF, len(member['name_bytes']),
+                ZIP_CENTRAL_ZIP64_EXTRA.size, 0, 0, 0, 0, 0xFFFFFFFF
+            ) + member['name_bytes'] + ZIP_CENTRAL_ZIP64_EXTRA.pack(
+                0x0001, 24, member['size'], member['size'], member['header_offset']))
+        return b''.join(entries)
+
+    def trailer(self) -> bytes:
+        count = len(self.members)
+        zip64_end_offset = self.central_offset + self.central_size
+        return (ZIP64_END_RECORD.pack(0x06064b50, ZIP64_END_RECORD.size - 12, ZIP_VERSION, ZIP_VERSION, 0, 0,
+                                      count, count, self.central_size, self.central_offset) +
+                ZIP64_END_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1) +
+                ZIP_END_RECORD.pack(0x06054b50, 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0))
+
+    def read(self, start: int, end: int):
+        """Yield archive bytes start..end; member data is fetched ahead concurrently"""
+        first = bisect.bisect_right(self.segment_offsets, start) - 1
+        pieces = []
+        for offset, length, kind, index in self.segments[first:]:
+            if offset > end:
+                break
+            piece_start = max(start, offset) - offset
+            piece_end = min(end, offset + length - 1) - offset
+            pieces.append((kind, index, piece_start, piece_end))
+
+        read_ahead = ExportReadAhead([(self.members[index]['file_id'], piece_start, piece_end)
+                                      for kind, index, piece_start, piece_end in pieces if kind == 'data'])
+        try:
+            for kind, index, piece_start, piece_end in pieces:
+                if kind == 'data':
+                    file_id, size = self.members[index]['file_id'], self.members[index]['size']
+                    # CRC from the member's start, or continued from the bytes before this range
+                    crc = 0 if piece_start == 0 else self.head_crcs.get((index, piece_start))
+                    done = piece_start
+                    for chunk in read_ahead.next_piece():
+                        if crc is not None:
+                            crc = zlib.crc32(chunk, crc)
+                            done += len(chunk)
+                            store_crc_checkpoint(file_id, done, crc)
+                        yield chunk
+                    if crc is not None and done == size:
+                        self.crcs[index] = crc
+                        store_crc(file_id, crc)
+                    continue
+                if kind == 'local':
+                    block = self.local_header(self.members[index])
+                elif kind == 'descriptor':
+                    block = self.descriptor(index)
+                elif kind == 'central':
+                    block = self.central_directory()
+                else:
+                    block = self.trailer()
+                yield block[piece_start:piece_end + 1]
+        finally:
+            read_ahead.close()
+            save_export_crc_cache()
+
+class ExportReadAhead:
+    """Fetch the data pieces of an export concurrently, a bounded window ahead of the writer
+
+    Each piece gets a thread filling a queue of at most EXPORT_READ_AHEAD_CHUNKS
+    chunks, and at most EXPORT_READ_AHEAD_MEMBERS pieces are in flight, so
+    memory stays bounded whatever the archive size.
+    """
+
+    def __init__(self, pieces: List[tuple]):
+        self.pieces = pieces  # (file_id, start, end)
+        self.queues: Dict[int, queue.Queue] = {}
+        self.next_index = 0
+        self.started = 0
+        self.stop = threading.Event()
+        for _ in range(EXPORT_READ_AHEAD_MEMBERS):
+            self._start_next()
+
+    def _start_next(self):
+        if self.started >= len(self.pieces):
+            return
+        index = self.started
+        self.started += 1
+        chunks = queue.Queue(maxsize=EXPORT_READ_AHEAD_CHUNKS)
+        self.queues[index] = chunks
+        threading.Thread(target=self._fetch, args=(index, chunks), daemon=True).start()
+
+    def _put(self, chunks: queue.Queue, item) -> bool:
+        while not self.stop.is_set():
+            try:
+                chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch(self, index: int, chunks: queue.Queue):
+        file_id, start, end = self.pieces[index]
+        reader = read_title_range(file_id, None, start, end)
+        try:
+            for chunk in reader:
+                if not self._put(chunks, chunk):
+                    return
+            self._put(chunks, None)
         except Exception as e:
-            print(f"❌ Error cleaning up cache for {file_id}: {e}")
+            self._put(chunks, e)
+        finally:
+            reader.close()
+
+    def next_piece(self):
+        """Yield the chunks of the next piece, in archive order"""
+        index = self.next_index
+        self.next_index += 1
+        chunks = self.queues.pop(index)
+        self._start_next()
+        while True:
+            item = chunks.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self.stop.set()
+
+def select_export_ids(ids: Optional[str], album: Optional[str], media_type: Optional[str], name_filter: Optional[str]) -> List[str]:
+    """Ids of an export in archive order: as listed, or an album / filter by date"""
+    if ids:
+        selected = []
+        for file_id in (part.strip() for part in ids.split(',')):
+            if file_id and file_id not in selected:
+                if file_id not in file_cache:
+                    raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+                selected.append(file_id)
+        return selected
+    if not (album or media_type or name_filter):
+        raise HTTPException(status_code=400, detail="Give ids, an album or a filter (type, q)")
+    candidates = [file_id for file_id in get_album_member_ids(album) if file_id in file_cache] if album else file_cache
+    selected = [
+        file_id for file_id in candidates
+        for info in (file_cache[file_id],)
+        if (not media_type or info.get('type') == media_type)
+        and (not name_filter or name_filter.lower() in info.get('filename', '').lower())
+    ]
+    return sorted(selected, key=lambda file_id: (file_cache[file_id]['timestamp'], file_id))
+
+def build_export_archive(file_ids: List[str]) -> ZipExportArchive:
+    """Layout of an export; sizes missing from the catalog are asked from upstream once"""
+    if not file_ids:
+        raise HTTPException(status_code=404, detail="Nothing matches the export selection")
+    if len(file_ids) > EXPORT_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Export limited to {EXPORT_MAX_ITEMS} items")
+
+    members = []
+    used_names = set()
+    for file_id in file_ids:
+        info = file_cache[file_id]
+        size = get_known_file_size(file_id)
+        if not size:
+            probe = open_upstream(file_id, None, 0, 0)
+            size = probe.total_size or 0
+            probe.close()
+        # Unique names inside the archive: "name (2).ext" for repeats
+        name = info['filename'] or file_id
+        stem, suffix = os.path.splitext(name)
+        counter = 2
+        while name.lower() in used_names:
+            name = f"{stem} ({counter}){suffix}"
+            counter += 1
+        used_names.add(name.lower())
+        members.append({'file_id': file_id, 'name': name, 'size': size, 'timestamp': info['timestamp'] or 0})
+    return ZipExportArchive(members)
 
-def start_cleanup_task():
-    """Start the background cleanup task"""
-    global cleanup_task_running
+# ========================================
+# 🖼️ THUMBNAIL CACHE
+# ========================================
 
-    if cleanup_task_running:
+THUMBNAIL_DEFAULT_SIZE = 256
+THUMBNAIL_MAX_SIZE = 2048
+THUMBNAIL_SIZE_STEP = 32                        # Requested sizes are rounded up to a multiple of this
+THUMBNAIL_RAM_MAX_BYTES = 64 * 1024 * 1024
+THUMBNAIL_DISK_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_MB', '1024')) * 1024 * 1024
+THUMBNAIL_PRUNE_EVERY = 200                     # Disk writes between two budget checks
+THUMBNAIL_PREFETCH_WORKERS = 8
+THUMBNAIL_PREFETCH_MAX_IDS = 500
+
+thumbnail_dir = Path(__file__).parent / "thumbnail_cache"
+thumbnail_dir.mkdir(exist_ok=True)
+
+thumbnail_ram_cache = RamSegmentCache(THUMBNAIL_RAM_MAX_BYTES)
+thumbnail_inflight: Dict[tuple, Future] = {}  # Single-flight: one upstream fetch per key
+thumbnail_lock = threading.Lock()
+thumbnail_pool = ThreadPoolExecutor(max_workers=THUMBNAIL_PREFETCH_WORKERS, thread_name_prefix="thumbnail")
+thumbnail_stats = {'ram_hits': 0, 'disk_hits': 0, 'fetched': 0, 'coalesced': 0, 'failed': 0}
+thumbnail_writes = 0
+
+def normalize_thumbnail_size(value: Optional[int]) -> int:
+    """Clamp and round a requested edge up to THUMBNAIL_SIZE_STEP so nearby sizes share entries"""
+    if not value or value <= 0:
+        return 0
+    value = min(value, THUMBNAIL_MAX_SIZE)
+    return -(-value // THUMBNAIL_SIZE_STEP) * THUMBNAIL_SIZE_STEP
+
+def get_thumbnail_key(file_id: str, width: int, height: int) -> tuple:
+    """Cache key: content plus content_version, so an edit gets new entries"""
+    version = file_cache.get(file_id, {}).get('content_version') or 0
+    return ('thumb', file_id, version, width, height)
+
+def get_thumbnail_path(key: tuple) -> Path:
+    _, file_id, version, width, height = key
+    return thumbnail_dir / f"{get_content_key(file_id)}_v{version}_{width}x{height}.jpg"
+
+def get_thumbnail_url(file_id: str, width: int = None, height: int = None) -> str:
+    """Versioned thumbnail URL, safe to cache forever"""
+    version = file_cache.get(file_id, {}).get('content_version') or 0
+    url = f"/api/files/thumbnail?id={file_id}&v={version}"
+    if width:
+        url += f"&w={width}"
+    if height:
+        url += f"&h={height}"
+    return url
+
+def prune_thumbnail_dir():
+    """Drop the least recently used thumbnails once the disk budget is exceeded"""
+    try:
+        files = [(path.stat(), path) for path in thumbnail_dir.glob("*.jpg")]
+    except OSError:
+        return
+    total = sum(stat.st_size for stat, _ in files)
+    if total <= THUMBNAIL_DISK_MAX_BYTES:
         return
+    for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+        path.unlink(missing_ok=True)
+        total -= stat.st_size
+        if total <= THUMBNAIL_DISK_MAX_BYTES * 0.9:
+            break
+    print(f"🧹 Thumbnail cache pruned to {total/1024/1024:.0f}MB")
 
-    cleanup_task_running = True
+def _fetch_thumbnail(key: tuple) -> bytes:
+    global thumbnail_writes
+    _, file_id, version, width, height = key
+    client = get_google_photos_client()
+    image = client.api.get_thumbnail(file_id, width=width or None, height=height or None,
+                                     content_version=version or None)
+    thumbnail_stats['fetched'] += 1
 
-    def cleanup_worker():
-        while cleanup_task_running:
+    path = get_thumbnail_path(key)
+    try:
+        # Written under a temporary name so readers never see a partial file
+        partial = path.with_suffix('.part')
+        partial.write_bytes(image)
+        os.replace(partial, path)
+    except OSError as e:
+        print(f"⚠️ Could not store thumbnail {path.name}: {e}")
+    thumbnail_ram_cache.put(key, image)
+
+    with thumbnail_lock:
+        thumbnail_writes += 1
+        prune = thumbnail_writes % THUMBNAIL_PRUNE_EVERY == 0
+    if prune:
+        prune_thumbnail_dir()
+    return image
+
+def get_thumbnail_bytes(file_id: str, width: int, height: int) -> bytes:
+    """Thumbnail from RAM, then disk, then upstream (concurrent misses share one fetch)"""
+    key = get_thumbnail_key(file_id, width, height)
+    image = thumbnail_ram_cache.get(key)
+    if image is not None:
+        thumbnail_stats['ram_hits'] += 1
+        return image
+
+    path = get_thumbnail_path(key)
+    try:
+        image = path.read_bytes()
+        os.utime(path)  # LRU order for pruning
+        thumbnail_stats['disk_hits'] += 1
+        thumbnail_ram_cache.put(key, image)
+        return image
+    except FileNotFoundError:
+        pass
+
+    with thumbnail_lock:
+        future = thumbnail_inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            thumbnail_inflight[key] = future
+        else:
+            thumbnail_stats['coalesced'] += 1
+    if not owner:
+        return future.result()
+
+    try:
+        image = _fetch_thumbnail(key)
+        future.set_result(image)
+        return image
+    except Exception as e:
+        thumbnail_stats['failed'] += 1
+        future.set_exception(e)
+        raise
+    finally:
+        with thumbnail_lock:
+            thumbnail_inflight.pop(key, None)
+
+def is_thumbnail_cached(file_id: str, width: int, height: int) -> bool:
+    key = get_thumbnail_key(file_id, width, height)
+    return key in thumbnail_ram_cache or get_thumbnail_path(key).exists()
+
+def prefetch_thumbnails(file_ids: List[str], width: int, height: int) -> dict:
+    """Warm the thumbnails of a page of results in the background"""
+    cached = 0
+    queued = 0
+    for file_id in file_ids:
+        if is_thumbnail_cached(file_id, width, height):
+            cached += 1
+            continue
+
+        def warm(file_id=file_id):
             try:
-                cleanup_inactive_cache()
-                time.sleep(CLEANUP_CHECK_INTERVAL)
+                get_thumbnail_bytes(file_id, width, height)
             except Exception as e:
-                print(f"❌ Cleanup task error: {e}")
-                time.sleep(CLEANUP_CHECK_INTERVAL)
+                print(f"⚠️ Thumbnail prefetch failed for {file_id[:8]}...: {e}")
 
-    threading.Thread(target=cleanup_worker, daemon=True).start()
-    print(f"🧹 Background cleanup task started (check every {CLEANUP_CHECK_INTERVAL}s, cleanup after {CACHE_CLEANUP_SECONDS}s)")
+        thumbnail_pool.submit(warm)
+        queued += 1
+    return {"cached": cached, "queued": queued}
 
+# ========================================
+# 📁 ALBUMS
+# ========================================
+# Albums come from the synced `collections` table and their items from the
+# `collection_media` membership table, so one album page costs an index range
+# scan over that album instead of an aggregation over the whole library.
+
+ALBUM_PAGE_DEFAULT = 100
+ALBUM_PAGE_MAX = 1000
+
+def open_library_storage() -> Storage:
+    """Open the library cache the client syncs into, read-only (WAL lets it read while a sync writes)"""
+    return Storage(get_google_photos_client().db_path, read_only=True)
+
+def resolve_album(album_id: str) -> Tuple[Optional[dict], List[str]]:
+    """(collection row or None, keys its items reference) for a media key, album id or title"""
+    with open_library_storage() as storage:
+        collection = storage.get_collection(album_id)
+    if collection is None:
+        return None, [album_id]
+    return collection, [collection['collection_media_key'], collection['collection_album_id']]
+
+def get_album_member_ids(album_id: str) -> List[str]:
+    """Media keys of an album, newest first"""
+    _, keys = resolve_album(album_id)
+    with open_library_storage() as storage:
+        return [row['media_key'] for row in storage.get_collection_media(keys)]
+
+def format_album(collection: dict) -> dict:
+    cover = collection.get('cover_item_media_key')
+    return {
+        'id': collection['collection_media_key'],
+        'album_id': collection.get('collection_album_id') or '',
+        'title': collection.get('title') or 'Untitled album',
+        'media_count': collection.get('media_count', 0),
+        'total_items': collection.get('total_items') or collection.get('media_count', 0),
+        'start': collection.get('start'),
+        'end': collection.get('end'),
+        'last_activity_time_ms': collection.get('last_activity_time_ms'),
+        'cover_id': cover,
+        'cover_thumbnail_url': get_thumbnail_url(cover) if cover in file_cache else None
+    }
+
+def format_album_file(row: dict) -> dict:
+    """A membership row in the /api/files/all item shape (catalog data wins when present)"""
+    file_id = row['media_key']
+    file_info = file_cache.get(file_id)
+    if file_info is None:
+        file_info = {
+            'filename': row['file_name'],
+            'size_bytes': row['size_bytes'] or 0,
+            'duration_ms': row['duration'] or 0,
+            'type': 'video' if row['type'] == 2 else 'image',
+            'timestamp': row['utc_timestamp'] or 0,
+            'collection_id': row['collection_id'],
+            'dedup_key': row['dedup_key'] or ''
+        }
+    return {
+        'id': file_id,
+        'filename': file_info['filename'],
+        'type': file_info['type'],
+        'size_bytes': file_info['size_bytes'],
+        'size_mb': round(file_info['size_bytes'] / (1024 * 1024), 2),
+        'duration_ms': file_info['duration_ms'],
+        'timestamp': file_info['timestamp'],
+        'collection_id': file_info['collection_id'],
+        'dedup_key': file_info.get('dedup_key', ''),
+        'thumbnail_url': get_thumbnail_url(file_id) if file_id in file_cache else None
+    }
+
+# ========================================
+# ✏️ BATCH MUTATIONS
+# ========================================
+# Favorite / archive / trash / restore / caption for many items at once. The
+# client batches and parallelises the RPCs and writes the outcome to Storage;
+# here the same outcome is applied to file_cache, so no resync is needed.
+
+MUTATION_ACTIONS = ("favorite", "unfavorite", "archive", "unarchive", "trash", "restore", "caption")
+MUTATION_MAX_IDS = 50000
+
+class MutationRequest(BaseModel):
+    ids: List[str]
+    caption: Optional[str] = None
+
+def apply_mutation_to_catalog(action: str, media_keys: List[str], caption: str = ""):
+    """Mirror a successful mutation in the in-memory catalog"""
+    if action == "trash":
+        for file_id in media_keys:
+            if file_id not in file_cache:
+                continue
+            content_key = get_content_key(file_id)
+            del file_cache[file_id]
+            aliases = content_aliases.get(content_key, [])
+            if file_id in aliases:
+                aliases.remove(file_id)
+            if not aliases:
+                content_aliases.pop(content_key, None)
+        return
 
+    if action == "restore":
+        with open_library_storage() as storage:
+            rows = storage.get_media(media_keys)
+        for row in rows:
+            file_cache[row['media_key']] = make_catalog_entry(row)
+            aliases = content_aliases.setdefault(get_content_key(row['media_key']), [])
+            if row['media_key'] not in aliases:
+                aliases.append(row['media_key'])
+        return
+
+    field, value = {
+        "favorite": ('is_favorite', True),
+        "unfavorite": ('is_favorite', False),
+        "archive": ('is_archived', True),
+        "unarchive": ('is_archived', False),
+        "caption": ('caption', caption or '')
+    }[action]
+    for file_id in media_keys:
+        if file_id in file_cache:
+            file_cache[file_id][field] = value
 
 # ========================================
 # 🎬 METADATA CACHE SYSTEM
 # ========================================
 
 def get_metadata_file_path(file_id: str) -> Path:
-    """Get the metadata file path for a video"""
-    return metadata_cache_dir / f"{file_id}.meta"
+    """Get the metadata file path for a video (shared by every alias of its content)"""
+    return metadata_cache_dir / f"{get_content_key(file_id)}.meta"
 
 def extract_tmdb_id_from_filename(filename: str) -> str:
     """Extract TMDB ID from filename. Expected format: MovieName_tmdbid.extension"""
@@ -694,16 +2739,22 @@ def extract_tmdb_id_from_filename(filename: str) -> str:
         print(f"⚠️ Error extracting TMDB ID from filename '{filename}': {e}")
         return None
 
-def extract_mp4_metadata(file_data: bytes, file_size: int, filename: str) -> dict:
-    """Extract MP4 metadata from the first chunk of data"""
+def extract_mp4_metadata(file_data: bytes, file_size: int, filename: str, range_reader=None) -> dict:
+    """Extract MP4 metadata from the first chunk of data
+
+    If the moov atom sits after mdat (not fast-start) and a range_reader is
+    given, the moov is fetched with a Range request instead of being skipped.
+    """
     try:
         metadata = {
             "file_size": file_size,
             "filename": filename,
+            "container": "mp4",
             "duration_ms": 0,
             "has_moov": False,
             "ftyp_data": None,
             "moov_data": None,
+            "seek_index": [],
             "created": time.time()
         }
 
@@ -714,8 +2765,15 @@ def extract_mp4_metadata(file_data: bytes, file_size: int, filename: str) -> dic
             if offset + 8 > len(file_data):
                 break
 
-            atom_size = struct.unpack('>I', file_data[offset:offset+4])[0]
-            atom_type = file_data[offset+4:offset+8].decode('ascii', errors='ignore')
+            atom_size = struct.unpack_from('>I', file_data, offset)[0]
+            atom_type = bytes(file_data[offset+4:offset+8]).decode('ascii', errors='ignore')
+            header_size = 8
+            if atom_size == 1 and offset + 16 <= len(file_data):
+                # 64-bit largesize (mdat of multi-GB files)
+                atom_size = struct.unpack_from('>Q', file_data, offset + 8)[0]
+                header_size = 16
+            elif atom_size == 0:
+                atom_size = file_size - offset
 
             print(f"🔍 Found MP4 atom: {atom_type} (size: {atom_size})")
 
@@ -727,35 +2785,28 @@ def extract_mp4_metadata(file_data: bytes, file_size: int, filename: str) -> dic
 
             elif atom_type == 'moov':
                 # Movie atom - contains all metadata
-                end_pos = min(offset + atom_size, len(file_data))
-
-                # OPTIMIZATION: Limit moov size to prevent huge metadata files
-                max_moov_size = 1024 * 1024  # 1MB max for moov atom
-                if atom_size > max_moov_size:
-                    print(f"⚠️ Large moov atom ({atom_size/1024/1024:.1f}MB), limiting to 1MB")
-                    end_pos = min(offset + max_moov_size, len(file_data))
-
-                metadata["moov_data"] = base64.b64encode(file_data[offset:end_pos]).decode()
-                metadata["has_moov"] = True
-                print(f"✅ Extracted moov atom ({end_pos - offset} bytes, original: {atom_size} bytes)")
-
-                # Try to extract duration from moov
-                try:
-                    moov_data = file_data[offset:end_pos]
-                    # Look for mvhd (movie header) inside moov
-                    mvhd_pos = moov_data.find(b'mvhd')
-                    if mvhd_pos > 0 and mvhd_pos + 24 < len(moov_data):
-                        # Skip mvhd header and read timescale and duration
-                        timescale = struct.unpack('>I', moov_data[mvhd_pos+12:mvhd_pos+16])[0]
-                        duration = struct.unpack('>I', moov_data[mvhd_pos+16:mvhd_pos+20])[0]
-                        if timescale > 0:
-                            metadata["duration_ms"] = int((duration / timescale) * 1000)
-                            print(f"✅ Extracted duration: {metadata['duration_ms']/1000:.1f}s")
-                except Exception as e:
-                    print(f"⚠️ Could not extract duration: {e}")
+                moov_data = file_data[offset:offset + atom_size]
+                if len(moov_data) < atom_size and range_reader:
+                    print(f"📡 moov truncated in head ({len(moov_data)}/{atom_size} bytes), fetching via Range")
+                    moov_data = range_reader(offset, offset + atom_size - 1)
+                _apply_mp4_moov(metadata, moov_data, atom_size)
+
+            elif atom_type == 'mdat' and not metadata["has_moov"] and range_reader:
+                # moov is stored after the media data: jump over mdat with a Range request
+                moov_offset = offset + atom_size
+                if moov_offset + 8 <= file_size:
+                    print(f"📡 moov after mdat, fetching atom header at {moov_offset/1024/1024:.1f}MB")
+                    atom_header = range_reader(moov_offset, min(moov_offset + 15, file_size - 1))
+                    if len(atom_header) >= 8 and atom_header[4:8] == b'moov':
+                        moov_size = struct.unpack_from('>I', atom_header, 0)[0]
+                        if moov_size == 1 and len(atom_header) >= 16:
+                            moov_size = struct.unpack_from('>Q', atom_header, 8)[0]
+                        moov_data = range_reader(moov_offset, moov_offset + moov_size - 1)
+                        _apply_mp4_moov(metadata, moov_data, moov_size)
+                break
 
             # Move to next atom
-            if atom_size <= 8:
+            if atom_size <= header_size:
                 offset += 8
             else:
                 offset += atom_size
@@ -767,13 +2818,40 @@ def extract_mp4_metadata(file_data: bytes, file_size: int, filename: str) -> dic
         return {
             "file_size": file_size,
             "filename": filename,
+            "container": "mp4",
             "duration_ms": 0,
             "has_moov": False,
             "ftyp_data": None,
             "moov_data": None,
+            "seek_index": [],
             "created": time.time()
         }
 
+def _apply_mp4_moov(metadata: dict, moov_data: bytes, atom_size: int):
+    """Store a moov atom in the metadata and derive duration + seek index from it"""
+    # OPTIMIZATION: Limit moov size to prevent huge metadata files
+    max_moov_size = 1024 * 1024  # 1MB max for moov atom
+    stored_moov = moov_data
+    if atom_size > max_moov_size:
+        print(f"⚠️ Large moov atom ({atom_size/1024/1024:.1f}MB), limiting to 1MB")
+        stored_moov = moov_data[:max_moov_size]
+
+    metadata["moov_data"] = base64.b64encode(stored_moov).decode()
+    metadata["has_moov"] = True
+    print(f"✅ Extracted moov atom ({len(stored_moov)} bytes, original: {atom_size} bytes)")
+
+    # The index is built from the complete moov, before the 1MB storage limit
+    try:
+        duration_ms, seek_index = build_mp4_seek_index(moov_data)
+        if duration_ms:
+            metadata["duration_ms"] = duration_ms
+            print(f"✅ Extracted duration: {duration_ms/1000:.1f}s")
+        metadata["seek_index"] = seek_index
+        if seek_index:
+            print(f"✅ Built MP4 seek index ({len(seek_index)} keyframes)")
+    except Exception as e:
+        print(f"⚠️ Could not build MP4 seek index: {e}")
+
 def save_metadata_cache(file_id: str, metadata: dict):
     """Save metadata to cache file"""
     try:
@@ -826,6 +2904,480 @@ def create_virtual_mp4_header(metadata: dict) -> bytes:
         print(f"❌ Error creating virtual MP4 header: {e}")
         return b''
 
+# ========================================
+# 🎞️ CONTAINER DETECTION & SEEK INDEX
+# ========================================
+
+# Supported video containers by file extension
+VIDEO_CONTAINER_EXTENSIONS = {
+    '.mp4': 'mp4',
+    '.m4v': 'mp4',
+    '.mov': 'mp4',
+    '.mkv': 'matroska',
+    '.webm': 'matroska',
+}
+
+CONTAINER_MIME_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m4v': 'video/mp4',
+    '.mov': 'video/quicktime',
+    '.mkv': 'video/x-matroska',
+    '.webm': 'video/webm',
+}
+
+SEEK_INDEX_MAX_POINTS = 1000  # Keyframe entries kept per title (decimated evenly)
+
+# Matroska / EBML element IDs (marker bits included)
+EBML_HEADER_ID = 0x1A45DFA3
+MKV_SEGMENT_ID = 0x18538067
+MKV_SEEKHEAD_ID = 0x114D9B74
+MKV_SEEK_ID = 0x4DBB
+MKV_SEEKID_ID = 0x53AB
+MKV_SEEKPOSITION_ID = 0x53AC
+MKV_INFO_ID = 0x1549A966
+MKV_TIMECODESCALE_ID = 0x2AD7B1
+MKV_DURATION_ID = 0x4489
+MKV_TRACKS_ID = 0x1654AE6B
+MKV_TRACKENTRY_ID = 0xAE
+MKV_TRACKNUMBER_ID = 0xD7
+MKV_TRACKTYPE_ID = 0x83
+MKV_CUES_ID = 0x1C53BB6B
+MKV_CUEPOINT_ID = 0xBB
+MKV_CUETIME_ID = 0xB3
+MKV_CUETRACKPOSITIONS_ID = 0xB7
+MKV_CUETRACK_ID = 0xF7
+MKV_CUECLUSTERPOSITION_ID = 0xF1
+MKV_CLUSTER_ID = 0x1F43B675
+
+def get_container_type(filename: str) -> Optional[str]:
+    """Return 'mp4' / 'matroska' for a supported video filename, None otherwise"""
+    return VIDEO_CONTAINER_EXTENSIONS.get(Path(filename or '').suffix.lower())
+
+def is_video_container(filename: str) -> bool:
+    """Check if a filename is a streamable video container (MP4 or MKV family)"""
+    return get_container_type(filename) is not None
+
+def get_container_mime_type(filename: str) -> str:
+    """Content-Type to send for a video file"""
+    return CONTAINER_MIME_TYPES.get(Path(filename or '').suffix.lower(), 'video/mp4')
+
+def detect_container(head: bytes, filename: str = '') -> Optional[str]:
+    """Detect the container from magic bytes, falling back to the file extension"""
+    if len(head) >= 4 and struct.unpack_from('>I', head, 0)[0] == EBML_HEADER_ID:
+        return 'matroska'
+    if len(head) >= 8 and bytes(head[4:8]) in (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip'):
+        return 'mp4'
+    return get_container_type(filename)
+
+def make_range_reader(file_id: str, download_url: str = None, holds_slot: bool = False):
+    """Build a reader(start, end) -> bytes that fetches an inclusive byte range from upstream
+
+    Reads run at metadata priority through the transfer scheduler and an
+    UpstreamReader, so they wait behind viewers and survive URL expiry.
+    holds_slot: the caller already holds a slot for this title that stays idle
+    while it parses (a download reading its own head), so reads reuse it
+    instead of queueing for a second one.
+    """
+    def read_range(start: int, end: int) -> bytes:
+        nonlocal download_url
+        transfer = scheduled_transfer(PRIORITY_METADATA, file_id)
+        buffer = bytearray()
+        try:
+            with nullcontext(transfer) if holds_slot else transfer:
+                response = open_upstream(file_id, download_url, start, end)
+                try:
+                    for chunk in response.iter_content(chunk_size=256 * 1024):
+                        transfer.consume(len(chunk))
+                        buffer += chunk
+                finally:
+                    response.close()
+                    download_url = response.download_url  # Keep a re-resolved URL for the next read
+            return bytes(buffer)
+        except Exception as e:
+            print(f"⚠️ Range request failed ({start}-{end}): {e}")
+            return b''
+    return read_range
+
+def _decimate_seek_index(seek_index: list) -> list:
+    """Keep at most SEEK_INDEX_MAX_POINTS entries, evenly spaced, first entry always kept"""
+    if len(seek_index) <= SEEK_INDEX_MAX_POINTS:
+        return seek_index
+    step = len(seek_index) / SEEK_INDEX_MAX_POINTS
+    return [seek_index[int(i * step)] for i in range(SEEK_INDEX_MAX_POINTS)]
+
+def seek_index_byte_for_time(seek_index: list, time_ms: int) -> Optional[int]:
+    """Byte offset of the last keyframe at or before time_ms"""
+    if not seek_index:
+        return None
+    pos = bisect.bisect_right(seek_index, [time_ms, float('inf')]) - 1
+    return seek_index[max(pos, 0)][1]
+
+def seek_index_time_for_byte(seek_index: list, byte_offset: int) -> Optional[int]:
+    """Timestamp (ms) of the last keyframe at or before byte_offset"""
+    if not seek_index:
+        return None
+    offsets = [entry[1] for entry in seek_index]
+    pos = bisect.bisect_right(offsets, byte_offset) - 1
+    return seek_index[max(pos, 0)][0]
+
+# 📦 MP4 box tree
+
+def _iter_mp4_boxes(data: bytes, start: int = 0, end: int = None):
+    """Yield (box_type, payload_start, box_end) for the boxes in data[start:end]"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, min(offset + size, end)
+        offset += size
+
+def _find_mp4_box(data: bytes, path: list, start: int = 0, end: int = None) -> Optional[tuple]:
+    """Find a nested box by path (e.g. [b'mdia', b'minf', b'stbl']), returns (payload_start, box_end)"""
+    for box_type, payload_start, box_end in _iter_mp4_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload_start, box_end
+            return _find_mp4_box(data, path[1:], payload_start, box_end)
+    return None
+
+def _read_mp4_timescale_duration(data: bytes, payload_start: int) -> tuple:
+    """Read (timescale, duration) from a full mvhd/mdhd box payload (version 0 or 1)"""
+    version = data[payload_start]
+    if version == 1:
+        # version/flags(4) creation(8) modification(8) timescale(4) duration(8)
+        return struct.unpack_from('>IQ', data, payload_start + 20)
+    # version/flags(4) creation(4) modification(4) timescale(4) duration(4)
+    return struct.unpack_from('>II', data, payload_start + 12)
+
+def _read_mp4_table(data: bytes, box: tuple, fields: str) -> tuple:
+    """Read a full-box table (version/flags, entry_count, entries) as a flat tuple"""
+    payload_start, box_end = box
+    entry_count = struct.unpack_from('>I', data, payload_start + 4)[0]
+    entry_size = struct.calcsize('>' + fields)
+    entry_count = min(entry_count, (box_end - payload_start - 8) // entry_size)
+    return struct.unpack_from(f'>{fields * entry_count}', data, payload_start + 8)
+
+def build_mp4_seek_index(moov_data: bytes) -> tuple:
+    """Build (duration_ms, [[time_ms, byte_offset], ...]) from a complete moov atom
+
+    The index lists the keyframes (stss) of the first video track, with their
+    absolute file offsets resolved through stsc/stsz/stco (or co64).
+    """
+    moov = _find_mp4_box(moov_data, [b'moov'])
+    if not moov:
+        return 0, []
+
+    duration_ms = 0
+    mvhd = _find_mp4_box(moov_data, [b'mvhd'], *moov)
+    if mvhd:
+        timescale, duration = _read_mp4_timescale_duration(moov_data, mvhd[0])
+        if timescale > 0:
+            duration_ms = int(duration * 1000 / timescale)
+
+    for box_type, trak_start, trak_end in _iter_mp4_boxes(moov_data, *moov):
+        if box_type != b'trak':
+            continue
+        hdlr = _find_mp4_box(moov_data, [b'mdia', b'hdlr'], trak_start, trak_end)
+        if not hdlr or moov_data[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+            continue
+
+        mdhd = _find_mp4_box(moov_data, [b'mdia', b'mdhd'], trak_start, trak_end)
+        stbl = _find_mp4_box(moov_data, [b'mdia', b'minf', b'stbl'], trak_start, trak_end)
+        if not mdhd or not stbl:
+            return duration_ms, []
+        track_timescale, track_duration = _read_mp4_timescale_duration(moov_data, mdhd[0])
+        if not track_timescale:
+            return duration_ms, []
+        if not duration_ms:
+            duration_ms = int(track_duration * 1000 / track_timescale)
+
+        stts = _find_mp4_box(moov_data, [b'stts'], *stbl)
+        stsc = _find_mp4_box(moov_data, [b'stsc'], *stbl)
+        stsz = _find_mp4_box(moov_data, [b'stsz'], *stbl)
+        stco = _find_mp4_box(moov_data, [b'stco'], *stbl)
+        co64 = _find_mp4_box(moov_data, [b'co64'], *stbl)
+        stss = _find_mp4_box(moov_data, [b'stss'], *stbl)
+        if not (stts and stsc and stsz and (stco or co64)):
+            return duration_ms, []
+
+        time_deltas = _read_mp4_table(moov_data, stts, 'II')
+        chunk_map = _read_mp4_table(moov_data, stsc, 'III')
+        chunk_offsets = _read_mp4_table(moov_data, co64, 'Q') if co64 else _read_mp4_table(moov_data, stco, 'I')
+
+        uniform_size, sample_count = struct.unpack_from('>II', moov_data, stsz[0] + 4)
+        if uniform_size:
+            sample_sizes = None
+        else:
+            sample_count = min(sample_count, (stsz[1] - stsz[0] - 12) // 4)
+            sample_sizes = struct.unpack_from(f'>{sample_count}I', moov_data, stsz[0] + 12)
+
+        # Keyframe sample numbers (1-based); every sample is a sync sample without stss
+        if stss:
+            sync_samples = _read_mp4_table(moov_data, stss, 'I')
+        else:
+            sync_samples = range(1, sample_count + 1)
+        if len(sync_samples) > SEEK_INDEX_MAX_POINTS:
+            step = len(sync_samples) / SEEK_INDEX_MAX_POINTS
+            sync_samples = [sync_samples[int(i * step)] for i in range(SEEK_INDEX_MAX_POINTS)]
+        wanted = set(sync_samples)
+
+        # Decode timestamps of the wanted samples from stts runs (both lists are ascending)
+        sample_times = {}
+        sample_number, decode_time, next_sync = 1, 0, 0
+        for i in range(0, len(time_deltas), 2):
+            count, delta = time_deltas[i], time_deltas[i + 1]
+            while next_sync < len(sync_samples) and sync_samples[next_sync] < sample_number + count:
+                sample = sync_samples[next_sync]
+                sample_times[sample] = decode_time + (sample - sample_number) * delta
+                next_sync += 1
+            sample_number += count
+            decode_time += count * delta
+
+        # Resolve byte offsets by walking chunks (stsc runs) and sample sizes
+        sample_offsets = {}
+        sample_number = 1
+        for i in range(0, len(chunk_map), 3):
+            first_chunk, samples_per_chunk = chunk_map[i], chunk_map[i + 1]
+            last_chunk = chunk_map[i + 3] - 1 if i + 3 < len(chunk_map) else len(chunk_offsets)
+            for chunk in range(first_chunk, last_chunk + 1):
+                if chunk > len(chunk_offsets) or sample_number > sample_count:
+                    break
+                offset = chunk_offsets[chunk - 1]
+                for _ in range(samples_per_chunk):
+                    if sample_number in wanted:
+                        sample_offsets[sample_number] = offset
+                    offset += uniform_size or sample_sizes[sample_number - 1]
+                    sample_number += 1
+                    if sample_number > sample_count:
+                        break
+
+        seek_index = [
+            [int(sample_times[sample] * 1000 / track_timescale), sample_offsets[sample]]
+            for sample in sync_samples
+            if sample in sample_times and sample in sample_offsets
+        ]
+        return duration_ms, seek_index
+
+    return duration_ms, []
+
+# 📦 Matroska (MKV / WebM) EBML parsing
+
+def _read_ebml_vint(data: bytes, offset: int, keep_marker: bool) -> tuple:
+    """Read an EBML variable-length integer, returns (value, length, is_unknown_size)"""
+    first = data[offset]
+    if first == 0:
+        raise ValueError(f"Invalid EBML vint at offset {offset}")
+    length = 1
+    mask = 0x80
+    while not first & mask:
+        mask >>= 1
+        length += 1
+    if offset + length > len(data):
+        raise ValueError(f"Truncated EBML vint at offset {offset}")
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, unknown
+
+def _iter_ebml_elements(data: bytes, start: int = 0, end: int = None):
+    """Yield (element_id, element_start, data_start, data_end) for elements in data[start:end]
+
+    data_end may lie beyond len(data) when an element is only partially present;
+    an unknown-size element (live-muxed Segment/Cluster) extends to end.
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset < end:
+        try:
+            element_id, id_length, _ = _read_ebml_vint(data, offset, keep_marker=True)
+            size, size_length, unknown = _read_ebml_vint(data, offset + id_length, keep_marker=False)
+        except (ValueError, IndexError):
+            return
+        data_start = offset + id_length + size_length
+        data_end = end if unknown else data_start + size
+        yield element_id, offset, data_start, data_end
+        if unknown:
+            return
+        offset = data_end
+
+def _read_ebml_uint(data: bytes, start: int, end: int) -> int:
+    return int.from_bytes(data[start:end], 'big')
+
+def _read_ebml_float(data: bytes, start: int, end: int) -> float:
+    if end - start == 4:
+        return struct.unpack_from('>f', data, start)[0]
+    if end - start == 8:
+        return struct.unpack_from('>d', data, start)[0]
+    return 0.0
+
+def _fetch_ebml_element(file_data: bytes, offset: int, file_size: int, range_reader) -> Optional[tuple]:
+    """Return (buffer, data_start, data_end) for a level-1 element at an absolute offset
+
+    Uses the downloaded head when it covers the element, otherwise a Range request.
+    """
+    header = bytes(file_data[offset:offset + 12]) if offset + 12 <= len(file_data) else None
+    if header is None:
+        if not range_reader:
+            return None
+        header = range_reader(offset, min(offset + 11, file_size - 1))
+    elements = list(_iter_ebml_elements(header, 0, len(header)))
+    if not elements:
+        return None
+    _, _, data_start, data_end = elements[0]
+    if offset + data_end <= len(file_data):
+        return file_data, offset + data_start, offset + data_end
+    if not range_reader:
+        return None
+    print(f"📡 Fetching MKV element at {offset/1024/1024:.1f}MB ({data_end/1024:.1f}KB) via Range")
+    body = range_reader(offset, offset + data_end - 1)
+    if len(body) < data_end:
+        return None
+    return body, data_start, data_end
+
+def extract_matroska_metadata(file_data: bytes, file_size: int, filename: str, range_reader=None) -> dict:
+    """Extract duration and a Cues-based seek index from the head of an MKV/WebM file
+
+    Cues are usually written at the end of the file; when the SeekHead points
+    beyond the downloaded head they are fetched with a Range request.
+    """
+    metadata = {
+        "file_size": file_size,
+        "filename": filename,
+        "container": "matroska",
+        "duration_ms": 0,
+        "has_moov": False,
+        "ftyp_data": None,
+        "moov_data": None,
+        "seek_index": [],
+        "created": time.time()
+    }
+    try:
+        segment = None
+        for element_id, _, data_start, data_end in _iter_ebml_elements(file_data):
+            if element_id == MKV_SEGMENT_ID:
+                segment = (data_start, min(data_end, file_size))
+                break
+        if not segment:
+            print(f"⚠️ No Matroska Segment found in {filename}")
+            return metadata
+        segment_start = segment[0]
+        metadata["segment_offset"] = segment_start
+
+        # Level-1 positions: from the SeekHead first, then whatever is present in the head
+        positions = {}
+        for element_id, element_start, data_start, data_end in _iter_ebml_elements(file_data, segment_start, segment[1]):
+            positions.setdefault(element_id, element_start)
+
+            if element_id == MKV_SEEKHEAD_ID and data_end <= len(file_data):
+                for seek_id, _, seek_start, seek_end in _iter_ebml_elements(file_data, data_start, data_end):
+                    if seek_id != MKV_SEEK_ID:
+                        continue
+                    target_id, target_position = None, None
+                    for child_id, _, child_start, child_end in _iter_ebml_elements(file_data, seek_start, seek_end):
+                        if child_id == MKV_SEEKID_ID:
+                            target_id = _read_ebml_uint(file_data, child_start, child_end)
+                        elif child_id == MKV_SEEKPOSITION_ID:
+                            target_position = _read_ebml_uint(file_data, child_start, child_end)
+                    if target_id is not None and target_position is not None:
+                        positions.setdefault(target_id, segment_start + target_position)
+
+            if element_id == MKV_CLUSTER_ID or data_end > len(file_data):
+                break
+
+        # Segment info: timecode scale and duration
+        timecode_scale = 1000000
+        if MKV_INFO_ID in positions:
+            info = _fetch_ebml_element(file_data, positions[MKV_INFO_ID], file_size, range_reader)
+            if info:
+                buffer, info_start, info_end = info
+                duration = 0.0
+                for child_id, _, child_start, child_end in _iter_ebml_elements(buffer, info_start, info_end):
+                    if child_id == MKV_TIMECODESCALE_ID:
+                        timecode_scale = _read_ebml_uint(buffer, child_start, child_end) or timecode_scale
+                    elif child_id == MKV_DURATION_ID:
+                        duration = _read_ebml_float(buffer, child_start, child_end)
+                metadata["duration_ms"] = int(duration * timecode_scale / 1000000)
+                print(f"✅ Extracted MKV duration: {metadata['duration_ms']/1000:.1f}s")
+
+        # Video track number, so cues of other tracks can be skipped
+        video_track = None
+        if MKV_TRACKS_ID in positions:
+            tracks = _fetch_ebml_element(file_data, positions[MKV_TRACKS_ID], file_size, range_reader)
+            if tracks:
+                buffer, tracks_start, tracks_end = tracks
+                for entry_id, _, entry_start, entry_end in _iter_ebml_elements(buffer, tracks_start, tracks_end):
+                    if entry_id != MKV_TRACKENTRY_ID:
+                        continue
+                    track_number, track_type = None, None
+                    for child_id, _, child_start, child_end in _iter_ebml_elements(buffer, entry_start, entry_end):
+                        if child_id == MKV_TRACKNUMBER_ID:
+                            track_number = _read_ebml_uint(buffer, child_start, child_end)
+                        elif child_id == MKV_TRACKTYPE_ID:
+                            track_type = _read_ebml_uint(buffer, child_start, child_end)
+                    if track_type == 1:
+                        video_track = track_number
+                        break
+
+        # Cues: CueTime -> CueClusterPosition (relative to the segment data start)
+        if MKV_CUES_ID in positions:
+            cues = _fetch_ebml_element(file_data, positions[MKV_CUES_ID], file_size, range_reader)
+            if cues:
+                buffer, cues_start, cues_end = cues
+                seek_index = []
+                for point_id, _, point_start, point_end in _iter_ebml_elements(buffer, cues_start, cues_end):
+                    if point_id != MKV_CUEPOINT_ID:
+                        continue
+                    cue_time, cluster_position = None, None
+                    for child_id, _, child_start, child_end in _iter_ebml_elements(buffer, point_start, point_end):
+                        if child_id == MKV_CUETIME_ID:
+                            cue_time = _read_ebml_uint(buffer, child_start, child_end)
+                        elif child_id == MKV_CUETRACKPOSITIONS_ID and cluster_position is None:
+                            cue_track, position = None, None
+                            for pos_id, _, pos_start, pos_end in _iter_ebml_elements(buffer, child_start, child_end):
+                                if pos_id == MKV_CUETRACK_ID:
+                                    cue_track = _read_ebml_uint(buffer, pos_start, pos_end)
+                                elif pos_id == MKV_CUECLUSTERPOSITION_ID:
+                                    position = _read_ebml_uint(buffer, pos_start, pos_end)
+                            if video_track is None or cue_track == video_track:
+                                cluster_position = position
+                    if cue_time is not None and cluster_position is not None:
+                        seek_index.append([int(cue_time * timecode_scale / 1000000), segment_start + cluster_position])
+                seek_index.sort()
+                metadata["seek_index"] = _decimate_seek_index(seek_index)
+                print(f"✅ Built MKV seek index from Cues ({len(seek_index)} cue points)")
+        else:
+            print(f"⚠️ No Cues element referenced in {filename}, seeking will use byte estimates")
+
+        return metadata
+
+    except Exception as e:
+        print(f"❌ Error extracting Matroska metadata: {e}")
+        return metadata
+
+def extract_media_metadata(file_data: bytes, file_size: int, filename: str, download_url: str = None,
+                           file_id: str = None, holds_slot: bool = False) -> dict:
+    """Extract seeking metadata for any supported container (MP4 or Matroska)
+
+    file_id enables Range requests for structures stored past the head
+    (MKV Cues at the end of the file, MP4 moov after mdat), see make_range_reader.
+    """
+    range_reader = make_range_reader(file_id, download_url, holds_slot) if file_id else None
+    container = detect_container(file_data[:16], filename)
+    if container == 'matroska':
+        return extract_matroska_metadata(file_data, file_size, filename, range_reader)
+    return extract_mp4_metadata(file_data, file_size, filename, range_reader)
+
 async def auto_refresh_cache():
     """Auto-refresh cache periodically"""
     global last_auto_refresh
@@ -906,6 +3458,7 @@ def clear_residual_cache():
 
         # Clear download status
         download_status.clear()
+        ram_cache.clear()
 
         if total_files > 0:
             print(f"🧹 Cleared residual cache: {total_files} files ({total_size/1024/1024/1024:.1f}GB freed)")
@@ -947,8 +3500,11 @@ async def startup_event():
     # Initialize components
     try:
         get_google_photos_client()
+        if UPSTREAM_WARM_UP:
+            warm_up_upstream()
         refresh_file_cache()
         start_cleanup_task()
+        start_prefetch_task()
 
         # Start auto-refresh task
         await start_auto_refresh()
@@ -1115,13 +3671,13 @@ async def serve_html_files(file_path: str):
 
 @app.get("/api/files/mp4")
 async def list_mp4_files():
-    """List all MP4 video files (deduplicated by filename)"""
+    """List all streamable video files - MP4 and MKV (deduplicated by filename)"""
     refresh_file_cache()
 
     # First collect all MP4 files
     all_mp4_files = []
     for file_id, file_info in file_cache.items():
-        if file_info['type'] == 'video' and file_info['filename'].lower().endswith('.mp4'):
+        if file_info['type'] == 'video' and is_video_container(file_info['filename']):
             # Extract TMDB ID from filename
             tmdb_id = extract_tmdb_id_from_filename(file_info['filename'])
 
@@ -1134,19 +3690,23 @@ async def list_mp4_files():
                 'duration_ms': file_info['duration_ms'],
                 'timestamp': file_info['timestamp'],
                 'collection_id': file_info['collection_id'],
+                'container': get_container_type(file_info['filename']),
+                'dedup_key': file_info.get('dedup_key', ''),
+                'thumbnail_url': get_thumbnail_url(file_id),
                 'tmdb_id': tmdb_id
             })
 
-    # Deduplicate by filename, keeping the most recent (highest timestamp)
-    filename_map = {}
-    for file_info in all_mp4_files:
-        filename = file_info['filename']
-        if filename not in filename_map or file_info['timestamp'] > filename_map[filename]['timestamp']:
-            filename_map[filename] = file_info
-
-    # Convert back to list and sort by timestamp (newest first)
-    mp4_files = list(filename_map.values())
-    mp4_files.sort(key=lambda x: x['timestamp'], reverse=True)
+    # Deduplicate by content (re-uploads) and by filename, keeping the most recent (highest timestamp)
+    mp4_files = []
+    seen_content = set()
+    seen_filenames = set()
+    for file_info in sorted(all_mp4_files, key=lambda x: x['timestamp'], reverse=True):
+        content_key = file_info['dedup_key'] or file_info['id']
+        if content_key in seen_content or file_info['filename'] in seen_filenames:
+            continue
+        seen_content.add(content_key)
+        seen_filenames.add(file_info['filename'])
+        mp4_files.append(file_info)
 
 
 
@@ -1166,7 +3726,7 @@ async def refresh_movies():
         # Get current movie count before refresh
         old_mp4_files = []
         for file_id, file_info in file_cache.items():
-            if file_info['type'] == 'video' and file_info['filename'].lower().endswith('.mp4'):
+            if file_info['type'] == 'video' and is_video_container(file_info['filename']):
                 old_mp4_files.append(file_id)
         old_count = len(old_mp4_files)
 
@@ -1180,7 +3740,7 @@ async def refresh_movies():
         # Get new movie count after refresh
         new_mp4_files = []
         for file_id, file_info in file_cache.items():
-            if file_info['type'] == 'video' and file_info['filename'].lower().endswith('.mp4'):
+            if file_info['type'] == 'video' and is_video_container(file_info['filename']):
                 new_mp4_files.append(file_id)
         new_count = len(new_mp4_files)
 
@@ -1204,12 +3764,12 @@ async def refresh_movies():
 
 @app.get("/api/files/mp4-raw")
 async def list_mp4_files_raw():
-    """List all MP4 video files (including duplicates) - for debugging"""
+    """List all streamable video files - MP4 and MKV (including duplicates) - for debugging"""
     refresh_file_cache()
 
     mp4_files = []
     for file_id, file_info in file_cache.items():
-        if file_info['type'] == 'video' and file_info['filename'].lower().endswith('.mp4'):
+        if file_info['type'] == 'video' and is_video_container(file_info['filename']):
             # Extract TMDB ID from filename
             tmdb_id = extract_tmdb_id_from_filename(file_info['filename'])
 
@@ -1222,6 +3782,9 @@ async def list_mp4_files_raw():
                 'duration_ms': file_info['duration_ms'],
                 'timestamp': file_info['timestamp'],
                 'collection_id': file_info['collection_id'],
+                'container': get_container_type(file_info['filename']),
+                'dedup_key': file_info.get('dedup_key', ''),
+                'thumbnail_url': get_thumbnail_url(file_id),
                 'tmdb_id': tmdb_id
             })
 
@@ -1249,7 +3812,8 @@ async def list_all_files():
             'size_mb': round(file_info['size_bytes'] / (1024 * 1024), 2),
             'duration_seconds': file_info['duration_ms'] // 1000 if file_info['duration_ms'] else 0,
             'timestamp': file_info['timestamp'],
-            'collection_id': file_info['collection_id']
+            'collection_id': file_info['collection_id'],
+            'thumbnail_url': get_thumbnail_url(file_id)
         })
 
     return {
@@ -1277,12 +3841,154 @@ async def get_file_info(id: str = Query(..., description="File ID")):
         'duration_seconds': file_info['duration_ms'] // 1000 if file_info['duration_ms'] else 0,
         'duration_formatted': f"{file_info['duration_ms'] // 60000}:{(file_info['duration_ms'] % 60000) // 1000:02d}" if file_info['duration_ms'] else "0:00",
         'timestamp': file_info['timestamp'],
-        'collection_id': file_info['collection_id']
+        'collection_id': file_info['collection_id'],
+        'container': get_container_type(file_info['filename']),
+        'dedup_key': file_info.get('dedup_key', ''),
+        'aliases': content_aliases.get(get_content_key(id), [id]),
+        'thumbnail_url': get_thumbnail_url(id)
+    }
+
+@app.get("/api/albums")
+async def list_albums():
+    """List albums with item counts and cover thumbnails"""
+    refresh_file_cache()
+
+    with open_library_storage() as storage:
+        albums = [format_album(collection) for collection in storage.list_collections()]
+
+    return {
+        "count": len(albums),
+        "albums": albums
+    }
+
+@app.get("/api/albums/{album_id}/files")
+async def list_album_files(
+    album_id: str,
+    limit: int = Query(ALBUM_PAGE_DEFAULT, ge=1, le=ALBUM_PAGE_MAX, description="Page size"),
+    offset: int = Query(0, ge=0, description="Items to skip")
+):
+    """One page of an album's items, newest first (album key, album id or exact title)"""
+    refresh_file_cache()
+
+    collection, keys = resolve_album(album_id)
+    with open_library_storage() as storage:
+        rows = storage.get_collection_media(keys, limit=limit + 1, offset=offset)
+    if collection is None and not rows and offset == 0:
+        raise HTTPException(status_code=404, detail="Album not found")
+
+    files = [format_album_file(row) for row in rows[:limit]]
+    return {
+        "album": format_album(collection) if collection else {'id': album_id, 'title': album_id},
+        "offset": offset,
+        "limit": limit,
+        "count": len(files),
+        "has_more": len(rows) > limit,
+        "files": files
+    }
+
+@app.get("/api/files/thumbnail")
+async def get_thumbnail(
+    id: str = Query(..., description="File ID"),
+    w: int = Query(None, description="Width in pixels"),
+    h: int = Query(None, description="Height in pixels"),
+    v: int = Query(None, description="content_version the URL was built for (makes it immutable)"),
+    request: Request = None
+):
+    """Thumbnail / resized preview of a photo or video, from memory, disk or Google Photos"""
+    refresh_file_cache()
+
+    if id not in file_cache:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    width = normalize_thumbnail_size(w)
+    height = normalize_thumbnail_size(h)
+    if not width and not height:
+        width = THUMBNAIL_DEFAULT_SIZE
+
+    version = file_cache[id].get('content_version') or 0
+    etag = f'"{get_content_key(id)}-v{version}-{width}x{height}"'
+    # Versioned URLs never change content; unversioned or stale ones revalidate
+    cache_control = "public, max-age=31536000, immutable" if v == version else "public, max-age=300"
+    if_none_match = request.headers.get('if-none-match') if request else None
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+    try:
+        image = await asyncio.to_thread(get_thumbnail_bytes, id, width, height)
+    except Exception as e:
+        print(f"❌ Thumbnail error for {id[:8]}...: {e}")
+        raise HTTPException(status_code=502, detail=f"Thumbnail failed: {str(e)}")
+
+    return Response(
+        content=image,
+        media_type="image/jpeg",
+        headers={
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+@app.post("/api/files/thumbnails/prefetch")
+async def prefetch_thumbnail_page(
+    ids: str = Query(..., description="Comma-separated file IDs (a page of results)"),
+    w: int = Query(None, description="Width in pixels"),
+    h: int = Query(None, description="Height in pixels")
+):
+    """Warm the thumbnails of a gallery page in the background"""
+    refresh_file_cache()
+
+    file_ids = [file_id for file_id in (part.strip() for part in ids.split(',')) if file_id in file_cache]
+    if len(file_ids) > THUMBNAIL_PREFETCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {THUMBNAIL_PREFETCH_MAX_IDS} ids per prefetch")
+
+    width = normalize_thumbnail_size(w)
+    height = normalize_thumbnail_size(h)
+    if not width and not height:
+        width = THUMBNAIL_DEFAULT_SIZE
+
+    result = prefetch_thumbnails(file_ids, width, height)
+    return {
+        "requested": len(file_ids),
+        **result,
+        "urls": {file_id: get_thumbnail_url(file_id, w, h) for file_id in file_ids}
+    }
+
+@app.post("/api/files/batch/{action}")
+async def batch_mutation(action: str, body: MutationRequest):
+    """Favorite/unfavorite, archive/unarchive, trash/restore or caption many items at once"""
+    if action not in MUTATION_ACTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown action: {action} (expected one of {', '.join(MUTATION_ACTIONS)})")
+    if not body.ids:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(body.ids) > MUTATION_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MUTATION_MAX_IDS} ids per request")
+    if action == "caption" and body.caption is None:
+        raise HTTPException(status_code=400, detail="caption is required")
+
+    refresh_file_cache()
+    client = get_google_photos_client()
+
+    started = time.time()
+    result = await asyncio.to_thread(client.batch_mutate, action, body.ids, body.caption or "")
+    apply_mutation_to_catalog(action, result['succeeded'], body.caption or "")
+
+    print(f"✏️ {action}: {len(result['succeeded'])} ok, {len(result['failed'])} failed in {time.time() - started:.2f}s")
+    return {
+        "action": action,
+        "requested": len(body.ids),
+        "succeeded": len(result['succeeded']),
+        "failed": result['failed'],
+        "elapsed_seconds": round(time.time() - started, 3)
     }
 
 @app.get("/api/files/download")
-async def download_file(id: str = Query(..., description="File ID")):
-    """Download a file by ID - Direct passthrough from Google Photos"""
+async def download_file(id: str = Query(..., description="File ID"), request: Request = None):
+    """Download a file by ID - from video_cache where cached, else passthrough from Google Photos
+
+    Single and multi-range requests are honored, so interrupted downloads
+    resume and segmented download clients can fetch parts in parallel.
+    """
     refresh_file_cache()
 
     if id not in file_cache:
@@ -1291,52 +3997,142 @@ async def download_file(id: str = Query(..., description="File ID")):
     file_info = file_cache[id]
     filename = file_info['filename']
 
+    file_size = get_known_file_size(id)
+    etag = get_title_etag(id, file_size)
+    status_code, ranges = evaluate_range_request(request, etag, file_size)
+    if status_code in (304, 416):
+        return range_status_response(status_code, etag, file_size)
 
+    response_headers = {
+        'Content-Disposition': get_attachment_disposition(filename),
+        'Accept-Ranges': 'bytes'
+    }
 
     try:
-        client = get_google_photos_client()
-        download_data = client.api.get_download_urls(id)
+        if not file_size:
+            # Size unknown: stream everything and take the length from upstream
+            response = open_upstream(id)
+            if response.total_size:
+                response_headers['Content-Length'] = str(response.total_size)
+            return StreamingResponse(
+                scheduled_stream(response.iter_content(chunk_size=RANGE_READ_CHUNK), PRIORITY_INTERACTIVE, id),
+                media_type='application/octet-stream',
+                headers=response_headers
+            )
 
-        # Extract download URL using the corrected path
-        try:
-            download_url = download_data["1"]["5"]["3"]["5"]
-        except KeyError:
-            try:
-                download_url = download_data["1"]["5"]["2"]["6"]
-            except KeyError:
-                try:
-                    download_url = download_data["1"]["5"]["2"]["5"]
-                except KeyError:
-                    raise HTTPException(status_code=500, detail="No download URL found")
+        ranges = ranges or [(0, file_size - 1)]
+        response_headers['ETag'] = etag
+        download_status.touch(id)
 
-        # Stream directly from Google Photos (PASSTHROUGH)
-        response = requests.get(download_url, stream=True)
-        response.raise_for_status()
+        # Resolve the URL up front (so failures are a clean 500) unless the cache covers every byte
+        download_url = None
+        if max(end for _, end in ranges) >= get_cached_bytes(id):
+            download_url = get_download_url(id)
 
-        # Encode filename properly for HTTP headers (handle Unicode characters)
-        try:
-            # Try ASCII encoding first
-            filename_ascii = filename.encode('ascii').decode('ascii')
-            content_disposition = f'attachment; filename="{filename_ascii}"'
-        except UnicodeEncodeError:
-            # Use RFC 5987 encoding for Unicode filenames
-            filename_encoded = quote(filename.encode('utf-8'))
-            content_disposition = f"attachment; filename*=UTF-8''{filename_encoded}"
+        if len(ranges) > 1:
+            chunks, content_length, media_type = build_multipart_byteranges(
+                ranges, file_size, 'application/octet-stream',
+                lambda start, end: read_title_range(id, download_url, start, end))
+            response_headers['Content-Length'] = str(content_length)
+            return StreamingResponse(chunks, status_code=206, media_type=media_type, headers=response_headers)
+
+        start, end = ranges[0]
+        response_headers['Content-Length'] = str(end - start + 1)
+        if status_code == 206:
+            response_headers['Content-Range'] = f"bytes {start}-{end}/{file_size}"
+        print(f"📥 Download {filename}: bytes {start}-{end} ({'cache' if download_url is None else 'cache+upstream'})")
 
         return StreamingResponse(
-            response.iter_content(chunk_size=8192),
+            read_title_range(id, download_url, start, end),
+            status_code=status_code,
             media_type='application/octet-stream',
-            headers={
-                'Content-Disposition': content_disposition,
-                'Content-Length': response.headers.get('Content-Length', ''),
-                'Accept-Ranges': 'bytes'
-            }
+            headers=response_headers
         )
 
     except Exception as e:
 
         raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
 
+@app.head("/api/files/download")
+async def download_file_head(id: str = Query(..., description="File ID"), request: Request = None):
+    """Probe a download (size, ranges, validators) without touching upstream"""
+    refresh_file_cache()
+    filename = file_cache.get(id, {}).get('filename', '')
+    return head_title_response(id, request, get_attachment_disposition(filename), 'application/octet-stream')
+
+async def prepare_export(ids, album, media_type, q, name, request: Request) -> tuple:
+    """Archive, validators and headers shared by the export GET and HEAD"""
+    refresh_file_cache()
+    file_ids = select_export_ids(ids, album, media_type, q)
+    archive = await asyncio.to_thread(build_export_archive, file_ids)
+    archive_name = f"{name or album or 'google-photos-export'}.zip"
+    status_code, ranges = evaluate_range_request(request, archive.etag, archive.size)
+    response_headers = {
+        'Content-Disposition': get_attachment_disposition(archive_name),
+        'Accept-Ranges': 'bytes',
+        'ETag': archive.etag,
+        'X-Export-Items': str(len(archive.members))
+    }
+    return archive, status_code, ranges, response_headers
+
+@app.get("/api/export")
+async def export_zip(
+    ids: str = Query(None, description="Comma-separated file IDs, in archive order"),
+    album: str = Query(None, description="Album (collection) ID"),
+    media_type: str = Query(None, alias="type", description="Filter: video or image"),
+    q: str = Query(None, description="Filter: filename contains"),
+    name: str = Query(None, description="Archive name (without .zip)"),
+    request: Request = None
+):
+    """Stream a ZIP64 archive of many items, stored (nothing is re-compressed)
+
+    Members are fetched concurrently a bounded window ahead of the writer,
+    from video_cache where cached. The layout is fixed per selection, so the
+    archive supports Range requests and resumed downloads.
+    """
+    archive, status_code, ranges, response_headers = await prepare_export(ids, album, media_type, q, name, request)
+    if status_code in (304, 416):
+        return range_status_response(status_code, archive.etag, archive.size)
+
+    print(f"📦 Export: {len(archive.members)} items, {archive.size/1024/1024:.1f}MB")
+    await asyncio.to_thread(archive.prepare_crcs, ranges or [(0, archive.size - 1)])
+    if ranges and len(ranges) > 1:
+        chunks, content_length, multipart_type = build_multipart_byteranges(ranges, archive.size, 'application/zip', archive.read)
+        response_headers['Content-Length'] = str(content_length)
+        return StreamingResponse(chunks, status_code=206, media_type=multipart_type, headers=response_headers)
+
+    start, end = ranges[0] if ranges else (0, archive.size - 1)
+    response_headers['Content-Length'] = str(end - start + 1)
+    if ranges:
+        response_headers['Content-Range'] = f"bytes {start}-{end}/{archive.size}"
+    return StreamingResponse(archive.read(start, end), status_code=status_code, media_type='application/zip', headers=response_headers)
+
+@app.head("/api/export")
+async def export_zip_head(
+    ids: str = Query(None, description="Comma-separated file IDs, in archive order"),
+    album: str = Query(None, description="Album (collection) ID"),
+    media_type: str = Query(None, alias="type", description="Filter: video or image"),
+    q: str = Query(None, description="Filter: filename contains"),
+    name: str = Query(None, description="Archive name (without .zip)"),
+    request: Request = None
+):
+    """Size and validators of an export without fetching any member"""
+    archive, status_code, ranges, response_headers = await prepare_export(ids, album, media_type, q, name, request)
+    if status_code in (304, 416):
+        return range_status_response(status_code, archive.etag, archive.size)
+    response_headers['Content-Type'] = 'application/zip'
+    if ranges and len(ranges) > 1:
+        _, content_length, multipart_type = build_multipart_byteranges(ranges, archive.size, 'application/zip', None)
+        response_headers['Content-Type'] = multipart_type
+        response_headers['Content-Length'] = str(content_length)
+    elif ranges:
+        start, end = ranges[0]
+        response_headers['Content-Range'] = f"bytes {start}-{end}/{archive.size}"
+        response_headers['Content-Length'] = str(end - start + 1)
+    else:
+        response_headers['Content-Length'] = str(archive.size)
+    return Response(status_code=status_code, headers=response_headers)
+
 @app.get("/api/files/downloadDirect")
 async def download_direct_redirect(id: str = Query(..., description="File ID")):
     """Direct redirect to Google Photos download URL - Client downloads directly"""
@@ -1492,7 +4288,15 @@ async def stream_video(
     if file_info['type'] != 'video':
         raise HTTPException(status_code=400, detail="File is not a video")
 
+    video_mime_type = get_container_mime_type(filename)
 
+    # Ranges and validators are settled from the catalog before any upstream I/O
+    file_size = get_known_file_size(id)
+    etag = get_title_etag(id, file_size)
+    range_header = request.headers.get('range') if request else None
+    status_code, ranges = evaluate_range_request(request, etag, file_size)
+    if status_code in (304, 416):
+        return range_status_response(status_code, etag, file_size)
 
     try:
         client = get_google_photos_client()
@@ -1510,14 +4314,31 @@ async def stream_video(
                 except KeyError:
                     raise HTTPException(status_code=500, detail="No download URL found")
 
-        # Handle range requests for seeking
-        range_header = request.headers.get('range') if request else None
-        headers = {}
-        if range_header:
-            headers['Range'] = range_header
+        # Several ranges: one multipart/byteranges body, each part from cache or upstream
+        if ranges and len(ranges) > 1:
+            chunks, content_length, media_type = build_multipart_byteranges(
+                ranges, file_size, video_mime_type,
+                lambda start, end: read_title_range(id, download_url, start, end))
+            return StreamingResponse(
+                chunks,
+                status_code=206,
+                headers={
+                    "Accept-Ranges": "bytes",
+                    "Access-Control-Allow-Origin": "*",
+                    "Content-Length": str(content_length),
+                    "ETag": etag
+                },
+                media_type=media_type
+            )
 
-        # Stream from Google Photos through our server
-        response = requests.get(download_url, headers=headers, stream=True)
+        # Stream from Google Photos through our server (ranges resume after drops)
+        if ranges:
+            response = open_upstream(id, download_url, ranges[0][0], ranges[0][1])
+        elif range_header and not file_size:
+            # Size unknown: let upstream interpret the header
+            response = requests.get(download_url, headers={'Range': range_header}, stream=True)
+        else:
+            response = open_upstream(id, download_url)
 
         if response.status_code in [200, 206]:
             # Prepare response headers for browser video streaming
@@ -1527,9 +4348,9 @@ async def stream_video(
                 "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
                 "Access-Control-Allow-Headers": "Range, Content-Range, Content-Length",
                 "Cache-Control": "public, max-age=3600",
-                "Content-Type": "video/mp4",
+                "Content-Type": video_mime_type,
                 # CRITICAL: Tell browser to display inline (stream), not download
-                "Content-Disposition": "inline; filename=\"video.mp4\"",
+                "Content-Disposition": f"inline; filename=\"video{Path(filename).suffix.lower() or '.mp4'}\"",
                 # Prevent MIME type sniffing
                 "X-Content-Type-Options": "nosniff",
                 # Additional headers for video streaming
@@ -1541,15 +4362,23 @@ async def stream_video(
             for header in ['Content-Length', 'Content-Range']:
                 if header in response.headers:
                     response_headers[header] = response.headers[header]
+            if ranges:
+                start, end = ranges[0]
+                response_headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+                response_headers["Content-Length"] = str(end - start + 1)
+            else:
+                response_headers.pop("Content-Range", None)
+            if file_size:
+                response_headers["ETag"] = etag
 
             # If it's a range request, make sure we return 206
-            status_code = 206 if range_header and response.status_code == 206 else 200
+            status_code = 206 if ranges or (range_header and not file_size and response.status_code == 206) else 200
 
             return StreamingResponse(
-                response.iter_content(chunk_size=8192),
+                scheduled_stream(response.iter_content(chunk_size=8192), PRIORITY_INTERACTIVE, id),
                 status_code=status_code,
                 headers=response_headers,
-                media_type="video/mp4"
+                media_type=video_mime_type
             )
         else:
             raise HTTPException(status_code=500, detail=f"Stream failed: {response.status_code}")
@@ -1560,6 +4389,16 @@ async def stream_video(
 
 
 
+@app.head("/api/files/stream")
+async def stream_video_head(
+    id: str = Query(..., description="File ID"),
+    request: Request = None
+):
+    """Probe a stream (size, ranges, validators) without touching upstream"""
+    refresh_file_cache()
+    filename = file_cache.get(id, {}).get('filename', '')
+    return head_title_response(id, request, f"inline; filename=\"video{Path(filename).suffix.lower() or '.mp4'}\"")
+
 @app.get("/api/files/smart-stream")
 async def smart_stream_download_ahead(
     id: str = Query(..., description="File ID"),
@@ -1574,6 +4413,7 @@ async def smart_stream_download_ahead(
 
     file_info = file_cache[id]
     filename = file_info['filename']
+    video_mime_type = get_container_mime_type(filename)
 
     # Don't use hardcoded fallback - we'll get real size from HTTP response
     file_size = file_info['size_bytes'] if file_info['size_bytes'] > 0 else 0
@@ -1590,30 +4430,45 @@ async def smart_stream_download_ahead(
         if cache_file.exists():
             try:
                 cache_file.unlink()
+                ram_cache.invalidate(id)
                 print(f"🗑️ Cache file removed")
             except Exception as e:
                 print(f"⚠️ Error removing cache file: {e}")
 
         # Reset download status
-        with download_locks[id]:
-            download_status[id] = {
-                'downloading': False,
-                'completed': False,
-                'file_path': None,
-                'download_start': 0,
-                'bytes_downloaded': 0,
-                'total_bytes': 0,
-                'download_speed_mbps': 0,
-                'last_access': time.time(),
-                'active_users': 0,
-                'user_sessions': set()
-            }
+        download_status.remove(id)
         print(f"✅ Cache state reset complete")
 
     # Register user access (for multi-user cache management)
-    user_session = request.headers.get('x-session-id') if request else None
+    user_session = get_session_id(request)
     register_user_access(id, user_session)
 
+    # Validators and Range are settled before any upstream I/O (probes cost nothing)
+    known_size = get_known_file_size(id)
+    etag = get_title_etag(id, known_size)
+    range_status, ranges = evaluate_range_request(request, etag, known_size)
+    if range_status in (304, 416):
+        print(f"📭 Answered {range_status} without upstream I/O")
+        return range_status_response(range_status, etag, known_size)
+
+    if ranges and len(ranges) > 1:
+        # Several ranges (players probing head and tail): multipart/byteranges from cache or upstream
+        print(f"🧩 Serving {len(ranges)} ranges as multipart/byteranges")
+        chunks, content_length, media_type = build_multipart_byteranges(
+            ranges, known_size, video_mime_type,
+            lambda start, end: read_title_range(id, None, start, end))
+        return StreamingResponse(
+            chunks,
+            status_code=206,
+            headers={
+                "Accept-Ranges": "bytes",
+                "Access-Control-Allow-Origin": "*",
+                "Content-Length": str(content_length),
+                "ETag": etag
+            },
+            media_type=media_type
+        )
+
     try:
         client = get_google_photos_client()
 
@@ -1665,58 +4520,82 @@ async def smart_stream_download_ahead(
                 print(f"🔄 Updating file size from metadata: {file_size/1024/1024/1024:.1f}GB → {metadata['file_size']/1024/1024/1024:.1f}GB")
                 file_size = metadata['file_size']
 
+        # Keyframe index (MP4 stss / MKV Cues) lets seeks beyond the cache go straight upstream
+        seek_index = metadata.get("seek_index") if metadata else None
+        indexed_seek = False
+
         # Auto-detect position from Range header
         current_start_byte = 0
+        requested_start_byte = 0
+        end_byte = file_size - 1
+        # Ranges ignored by the engine (If-Range mismatch, malformed) mean a full response
         range_header = None
-        if request and hasattr(request, 'headers'):
+        if request and hasattr(request, 'headers') and (ranges or not known_size):
             range_header = request.headers.get('range')
 
+        if not range_header or range_header.strip() == 'bytes=0-':
+            record_playback_start(id)
+
         # Initialize cache_file here so it's available in all code paths
         cache_file = get_cache_file_path(id)
 
         if range_header:
             try:
-                range_match = range_header.replace('bytes=', '').split('-')
-                requested_start_byte = int(range_match[0]) if range_match[0] else 0
-                end_byte = int(range_match[1]) if len(range_match) > 1 and range_match[1] else file_size - 1
+                byte_ranges = ranges or parse_byte_ranges(range_header, file_size) or [(0, file_size - 1)]
+                requested_start_byte, end_byte = byte_ranges[0]
 
                 # Check cache availability BEFORE processing the request
                 max_available_byte = 0
 
                 if cache_file.exists():
-                    cached_size = cache_file.stat().st_size
+                    cached_size = get_cached_bytes(id)
                     max_available_byte = cached_size - 1  # Last available byte in cache
 
                     # UPDATE DOWNLOAD STATUS: Check if download completed since last check
-                    if cached_size >= file_size * 0.95 and not download_status[id]['completed']:
-                        download_status[id]['completed'] = True
+                    status = download_status.get(id)
+                    if status is not None and cached_size >= file_size * 0.95 and not status.completed:
+                        status.completed = True
                         print(f"✅ Download completed during request! Cache: {cached_size/1024/1024:.0f}MB")
 
                     # SMART SEEKING: Handle based on download status
-                    if download_status[id]['completed']:
+                    if is_download_completed(id):
                         # Download complete - allow any range
                         current_start_byte = requested_start_byte
                         print(f"✅ Download complete - allowing seek to {requested_start_byte/1024/1024:.1f}MB")
                     elif requested_start_byte > max_available_byte:
                         print(f"🛡️ Seeking beyond cache! Requested: {requested_start_byte/1024/1024:.1f}MB, Available: {max_available_byte/1024/1024:.1f}MB")
-                        current_start_byte = max_available_byte  # Limit to cache boundary
-                        print(f"🔄 Auto-corrected to maximum available position")
+                        if seek_index:
+                            current_start_byte = requested_start_byte
+                            indexed_seek = True
+                            print(f"🗂️ Seek index available - serving seek directly from upstream")
+                        else:
+                            current_start_byte = max_available_byte  # Limit to cache boundary
+                            print(f"🔄 Auto-corrected to maximum available position")
                     else:
                         current_start_byte = requested_start_byte
                         print(f"✅ Seek within cache - allowing {requested_start_byte/1024/1024:.1f}MB")
+                elif seek_index and requested_start_byte > 0:
+                    current_start_byte = requested_start_byte
+                    indexed_seek = True
+                    print(f"🗂️ No cache yet, seek index available - serving seek directly from upstream")
                 else:
                     current_start_byte = 0  # No cache, start from beginning
 
-                # Estimate time position
-                total_duration = file_info['duration_ms'] / 1000 if file_info['duration_ms'] else 7200
-                bytes_per_second = file_size / total_duration
-                current_time = current_start_byte / bytes_per_second
+                # Time position: exact keyframe time from the index, else a bitrate estimate
+                duration_ms = file_info['duration_ms'] or (metadata or {}).get('duration_ms', 0)
+                if seek_index:
+                    current_time = seek_index_time_for_byte(seek_index, current_start_byte) / 1000
+                else:
+                    total_duration = duration_ms / 1000 if duration_ms else 7200
+                    bytes_per_second = file_size / total_duration
+                    current_time = current_start_byte / bytes_per_second
                 cache_percentage = (max_available_byte / file_size) * 100 if max_available_byte > 0 else 0
 
                 print(f"🎯 Seeking to: {current_time:.1f}s ({(current_start_byte/file_size)*100:.1f}%) [Cache: {cache_percentage:.1f}%]")
             except Exception as e:
                 print(f"❌ Error parsing range header: {e}")
                 current_start_byte = 0
+                indexed_seek = False
                 print(f"🎬 Starting from beginning")
         else:
             current_start_byte = 0
@@ -1724,12 +4603,12 @@ async def smart_stream_download_ahead(
 
         # Check if we can serve from cache (we already checked this above, but double-check)
         can_serve_from_cache = False
-        if cache_file.exists():
-            cached_size = cache_file.stat().st_size
+        if cache_file.exists() and not indexed_seek:
+            cached_size = get_cached_bytes(id)
 
             # Since we already limited current_start_byte to cache boundaries above,
             # we should ALWAYS be able to serve from cache if it exists
-            if download_status[id]['completed']:
+            if is_download_completed(id):
                 can_serve_from_cache = True
                 print(f"⚡ File fully cached! Serving from local file")
             elif current_start_byte < cached_size:
@@ -1744,23 +4623,39 @@ async def smart_stream_download_ahead(
                 can_serve_from_cache = True if current_start_byte >= 0 else False
 
         if can_serve_from_cache:
-            cached_size = cache_file.stat().st_size
+            cached_size = get_cached_bytes(id)
             print(f"⚡ Serving from cache: {(cached_size/file_size)*100:.1f}% available")
 
             # Update last_access time when serving from cache
-            download_status[id]['last_access'] = time.time()
+            download_status.touch(id)
+
+            # Partial file left by an interrupted download: resume it in the background
+            if cached_size < file_size and not is_download_started(id):
+                print(f"🔁 Resuming interrupted download from {cached_size/1024/1024:.1f}MB")
+                start_full_download(id, download_url, file_size)
+
+            # Start of playback comes from the RAM tier, the rest from disk
+            head = None
+            if current_start_byte < RAM_CACHE_HEAD_BYTES:
+                head = get_head_from_ram_cache(id, cache_file, cached_size, file_size)
 
             # Serve from cached file with range support
             def serve_from_cache():
                 bytes_served = 0
                 last_activity_update = time.time()
 
-                with open(cache_file, 'rb') as f:
-                    f.seek(current_start_byte)
+                # For partial files, only serve what we have (and what Content-Length announced)
+                max_bytes_to_serve = remaining_bytes
+
+                if head is not None and current_start_byte < len(head):
+                    head_view = memoryview(head)[current_start_byte:current_start_byte + max_bytes_to_serve]
+                    for offset in range(0, len(head_view), 64 * 1024):
+                        chunk = head_view[offset:offset + 64 * 1024]
+                        bytes_served += len(chunk)
+                        yield bytes(chunk)
 
-                    # For partial files, only serve what we have
-                    cached_size = cache_file.stat().st_size
-                    max_bytes_to_serve = min(cached_size - current_start_byte, file_size - current_start_byte)
+                with open(cache_file, 'rb') as f:
+                    f.seek(current_start_byte + bytes_served)
 
                     while bytes_served < max_bytes_to_serve:
                         chunk_size = min(8192, max_bytes_to_serve - bytes_served)
@@ -1772,18 +4667,20 @@ async def smart_stream_download_ahead(
                         # Update last_access every 5 seconds while streaming
                         current_time = time.time()
                         if current_time - last_activity_update >= 5:
-                            download_status[id]['last_access'] = current_time
+                            download_status.touch(id, current_time)
+                            if user_session:
+                                session_registry.touch(user_session, id)
                             last_activity_update = current_time
                             print(f"🔄 Streaming activity detected - keeping session alive")
 
                         yield chunk
 
                 # Final update when streaming completes
-                download_status[id]['last_access'] = time.time()
+                download_status.touch(id)
                 print(f"✅ Served {bytes_served:,} bytes from cache")
 
             # Calculate actual bytes we can serve from cache
-            cached_size = cache_file.stat().st_size
+            cached_size = get_cached_bytes(id)
             remaining_bytes = min(cached_size - current_start_byte, file_size - current_start_byte)
 
             # Calculate correct end_byte for Content-Range header
@@ -1798,8 +4695,9 @@ async def smart_stream_download_ahead(
                 "Content-Length": str(remaining_bytes),
                 "Access-Control-Allow-Origin": "*",
                 "Cache-Control": "max-age=3600",
+                "ETag": etag,
                 "X-Cache-Status": "HIT",
-                "X-Cache-Source": "LOCAL_FILE",
+                "X-Cache-Source": "RAM+LOCAL_FILE" if head is not None and current_start_byte < len(head) else "LOCAL_FILE",
                 "X-Cache-Progress": f"{cache_progress_percent:.1f}%",
                 "X-Cache-Time-Available": f"{cache_time_available:.0f}s"
             }
@@ -1811,11 +4709,83 @@ async def smart_stream_download_ahead(
 
             return StreamingResponse(
                 serve_from_cache(),
-                media_type="video/mp4",
+                media_type=video_mime_type,
                 headers=response_headers,
                 status_code=206 if current_start_byte > 0 else 200
             )
         else:
+            # ⚡ RAM SEGMENT: a prefetched head or resume segment covers the requested byte
+            ram_segment = ram_cache.find_segment(id, requested_start_byte) if range_header else None
+            if ram_segment:
+                segment_start, segment_data = ram_segment
+                if not is_download_started(id):
+                    start_full_download(id, download_url, file_size)
+                download_status.touch(id)
+
+                segment_end = min(segment_start + len(segment_data) - 1, end_byte, file_size - 1)
+                segment_view = memoryview(segment_data)[requested_start_byte - segment_start:segment_end - segment_start + 1]
+                print(f"⚡ Serving {len(segment_view)/1024/1024:.1f}MB from prefetched RAM segment at {requested_start_byte/1024/1024:.1f}MB")
+
+                def serve_ram_segment():
+                    for offset in range(0, len(segment_view), 64 * 1024):
+                        yield bytes(segment_view[offset:offset + 64 * 1024])
+
+                return StreamingResponse(
+                    serve_ram_segment(),
+                    media_type=video_mime_type,
+                    headers={
+                        "Accept-Ranges": "bytes",
+                        "Content-Length": str(len(segment_view)),
+                        "Content-Range": f"bytes {requested_start_byte}-{segment_end}/{file_size}",
+                        "Access-Control-Allow-Origin": "*",
+                        "Cache-Control": "no-cache",
+                        "X-Cache-Status": "HIT",
+                        "X-Cache-Source": "RAM_PREFETCH"
+                    },
+                    status_code=206
+                )
+
+            # 🗂️ INDEXED SEEK: the player already knows the keyframe layout (moov / Cues),
+            # so the requested byte range can be passed through from upstream as-is
+            if indexed_seek:
+                if not is_download_started(id):
+                    start_full_download(id, download_url, file_size)
+                download_status.touch(id)
+
+                end_byte = min(end_byte, file_size - 1)
+                response = open_upstream(id, download_url, current_start_byte, end_byte)
+
+                response_headers = {
+                    "Accept-Ranges": "bytes",
+                    "Content-Length": str(end_byte - current_start_byte + 1),
+                    "Content-Range": f"bytes {current_start_byte}-{end_byte}/{file_size}",
+                    "Access-Control-Allow-Origin": "*",
+                    "Cache-Control": "no-cache",
+                    "X-Cache-Status": "MISS",
+                    "X-Stream-Strategy": "INDEXED_SEEK"
+                }
+                print(f"📤 Indexed seek passthrough: {current_start_byte/1024/1024:.1f}MB-{end_byte/1024/1024:.1f}MB")
+
+                def stream_indexed_seek():
+                    last_activity_update = time.time()
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:
+                            current_time = time.time()
+                            if current_time - last_activity_update >= 5:
+                                download_status.touch(id, current_time)
+                                if user_session:
+                                    session_registry.touch(user_session, id)
+                                last_activity_update = current_time
+                            yield chunk
+                    download_status.touch(id)
+
+                return StreamingResponse(
+                    scheduled_stream(stream_indexed_seek(), PRIORITY_INTERACTIVE, id),
+                    media_type=video_mime_type,
+                    headers=response_headers,
+                    status_code=206
+                )
+
             # 🎬 VIRTUAL MP4 STRATEGY: Use metadata to create virtual MP4 for instant seeking
             if metadata and metadata.get("has_moov") and range_header and current_start_byte > 0:
                 print(f"🎭 Creating virtual MP4 with metadata for instant seeking")
@@ -1823,7 +4793,7 @@ async def smart_stream_download_ahead(
                 def create_virtual_mp4_stream():
                     try:
                         # Create virtual MP4 header with metadata
-                        virtual_header = create_virtual_mp4_header(metadata)
+                        virtual_header = get_virtual_mp4_header(id, metadata)
 
                         if virtual_header:
                             print(f"📦 Virtual MP4 header created ({len(virtual_header)} bytes)")
@@ -1834,8 +4804,7 @@ async def smart_stream_download_ahead(
                             # Then stream from Google Photos starting from requested position
                             print(f"🌐 Streaming from Google Photos starting at {current_start_byte/1024/1024:.1f}MB")
 
-                            headers = {'Range': f'bytes={current_start_byte}-{file_size-1}'}
-                            response = requests.get(download_url, headers=headers, stream=True, timeout=30)
+                            response = open_upstream(id, download_url, current_start_byte, file_size - 1)
 
                             if response.status_code in [200, 206]:
                                 bytes_served = len(virtual_header)
@@ -1847,7 +4816,7 @@ async def smart_stream_download_ahead(
 
                                         # Update activity
                                         if bytes_served % (1024*1024) == 0:  # Every 1MB
-                                            download_status[id]['last_access'] = time.time()
+                                            download_status.touch(id)
 
                                 print(f"✅ Virtual MP4 stream completed: {bytes_served:,} bytes")
                             else:
@@ -1864,7 +4833,7 @@ async def smart_stream_download_ahead(
 
                 try:
                     # Calculate virtual content length (header + requested range)
-                    virtual_header = create_virtual_mp4_header(metadata)
+                    virtual_header = get_virtual_mp4_header(id, metadata)
                     virtual_content_length = len(virtual_header) + (file_size - current_start_byte)
 
                     response_headers = {
@@ -1881,7 +4850,7 @@ async def smart_stream_download_ahead(
                     print(f"📤 Serving virtual MP4: header({len(virtual_header)}B) + range({current_start_byte/1024/1024:.1f}MB-end)")
 
                     return StreamingResponse(
-                        create_virtual_mp4_stream(),
+                        scheduled_stream(create_virtual_mp4_stream(), PRIORITY_INTERACTIVE, id),
                         media_type="video/mp4",
                         headers=response_headers,
                         status_code=206
@@ -1900,7 +4869,7 @@ async def smart_stream_download_ahead(
                 return RedirectResponse(url=redirect_url, status_code=302)
 
             # Start background download if not already started
-            if not download_status[id]['downloading'] and not download_status[id]['completed']:
+            if not is_download_started(id):
                 start_full_download(id, download_url, file_size)
                 print(f"🎯 Background download started (ETA: ~7 seconds)")
 
@@ -1908,11 +4877,10 @@ async def smart_stream_download_ahead(
             print(f"🌐 Streaming from Google Photos (download in progress)")
 
             # Update last_access time when streaming from Google Photos
-            download_status[id]['last_access'] = time.time()
+            download_status.touch(id)
 
             try:
-                headers = {'Range': f'bytes={current_start_byte}-{file_size-1}'}
-                response = requests.get(download_url, headers=headers, stream=True, timeout=30)
+                response = open_upstream(id, download_url, current_start_byte, file_size - 1)
 
                 if response.status_code in [200, 206]:
                     response_headers = {
@@ -1942,22 +4910,24 @@ async def smart_stream_download_ahead(
                                     # Update last_access every 5 seconds while streaming
                                     current_time = time.time()
                                     if current_time - last_activity_update >= 5:
-                                        download_status[id]['last_access'] = current_time
+                                        download_status.touch(id, current_time)
+                                        if user_session:
+                                            session_registry.touch(user_session, id)
                                         last_activity_update = current_time
                                         print(f"🔄 Google Photos streaming activity - keeping session alive")
 
                                     yield chunk
 
                             # Final update when streaming completes
-                            download_status[id]['last_access'] = time.time()
+                            download_status.touch(id)
                             print(f"✅ Streamed {bytes_served:,} bytes from Google Photos")
                         except Exception as e:
                             print(f"❌ Error during streaming: {e}")
                             raise
 
                     return StreamingResponse(
-                        stream_with_error_handling(),
-                        media_type="video/mp4",
+                        scheduled_stream(stream_with_error_handling(), PRIORITY_INTERACTIVE, id),
+                        media_type=video_mime_type,
                         headers=response_headers,
                         status_code=response.status_code
                     )
@@ -1975,6 +4945,14 @@ async def smart_stream_download_ahead(
         print(f"❌ Smart stream error: {e}")
         raise HTTPException(status_code=500, detail=f"Smart stream failed: {str(e)}")
 
+@app.head("/api/files/smart-stream")
+async def smart_stream_head(
+    id: str = Query(..., description="File ID"),
+    request: Request = None
+):
+    """Probe a smart stream without resolving URLs or starting a download"""
+    return head_title_response(id, request, "inline")
+
 @app.get("/api/files/download-status")
 async def get_download_status_all():
     """Get download status for all files"""
@@ -1982,27 +4960,34 @@ async def get_download_status_all():
 
     status_list = {}
 
-    for file_id, status in download_status.items():
+    for content_key, status in download_status.items():
+        file_id = get_media_id(content_key)
         if file_id in file_cache:
             filename = file_cache[file_id]['filename']
             progress_info = get_download_progress(file_id)
 
             status_list[file_id] = {
                 'filename': filename,
+                'aliases': content_aliases.get(content_key, [file_id]),
                 'status': progress_info['status'],
                 'progress': progress_info['progress'],
                 'speed_mbps': progress_info['speed_mbps'],
                 'eta_seconds': progress_info['eta_seconds'],
-                'file_size_gb': status['total_bytes'] / 1024 / 1024 / 1024 if status['total_bytes'] > 0 else 0,
-                'downloaded_gb': status['bytes_downloaded'] / 1024 / 1024 / 1024,
+                'file_size_gb': status.total_bytes / 1024 / 1024 / 1024 if status.total_bytes > 0 else 0,
+                'downloaded_gb': status.bytes_downloaded / 1024 / 1024 / 1024,
                 'cache_file_exists': get_cache_file_path(file_id).exists(),
-                'last_access_seconds_ago': time.time() - status['last_access'] if status['last_access'] > 0 else 0,
-                'will_cleanup_in_seconds': max(0, CACHE_CLEANUP_SECONDS - (time.time() - status['last_access'])) if status['last_access'] > 0 else 0
+                'last_access_seconds_ago': time.time() - status.last_access,
+                'will_cleanup_in_seconds': max(0, CACHE_CLEANUP_SECONDS - (time.time() - status.last_access))
             }
 
     return {
         "downloads": status_list,
-        "cache_directory": str(cache_dir)
+        "cache_directory": str(cache_dir),
+        "ram_cache": ram_cache.stats(),
+        "thumbnails": {**thumbnail_stats, "ram": thumbnail_ram_cache.stats(), "in_flight": len(thumbnail_inflight)},
+        "prefetch": {**prefetch_stats, "queued_jobs": len(prefetch_queue)},
+        "transfers": transfer_scheduler.stats(),
+        "sessions": session_registry.stats()
     }
 
 @app.get("/api/files/download-status/{file_id}")
@@ -2015,7 +5000,8 @@ async def get_download_status_single(file_id: str):
 
     filename = file_cache[file_id]['filename']
     progress_info = get_download_progress(file_id)
-    status = download_status[file_id]
+    status = download_status.get(file_id)
+    total_bytes = status.total_bytes if status else 0
 
     return {
         'file_id': file_id,
@@ -2024,10 +5010,10 @@ async def get_download_status_single(file_id: str):
         'progress': progress_info['progress'],
         'speed_mbps': progress_info['speed_mbps'],
         'eta_seconds': progress_info['eta_seconds'],
-        'file_size_gb': status['total_bytes'] / 1024 / 1024 / 1024 if status['total_bytes'] > 0 else 0,
-        'downloaded_gb': status['bytes_downloaded'] / 1024 / 1024 / 1024,
+        'file_size_gb': total_bytes / 1024 / 1024 / 1024 if total_bytes > 0 else 0,
+        'downloaded_gb': status.bytes_downloaded / 1024 / 1024 / 1024 if status else 0,
         'cache_file_exists': get_cache_file_path(file_id).exists(),
-        'download_start_time': status['download_start']
+        'download_start_time': status.download_start if status else 0
     }
 
 
@@ -2043,21 +5029,10 @@ async def clear_cache(file_id: str = Query(None, description="File ID to clear (
             if cache_file.exists():
                 file_size = cache_file.stat().st_size
                 cache_file.unlink()
+                ram_cache.invalidate(file_id)
 
                 # Reset download status
-                with download_locks[file_id]:
-                    download_status[file_id] = {
-                        'downloading': False,
-                        'completed': False,
-                        'file_path': None,
-                        'download_start': 0,
-                        'bytes_downloaded': 0,
-                        'total_bytes': 0,
-                        'download_speed_mbps': 0,
-                        'last_access': 0,
-                        'active_users': 0,
-                        'user_sessions': set()
-                    }
+                download_status.remove(file_id)
 
                 return {
                     "message": f"Cache cleared for file {file_id}",
@@ -2083,6 +5058,7 @@ async def clear_cache(file_id: str = Query(None, description="File ID to clear (
 
             # Reset all download status
             download_status.clear()
+            ram_cache.clear()
 
             return {
                 "message": "All cache cleared",
@@ -2096,19 +5072,24 @@ async def clear_cache(file_id: str = Query(None, description="File ID to clear (
         raise HTTPException(status_code=500, detail=f"Failed to clear cache: {str(e)}")
 
 @app.post("/api/files/heartbeat")
-async def video_heartbeat(id: str = Query(..., description="File ID being watched")):
+async def video_heartbeat(
+    id: str = Query(..., description="File ID being watched"),
+    position: float = Query(None, description="Current playback position in seconds (warms the resume segment)"),
+    request: Request = None
+):
     """Keep video session alive - call this every 10-15 seconds while watching"""
     if id not in file_cache:
         raise HTTPException(status_code=404, detail="File not found")
 
-    # Update last access time
-    download_status[id]['last_access'] = time.time()
+    # Update last access time and the viewer session
+    register_user_access(id, get_session_id(request))
+
+    if position is not None and position > 0:
+        record_resume_position(id, position)
 
     # Get current status
     progress_info = get_download_progress(id)
-    cache_file = get_cache_file_path(id)
-    cache_exists = cache_file.exists()
-    cache_size = cache_file.stat().st_size if cache_exists else 0
+    cache_size = get_cached_bytes(id)
 
     return {
         "status": "alive",
@@ -2117,7 +5098,7 @@ async def video_heartbeat(id: str = Query(..., description="File ID being watche
         "download_status": progress_info['status'],
         "download_progress": progress_info['progress'],
         "cache_size_mb": cache_size / 1024 / 1024,
-        "will_cleanup_in_seconds": max(0, CACHE_CLEANUP_SECONDS - (time.time() - download_status[id]['last_access']))
+        "will_cleanup_in_seconds": CACHE_CLEANUP_SECONDS if id in download_status else 0
     }
 
 @app.post("/api/files/extract-all-metadata")
@@ -2125,7 +5106,7 @@ async def extract_all_metadata(
     limit: int = Query(1000, description="Maximum files to process (unlimited)"),
     skip_cached: bool = Query(True, description="Skip files that already have metadata cached")
 ):
-    """Extract metadata for MP4 files (first 20MB only) - batch processing"""
+    """Extract seeking metadata for MP4/MKV files (first 20MB only) - batch processing"""
     refresh_file_cache()
 
     # Validate limit - now unlimited
@@ -2144,16 +5125,19 @@ async def extract_all_metadata(
     try:
         client = get_google_photos_client()
 
-        # Filter video files only and deduplicate by filename
+        # Filter video files only and deduplicate by content and filename (metadata is stored per content)
         video_files = {}
         seen_filenames = set()
+        seen_content = set()
 
         for fid, info in file_cache.items():
             if info.get('type') == 'video':
                 filename = info['filename']
-                if filename not in seen_filenames:
+                content_key = get_content_key(fid)
+                if filename not in seen_filenames and content_key not in seen_content:
                     video_files[fid] = info
                     seen_filenames.add(filename)
+                    seen_content.add(content_key)
                 else:
                     print(f"🔄 Skipping duplicate: {filename}")
 
@@ -2203,41 +5187,47 @@ async def extract_all_metadata(
                 print(f"📥 Downloading first 20MB of {filename}...")
                 max_download_size = 20 * 1024 * 1024  # 20MB limit
 
-                # Start streaming download
-                response = requests.get(download_url, stream=True, timeout=30)
-                response.raise_for_status()
+                # Start streaming download at metadata priority, off the event loop
+                def fetch_metadata_head():
+                    with scheduled_transfer(PRIORITY_METADATA, file_id) as transfer:
+                        response = open_upstream(file_id, download_url, 0, max_download_size - 1)
 
-                chunk_data = b''
-                bytes_downloaded = 0
+                        chunk_data = b''
+                        bytes_downloaded = 0
 
-                # Stream until we hit 20MB limit
-                for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
-                    if chunk:
-                        chunk_data += chunk
-                        bytes_downloaded += len(chunk)
+                        # Stream until we hit 20MB limit
+                        for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
+                            if chunk:
+                                transfer.consume(len(chunk))
+                                chunk_data += chunk
+                                bytes_downloaded += len(chunk)
 
-                        # Show progress every 5MB
-                        if bytes_downloaded % (5 * 1024 * 1024) == 0:
-                            progress = (bytes_downloaded / max_download_size) * 100
-                            print(f"📊 Progress: {progress:.0f}% ({bytes_downloaded/1024/1024:.0f}MB/20MB)")
+                                # Show progress every 5MB
+                                if bytes_downloaded % (5 * 1024 * 1024) == 0:
+                                    progress = (bytes_downloaded / max_download_size) * 100
+                                    print(f"📊 Progress: {progress:.0f}% ({bytes_downloaded/1024/1024:.0f}MB/20MB)")
 
-                        # Stop when we reach 20MB
-                        if bytes_downloaded >= max_download_size:
-                            print(f"🛑 Reached 20MB limit, stopping download")
-                            break
+                                # Stop when we reach 20MB
+                                if bytes_downloaded >= max_download_size:
+                                    print(f"🛑 Reached 20MB limit, stopping download")
+                                    break
+                        response.close()
+                        return response, chunk_data
+
+                response, chunk_data = await asyncio.to_thread(fetch_metadata_head)
 
                 actual_size = len(chunk_data)
                 print(f"✅ Downloaded {actual_size/1024/1024:.1f}MB for metadata extraction")
 
-                # Get real file size from Content-Length if available
-                if 'Content-Length' in response.headers:
-                    real_file_size = int(response.headers['Content-Length'])
+                # Get real file size from Content-Range if available
+                if response.total_size:
+                    real_file_size = response.total_size
                 else:
                     real_file_size = file_size if file_size > 0 else actual_size
 
                 # Extract metadata
-                print(f"🎬 Extracting MP4 metadata...")
-                metadata = extract_mp4_metadata(chunk_data, real_file_size, filename)
+                print(f"🎬 Extracting video metadata...")
+                metadata = await asyncio.to_thread(extract_media_metadata, chunk_data, real_file_size, filename, download_url, file_id)
 
                 # Save metadata cache
                 save_metadata_cache(file_id, metadata)
@@ -2250,6 +5240,8 @@ async def extract_all_metadata(
                     "file_size_gb": real_file_size / 1024 / 1024 / 1024,
                     "metadata_size_kb": len(str(metadata)) / 1024,
                     "has_moov": metadata.get("has_moov", False),
+                    "container": metadata.get("container", "mp4"),
+                    "seek_points": len(metadata.get("seek_index", [])),
                     "duration_seconds": metadata.get("duration_ms", 0) / 1000
                 })
 
@@ -2354,6 +5346,7 @@ async def force_cleanup(force_all: bool = Query(False, description="Force cleanu
 
             # Clear all download status
             download_status.clear()
+            ram_cache.clear()
 
             return {
                 "message": f"Force cleanup completed - {total_files} files removed",
@@ -2419,6 +5412,7 @@ async def clear_cache():
         # Clear download status
         old_download_count = len(download_status)
         download_status.clear()
+        ram_cache.clear()
 
         # Clear physical cache files
         cache_files_removed = 0
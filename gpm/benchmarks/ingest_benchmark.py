@@ -0,0 +1,95 @@
+"""
+Library ingest rows/s: parsed page -> remote_media.
+
+Usage:
+    python benchmarks/ingest_benchmark.py [--items N] [--repeat R]
+
+"asdict upsert" is the previous `Storage.update` (a dict per item, the SQL
+rebuilt per call, a tuple built from each dict); "prepared upsert" is the
+current row-tuple path. Both write a fresh database per run and upsert the
+same page twice (insert, then update). "rows -> dataclasses" is the writer's
+previous handling of rows packed by a `ParsePool` worker (rebuilt into
+`MediaItem`s, then `Storage.update`); "rows -> update_rows" is the current
+one. The last line is a whole page on the writer thread without a pool.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+GPM_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(GPM_DIR), str(GPM_DIR / "tests")]
+
+from gpmc.db import Storage  # noqa: E402
+from gpmc.db_update_parser import parse_db_update  # noqa: E402
+from gpmc.parse_pool import parse_packed  # noqa: E402
+from gpmc.models import MediaItem  # noqa: E402
+from library_fixtures import library_response  # noqa: E402
+
+
+def asdict_update(storage: Storage, items) -> None:
+    items_dicts = [asdict(item) for item in items]
+    columns = list(items_dicts[0].keys())
+    columns_str = ", ".join(f'"{col}"' for col in columns)
+    updates = ", ".join(f'"{col}"=excluded."{col}"' for col in columns if col != "media_key")
+    sql = f"INSERT INTO remote_media ({columns_str}) VALUES ({', '.join('?' * len(columns))}) ON CONFLICT(media_key) DO UPDATE SET {updates}"
+    with storage.transaction():
+        storage.conn.executemany(sql, [tuple(item[col] for col in columns) for item in items_dicts])
+        storage.conn.executemany("DELETE FROM collection_media WHERE media_key = ?", [(item["media_key"],) for item in items_dicts])
+        storage.conn.executemany(
+            "INSERT OR IGNORE INTO collection_media (collection_id, media_key) VALUES (?, ?)",
+            [(item["collection_id"], item["media_key"]) for item in items_dicts if item["collection_id"]],
+        )
+
+
+def prepared_update(storage: Storage, items) -> None:
+    storage.update(items)
+
+
+def measure(function, repeat: int) -> float:
+    """Best wall time over `repeat` runs, each on a fresh database."""
+    best = float("inf")
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp_dir, Storage(Path(tmp_dir) / "storage.db") as storage:
+            start = time.perf_counter()
+            function(storage)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000, help="Items per synthetic page")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    content = library_response(args.items)
+    items = parse_db_update(content)[2]
+    rows = 2 * len(items)
+    print(f"{len(items)} media items, {len(content) / 1e6:.1f} MB")
+
+    parse = measure(lambda storage: parse_db_update(content), args.repeat)
+    print(f"  {'parse':<22} {len(items) / parse:10,.0f} rows/s")
+    baseline = None
+    for label, update in (("asdict upsert", asdict_update), ("prepared upsert", prepared_update)):
+        seconds = measure(lambda storage: (update(storage, items), update(storage, items)), args.repeat)
+        baseline = baseline or seconds
+        print(f"  {label:<22} {rows / seconds:10,.0f} rows/s  x{baseline / seconds:4.1f}")
+    packed_rows = parse_packed(content)[2]
+    baseline = None
+    for label, update in (
+        ("rows -> dataclasses", lambda storage: storage.update([MediaItem(*row) for row in packed_rows])),
+        ("rows -> update_rows", lambda storage: storage.update_rows(packed_rows)),
+    ):
+        seconds = measure(update, args.repeat)
+        baseline = baseline or seconds
+        print(f"  {label:<22} {len(items) / seconds:10,.0f} rows/s  x{baseline / seconds:4.1f}")
+    seconds = measure(lambda storage: storage.update_rows(parse_packed(content)[2]), args.repeat)
+    print(f"  {'parse_packed + rows':<22} {len(items) / seconds:10,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
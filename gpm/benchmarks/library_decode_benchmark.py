@@ -0,0 +1,79 @@
+"""
+Library state decoding: blackboxprotobuf + db_update_parser vs library_decoder.
+
+Usage:
+    python benchmarks/library_decode_benchmark.py [response.bin ...] [--items N]
+
+Recorded fixtures are raw response bodies, e.g. saved with
+`Path("page.bin").write_bytes(client.api.get_library_page_init(raw=True))`.
+Without any, a synthetic response of N items (default 5000) is used.
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from blackboxprotobuf import decode_message
+
+GPM_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(GPM_DIR), str(GPM_DIR / "tests")]
+
+from gpmc import message_types  # noqa: E402
+from gpmc.db_update_parser import parse_db_update  # noqa: E402
+from gpmc.library_decoder import iter_media_items  # noqa: E402
+from library_fixtures import library_response  # noqa: E402
+
+
+def blackboxprotobuf_path(content: bytes):
+    decoded, _ = decode_message(content, message_type=message_types.LIB_STATE_RESPONSE_FIX)
+    return parse_db_update(decoded)
+
+
+def library_decoder_path(content: bytes):
+    return parse_db_update(content)
+
+
+def streaming_path(content: bytes):
+    return sum(1 for _ in iter_media_items(content))
+
+
+def measure(function, content: bytes, repeat: int) -> tuple[float, int]:
+    """Best wall time over `repeat` runs and peak traced allocation of one run."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(content)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="*", type=Path, help="Recorded raw library responses")
+    parser.add_argument("--items", type=int, default=5000, help="Synthetic response size when no fixtures are given")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fixtures = [(path.name, path.read_bytes()) for path in args.fixtures] or [(f"synthetic[{args.items}]", library_response(args.items))]
+    for name, content in fixtures:
+        expected = blackboxprotobuf_path(content)
+        if library_decoder_path(content) != expected:
+            print(f"{name}: library_decoder output differs from blackboxprotobuf path")
+        items = len(expected[2])
+        print(f"{name}: {len(content) / 1e6:.1f} MB, {items} media items")
+        baseline = None
+        for label, function in (("blackboxprotobuf", blackboxprotobuf_path), ("library_decoder", library_decoder_path), ("iter_media_items", streaming_path)):
+            seconds, peak = measure(function, content, args.repeat)
+            baseline = baseline or seconds
+            per_item = seconds / items * 1e6 if items else 0
+            print(f"  {label:<17} {seconds * 1000:9.1f} ms  {per_item:7.1f} us/item  x{baseline / seconds:5.1f}  peak {peak / 1e6:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
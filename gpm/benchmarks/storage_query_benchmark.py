@@ -0,0 +1,95 @@
+"""
+remote_media queries with and without the secondary indexes from `MIGRATIONS`.
+
+Usage:
+    python benchmarks/storage_query_benchmark.py [--rows 10000 100000 1000000]
+
+Each size builds a synthetic library (90% images, 2% trashed, 500 albums),
+times the common queries with the indexes, then drops them and times again.
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+GPM_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(GPM_DIR))
+
+from gpmc.db import MIGRATIONS, Storage  # noqa: E402
+
+INDEXES = [sql.split()[5] for statements in MIGRATIONS for sql in statements if sql.startswith("CREATE INDEX")]
+
+
+def populate(storage: Storage, rows: int) -> None:
+    columns = [row[1] for row in storage.conn.execute("PRAGMA table_info(remote_media)")]
+    rng = random.Random(rows)
+    template = dict.fromkeys(columns)
+
+    def row(i: int) -> tuple:
+        template.update(
+            media_key=f"AF1Qip{i:09d}",
+            file_name=f"IMG_{i:07d}.jpg",
+            dedup_key=f"dedup{i:09d}",
+            type=2 if rng.random() < 0.1 else 1,
+            collection_id=f"album{i % 500}",
+            size_bytes=rng.randrange(1 << 20, 1 << 26),
+            utc_timestamp=rng.randrange(1_300_000_000_000, 1_700_000_000_000),
+            trash_timestamp=1_700_000_000_000 if rng.random() < 0.02 else 0,
+        )
+        return tuple(template[column] for column in columns)
+
+    sql = f"INSERT INTO remote_media VALUES ({', '.join('?' * len(columns))})"
+    with storage.transaction():
+        storage.conn.executemany(sql, (row(i) for i in range(rows)))
+        storage.conn.execute("INSERT INTO collection_media SELECT collection_id, media_key FROM remote_media")
+
+
+def queries(rows: int) -> dict:
+    rng = random.Random(0)
+    dedup_keys = [f"dedup{rng.randrange(rows):09d}" for _ in range(1000)]
+    return {
+        "timeline page (100)": lambda storage: storage.list_media(limit=100),
+        "videos page (100)": lambda storage: storage.list_media("videos", limit=100),
+        "videos, all": lambda storage: storage.list_media("videos", columns=["media_key"]),
+        "catalog, all": lambda storage: storage.list_media(columns=["media_key", "file_name", "utc_timestamp"]),
+        "dedup lookup (1000)": lambda storage: storage.get_media_keys_by_dedup_key(dedup_keys),
+        "album counts": lambda storage: storage.list_collections(),
+    }
+
+
+def measure(function, storage: Storage, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(storage)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp_dir, Storage(Path(tmp_dir) / "storage.db") as storage:
+            start = time.perf_counter()
+            populate(storage, rows)
+            storage.analyze()
+            print(f"{rows} rows (built in {time.perf_counter() - start:.1f} s)")
+
+            indexed = {name: measure(function, storage, args.repeat) for name, function in queries(rows).items()}
+            for index in INDEXES:
+                storage.conn.execute(f"DROP INDEX {index}")
+            storage.analyze()
+            for name, function in queries(rows).items():
+                scan = measure(function, storage, args.repeat)
+                print(f"  {name:<20} indexed {indexed[name] * 1000:9.2f} ms  scan {scan * 1000:9.2f} ms  x{scan / indexed[name]:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,597 @@
-from typing import Any, IO, Generator, Literal, Sequence
+from typing import Any, Callable, IO, Generator, Literal, Self, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import threading
 import time
 from urllib.parse import parse_qs
 from pathlib import Path
 
 import requests
+import urllib3
 from requests.adapters import HTTPAdapter, Retry
-from blackboxprotobuf import decode_message, encode_message
+from blackboxprotobuf import decode_message
 
 from . import message_types
+from .codec import Param, RequestTemplate, encode_message
 from .exceptions import UploadRejected
+from .token_store import TokenStore
 
 DEFAULT_TIMEOUT = 60
 RETRIES = 10
+RETRY_BACKOFF_FACTOR = 1
+RETRY_STATUSES = (502, 503, 504)
+# Methods urllib3's Retry resends after a read error or a retryable status (not POST)
+IDEMPOTENT_METHODS = Retry.DEFAULT_ALLOWED_METHODS
+# Keep-alive connections kept per host; size it to the number of concurrent RPCs
+DEFAULT_POOL_SIZE = 32
+# Hosts the api talks to: rpc, upload and thumbnail/download
+WARM_UP_HOSTS = (
+    "photosdata-pa.googleapis.com",
+    "photos.googleapis.com",
+    "ap2.googleusercontent.com",
+)
+WARM_UP_TIMEOUT = 10
+# Bearer tokens are renewed in the background this long before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+
+@dataclass(slots=True)
+class RpcRequest:
+    """
+    A fully built api request, independent of the HTTP client that sends it.
+
+    `Api` and `AsyncApi` share the builders that produce these and the
+    `parse` callbacks that turn a response (requests or httpx, both expose
+    `.content`, `.text` and `.headers`) into the method's return value.
+    """
+
+    url: str
+    headers: dict[str, str]
+    data: Any = None
+    method: str = "POST"
+    parse: Callable[[Any], Any] = lambda response: response
+    authorize: bool = True
+    # Safe to resend after the server may have acted on it (read-only RPCs)
+    idempotent: bool = False
 
 
-class Api:
+def _decode_response(response) -> dict:
+    decoded_message, _ = decode_message(response.content)
+    return decoded_message
+
+
+def _decode_library_response(response) -> dict:
+    decoded_message, _ = decode_message(response.content, message_type=message_types.LIB_STATE_RESPONSE_FIX)  # type: ignore
+    return decoded_message
+
+
+def _parse_auth_response(response) -> dict[str, str]:
+    parsed_auth_response = {}
+    for line in response.text.splitlines():
+        if "=" in line:
+            key, value = line.split("=", 1)
+            parsed_auth_response[key] = value
+    return parsed_auth_response
+
+
+def _parse_upload_token(response) -> str:
+    return response.headers["X-GUploader-UploadID"]
+
+
+def _parse_remote_media_key(response) -> str | None:
+    decoded_message = _decode_response(response)
+    return decoded_message["1"].get("2", {}).get("2", {}).get("1", None)
+
+
+def _parse_commit_upload(response) -> str:
+    decoded_message = _decode_response(response)
+    try:
+        media_key = decoded_message["1"]["3"]["1"]
+    except KeyError as e:
+        raise UploadRejected("File upload rejected by api") from e
+    return media_key
+
+
+def _parse_album_key(response) -> str:
+    return _decode_response(response)["1"]["1"]
+
+
+def _parse_album_list(response) -> list[dict]:
+    decoded_message = _decode_response(response)
+
+    albums = []
+    if "2" in decoded_message and decoded_message["2"]:
+        for album_data in decoded_message["2"]:
+            if "1" in album_data:
+                album_info = album_data["1"]
+                album = {
+                    "album_key": album_info.get("1", ""),
+                    "title": album_info.get("2", ""),
+                    "media_count": album_info.get("3", 0),
+                    "cover_photo_key": album_info.get("4", ""),
+                    "creation_time": album_info.get("5", 0),
+                }
+                albums.append(album)
+
+    return albums
+
+
+def _parse_album_media(response) -> list[dict]:
+    decoded_message = _decode_response(response)
+
+    media_items = []
+    if "1" in decoded_message and decoded_message["1"]:
+        for media_data in decoded_message["1"]:
+            if "1" in media_data:
+                media_info = media_data["1"]
+                media_item = {
+                    "media_key": media_info.get("1", ""),
+                    "filename": media_info.get("2", ""),
+                    "mime_type": media_info.get("3", ""),
+                    "width": media_info.get("4", 0),
+                    "height": media_info.get("5", 0),
+                    "creation_time": media_info.get("6", 0),
+                    "size_bytes": media_info.get("7", 0),
+                    "type": media_info.get("8", 0),  # 1=image, 2=video
+                }
+                media_items.append(media_item)
+
+    return media_items
+
+
+def _response_content(response) -> bytes:
+    return response.content
+
+
+def _ignore_response(response) -> None:
+    return None
+
+
+def retry_delay(attempt: int) -> float:
+    """Backoff before retry number `attempt` (1-based), matching urllib3's Retry policy."""
+    return min(RETRY_BACKOFF_FACTOR * (2 ** (attempt - 1)), 120)
+
+
+# Library sync bodies are large and constant apart from the tokens: encode them once
+_LIB_STATE_TEMPLATE = RequestTemplate(
+    {
+        "1": {
+            "1": {
+                "1": {
+                    "1": {},
+                    "3": {},
+                    "4": {},
+                    "5": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}},
+                    "6": {},
+                    "7": {"2": {}},
+                    "15": {},
+                    "16": {},
+                    "17": {},
+                    "19": {},
+                    "20": {},
+                    "21": {"5": {"3": {}}, "6": {}},
+                    "25": {},
+                    "30": {"2": {}},
+                    "31": {},
+                    "32": {},
+                    "33": {"1": {}},
+                    "34": {},
+                    "36": {},
+                    "37": {},
+                    "38": {},
+                    "39": {},
+                    "40": {},
+                    "41": {},
+                },
+                "5": {
+                    "2": {"2": {"3": {"2": {}}, "4": {"2": {}, "4": {}}}, "4": {"2": {"2": 1}}, "5": {"2": {}}, "6": 1},
+                    "3": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1, "3": {}}}, "4": {}, "5": {"2": {"2": 1}}, "7": {}},
+                    "4": {"2": {"2": {}}},
+                    "5": {"1": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1, "3": {}}}}, "3": 1},
+                },
+                "8": {},
+                "9": {"2": {}, "3": {"1": {}, "2": {}}, "4": {"1": {"3": {"1": {"1": {"5": {"1": {}}, "6": {}, "7": {}}, "2": {}, "3": {"1": {"5": {"1": {}}, "6": {}, "7": {}}, "2": {}}}}, "4": {"1": {"2": {}}}}}},
+                "11": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "12": {},
+                "14": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "15": {"1": {}, "4": {}},
+                "17": {"1": {}, "4": {}},
+                "19": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "21": {"1": {}},
+                "22": {},
+                "23": {},
+                "24": {},
+            },
+            "2": {
+                "1": {"2": {}, "3": {}, "4": {}, "5": {}, "6": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}}, "7": {}, "8": {}, "10": {}, "12": {}, "13": {"2": {}, "3": {}}, "15": {"1": {}}, "18": {}},
+                "4": {"1": {}},
+                "9": {},
+                "11": {"1": {"1": {}, "4": {}, "5": {}, "6": {}, "9": {}}},
+                "14": {"1": {"1": {"1": {}, "2": {"2": {"1": {"1": {}}, "3": {}}}, "3": {"4": {"1": {"1": {}}, "3": {}}, "5": {"1": {"1": {}}, "3": {}}}}, "2": {}}},
+                "17": {},
+                "18": {"1": {}, "2": {"1": {}}},
+                "20": {"2": {"1": {}, "2": {}}},
+                "22": {},
+                "23": {},
+                "24": {},
+            },
+            "3": {
+                "2": {},
+                "3": {
+                    "2": {},
+                    "3": {},
+                    "7": {},
+                    "8": {},
+                    "14": {"1": {}},
+                    "16": {},
+                    "17": {"2": {}},
+                    "18": {},
+                    "19": {},
+                    "20": {},
+                    "21": {},
+                    "22": {},
+                    "23": {},
+                    "27": {"1": {}, "2": {"1": {}}},
+                    "29": {},
+                    "30": {},
+                    "31": {},
+                    "32": {},
+                    "34": {},
+                    "37": {},
+                    "38": {},
+                    "39": {},
+                    "41": {},
+                    "43": {"1": {}},
+                    "45": {"1": {"1": {}}},
+                    "46": {"1": {}, "2": {}, "3": {}},
+                    "47": {},
+                },
+                "4": {"2": {}, "3": {"1": {}}, "4": {}, "5": {"1": {}}},
+                "7": {},
+                "12": {},
+                "13": {},
+                "14": {"1": {}, "2": {"1": {}, "2": {"1": {}}, "3": {}, "4": {"1": {}}}, "3": {"1": {}, "2": {"1": {}}, "3": {}, "4": {}}},
+                "15": {},
+                "16": {"1": {}},
+                "18": {},
+                "19": {"4": {"2": {}}, "6": {"2": {}, "3": {}}, "7": {"2": {}, "3": {}}, "8": {}, "9": {}},
+                "20": {},
+                "22": {},
+                "24": {},
+                "25": {},
+                "26": {},
+            },
+            "6": Param("state_token"),
+            "7": 2,
+            "9": {"1": {"2": {"1": {}, "2": {}}}, "2": {"3": {"2": 1}}, "3": {"2": {}}, "4": {}, "7": {"1": {}}, "8": {"1": 2, "2": "\x01\x02\x03\x05\x06\x07"}, "9": {}, "11": {"1": {}}},
+            "11": [1, 2, 6],
+            "12": {"2": {"1": {}, "2": {}}, "3": {"1": {}}, "4": {}},
+            "13": {},
+            "15": {"3": {"1": 1}},
+            "18": {"169945741": {"1": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}}}},
+            "19": {"1": {"1": {}, "2": {}}, "2": {"1": [1, 2, 4, 6, 5, 7]}, "3": {"1": {}, "2": {}}, "5": {"1": {}, "2": {}}, "6": {"1": {}}, "7": {"1": {}, "2": {}}, "8": {"1": {}}},
+            "20": {
+                "1": 1,
+                "2": "",
+                "3": {
+                    "1": "type.googleapis.com/photos.printing.client.PrintingPromotionSyncOptions",
+                    "2": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}},
+                },
+            },
+            "21": {
+                "2": {"2": {"4": {}}, "4": {}, "5": {}},
+                "3": {"2": {"1": 1}, "4": {"2": {}}},
+                "5": {"1": {}},
+                "6": {"1": {}, "2": {"1": {}}},
+                "7": {"1": 2, "2": "\x01\x07\x08\t\n\r\x0e\x0f\x11\x13\x14\x16\x17-./01:\x06\x18267;>?@A89<GBED", "3": "\x01"},
+                "8": {"3": {"1": {"1": {"2": {"1": 1}, "4": {"2": {}}}}, "3": {}}, "4": {"1": {}}, "5": {"1": {"2": {"1": 1}, "4": {"2": {}}}}},
+                "9": {"1": {}},
+                "10": {"1": {"1": {}}, "3": {}, "5": {}, "6": {"1": {}}, "7": {}, "9": {}, "10": {}},
+                "11": {},
+                "12": {},
+                "13": {},
+                "14": {},
+                "16": {"1": {}},
+            },
+            "22": {"1": 1, "2": "107818234414673686888"},
+            "25": {"1": {"1": {"1": {"1": {}}}}, "2": {}},
+            "26": {},
+        },
+        "2": {"1": {"1": {"1": {"1": {}}, "2": {}}}, "2": {}},
+    },
+    message_types.GET_LIB_STATE,  # type: ignore
+)
+
+
+_LIB_PAGE_INIT_TEMPLATE = RequestTemplate(
+    {
+        "1": {
+            "1": {
+                "1": {
+                    "1": {},
+                    "3": {},
+                    "4": {},
+                    "5": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}},
+                    "6": {},
+                    "7": {"2": {}},
+                    "15": {},
+                    "16": {},
+                    "17": {},
+                    "19": {},
+                    "20": {},
+                    "21": {"5": {"3": {}}, "6": {}},
+                    "25": {},
+                    "30": {"2": {}},
+                    "31": {},
+                    "32": {},
+                    "33": {"1": {}},
+                    "34": {},
+                    "36": {},
+                    "37": {},
+                    "38": {},
+                    "39": {},
+                    "40": {},
+                    "41": {},
+                },
+                "5": {
+                    "2": {"2": {"3": {"2": {}}, "4": {"2": {}}}, "4": {"2": {"2": 1}}, "5": {"2": {}}, "6": 1},
+                    "3": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}, "4": {}, "5": {"2": {"2": 1}}, "7": {}},
+                    "4": {"2": {"2": {}}},
+                    "5": {"1": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}}, "3": 1},
+                },
+                "8": {},
+                "9": {"2": {}, "3": {"1": {}, "2": {}}, "4": {"1": {"3": {"1": {"1": {"5": {"1": {}}, "6": {}}, "2": {}, "3": {"1": {"5": {"1": {}}, "6": {}}, "2": {}}}}, "4": {"1": {"2": {}}}}}},
+                "11": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "12": {},
+                "14": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "15": {"1": {}, "4": {}},
+                "17": {"1": {}, "4": {}},
+                "19": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "22": {},
+                "23": {},
+            },
+            "2": {
+                "1": {"2": {}, "3": {}, "4": {}, "5": {}, "6": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}}, "7": {}, "8": {}, "10": {}, "12": {}, "13": {"2": {}, "3": {}}, "15": {"1": {}}, "18": {}},
+                "4": {"1": {}},
+                "9": {},
+                "11": {"1": {"1": {}, "4": {}, "5": {}, "6": {}, "9": {}}},
+                "14": {"1": {"1": {"1": {}, "2": {"2": {"1": {"1": {}}, "3": {}}}, "3": {"4": {"1": {"1": {}}, "3": {}}, "5": {"1": {"1": {}}, "3": {}}}}, "2": {}}},
+                "17": {},
+                "18": {"1": {}, "2": {"1": {}}},
+                "20": {"2": {"1": {}, "2": {}}},
+                "23": {},
+            },
+            "3": {
+                "2": {},
+                "3": {
+                    "2": {},
+                    "3": {},
+                    "7": {},
+                    "8": {},
+                    "14": {"1": {}},
+                    "16": {},
+                    "17": {"2": {}},
+                    "18": {},
+                    "19": {},
+                    "20": {},
+                    "21": {},
+                    "22": {},
+                    "23": {},
+                    "27": {"1": {}, "2": {"1": {}}},
+                    "29": {},
+                    "30": {},
+                    "31": {},
+                    "32": {},
+                    "34": {},
+                    "37": {},
+                    "38": {},
+                    "39": {},
+                    "41": {},
+                },
+                "4": {"2": {}, "3": {}, "4": {}},
+                "7": {},
+                "12": {},
+                "13": {},
+                "14": {"1": {}, "2": {"1": {}, "2": {"1": {}}, "3": {}, "4": {"1": {}}}, "3": {"1": {}, "2": {"1": {}}, "3": {}, "4": {}}},
+                "15": {},
+                "16": {"1": {}},
+                "18": {},
+                "19": {"4": {"2": {}}, "6": {"2": {}, "3": {}}, "7": {"2": {}, "3": {}}, "8": {}},
+                "20": {},
+                "24": {},
+                "25": {},
+            },
+            "4": Param("page_token"),
+            "7": 2,
+            "9": {"1": {"2": {"1": {}, "2": {}}}, "2": {"3": {"2": 1}}, "3": {"2": {}}, "4": {}, "7": {"1": {}}, "8": {"1": 2, "2": "\x01\x02\x03\x05\x06"}, "9": {}},
+            "11": [1, 2],
+            "12": {"2": {"1": {}, "2": {}}, "3": {"1": {}}, "4": {}},
+            "13": {},
+            "15": {"3": {"1": 1}},
+            "18": {"169945741": {"1": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}}}},
+            "19": {"1": {"1": {}, "2": {}}, "2": {"1": [1, 2, 4, 6, 5, 7]}, "3": {"1": {}, "2": {}}, "5": {"1": {}, "2": {}}, "6": {"1": {}}, "7": {"1": {}, "2": {}}, "8": {"1": {}}},
+            "20": {
+                "1": 1,
+                "3": {
+                    "1": "type.googleapis.com/photos.printing.client.PrintingPromotionSyncOptions",
+                    "2": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}},
+                },
+            },
+            "21": {
+                "2": {"2": {}, "4": {}, "5": {}},
+                "3": {"2": {"1": 1}},
+                "5": {"1": {}},
+                "6": {"1": {}, "2": {"1": {}}},
+                "7": {"1": 2, "2": "\x01\x07\x08\t\n\r\x0e\x0f\x11\x13\x14\x16\x17-./01:\x06\x18267;>?@A89<", "3": "\x01"},
+                "8": {"3": {"1": {"1": {"2": {"1": 1}}}}, "4": {"1": {}}},
+                "9": {"1": {}},
+                "10": {"1": {"1": {}}, "3": {}, "5": {}, "6": {"1": {}}, "7": {}, "9": {}, "10": {}},
+                "11": {},
+                "12": {},
+                "13": {},
+            },
+            "22": {"1": 2},
+            "25": {"1": {"1": {"1": {"1": {}}}}, "2": {}},
+        },
+        "2": {"1": {"1": {"1": {"1": {}}, "2": {}}}, "2": {}},
+    },
+    message_types.GET_LIB_PAGE_INIT,  # type: ignore
+)
+
+
+_LIB_PAGE_TEMPLATE = RequestTemplate(
+    {
+        "1": {
+            "1": {
+                "1": {
+                    "1": {},
+                    "3": {},
+                    "4": {},
+                    "5": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}},
+                    "6": {},
+                    "7": {"2": {}},
+                    "15": {},
+                    "16": {},
+                    "17": {},
+                    "19": {},
+                    "20": {},
+                    "21": {"5": {"3": {}}, "6": {}},
+                    "25": {},
+                    "30": {"2": {}},
+                    "31": {},
+                    "32": {},
+                    "33": {"1": {}},
+                    "34": {},
+                    "36": {},
+                    "37": {},
+                    "38": {},
+                    "39": {},
+                    "40": {},
+                    "41": {},
+                },
+                "5": {
+                    "2": {"2": {"3": {"2": {}}, "4": {"2": {}}}, "4": {"2": {"2": 1}}, "5": {"2": {}}, "6": 1},
+                    "3": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}, "4": {}, "5": {"2": {"2": 1}}, "7": {}},
+                    "4": {"2": {"2": {}}},
+                    "5": {"1": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}}, "3": 1},
+                },
+                "8": {},
+                "9": {"2": {}, "3": {"1": {}, "2": {}}, "4": {"1": {"3": {"1": {"1": {"5": {"1": {}}, "6": {}}, "2": {}, "3": {"1": {"5": {"1": {}}, "6": {}}, "2": {}}}}, "4": {"1": {"2": {}}}}}},
+                "11": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "12": {},
+                "14": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "15": {"1": {}, "4": {}},
+                "17": {"1": {}, "4": {}},
+                "19": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
+                "22": {},
+                "23": {},
+            },
+            "2": {
+                "1": {"2": {}, "3": {}, "4": {}, "5": {}, "6": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}}, "7": {}, "8": {}, "10": {}, "12": {}, "13": {"2": {}, "3": {}}, "15": {"1": {}}, "18": {}},
+                "4": {"1": {}},
+                "9": {},
+                "11": {"1": {"1": {}, "4": {}, "5": {}, "6": {}, "9": {}}},
+                "14": {"1": {"1": {"1": {}, "2": {"2": {"1": {"1": {}}, "3": {}}}, "3": {"4": {"1": {"1": {}}, "3": {}}, "5": {"1": {"1": {}}, "3": {}}}}, "2": {}}},
+                "17": {},
+                "18": {"1": {}, "2": {"1": {}}},
+                "20": {"2": {"1": {}, "2": {}}},
+                "23": {},
+            },
+            "3": {
+                "2": {},
+                "3": {
+                    "2": {},
+                    "3": {},
+                    "7": {},
+                    "8": {},
+                    "14": {"1": {}},
+                    "16": {},
+                    "17": {"2": {}},
+                    "18": {},
+                    "19": {},
+                    "20": {},
+                    "21": {},
+                    "22": {},
+                    "23": {},
+                    "27": {"1": {}, "2": {"1": {}}},
+                    "29": {},
+                    "30": {},
+                    "31": {},
+                    "32": {},
+                    "34": {},
+                    "37": {},
+                    "38": {},
+                    "39": {},
+                    "41": {},
+                },
+                "4": {"2": {}, "3": {}, "4": {}},
+                "7": {},
+                "12": {},
+                "13": {},
+                "14": {"1": {}, "2": {"1": {}, "2": {"1": {}}, "3": {}, "4": {"1": {}}}, "3": {"1": {}, "2": {"1": {}}, "3": {}, "4": {}}},
+                "15": {},
+                "16": {"1": {}},
+                "18": {},
+                "19": {"4": {"2": {}}, "6": {"2": {}, "3": {}}, "7": {"2": {}, "3": {}}, "8": {}},
+                "20": {},
+                "24": {},
+                "25": {},
+            },
+            "4": Param("page_token"),
+            "6": Param("state_token"),
+            "7": 2,
+            "9": {"1": {"2": {"1": {}, "2": {}}}, "2": {"3": {"2": 1}}, "3": {"2": {}}, "4": {}, "7": {"1": {}}, "8": {"1": 2, "2": "\x01\x02\x03\x05\x06"}, "9": {}},
+            "11": [1, 2],
+            "12": {"2": {"1": {}, "2": {}}, "3": {"1": {}}, "4": {}},
+            "13": {},
+            "15": {"3": {"1": 1}},
+            "18": {"169945741": {"1": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}}}},
+            "19": {"1": {"1": {}, "2": {}}, "2": {"1": [1, 2, 4, 6, 5, 7]}, "3": {"1": {}, "2": {}}, "5": {"1": {}, "2": {}}, "6": {"1": {}}, "7": {"1": {}, "2": {}}, "8": {"1": {}}},
+            "20": {
+                "1": 1,
+                "2": "AH_uQ41bEgartCAb9ZVh48fOzHLvaA7xJy_EHlv_4kR6Q7xI4Bol3igCVJ6HJ_VViRfrDrBJB5EQ",
+                "3": {
+                    "1": "type.googleapis.com/photos.printing.client.PrintingPromotionSyncOptions",
+                    "2": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}},
+                },
+            },
+            "21": {
+                "2": {"2": {}, "4": {}, "5": {}},
+                "3": {"2": {"1": 1}},
+                "5": {"1": {}},
+                "6": {"1": {}, "2": {"1": {}}},
+                "7": {"1": 2, "2": "\x01\x07\x08\t\n\r\x0e\x0f\x11\x13\x14\x16\x17-./01:\x06\x18267;>?@A89<", "3": "\x01"},
+                "8": {"3": {"1": {"1": {"2": {"1": 1}}}}, "4": {"1": {}}},
+                "9": {"1": {}},
+                "10": {"1": {"1": {}}, "3": {}, "5": {}, "6": {"1": {}}, "7": {}, "9": {}, "10": {}},
+                "11": {},
+                "12": {},
+                "13": {},
+            },
+            "22": {"1": 2},
+            "25": {"1": {"1": {"1": {"1": {}}}}, "2": {}},
+        },
+        "2": {"1": {"1": {"1": {"1": {}}, "2": {}}}, "2": {}},
+    },
+    message_types.GET_LIB_PAGE,  # type: ignore
+)
+
+
+class BaseApi:
+    """Request builders shared by the sync `Api` and the async `AsyncApi`."""
+
     def __init__(
         self,
         auth_data: str,
         proxy: str = "",
         language: str = "en_US",
         timeout: int = DEFAULT_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        token_path: str | Path | None = None,
     ) -> None:
-        """
-        Initialize the Google Photos mobile api.
-        """
         self.proxy = proxy
         self.timeout = timeout
+        self.pool_size = pool_size
         self.android_api_version = 28
         self.model = "Pixel XL"
         self.make = "Google"
@@ -34,43 +599,26 @@ class Api:
         self.user_agent = f"com.google.android.apps.photos/{self.client_verion_code} (Linux; U; Android 9; en_US; Pixel XL; Build/PQ2A.190205.001; Cronet/127.0.6510.5) (gzip)"
         self.language = language
         self.auth_data = auth_data
-        self.auth_response_cache: dict[str, str] = {"Expiry": "0", "Auth": ""}
+        self.token_store = TokenStore(token_path, auth_data) if token_path else None
+        self.auth_response_cache: dict[str, str] = (self.token_store and self.token_store.load()) or {"Expiry": "0", "Auth": ""}
 
-    @property
-    def bearer_token(self) -> str:
-        """Property that automatically checks and renews the auth token if expired."""
-        if int(self.auth_response_cache.get("Expiry", "0")) <= int(time.time()):
-            self.auth_response_cache = self._get_auth_token()
+    def _token_expired(self, margin: int = 0) -> bool:
+        return int(self.auth_response_cache.get("Expiry", "0")) - margin <= int(time.time())
+
+    def _set_auth_response(self, auth_response: dict[str, str]) -> None:
+        self.auth_response_cache = auth_response
+        if self.token_store:
+            try:
+                self.token_store.save(auth_response)
+            except OSError:
+                pass  # persistence is an optimization, the token in memory is still valid
+
+    def _cached_token(self) -> str:
         if token := self.auth_response_cache.get("Auth", ""):
             return token
         raise RuntimeError("Auth response does not contain bearer token")
 
-    def _new_session(self) -> requests.Session:
-        """Create a new request session with retry mechanism"""
-        # https://stackoverflow.com/questions/23267409/how-to-implement-retry-mechanism-into-python-requests-library
-        s = requests.Session()
-        retries = Retry(total=RETRIES, backoff_factor=1, status_forcelist=[502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries)
-        s.mount("http://", adapter)
-        s.mount("https://", adapter)
-        s.proxies = {
-            "http": self.proxy,
-            "https": self.proxy,
-        }
-        if self.proxy:
-            s.verify = False
-        return s
-
-    def _get_auth_token(self) -> dict[str, str]:
-        """
-        Send auth request to get bearer token.
-
-        Returns:
-            Dict[str, str]: Parsed authentication response with token and other details.
-
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+    def _auth_token_request(self) -> RpcRequest:
         auth_data_dict = {k: v[0] if len(v) == 1 else v for k, v in parse_qs(self.auth_data).items()}
 
         # this dict has a purpose, just sending `auth_data_dict` can result in auth request that returns encrypted token
@@ -100,39 +648,29 @@ class Api:
             "User-Agent": "GoogleAuth/1.4 (Pixel XL PQ2A.190205.001); gzip",
         }
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://android.googleapis.com/auth",
-                headers=headers,
-                data=auth_request_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        parsed_auth_response = {}
-        for line in response.text.splitlines():
-            if "=" in line:
-                key, value = line.split("=", 1)
-                parsed_auth_response[key] = value
-
-        return parsed_auth_response
+        return RpcRequest(
+            "https://android.googleapis.com/auth",
+            headers,
+            auth_request_data,
+            parse=_parse_auth_response,
+            authorize=False,
+        )
 
-    def get_upload_token(self, sha_hash_b64: str, file_size: int) -> str:
-        """
-        Obtain an upload token from the Google Photos API.
-
-        Args:
-            sha_hash_b64: Base64-encoded SHA-1 hash of the file.
-            file_size: Size of the file in bytes.
-
-        Returns:
-            str: Upload token for the file.
+    def _upload_file_request(self, upload_token: str) -> RpcRequest:
+        headers = {
+            "Accept-Encoding": "gzip",
+            "Accept-Language": self.language,
+            "User-Agent": self.user_agent,
+        }
 
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+        return RpcRequest(
+            f"https://photos.googleapis.com/data/upload/uploadmedia/interactive?upload_id={upload_token}",
+            headers,
+            method="PUT",
+            parse=_decode_response,
+        )
 
+    def _get_upload_token_request(self, sha_hash_b64: str, file_size: int) -> RpcRequest:
         proto_body = {"1": 2, "2": 2, "3": 1, "4": 3, "7": file_size}
 
         serialized_data = encode_message(proto_body, message_types.GET_UPLOAD_TOKEN)  # type: ignore
@@ -142,34 +680,18 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "X-Goog-Hash": f"sha1={sha_hash_b64}",
             "X-Upload-Content-Length": str(file_size),
         }
-        with self._new_session() as session:
-            response = session.post(
-                "https://photos.googleapis.com/data/upload/uploadmedia/interactive",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-        return response.headers["X-GUploader-UploadID"]
-
-    def find_remote_media_by_hash(self, sha1_hash: bytes) -> str | None:
-        """
-        Check library for existing files with the hash.
-
-        Args:
-            sha1_hash: SHA-1 hash of the file.
-
-        Returns:
-            str: Media key of the existing file, or None if not found.
 
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+        return RpcRequest(
+            "https://photos.googleapis.com/data/upload/uploadmedia/interactive",
+            headers,
+            serialized_data,
+            parse=_parse_upload_token,
+        )
 
+    def _find_remote_media_by_hash_request(self, sha1_hash: bytes) -> RpcRequest:
         proto_body = {"1": {"1": {"1": sha1_hash}, "2": {}}}
         serialized_data = encode_message(proto_body, message_types.FIND_REMOTE_MEDIA_BY_HASH)  # type: ignore
         headers = {
@@ -177,66 +699,17 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
-        }
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/5084965799730810217",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-        media_key = decoded_message["1"].get("2", {}).get("2", {}).get("1", None)
-        return media_key
-
-    def upload_file(self, file: str | Path | bytes | IO[bytes] | Generator[bytes, None, None], upload_token: str) -> dict:
-        """
-        Upload a file to Google Photos.
-
-        Args:
-            file: The file to upload. Can be a path (str or Path), bytes, BufferedReader, or a generator yielding bytes.
-            upload_token Upload token from `get_upload_token()`.
-
-        Returns:
-            dict: Decoded api response.
-
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
-
-        headers = {
-            "Accept-Encoding": "gzip",
-            "Accept-Language": self.language,
-            "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
         }
 
-        with self._new_session() as session:
-            if isinstance(file, (str, Path)):
-                with Path(file).open("rb") as f:
-                    response = session.put(
-                        f"https://photos.googleapis.com/data/upload/uploadmedia/interactive?upload_id={upload_token}",
-                        headers=headers,
-                        timeout=self.timeout,
-                        data=f,
-                    )
-            else:
-                response = session.put(
-                    f"https://photos.googleapis.com/data/upload/uploadmedia/interactive?upload_id={upload_token}",
-                    headers=headers,
-                    timeout=self.timeout,
-                    data=file,
-                )
-
-        response.raise_for_status()
-
-        upload_response_decoded, _ = decode_message(response.content)
-        return upload_response_decoded
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/5084965799730810217",
+            headers,
+            serialized_data,
+            parse=_parse_remote_media_key,
+            idempotent=True,
+        )
 
-    def commit_upload(
+    def _commit_upload_request(
         self,
         upload_response_decoded: dict[str, Any],
         file_name: str,
@@ -245,25 +718,7 @@ class Api:
         make: str | None = None,
         model: str | None = None,
         upload_timestamp: int | None = None,
-    ) -> str:
-        """
-        Commit the upload.
-
-        Args:
-            upload_response_decoded: Decoded upload response.
-            file_name: Name of the uploaded file.
-            sha1_hash: SHA-1 hash of the file.
-            quality: Quality setting for the upload. Defaults to "original".
-            make: Device manufacturer name. Overrides client's make.
-            model: Device model name. Overrides client's model.
-
-        Returns:
-            str: Media key of the uploaded file.
-
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
-
+    ) -> RpcRequest:
         if make is None:
             make = self.make
         if model is None:
@@ -338,39 +793,18 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/16538846908252377752",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-        decoded_message, _ = decode_message(response.content)
-        try:
-            media_key = decoded_message["1"]["3"]["1"]
-        except KeyError as e:
-            raise UploadRejected("File upload rejected by api") from e
-        return media_key
 
-    def move_remote_media_to_trash(self, dedup_keys: Sequence[str]) -> dict:
-        """
-        Move remote media items to the trash using deduplication keys.
-
-        Args:
-            dedup_keys: Deduplication keys for the media items to be trashed.
-
-        Returns:
-            dict: Api response message.
-
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/16538846908252377752",
+            headers,
+            serialized_data,
+            parse=_parse_commit_upload,
+        )
 
+    def _move_remote_media_to_trash_request(self, dedup_keys: Sequence[str]) -> RpcRequest:
         proto_body = {
             "2": 1,
             "3": dedup_keys,
@@ -384,34 +818,16 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
         }
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/17490284929287180316",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-        return decoded_message
-
-    def create_album(self, album_name: str, media_keys: Sequence[str]) -> str:
-        """Create new album with media.
-
-        Args:
-            album_name: Album name.
-            media_keys: Media keys of the media items to be added to album.
-
-        Returns:
-            str: Album media key.
 
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/17490284929287180316",
+            headers,
+            serialized_data,
+            parse=_decode_response,
+        )
 
+    def _create_album_request(self, album_name: str, media_keys: Sequence[str]) -> RpcRequest:
         proto_body = {
             "1": album_name,
             "2": int(time.time()),
@@ -429,36 +845,18 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/8386163679468898444",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-        return decoded_message["1"]["1"]
 
-    def add_media_to_album(self, album_media_key: str, media_keys: Sequence[str]) -> dict:
-        """Add media to an album.
-
-        Args:
-            album_media_key: Target album media key.
-            media_keys: Media keys of the media items to be added to album.
-
-        Returns:
-            dict: Decoded api response.
-
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/8386163679468898444",
+            headers,
+            serialized_data,
+            parse=_parse_album_key,
+        )
 
+    def _add_media_to_album_request(self, album_media_key: str, media_keys: Sequence[str]) -> RpcRequest:
         proto_body = {
             "1": list(media_keys),
             "2": album_media_key,
@@ -473,36 +871,18 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/484917746253879292",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-        return decoded_message
-
-    def list_albums(self) -> list[dict]:
-        """List all albums from Google Photos.
 
-        Returns:
-            list[dict]: List of albums with metadata including:
-                - album_key: Album media key
-                - title: Album name
-                - media_count: Number of items in album
-                - cover_photo_key: Media key of cover photo
-                - creation_time: Album creation timestamp
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/484917746253879292",
+            headers,
+            serialized_data,
+            parse=_decode_response,
+        )
 
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+    def _list_albums_request(self) -> RpcRequest:
         proto_body = {
             "1": {"1": 1},  # Request type for listing albums
             "2": {"3": self.model, "4": self.make, "5": self.android_api_version},
@@ -515,51 +895,19 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/8386163679468898444",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-
-        albums = []
-        if "2" in decoded_message and decoded_message["2"]:
-            for album_data in decoded_message["2"]:
-                if "1" in album_data:
-                    album_info = album_data["1"]
-                    album = {
-                        "album_key": album_info.get("1", ""),
-                        "title": album_info.get("2", ""),
-                        "media_count": album_info.get("3", 0),
-                        "cover_photo_key": album_info.get("4", ""),
-                        "creation_time": album_info.get("5", 0),
-                    }
-                    albums.append(album)
-
-        return albums
-
-    def get_album_media(self, album_key: str, limit: int | None = None) -> list[dict]:
-        """Get media items from a specific album.
-
-        Args:
-            album_key: Album media key to get items from.
-            limit: Maximum number of items to return. None for all items.
-
-        Returns:
-            list[dict]: List of media items in the album with metadata.
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/8386163679468898444",
+            headers,
+            serialized_data,
+            parse=_parse_album_list,
+            idempotent=True,
+        )
 
-        Raises:
-            requests.HTTPError: If the api request fails.
-        """
+    def _get_album_media_request(self, album_key: str, limit: int | None = None) -> RpcRequest:
         proto_body = {
             "1": album_key,
             "2": {"1": limit if limit else 50000},  # Increased default limit
@@ -573,568 +921,84 @@ class Api:
             "Accept-Language": self.language,
             "Content-Type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/484917746253879292",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-
-        media_items = []
-        if "1" in decoded_message and decoded_message["1"]:
-            for media_data in decoded_message["1"]:
-                if "1" in media_data:
-                    media_info = media_data["1"]
-                    media_item = {
-                        "media_key": media_info.get("1", ""),
-                        "filename": media_info.get("2", ""),
-                        "mime_type": media_info.get("3", ""),
-                        "width": media_info.get("4", 0),
-                        "height": media_info.get("5", 0),
-                        "creation_time": media_info.get("6", 0),
-                        "size_bytes": media_info.get("7", 0),
-                        "type": media_info.get("8", 0),  # 1=image, 2=video
-                    }
-                    media_items.append(media_item)
-
-        return media_items
-
-    def get_library_state(self, state_token: str = "") -> dict:
-        """Get library state
-
-        Args:
-            state_token: Previously received state_token.
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/484917746253879292",
+            headers,
+            serialized_data,
+            parse=_parse_album_media,
+            idempotent=True,
+        )
 
-        Returns:
-            dict: Decoded api response.
-        """
+    def _get_library_state_request(self, state_token: str = "", raw: bool = False) -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
 
-        proto_body = {
-            "1": {
-                "1": {
-                    "1": {
-                        "1": {},
-                        "3": {},
-                        "4": {},
-                        "5": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}},
-                        "6": {},
-                        "7": {"2": {}},
-                        "15": {},
-                        "16": {},
-                        "17": {},
-                        "19": {},
-                        "20": {},
-                        "21": {"5": {"3": {}}, "6": {}},
-                        "25": {},
-                        "30": {"2": {}},
-                        "31": {},
-                        "32": {},
-                        "33": {"1": {}},
-                        "34": {},
-                        "36": {},
-                        "37": {},
-                        "38": {},
-                        "39": {},
-                        "40": {},
-                        "41": {},
-                    },
-                    "5": {
-                        "2": {"2": {"3": {"2": {}}, "4": {"2": {}, "4": {}}}, "4": {"2": {"2": 1}}, "5": {"2": {}}, "6": 1},
-                        "3": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1, "3": {}}}, "4": {}, "5": {"2": {"2": 1}}, "7": {}},
-                        "4": {"2": {"2": {}}},
-                        "5": {"1": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1, "3": {}}}}, "3": 1},
-                    },
-                    "8": {},
-                    "9": {"2": {}, "3": {"1": {}, "2": {}}, "4": {"1": {"3": {"1": {"1": {"5": {"1": {}}, "6": {}, "7": {}}, "2": {}, "3": {"1": {"5": {"1": {}}, "6": {}, "7": {}}, "2": {}}}}, "4": {"1": {"2": {}}}}}},
-                    "11": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "12": {},
-                    "14": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "15": {"1": {}, "4": {}},
-                    "17": {"1": {}, "4": {}},
-                    "19": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "21": {"1": {}},
-                    "22": {},
-                    "23": {},
-                    "24": {},
-                },
-                "2": {
-                    "1": {"2": {}, "3": {}, "4": {}, "5": {}, "6": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}}, "7": {}, "8": {}, "10": {}, "12": {}, "13": {"2": {}, "3": {}}, "15": {"1": {}}, "18": {}},
-                    "4": {"1": {}},
-                    "9": {},
-                    "11": {"1": {"1": {}, "4": {}, "5": {}, "6": {}, "9": {}}},
-                    "14": {"1": {"1": {"1": {}, "2": {"2": {"1": {"1": {}}, "3": {}}}, "3": {"4": {"1": {"1": {}}, "3": {}}, "5": {"1": {"1": {}}, "3": {}}}}, "2": {}}},
-                    "17": {},
-                    "18": {"1": {}, "2": {"1": {}}},
-                    "20": {"2": {"1": {}, "2": {}}},
-                    "22": {},
-                    "23": {},
-                    "24": {},
-                },
-                "3": {
-                    "2": {},
-                    "3": {
-                        "2": {},
-                        "3": {},
-                        "7": {},
-                        "8": {},
-                        "14": {"1": {}},
-                        "16": {},
-                        "17": {"2": {}},
-                        "18": {},
-                        "19": {},
-                        "20": {},
-                        "21": {},
-                        "22": {},
-                        "23": {},
-                        "27": {"1": {}, "2": {"1": {}}},
-                        "29": {},
-                        "30": {},
-                        "31": {},
-                        "32": {},
-                        "34": {},
-                        "37": {},
-                        "38": {},
-                        "39": {},
-                        "41": {},
-                        "43": {"1": {}},
-                        "45": {"1": {"1": {}}},
-                        "46": {"1": {}, "2": {}, "3": {}},
-                        "47": {},
-                    },
-                    "4": {"2": {}, "3": {"1": {}}, "4": {}, "5": {"1": {}}},
-                    "7": {},
-                    "12": {},
-                    "13": {},
-                    "14": {"1": {}, "2": {"1": {}, "2": {"1": {}}, "3": {}, "4": {"1": {}}}, "3": {"1": {}, "2": {"1": {}}, "3": {}, "4": {}}},
-                    "15": {},
-                    "16": {"1": {}},
-                    "18": {},
-                    "19": {"4": {"2": {}}, "6": {"2": {}, "3": {}}, "7": {"2": {}, "3": {}}, "8": {}, "9": {}},
-                    "20": {},
-                    "22": {},
-                    "24": {},
-                    "25": {},
-                    "26": {},
-                },
-                "6": state_token,
-                "7": 2,
-                "9": {"1": {"2": {"1": {}, "2": {}}}, "2": {"3": {"2": 1}}, "3": {"2": {}}, "4": {}, "7": {"1": {}}, "8": {"1": 2, "2": "\x01\x02\x03\x05\x06\x07"}, "9": {}, "11": {"1": {}}},
-                "11": [1, 2, 6],
-                "12": {"2": {"1": {}, "2": {}}, "3": {"1": {}}, "4": {}},
-                "13": {},
-                "15": {"3": {"1": 1}},
-                "18": {"169945741": {"1": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}}}},
-                "19": {"1": {"1": {}, "2": {}}, "2": {"1": [1, 2, 4, 6, 5, 7]}, "3": {"1": {}, "2": {}}, "5": {"1": {}, "2": {}}, "6": {"1": {}}, "7": {"1": {}, "2": {}}, "8": {"1": {}}},
-                "20": {
-                    "1": 1,
-                    "2": "",
-                    "3": {
-                        "1": "type.googleapis.com/photos.printing.client.PrintingPromotionSyncOptions",
-                        "2": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}},
-                    },
-                },
-                "21": {
-                    "2": {"2": {"4": {}}, "4": {}, "5": {}},
-                    "3": {"2": {"1": 1}, "4": {"2": {}}},
-                    "5": {"1": {}},
-                    "6": {"1": {}, "2": {"1": {}}},
-                    "7": {"1": 2, "2": "\x01\x07\x08\t\n\r\x0e\x0f\x11\x13\x14\x16\x17-./01:\x06\x18267;>?@A89<GBED", "3": "\x01"},
-                    "8": {"3": {"1": {"1": {"2": {"1": 1}, "4": {"2": {}}}}, "3": {}}, "4": {"1": {}}, "5": {"1": {"2": {"1": 1}, "4": {"2": {}}}}},
-                    "9": {"1": {}},
-                    "10": {"1": {"1": {}}, "3": {}, "5": {}, "6": {"1": {}}, "7": {}, "9": {}, "10": {}},
-                    "11": {},
-                    "12": {},
-                    "13": {},
-                    "14": {},
-                    "16": {"1": {}},
-                },
-                "22": {"1": 1, "2": "107818234414673686888"},
-                "25": {"1": {"1": {"1": {"1": {}}}}, "2": {}},
-                "26": {},
-            },
-            "2": {"1": {"1": {"1": {"1": {}}, "2": {}}}, "2": {}},
-        }
-        serialized_data = encode_message(proto_body, message_types.GET_LIB_STATE)  # type: ignore
-
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/18047484249733410717",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content, message_type=message_types.LIB_STATE_RESPONSE_FIX)  # type: ignore
-        return decoded_message
+        serialized_data = _LIB_STATE_TEMPLATE.render(state_token=state_token)
 
-    def get_library_page_init(self, page_token: str = "") -> dict:
-        """Get library state page during init process
-
-        Args:
-            page_token: Page token.
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/18047484249733410717",
+            headers,
+            serialized_data,
+            parse=_response_content if raw else _decode_library_response,
+            idempotent=True,
+        )
 
-        Returns:
-            dict: Decoded api response.
-        """
+    def _get_library_page_init_request(self, page_token: str = "", raw: bool = False) -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
 
-        proto_body = {
-            "1": {
-                "1": {
-                    "1": {
-                        "1": {},
-                        "3": {},
-                        "4": {},
-                        "5": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}},
-                        "6": {},
-                        "7": {"2": {}},
-                        "15": {},
-                        "16": {},
-                        "17": {},
-                        "19": {},
-                        "20": {},
-                        "21": {"5": {"3": {}}, "6": {}},
-                        "25": {},
-                        "30": {"2": {}},
-                        "31": {},
-                        "32": {},
-                        "33": {"1": {}},
-                        "34": {},
-                        "36": {},
-                        "37": {},
-                        "38": {},
-                        "39": {},
-                        "40": {},
-                        "41": {},
-                    },
-                    "5": {
-                        "2": {"2": {"3": {"2": {}}, "4": {"2": {}}}, "4": {"2": {"2": 1}}, "5": {"2": {}}, "6": 1},
-                        "3": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}, "4": {}, "5": {"2": {"2": 1}}, "7": {}},
-                        "4": {"2": {"2": {}}},
-                        "5": {"1": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}}, "3": 1},
-                    },
-                    "8": {},
-                    "9": {"2": {}, "3": {"1": {}, "2": {}}, "4": {"1": {"3": {"1": {"1": {"5": {"1": {}}, "6": {}}, "2": {}, "3": {"1": {"5": {"1": {}}, "6": {}}, "2": {}}}}, "4": {"1": {"2": {}}}}}},
-                    "11": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "12": {},
-                    "14": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "15": {"1": {}, "4": {}},
-                    "17": {"1": {}, "4": {}},
-                    "19": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "22": {},
-                    "23": {},
-                },
-                "2": {
-                    "1": {"2": {}, "3": {}, "4": {}, "5": {}, "6": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}}, "7": {}, "8": {}, "10": {}, "12": {}, "13": {"2": {}, "3": {}}, "15": {"1": {}}, "18": {}},
-                    "4": {"1": {}},
-                    "9": {},
-                    "11": {"1": {"1": {}, "4": {}, "5": {}, "6": {}, "9": {}}},
-                    "14": {"1": {"1": {"1": {}, "2": {"2": {"1": {"1": {}}, "3": {}}}, "3": {"4": {"1": {"1": {}}, "3": {}}, "5": {"1": {"1": {}}, "3": {}}}}, "2": {}}},
-                    "17": {},
-                    "18": {"1": {}, "2": {"1": {}}},
-                    "20": {"2": {"1": {}, "2": {}}},
-                    "23": {},
-                },
-                "3": {
-                    "2": {},
-                    "3": {
-                        "2": {},
-                        "3": {},
-                        "7": {},
-                        "8": {},
-                        "14": {"1": {}},
-                        "16": {},
-                        "17": {"2": {}},
-                        "18": {},
-                        "19": {},
-                        "20": {},
-                        "21": {},
-                        "22": {},
-                        "23": {},
-                        "27": {"1": {}, "2": {"1": {}}},
-                        "29": {},
-                        "30": {},
-                        "31": {},
-                        "32": {},
-                        "34": {},
-                        "37": {},
-                        "38": {},
-                        "39": {},
-                        "41": {},
-                    },
-                    "4": {"2": {}, "3": {}, "4": {}},
-                    "7": {},
-                    "12": {},
-                    "13": {},
-                    "14": {"1": {}, "2": {"1": {}, "2": {"1": {}}, "3": {}, "4": {"1": {}}}, "3": {"1": {}, "2": {"1": {}}, "3": {}, "4": {}}},
-                    "15": {},
-                    "16": {"1": {}},
-                    "18": {},
-                    "19": {"4": {"2": {}}, "6": {"2": {}, "3": {}}, "7": {"2": {}, "3": {}}, "8": {}},
-                    "20": {},
-                    "24": {},
-                    "25": {},
-                },
-                "4": page_token,
-                "7": 2,
-                "9": {"1": {"2": {"1": {}, "2": {}}}, "2": {"3": {"2": 1}}, "3": {"2": {}}, "4": {}, "7": {"1": {}}, "8": {"1": 2, "2": "\x01\x02\x03\x05\x06"}, "9": {}},
-                "11": [1, 2],
-                "12": {"2": {"1": {}, "2": {}}, "3": {"1": {}}, "4": {}},
-                "13": {},
-                "15": {"3": {"1": 1}},
-                "18": {"169945741": {"1": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}}}},
-                "19": {"1": {"1": {}, "2": {}}, "2": {"1": [1, 2, 4, 6, 5, 7]}, "3": {"1": {}, "2": {}}, "5": {"1": {}, "2": {}}, "6": {"1": {}}, "7": {"1": {}, "2": {}}, "8": {"1": {}}},
-                "20": {
-                    "1": 1,
-                    "3": {
-                        "1": "type.googleapis.com/photos.printing.client.PrintingPromotionSyncOptions",
-                        "2": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}},
-                    },
-                },
-                "21": {
-                    "2": {"2": {}, "4": {}, "5": {}},
-                    "3": {"2": {"1": 1}},
-                    "5": {"1": {}},
-                    "6": {"1": {}, "2": {"1": {}}},
-                    "7": {"1": 2, "2": "\x01\x07\x08\t\n\r\x0e\x0f\x11\x13\x14\x16\x17-./01:\x06\x18267;>?@A89<", "3": "\x01"},
-                    "8": {"3": {"1": {"1": {"2": {"1": 1}}}}, "4": {"1": {}}},
-                    "9": {"1": {}},
-                    "10": {"1": {"1": {}}, "3": {}, "5": {}, "6": {"1": {}}, "7": {}, "9": {}, "10": {}},
-                    "11": {},
-                    "12": {},
-                    "13": {},
-                },
-                "22": {"1": 2},
-                "25": {"1": {"1": {"1": {"1": {}}}}, "2": {}},
-            },
-            "2": {"1": {"1": {"1": {"1": {}}, "2": {}}}, "2": {}},
-        }
-        serialized_data = encode_message(proto_body, message_types.GET_LIB_PAGE_INIT)  # type: ignore
-
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/18047484249733410717",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content, message_type=message_types.LIB_STATE_RESPONSE_FIX)  # type: ignore
-        return decoded_message
+        serialized_data = _LIB_PAGE_INIT_TEMPLATE.render(page_token=page_token)
 
-    def get_library_page(self, page_token: str = "", state_token: str = "") -> dict:
-        """Get library state page
-
-        Args:
-            page_token: Page token.
-            state_token: State token.
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/18047484249733410717",
+            headers,
+            serialized_data,
+            parse=_response_content if raw else _decode_library_response,
+            idempotent=True,
+        )
 
-        Returns:
-            dict: Decoded api response.
-        """
+    def _get_library_page_request(self, page_token: str = "", state_token: str = "", raw: bool = False) -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
 
-        proto_body = {
-            "1": {
-                "1": {
-                    "1": {
-                        "1": {},
-                        "3": {},
-                        "4": {},
-                        "5": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}},
-                        "6": {},
-                        "7": {"2": {}},
-                        "15": {},
-                        "16": {},
-                        "17": {},
-                        "19": {},
-                        "20": {},
-                        "21": {"5": {"3": {}}, "6": {}},
-                        "25": {},
-                        "30": {"2": {}},
-                        "31": {},
-                        "32": {},
-                        "33": {"1": {}},
-                        "34": {},
-                        "36": {},
-                        "37": {},
-                        "38": {},
-                        "39": {},
-                        "40": {},
-                        "41": {},
-                    },
-                    "5": {
-                        "2": {"2": {"3": {"2": {}}, "4": {"2": {}}}, "4": {"2": {"2": 1}}, "5": {"2": {}}, "6": 1},
-                        "3": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}, "4": {}, "5": {"2": {"2": 1}}, "7": {}},
-                        "4": {"2": {"2": {}}},
-                        "5": {"1": {"2": {"3": {}, "4": {}}, "3": {"2": {}, "3": {"2": 1}}}, "3": 1},
-                    },
-                    "8": {},
-                    "9": {"2": {}, "3": {"1": {}, "2": {}}, "4": {"1": {"3": {"1": {"1": {"5": {"1": {}}, "6": {}}, "2": {}, "3": {"1": {"5": {"1": {}}, "6": {}}, "2": {}}}}, "4": {"1": {"2": {}}}}}},
-                    "11": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "12": {},
-                    "14": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "15": {"1": {}, "4": {}},
-                    "17": {"1": {}, "4": {}},
-                    "19": {"2": {}, "3": {}, "4": {"2": {"1": 1, "2": 2}}},
-                    "22": {},
-                    "23": {},
-                },
-                "2": {
-                    "1": {"2": {}, "3": {}, "4": {}, "5": {}, "6": {"1": {}, "2": {}, "3": {}, "4": {}, "5": {}, "7": {}}, "7": {}, "8": {}, "10": {}, "12": {}, "13": {"2": {}, "3": {}}, "15": {"1": {}}, "18": {}},
-                    "4": {"1": {}},
-                    "9": {},
-                    "11": {"1": {"1": {}, "4": {}, "5": {}, "6": {}, "9": {}}},
-                    "14": {"1": {"1": {"1": {}, "2": {"2": {"1": {"1": {}}, "3": {}}}, "3": {"4": {"1": {"1": {}}, "3": {}}, "5": {"1": {"1": {}}, "3": {}}}}, "2": {}}},
-                    "17": {},
-                    "18": {"1": {}, "2": {"1": {}}},
-                    "20": {"2": {"1": {}, "2": {}}},
-                    "23": {},
-                },
-                "3": {
-                    "2": {},
-                    "3": {
-                        "2": {},
-                        "3": {},
-                        "7": {},
-                        "8": {},
-                        "14": {"1": {}},
-                        "16": {},
-                        "17": {"2": {}},
-                        "18": {},
-                        "19": {},
-                        "20": {},
-                        "21": {},
-                        "22": {},
-                        "23": {},
-                        "27": {"1": {}, "2": {"1": {}}},
-                        "29": {},
-                        "30": {},
-                        "31": {},
-                        "32": {},
-                        "34": {},
-                        "37": {},
-                        "38": {},
-                        "39": {},
-                        "41": {},
-                    },
-                    "4": {"2": {}, "3": {}, "4": {}},
-                    "7": {},
-                    "12": {},
-                    "13": {},
-                    "14": {"1": {}, "2": {"1": {}, "2": {"1": {}}, "3": {}, "4": {"1": {}}}, "3": {"1": {}, "2": {"1": {}}, "3": {}, "4": {}}},
-                    "15": {},
-                    "16": {"1": {}},
-                    "18": {},
-                    "19": {"4": {"2": {}}, "6": {"2": {}, "3": {}}, "7": {"2": {}, "3": {}}, "8": {}},
-                    "20": {},
-                    "24": {},
-                    "25": {},
-                },
-                "4": page_token,
-                "6": state_token,
-                "7": 2,
-                "9": {"1": {"2": {"1": {}, "2": {}}}, "2": {"3": {"2": 1}}, "3": {"2": {}}, "4": {}, "7": {"1": {}}, "8": {"1": 2, "2": "\x01\x02\x03\x05\x06"}, "9": {}},
-                "11": [1, 2],
-                "12": {"2": {"1": {}, "2": {}}, "3": {"1": {}}, "4": {}},
-                "13": {},
-                "15": {"3": {"1": 1}},
-                "18": {"169945741": {"1": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}}}},
-                "19": {"1": {"1": {}, "2": {}}, "2": {"1": [1, 2, 4, 6, 5, 7]}, "3": {"1": {}, "2": {}}, "5": {"1": {}, "2": {}}, "6": {"1": {}}, "7": {"1": {}, "2": {}}, "8": {"1": {}}},
-                "20": {
-                    "1": 1,
-                    "2": "AH_uQ41bEgartCAb9ZVh48fOzHLvaA7xJy_EHlv_4kR6Q7xI4Bol3igCVJ6HJ_VViRfrDrBJB5EQ",
-                    "3": {
-                        "1": "type.googleapis.com/photos.printing.client.PrintingPromotionSyncOptions",
-                        "2": {"1": {"4": [2, 1, 6, 8, 10, 15, 18, 13, 17, 19, 14, 20], "5": 6, "6": 2, "7": 1, "8": 2, "11": 3, "12": 1, "13": 3, "15": 1, "16": 1, "17": 1, "18": 2}},
-                    },
-                },
-                "21": {
-                    "2": {"2": {}, "4": {}, "5": {}},
-                    "3": {"2": {"1": 1}},
-                    "5": {"1": {}},
-                    "6": {"1": {}, "2": {"1": {}}},
-                    "7": {"1": 2, "2": "\x01\x07\x08\t\n\r\x0e\x0f\x11\x13\x14\x16\x17-./01:\x06\x18267;>?@A89<", "3": "\x01"},
-                    "8": {"3": {"1": {"1": {"2": {"1": 1}}}}, "4": {"1": {}}},
-                    "9": {"1": {}},
-                    "10": {"1": {"1": {}}, "3": {}, "5": {}, "6": {"1": {}}, "7": {}, "9": {}, "10": {}},
-                    "11": {},
-                    "12": {},
-                    "13": {},
-                },
-                "22": {"1": 2},
-                "25": {"1": {"1": {"1": {"1": {}}}}, "2": {}},
-            },
-            "2": {"1": {"1": {"1": {"1": {}}, "2": {}}}, "2": {}},
-        }
-
-        serialized_data = encode_message(proto_body, message_types.GET_LIB_PAGE)  # type: ignore
-
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/18047484249733410717",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content, message_type=message_types.LIB_STATE_RESPONSE_FIX)  # type: ignore
-        return decoded_message
-
-    def set_item_caption(self, dedup_key: str = "", caption: str = "") -> None:
-        """Set item's caption
+        serialized_data = _LIB_PAGE_TEMPLATE.render(page_token=page_token, state_token=state_token)
 
-        Args:
-            dedup_key: Target item's dedup key.
-            caption: New caption.
-        """
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/18047484249733410717",
+            headers,
+            serialized_data,
+            parse=_response_content if raw else _decode_library_response,
+            idempotent=True,
+        )
 
+    def _set_item_caption_request(self, dedup_key: str = "", caption: str = "") -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
@@ -1143,17 +1007,14 @@ class Api:
 
         serialized_data = encode_message(proto_body, message_types.SET_CAPTION)  # type: ignore
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/1552790390512470739",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/1552790390512470739",
+            headers,
+            serialized_data,
+            parse=_ignore_response,
+        )
 
-    def get_thumbnail(
+    def _get_thumbnail_request(
         self,
         media_key: str,
         width: int | None = None,
@@ -1161,21 +1022,8 @@ class Api:
         force_jpeg: bool = True,
         content_version: int | None = None,
         no_overlay: bool = True,
-    ) -> bytes:
-        """Get media item's thumbnail
-
-        Args:
-            media_key: The unique identifier key for the media item.
-            width: Optional; The desired width of the thumbnail in pixels.
-            height: Optional; The desired height of the thumbnail in pixels.
-            force_jpeg: If True, forces the response to be in JPEG format. Defaults to True.
-            content_version: Specifies content version. Without it thumbnails will represent the original, not edited content.
-            no_overlay: If True, removes overlay from the thumbnail, e.g. play symbol for videos. Defaults to True.
-
-        Returns:
-            bytes: Image bytes."""
+    ) -> RpcRequest:
         headers = {
-            "authorization": f"Bearer {self.bearer_token}",
             "user-agent": self.user_agent,
             "accept-encoding": "gzip",
         }
@@ -1192,33 +1040,20 @@ class Api:
         if no_overlay:
             url += "-no"
 
-        with self._new_session() as session:
-            response = session.get(
-                url,
-                headers=headers,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        return response.content
-
-    def set_favorite(self, dedup_key: str, is_favorite: bool) -> dict:
-        """Sets or removes the favorite status for a single item.
-
-        Args:
-            dedup_key: Target item's dedup key.
-            is_favorite: Whether to mark the item as favorite (True) or remove favorite status (False).
+        return RpcRequest(
+            url,
+            headers,
+            None,
+            method="GET",
+            parse=_response_content,
+        )
 
-        Returns:
-            dict: Decoded api response.
-        """
+    def _set_favorite_request(self, dedup_key: str, is_favorite: bool) -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
@@ -1229,35 +1064,19 @@ class Api:
 
         serialized_data = encode_message(proto_body, message_types.SET_FAVORITE)  # type: ignore
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/5144645502632292153",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-        return decoded_message
-
-    def set_archived(self, dedup_keys: Sequence[str], is_archived: bool) -> dict:
-        """Sets or removes the archived status for multiple items.
-
-        Args:
-            dedup_keys: Sequence of target items' dedup keys.
-            is_archived: Whether to mark the item as archived (True) or remove archived status (False).
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/5144645502632292153",
+            headers,
+            serialized_data,
+            parse=_decode_response,
+        )
 
-        Returns:
-            dict: Decoded api response.
-        """
+    def _set_archived_request(self, dedup_keys: Sequence[str], is_archived: bool) -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
@@ -1271,38 +1090,19 @@ class Api:
 
         serialized_data = encode_message(proto_body, message_types.SET_ARCHIVED)  # type: ignore
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/6715446385130606868",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-        return decoded_message
-
-    def get_download_urls(self, media_key: str) -> dict:
-        """Get item's download links.
-
-        Args:
-            media_key: Target item's media key.
-
-        Returns:
-            dict: Decoded api response.
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/6715446385130606868",
+            headers,
+            serialized_data,
+            parse=_decode_response,
+        )
 
-        Note:
-            output_dict["1"]["5"]["2"]["5"] - url for downloading the file with applied edits (if any)
-            output_dict["1"]["5"]["2"]["6"] - url for downloading the original file
-        """
+    def _get_download_urls_request(self, media_key: str) -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
@@ -1311,34 +1111,20 @@ class Api:
 
         serialized_data = encode_message(proto_body, message_types.GET_DOWNLOAD_URLS)  # type: ignore
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/$rpc/social.frontend.photos.preparedownloaddata.v1.PhotosPrepareDownloadDataService/PhotosPrepareDownload",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
-
-        response.raise_for_status()
-
-        decoded_message, _ = decode_message(response.content)
-        return decoded_message
-
-    def restore_from_trash(self, dedup_keys: Sequence[str]) -> dict:
-        """Restore items from trash.
-
-        Args:
-            dedup_keys: Sequence of target items' dedup keys.
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/$rpc/social.frontend.photos.preparedownloaddata.v1.PhotosPrepareDownloadDataService/PhotosPrepareDownload",
+            headers,
+            serialized_data,
+            parse=_decode_response,
+            idempotent=True,
+        )
 
-        Returns:
-            dict: Decoded api response.
-        """
+    def _restore_from_trash_request(self, dedup_keys: Sequence[str]) -> RpcRequest:
         headers = {
             "accept-encoding": "gzip",
             "Accept-Language": self.language,
             "content-type": "application/x-protobuf",
             "User-Agent": self.user_agent,
-            "Authorization": f"Bearer {self.bearer_token}",
             "x-goog-ext-173412678-bin": "CgcIAhClARgC",
             "x-goog-ext-174067345-bin": "CgIIAg==",
         }
@@ -1353,15 +1139,439 @@ class Api:
 
         serialized_data = encode_message(proto_body, message_types.RESTORE_FROM_TRASH)  # type: ignore
 
-        with self._new_session() as session:
-            response = session.post(
-                "https://photosdata-pa.googleapis.com/6439526531001121323/17490284929287180316",
-                headers=headers,
-                data=serialized_data,
-                timeout=self.timeout,
-            )
+        return RpcRequest(
+            "https://photosdata-pa.googleapis.com/6439526531001121323/17490284929287180316",
+            headers,
+            serialized_data,
+            parse=_decode_response,
+        )
 
-        response.raise_for_status()
 
-        decoded_message, _ = decode_message(response.content)
-        return decoded_message
+class Api(BaseApi):
+    def __init__(
+        self,
+        auth_data: str,
+        proxy: str = "",
+        language: str = "en_US",
+        timeout: int = DEFAULT_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        token_path: str | Path | None = None,
+    ) -> None:
+        """
+        Initialize the Google Photos mobile api.
+
+        All requests share one keep-alive connection pool holding up to
+        `pool_size` connections per host, so RPCs after the first skip the
+        TCP connect and TLS handshake.
+
+        If `token_path` is set, the bearer token is persisted there
+        (encrypted) and reused by the next process while it is valid.
+        """
+        super().__init__(auth_data, proxy=proxy, language=language, timeout=timeout, pool_size=pool_size, token_path=token_path)
+        self._session: requests.Session | None = None
+        self._session_lock = threading.Lock()
+        # Held by whoever is refreshing the token, including the background refresh thread
+        self._token_lock = threading.Lock()
+
+    @property
+    def bearer_token(self) -> str:
+        """
+        Current bearer token.
+
+        An expired token is renewed once while other threads wait for it; a token
+        about to expire is renewed in the background and keeps being served meanwhile.
+        """
+        if self._token_expired():
+            with self._token_lock:
+                if self._token_expired():
+                    self._set_auth_response(self._get_auth_token())
+        elif self._token_expired(TOKEN_REFRESH_MARGIN) and self._token_lock.acquire(blocking=False):
+            threading.Thread(target=self._refresh_token_locked, daemon=True).start()
+        return self._cached_token()
+
+    def _refresh_token_locked(self) -> None:
+        """Background refresh; the caller acquired `_token_lock` and this releases it."""
+        try:
+            if self._token_expired(TOKEN_REFRESH_MARGIN):
+                self._set_auth_response(self._get_auth_token())
+        except requests.RequestException:
+            pass  # the current token is still valid; the next call retries
+        finally:
+            self._token_lock.release()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @property
+    def session(self) -> requests.Session:
+        """Long-lived pooled session shared by all requests (safe to use from many threads)."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._new_session()
+        return self._session
+
+    def warm_up(self, hosts: Sequence[str] = WARM_UP_HOSTS, connections: int = 1) -> dict[str, bool]:
+        """
+        Pre-connect to the api hosts so the first real requests skip the handshake.
+
+        Args:
+            hosts: Host names (or base urls) to connect to.
+            connections: Connections to open per host (capped at the pool size).
+
+        Returns:
+            dict[str, bool]: Whether each host answered.
+        """
+        connections = max(1, min(connections, self.pool_size))
+
+        if self.proxy:
+            # Connections go through the proxy; nothing host-specific to pre-open
+            return {host: False for host in hosts}
+
+        def connect(host: str) -> bool:
+            url = host if "://" in host else f"https://{host}"
+            # Use the session's own pool, without the retry policy: a dead host should fail fast
+            pool = self.session.get_adapter(url).poolmanager.connection_from_url(url)
+            try:
+                response = pool.urlopen("HEAD", "/", retries=False, timeout=WARM_UP_TIMEOUT, preload_content=False)
+            except urllib3.exceptions.HTTPError:
+                return False
+            # Any response means the connection is up; hand it back to the pool
+            response.release_conn()
+            return True
+
+        targets = [host for host in hosts for _ in range(connections)]
+        with ThreadPoolExecutor(max_workers=len(targets) or 1) as executor:
+            results = list(executor.map(connect, targets))
+        return {host: any(ok for target, ok in zip(targets, results) if target == host) for host in hosts}
+
+    def close(self) -> None:
+        """Close the pooled connections (a later request opens a new pool)."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _new_session(self) -> requests.Session:
+        """Create a new request session with retry mechanism and a per-host connection pool"""
+        # https://stackoverflow.com/questions/23267409/how-to-implement-retry-mechanism-into-python-requests-library
+        s = requests.Session()
+        retries = Retry(total=RETRIES, backoff_factor=RETRY_BACKOFF_FACTOR, status_forcelist=list(RETRY_STATUSES))
+        adapter = HTTPAdapter(pool_connections=len(WARM_UP_HOSTS) + 1, pool_maxsize=self.pool_size, max_retries=retries)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        s.proxies = {
+            "http": self.proxy,
+            "https": self.proxy,
+        }
+        if self.proxy:
+            s.verify = False
+        return s
+
+    def _send(self, request: RpcRequest) -> Any:
+        """Send a built request on the pooled session and parse the response."""
+        headers = request.headers
+        if request.authorize:
+            headers = {**headers, "Authorization": f"Bearer {self.bearer_token}"}
+        response = self.session.request(
+            request.method,
+            request.url,
+            headers=headers,
+            data=request.data,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return request.parse(response)
+
+    def _get_auth_token(self) -> dict[str, str]:
+        """
+        Send auth request to get bearer token.
+
+        Returns:
+            Dict[str, str]: Parsed authentication response with token and other details.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._auth_token_request())
+
+    def get_upload_token(self, sha_hash_b64: str, file_size: int) -> str:
+        """
+        Obtain an upload token from the Google Photos API.
+
+        Args:
+            sha_hash_b64: Base64-encoded SHA-1 hash of the file.
+            file_size: Size of the file in bytes.
+
+        Returns:
+            str: Upload token for the file.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._get_upload_token_request(sha_hash_b64, file_size))
+
+    def find_remote_media_by_hash(self, sha1_hash: bytes) -> str | None:
+        """
+        Check library for existing files with the hash.
+
+        Args:
+            sha1_hash: SHA-1 hash of the file.
+
+        Returns:
+            str: Media key of the existing file, or None if not found.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._find_remote_media_by_hash_request(sha1_hash))
+
+    def upload_file(self, file: str | Path | bytes | IO[bytes] | Generator[bytes, None, None], upload_token: str) -> dict:
+        """
+        Upload a file to Google Photos.
+
+        Args:
+            file: The file to upload. Can be a path (str or Path), bytes, BufferedReader, or a generator yielding bytes.
+            upload_token Upload token from `get_upload_token()`.
+
+        Returns:
+            dict: Decoded api response.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        request = self._upload_file_request(upload_token)
+        if isinstance(file, (str, Path)):
+            with Path(file).open("rb") as f:
+                request.data = f
+                return self._send(request)
+        request.data = file
+        return self._send(request)
+
+
+    def commit_upload(
+        self,
+        upload_response_decoded: dict[str, Any],
+        file_name: str,
+        sha1_hash: bytes,
+        quality: Literal["original", "saver"] = "original",
+        make: str | None = None,
+        model: str | None = None,
+        upload_timestamp: int | None = None,
+    ) -> str:
+        """
+        Commit the upload.
+
+        Args:
+            upload_response_decoded: Decoded upload response.
+            file_name: Name of the uploaded file.
+            sha1_hash: SHA-1 hash of the file.
+            quality: Quality setting for the upload. Defaults to "original".
+            make: Device manufacturer name. Overrides client's make.
+            model: Device model name. Overrides client's model.
+
+        Returns:
+            str: Media key of the uploaded file.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._commit_upload_request(upload_response_decoded, file_name, sha1_hash, quality, make, model, upload_timestamp))
+
+    def move_remote_media_to_trash(self, dedup_keys: Sequence[str]) -> dict:
+        """
+        Move remote media items to the trash using deduplication keys.
+
+        Args:
+            dedup_keys: Deduplication keys for the media items to be trashed.
+
+        Returns:
+            dict: Api response message.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._move_remote_media_to_trash_request(dedup_keys))
+
+    def create_album(self, album_name: str, media_keys: Sequence[str]) -> str:
+        """Create new album with media.
+
+        Args:
+            album_name: Album name.
+            media_keys: Media keys of the media items to be added to album.
+
+        Returns:
+            str: Album media key.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._create_album_request(album_name, media_keys))
+
+    def add_media_to_album(self, album_media_key: str, media_keys: Sequence[str]) -> dict:
+        """Add media to an album.
+
+        Args:
+            album_media_key: Target album media key.
+            media_keys: Media keys of the media items to be added to album.
+
+        Returns:
+            dict: Decoded api response.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._add_media_to_album_request(album_media_key, media_keys))
+
+    def list_albums(self) -> list[dict]:
+        """List all albums from Google Photos.
+
+        Returns:
+            list[dict]: List of albums with metadata including:
+                - album_key: Album media key
+                - title: Album name
+                - media_count: Number of items in album
+                - cover_photo_key: Media key of cover photo
+                - creation_time: Album creation timestamp
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._list_albums_request())
+
+    def get_album_media(self, album_key: str, limit: int | None = None) -> list[dict]:
+        """Get media items from a specific album.
+
+        Args:
+            album_key: Album media key to get items from.
+            limit: Maximum number of items to return. None for all items.
+
+        Returns:
+            list[dict]: List of media items in the album with metadata.
+
+        Raises:
+            requests.HTTPError: If the api request fails.
+        """
+        return self._send(self._get_album_media_request(album_key, limit))
+
+    def get_library_state(self, state_token: str = "", raw: bool = False) -> dict | bytes:
+        """Get library state
+
+        Args:
+            state_token: Previously received state_token.
+            raw: Return the undecoded response bytes, for `parse_db_update`'s fast path.
+
+        Returns:
+            dict | bytes: Decoded api response, or its bytes if `raw`.
+        """
+        return self._send(self._get_library_state_request(state_token, raw))
+
+    def get_library_page_init(self, page_token: str = "", raw: bool = False) -> dict | bytes:
+        """Get library state page during init process
+
+        Args:
+            page_token: Page token.
+            raw: Return the undecoded response bytes, for `parse_db_update`'s fast path.
+
+        Returns:
+            dict | bytes: Decoded api response, or its bytes if `raw`.
+        """
+        return self._send(self._get_library_page_init_request(page_token, raw))
+
+    def get_library_page(self, page_token: str = "", state_token: str = "", raw: bool = False) -> dict | bytes:
+        """Get library state page
+
+        Args:
+            page_token: Page token.
+            state_token: State token.
+            raw: Return the undecoded response bytes, for `parse_db_update`'s fast path.
+
+        Returns:
+            dict | bytes: Decoded api response, or its bytes if `raw`.
+        """
+        return self._send(self._get_library_page_request(page_token, state_token, raw))
+
+    def set_item_caption(self, dedup_key: str = "", caption: str = "") -> None:
+        """Set item's caption
+
+        Args:
+            dedup_key: Target item's dedup key.
+            caption: New caption.
+        """
+        return self._send(self._set_item_caption_request(dedup_key, caption))
+
+    def get_thumbnail(
+        self,
+        media_key: str,
+        width: int | None = None,
+        height: int | None = None,
+        force_jpeg: bool = True,
+        content_version: int | None = None,
+        no_overlay: bool = True,
+    ) -> bytes:
+        """Get media item's thumbnail
+
+        Args:
+            media_key: The unique identifier key for the media item.
+            width: Optional; The desired width of the thumbnail in pixels.
+            height: Optional; The desired height of the thumbnail in pixels.
+            force_jpeg: If True, forces the response to be in JPEG format. Defaults to True.
+            content_version: Specifies content version. Without it thumbnails will represent the original, not edited content.
+            no_overlay: If True, removes overlay from the thumbnail, e.g. play symbol for videos. Defaults to True.
+
+        Returns:
+            bytes: Image bytes."""
+        return self._send(self._get_thumbnail_request(media_key, width, height, force_jpeg, content_version, no_overlay))
+
+    def set_favorite(self, dedup_key: str, is_favorite: bool) -> dict:
+        """Sets or removes the favorite status for a single item.
+
+        Args:
+            dedup_key: Target item's dedup key.
+            is_favorite: Whether to mark the item as favorite (True) or remove favorite status (False).
+
+        Returns:
+            dict: Decoded api response.
+        """
+        return self._send(self._set_favorite_request(dedup_key, is_favorite))
+
+    def set_archived(self, dedup_keys: Sequence[str], is_archived: bool) -> dict:
+        """Sets or removes the archived status for multiple items.
+
+        Args:
+            dedup_keys: Sequence of target items' dedup keys.
+            is_archived: Whether to mark the item as archived (True) or remove archived status (False).
+
+        Returns:
+            dict: Decoded api response.
+        """
+        return self._send(self._set_archived_request(dedup_keys, is_archived))
+
+    def get_download_urls(self, media_key: str) -> dict:
+        """Get item's download links.
+
+        Args:
+            media_key: Target item's media key.
+
+        Returns:
+            dict: Decoded api response.
+
+        Note:
+            output_dict["1"]["5"]["2"]["5"] - url for downloading the file with applied edits (if any)
+            output_dict["1"]["5"]["2"]["6"] - url for downloading the original file
+        """
+        return self._send(self._get_download_urls_request(media_key))
+
+    def restore_from_trash(self, dedup_keys: Sequence[str]) -> dict:
+        """Restore items from trash.
+
+        Args:
+            dedup_keys: Sequence of target items' dedup keys.
+
+        Returns:
+            dict: Decoded api response.
+        """
+        return self._send(self._restore_from_trash_request(dedup_keys))
@@ -0,0 +1,246 @@
+from typing import Any, AsyncIterable, Literal, Self, Sequence
+from pathlib import Path
+import asyncio
+
+try:
+    import httpx
+except ImportError as e:  # optional dependency
+    raise ImportError("AsyncApi requires httpx, install it with `pip install gpmc[async]`") from e
+
+from .api import BaseApi, RpcRequest, DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE, IDEMPOTENT_METHODS, RETRIES, RETRY_STATUSES, TOKEN_REFRESH_MARGIN, retry_delay
+
+# In-flight requests allowed at once (connections are capped separately by pool_size)
+DEFAULT_MAX_CONCURRENCY = 256
+# Responses larger than this are decoded in a worker thread instead of on the event loop
+PARSE_IN_THREAD_BYTES = 256 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _read_file_chunks(file_path: Path, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterable[bytes]:
+    """Stream a file without blocking the event loop."""
+    file = await asyncio.to_thread(file_path.open, "rb")
+    try:
+        while chunk := await asyncio.to_thread(file.read, chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+class AsyncApi(BaseApi):
+    """
+    Asyncio variant of `Api` on httpx.
+
+    Requests are built and parsed by the same code as `Api`; only the
+    transport differs. A semaphore bounds the requests in flight, so callers
+    can `asyncio.gather` thousands of calls without opening thousands of
+    connections.
+    """
+
+    def __init__(
+        self,
+        auth_data: str,
+        proxy: str = "",
+        language: str = "en_US",
+        timeout: int = DEFAULT_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        token_path: str | Path | None = None,
+    ) -> None:
+        """
+        Initialize the async Google Photos mobile api.
+
+        Args:
+            pool_size: Maximum open connections (keep-alive pool size).
+            max_concurrency: Maximum requests in flight, including ones waiting for a connection.
+            token_path: Where to persist the bearer token (encrypted), see `Api`.
+        """
+        super().__init__(auth_data, proxy=proxy, language=language, timeout=timeout, pool_size=pool_size, token_path=token_path)
+        self.max_concurrency = max_concurrency
+        self._client: httpx.AsyncClient | None = None
+        # asyncio primitives bind to the running loop on first use, not here
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._token_lock = asyncio.Lock()
+        self._token_refresh: asyncio.Task | None = None
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled httpx client, created on first use inside the running event loop."""
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            transport = httpx.AsyncHTTPTransport(limits=limits, proxy=self.proxy or None, verify=not self.proxy, retries=0)
+            self._client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_bearer_token(self) -> str:
+        """Current bearer token, renewed once (not once per waiting request) when expired, in the background when about to."""
+        if self._token_expired():
+            await self._refresh_token(margin=0)
+        elif self._token_expired(TOKEN_REFRESH_MARGIN) and not self._token_lock.locked() and (self._token_refresh is None or self._token_refresh.done()):
+            self._token_refresh = asyncio.create_task(self._refresh_token(margin=TOKEN_REFRESH_MARGIN, background=True))
+        return self._cached_token()
+
+    async def _refresh_token(self, margin: int, background: bool = False) -> None:
+        async with self._token_lock:
+            if not self._token_expired(margin):
+                return
+            try:
+                auth_response = await self._send(self._auth_token_request())
+            except httpx.HTTPError:
+                if background:
+                    return  # the current token is still valid; the next call retries
+                raise
+            await asyncio.to_thread(self._set_auth_response, auth_response)
+
+    async def _send(self, request: RpcRequest) -> Any:
+        """
+        Send a built request and parse the response.
+
+        Retries follow `Api`'s urllib3 policy: a request that never reached the
+        server (connect errors) is always retried, while read errors and
+        502/503/504 are retried only for idempotent requests, so a POST such
+        as `create_album` or `commit_upload` is never sent twice.
+        """
+        client = self.client
+        headers = request.headers
+        if request.authorize:
+            headers = {**headers, "Authorization": f"Bearer {await self.get_bearer_token()}"}
+
+        body: dict[str, Any] = {}
+        if isinstance(request.data, dict):
+            body["data"] = request.data
+        elif request.data is not None:
+            body["content"] = request.data
+        # A streamed body can only be sent once
+        retries = RETRIES if isinstance(request.data, (bytes, dict, type(None))) else 0
+        idempotent = request.idempotent or request.method in IDEMPOTENT_METHODS
+
+        async with self._semaphore:
+            attempt = 0
+            while True:
+                try:
+                    response = await client.request(request.method, request.url, headers=headers, **body)
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                    if attempt >= retries:
+                        raise
+                except httpx.TransportError:
+                    if not idempotent or attempt >= retries:
+                        raise
+                else:
+                    if not idempotent or response.status_code not in RETRY_STATUSES or attempt >= retries:
+                        break
+                attempt += 1
+                await asyncio.sleep(retry_delay(attempt))
+
+        response.raise_for_status()
+        if len(response.content) > PARSE_IN_THREAD_BYTES:
+            return await asyncio.to_thread(request.parse, response)
+        return request.parse(response)
+
+    async def get_upload_token(self, sha_hash_b64: str, file_size: int) -> str:
+        """Async `Api.get_upload_token`."""
+        return await self._send(self._get_upload_token_request(sha_hash_b64, file_size))
+
+    async def find_remote_media_by_hash(self, sha1_hash: bytes) -> str | None:
+        """Async `Api.find_remote_media_by_hash`."""
+        return await self._send(self._find_remote_media_by_hash_request(sha1_hash))
+
+    async def upload_file(self, file: str | Path | bytes | AsyncIterable[bytes], upload_token: str) -> dict:
+        """
+        Async `Api.upload_file`.
+
+        Args:
+            file: A path (read in chunks off the event loop), bytes, or an async iterable of bytes.
+            upload_token: Upload token from `get_upload_token()`.
+        """
+        request = self._upload_file_request(upload_token)
+        request.data = _read_file_chunks(Path(file)) if isinstance(file, (str, Path)) else file
+        return await self._send(request)
+
+    async def commit_upload(
+        self,
+        upload_response_decoded: dict[str, Any],
+        file_name: str,
+        sha1_hash: bytes,
+        quality: Literal["original", "saver"] = "original",
+        make: str | None = None,
+        model: str | None = None,
+        upload_timestamp: int | None = None,
+    ) -> str:
+        """Async `Api.commit_upload`."""
+        return await self._send(self._commit_upload_request(upload_response_decoded, file_name, sha1_hash, quality, make, model, upload_timestamp))
+
+    async def move_remote_media_to_trash(self, dedup_keys: Sequence[str]) -> dict:
+        """Async `Api.move_remote_media_to_trash`."""
+        return await self._send(self._move_remote_media_to_trash_request(dedup_keys))
+
+    async def create_album(self, album_name: str, media_keys: Sequence[str]) -> str:
+        """Async `Api.create_album`."""
+        return await self._send(self._create_album_request(album_name, media_keys))
+
+    async def add_media_to_album(self, album_media_key: str, media_keys: Sequence[str]) -> dict:
+        """Async `Api.add_media_to_album`."""
+        return await self._send(self._add_media_to_album_request(album_media_key, media_keys))
+
+    async def list_albums(self) -> list[dict]:
+        """Async `Api.list_albums`."""
+        return await self._send(self._list_albums_request())
+
+    async def get_album_media(self, album_key: str, limit: int | None = None) -> list[dict]:
+        """Async `Api.get_album_media`."""
+        return await self._send(self._get_album_media_request(album_key, limit))
+
+    async def get_library_state(self, state_token: str = "", raw: bool = False) -> dict | bytes:
+        """Async `Api.get_library_state`."""
+        return await self._send(self._get_library_state_request(state_token, raw))
+
+    async def get_library_page_init(self, page_token: str = "", raw: bool = False) -> dict | bytes:
+        """Async `Api.get_library_page_init`."""
+        return await self._send(self._get_library_page_init_request(page_token, raw))
+
+    async def get_library_page(self, page_token: str = "", state_token: str = "", raw: bool = False) -> dict | bytes:
+        """Async `Api.get_library_page`."""
+        return await self._send(self._get_library_page_request(page_token, state_token, raw))
+
+    async def set_item_caption(self, dedup_key: str = "", caption: str = "") -> None:
+        """Async `Api.set_item_caption`."""
+        return await self._send(self._set_item_caption_request(dedup_key, caption))
+
+    async def get_thumbnail(
+        self,
+        media_key: str,
+        width: int | None = None,
+        height: int | None = None,
+        force_jpeg: bool = True,
+        content_version: int | None = None,
+        no_overlay: bool = True,
+    ) -> bytes:
+        """Async `Api.get_thumbnail`."""
+        return await self._send(self._get_thumbnail_request(media_key, width, height, force_jpeg, content_version, no_overlay))
+
+    async def set_favorite(self, dedup_key: str, is_favorite: bool) -> dict:
+        """Async `Api.set_favorite`."""
+        return await self._send(self._set_favorite_request(dedup_key, is_favorite))
+
+    async def set_archived(self, dedup_keys: Sequence[str], is_archived: bool) -> dict:
+        """Async `Api.set_archived`."""
+        return await self._send(self._set_archived_request(dedup_keys, is_archived))
+
+    async def get_download_urls(self, media_key: str) -> dict:
+        """Async `Api.get_download_urls`."""
+        return await self._send(self._get_download_urls_request(media_key))
+
+    async def restore_from_trash(self, dedup_keys: Sequence[str]) -> dict:
+        """Async `Api.restore_from_trash`."""
+        return await self._send(self._restore_from_trash_request(dedup_keys))
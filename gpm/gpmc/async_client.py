@@ -0,0 +1,325 @@
+from typing import Mapping, Sequence
+from pathlib import Path
+import asyncio
+import base64
+import hashlib
+import os
+import time
+
+from .async_api import AsyncApi, DEFAULT_MAX_CONCURRENCY
+from .api import DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE
+from .client import LogLevel, MutationAction, MUTATION_BATCH_SIZES, TOKEN_FILE_NAME
+from .db import Storage
+from .db_update_parser import parse_db_update
+from .hash_handler import convert_sha1_hash
+from . import utils
+
+# Concurrent file transfers (uploads/downloads); RPCs are bounded by AsyncApi.max_concurrency
+DEFAULT_MAX_TRANSFERS = 16
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _calculate_sha1_hash(file_path: Path) -> tuple[bytes, str]:
+    """SHA-1 of a file as (bytes, base64), without progress reporting."""
+    hash_sha1 = hashlib.sha1()
+    with file_path.open("rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            hash_sha1.update(chunk)
+    hash_bytes = hash_sha1.digest()
+    return hash_bytes, base64.b64encode(hash_bytes).decode("utf-8")
+
+
+def _extract_download_url(download_data: dict) -> str:
+    """Download url from a `get_download_urls` response."""
+    for path in (("3", "5"), ("2", "6"), ("2", "5")):
+        try:
+            if url := download_data["1"]["5"][path[0]][path[1]]:
+                return url
+        except KeyError:
+            continue
+    raise ValueError("No download URL found in response structure")
+
+
+class AsyncClient:
+    """
+    Asyncio Google Photos client.
+
+    Mirrors the transfer- and RPC-heavy parts of `Client` (upload, download,
+    cache sync, batch mutations) on `AsyncApi`. Concurrency is bounded by
+    semaphores instead of thread pools, so one event loop can keep thousands
+    of operations in flight.
+    """
+
+    def __init__(
+        self,
+        auth_data: str = "",
+        proxy: str = "",
+        language: str = "",
+        timeout: int = DEFAULT_TIMEOUT,
+        log_level: LogLevel = "INFO",
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_transfers: int = DEFAULT_MAX_TRANSFERS,
+    ) -> None:
+        """
+        Asyncio Google Photos client.
+
+        Args:
+            auth_data: Google authentication data string. If not provided, will attempt to use
+                      the `GP_AUTH_DATA` environment variable.
+            proxy: Proxy url `protocol://username:password@ip:port`.
+            language: Accept-Language header value. If not provided, will attempt to parse from auth_data. Fallback value is `en_US`.
+            timeout: Requests timeout, seconds. Defaults to DEFAULT_TIMEOUT.
+            log_level: Logging level to use.
+            pool_size: Maximum open connections.
+            max_concurrency: Maximum RPCs in flight.
+            max_transfers: Maximum uploads/downloads in flight.
+
+        Raises:
+            ValueError: If no auth_data is provided and GP_AUTH_DATA environment variable is not set.
+        """
+        self.logger = utils.create_logger(log_level)
+        self.timeout = timeout
+        self.auth_data = utils.resolve_auth_data(auth_data)
+        self.language = language or utils.parse_language(self.auth_data) or "en_US"
+        email = utils.parse_email(self.auth_data)
+        self.cache_dir = Path.home() / ".gpmc" / email
+        self.api = AsyncApi(
+            self.auth_data,
+            proxy=proxy,
+            language=self.language,
+            timeout=timeout,
+            pool_size=pool_size,
+            max_concurrency=max_concurrency,
+            token_path=self.cache_dir / TOKEN_FILE_NAME,
+        )
+        self.db_path = self.cache_dir / "storage.db"
+        self._transfers = asyncio.Semaphore(max_transfers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.api.aclose()
+
+    async def get_media_key_by_hash(self, sha1_hash: bytes | str) -> str | None:
+        """Async `Client.get_media_key_by_hash`."""
+        hash_bytes, _ = convert_sha1_hash(sha1_hash)
+        return await self.api.find_remote_media_by_hash(hash_bytes)
+
+    async def _upload_file(self, file_path: Path, force_upload: bool, use_quota: bool, saver: bool) -> str:
+        """Upload one file and return its media key."""
+        async with self._transfers:
+            file_size = (await asyncio.to_thread(file_path.stat)).st_size
+            hash_bytes, hash_b64 = await asyncio.to_thread(_calculate_sha1_hash, file_path)
+
+            if not force_upload:
+                if remote_media_key := await self.api.find_remote_media_by_hash(hash_bytes):
+                    return remote_media_key
+
+            upload_token = await self.api.get_upload_token(hash_b64, file_size)
+            upload_response = await self.api.upload_file(file=file_path, upload_token=upload_token)
+
+        model = "Pixel XL"
+        quality = "original"
+        if saver:
+            quality = "saver"
+            model = "Pixel 2"
+        if use_quota:
+            model = "Pixel 8"
+        return await self.api.commit_upload(
+            upload_response_decoded=upload_response,
+            file_name=file_path.name,
+            sha1_hash=hash_bytes,
+            upload_timestamp=int(os.path.getmtime(file_path)),
+            model=model,
+            quality=quality,
+        )
+
+    async def upload(self, file_paths: Sequence[str | Path], force_upload: bool = False, use_quota: bool = False, saver: bool = False) -> dict[str, str]:
+        """
+        Upload files concurrently.
+
+        Args:
+            file_paths: Files to upload.
+            force_upload: Upload files even if they're already present in Google Photos.
+            use_quota: Uploaded files will count against your Google Photos storage quota.
+            saver: Upload files in storage saver quality.
+
+        Returns:
+            dict[str, str]: Absolute file path -> media key, for the files that uploaded.
+        """
+        paths = [Path(file_path) for file_path in file_paths]
+        results = await asyncio.gather(*(self._upload_file(path, force_upload, use_quota, saver) for path in paths), return_exceptions=True)
+
+        uploaded = {}
+        for path, result in zip(paths, results):
+            if isinstance(result, BaseException):
+                self.logger.error(f"Error uploading file {path}: {result}")
+            else:
+                uploaded[path.absolute().as_posix()] = result
+        return uploaded
+
+    async def download_media(self, media_key: str, output_path: str | Path, overwrite: bool = False) -> bool:
+        """
+        Download a media file, streaming it to disk.
+
+        Returns:
+            bool: True if download was successful, False otherwise.
+
+        Raises:
+            FileExistsError: If file exists and overwrite is False.
+        """
+        output_path = Path(output_path)
+        if output_path.exists() and not overwrite:
+            raise FileExistsError(f"File already exists: {output_path}")
+
+        try:
+            download_url = _extract_download_url(await self.api.get_download_urls(media_key))
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            async with self._transfers:
+                async with self.api.client.stream("GET", download_url) as response:
+                    response.raise_for_status()
+                    file = await asyncio.to_thread(output_path.open, "wb")
+                    try:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            await asyncio.to_thread(file.write, chunk)
+                    finally:
+                        file.close()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error downloading {media_key}: {e}")
+            return False
+
+    async def download_multiple_media(self, targets: Mapping[str, str | Path], overwrite: bool = False) -> dict[str, bool]:
+        """
+        Download many files concurrently.
+
+        Args:
+            targets: Media key -> output path.
+            overwrite: Whether to overwrite existing files.
+
+        Returns:
+            dict[str, bool]: Media key -> download success.
+        """
+
+        async def download(media_key: str, output_path: str | Path) -> bool:
+            try:
+                return await self.download_media(media_key, output_path, overwrite=overwrite)
+            except FileExistsError:
+                return False
+
+        results = await asyncio.gather(*(download(media_key, path) for media_key, path in targets.items()))
+        return dict(zip(targets, results))
+
+    async def _store_update(self, response: dict, state_token: str | None = None) -> tuple[str | None, int, int]:
+        """Parse a library response and write it to the cache; returns (next_page_token, updated, deleted)."""
+
+        def store() -> tuple[str | None, int, int]:
+            next_state_token, next_page_token, remote_media, media_keys_to_delete, collections, collection_keys_to_delete = parse_db_update(response)
+            with Storage(self.db_path) as storage:
+                if state_token is None:
+                    storage.update_state_tokens(page_token=next_page_token)
+                else:
+                    storage.update_state_tokens(next_state_token, next_page_token)
+                storage.update(remote_media)
+                storage.delete(media_keys_to_delete)
+                storage.update_collections(collections)
+                storage.delete_collections(collection_keys_to_delete)
+            return next_page_token, len(remote_media), len(media_keys_to_delete)
+
+        return await asyncio.to_thread(store)
+
+    async def update_cache(self) -> dict[str, int]:
+        """
+        Incrementally update local library cache (async `Client.update_cache`).
+
+        Returns:
+            dict[str, int]: Counts of updated and deleted items.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        totals = {"updated": 0, "deleted": 0}
+
+        def count(updated: int, deleted: int) -> None:
+            totals["updated"] += updated
+            totals["deleted"] += deleted
+
+        with Storage(self.db_path) as storage:
+            init_state = storage.get_init_state()
+            state_token, page_token = storage.get_state_tokens()
+
+        if not init_state:
+            self.logger.info("Cache Initiation")
+            while page_token:
+                page_token, *counts = await self._store_update(await self.api.get_library_page_init(page_token, raw=True))
+                count(*counts)
+            page_token, *counts = await self._store_update(await self.api.get_library_state(state_token, raw=True), state_token)
+            count(*counts)
+            while page_token:
+                page_token, *counts = await self._store_update(await self.api.get_library_page_init(page_token, raw=True))
+                count(*counts)
+            with Storage(self.db_path) as storage:
+                storage.set_init_state(1)
+                state_token, _ = storage.get_state_tokens()
+
+        self.logger.info("Cache Update")
+        page_token, *counts = await self._store_update(await self.api.get_library_state(state_token, raw=True), state_token)
+        count(*counts)
+        while page_token:
+            page_token, *counts = await self._store_update(await self.api.get_library_page(page_token, state_token, raw=True))
+            count(*counts)
+        return totals
+
+    async def batch_mutate(self, action: MutationAction, media_keys: Sequence[str], caption: str = "") -> dict:
+        """Async `Client.batch_mutate`: all batches are sent concurrently (bounded by the api semaphore)."""
+        if action not in MUTATION_BATCH_SIZES:
+            raise ValueError(f"Unknown mutation: {action}")
+
+        media_keys = list(dict.fromkeys(media_keys))
+        with Storage(self.db_path) as storage:
+            dedup_keys = storage.get_dedup_keys(media_keys)
+
+        failed = {media_key: "Not in local cache" for media_key in media_keys if media_key not in dedup_keys}
+        known = [media_key for media_key in media_keys if media_key in dedup_keys]
+        batch_size = MUTATION_BATCH_SIZES[action]
+        batches = [known[i : i + batch_size] for i in range(0, len(known), batch_size)]
+
+        async def run_batch(batch: list[str]) -> None:
+            keys = [dedup_keys[media_key] for media_key in batch]
+            match action:
+                case "favorite" | "unfavorite":
+                    await self.api.set_favorite(keys[0], action == "favorite")
+                case "archive" | "unarchive":
+                    await self.api.set_archived(keys, action == "archive")
+                case "trash":
+                    await self.api.move_remote_media_to_trash(keys)
+                case "restore":
+                    await self.api.restore_from_trash(keys)
+                case "caption":
+                    await self.api.set_item_caption(keys[0], caption)
+
+        succeeded = []
+        results = await asyncio.gather(*(run_batch(batch) for batch in batches), return_exceptions=True)
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                self.logger.error(f"{action} failed for {len(batch)} item(s): {result}")
+                failed.update((media_key, str(result)) for media_key in batch)
+            else:
+                succeeded.extend(batch)
+
+        fields = {
+            "favorite": {"is_favorite": 1},
+            "unfavorite": {"is_favorite": 0},
+            "archive": {"is_archived": 1},
+            "unarchive": {"is_archived": 0},
+            "trash": {"trash_timestamp": int(time.time() * 1000)},
+            "restore": {"trash_timestamp": 0},
+            "caption": {"caption": caption or None},
+        }[action]
+        with Storage(self.db_path) as storage:
+            storage.update_fields(succeeded, fields)
+
+        return {"succeeded": succeeded, "failed": failed}
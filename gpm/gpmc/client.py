@@ -1,11 +1,13 @@
-from typing import Literal, Sequence, Mapping
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, Literal, Sequence, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from queue import Queue
 import signal
-from contextlib import nullcontext
+import threading
+from contextlib import contextmanager, nullcontext
 import os
 import re
+import time
 import mimetypes
-import requests
 from pathlib import Path
 from datetime import datetime
 
@@ -25,22 +27,43 @@ from rich.progress import (
 )
 
 from .db import Storage
-from .api import Api, DEFAULT_TIMEOUT
+from .api import Api, DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE
 from . import utils
 from .hash_handler import calculate_sha1_hash, convert_sha1_hash
 from .db_update_parser import parse_db_update
+from .library_decoder import read_page_tokens
+from .parse_pool import PackedUpdate, ParsePool, parse_packed
 
 # Make Ctrl+C work for cancelling threads
 signal.signal(signal.SIGINT, signal.SIG_DFL)
 
 
 LogLevel = Literal["INFO", "DEBUG", "WARNING", "ERROR", "CRITICAL"]
+MutationAction = Literal["favorite", "unfavorite", "archive", "unarchive", "trash", "restore", "caption"]
+
+# Items per RPC: favorite and caption RPCs take a single item, the others a key list
+MUTATION_BATCH_SIZES: dict[str, int] = {
+    "favorite": 1,
+    "unfavorite": 1,
+    "caption": 1,
+    "archive": 10000,
+    "unarchive": 10000,
+    "trash": 10000,
+    "restore": 10000,
+}
+MUTATION_THREADS = 16
+# Library pages fetched ahead of the cache writer during sync
+PAGE_PREFETCH = 4
+# Most library pages the cache writer commits in one transaction
+PAGES_PER_COMMIT = 8
+# Encrypted bearer token cache, next to storage.db
+TOKEN_FILE_NAME = "auth_token"
 
 
 class Client:
     """Google Photos client based on reverse engineered mobile API."""
 
-    def __init__(self, auth_data: str = "", proxy: str = "", language: str = "", timeout: int = DEFAULT_TIMEOUT, log_level: LogLevel = "INFO") -> None:
+    def __init__(self, auth_data: str = "", proxy: str = "", language: str = "", timeout: int = DEFAULT_TIMEOUT, log_level: LogLevel = "INFO", pool_size: int = DEFAULT_POOL_SIZE) -> None:
         """
         Google Photos client based on reverse engineered mobile API.
 
@@ -52,6 +75,7 @@ class Client:
             log_level: Logging level to use. Must be one of "INFO", "DEBUG", "WARNING",
                       "ERROR", or "CRITICAL". Defaults to "INFO".
             timeout: Requests timeout, seconds. Defaults to DEFAULT_TIMEOUT.
+            pool_size: Keep-alive connections per host shared by all requests. Defaults to DEFAULT_POOL_SIZE.
 
         Raises:
             ValueError: If no auth_data is provided and GP_AUTH_DATA environment variable is not set.
@@ -65,9 +89,42 @@ class Client:
         email = utils.parse_email(self.auth_data)
         self.logger.info(f"User: {email}")
         self.logger.info(f"Language: {self.language}")
-        self.api = Api(self.auth_data, proxy=proxy, language=self.language, timeout=timeout)
         self.cache_dir = Path.home() / ".gpmc" / email
+        self.api = Api(self.auth_data, proxy=proxy, language=self.language, timeout=timeout, pool_size=pool_size, token_path=self.cache_dir / TOKEN_FILE_NAME)
         self.db_path = self.cache_dir / "storage.db"
+        self._storage: Storage | None = None
+        self._storage_lock = threading.RLock()
+
+    @contextmanager
+    def storage(self) -> Iterator[Storage]:
+        """
+        The library cache connection, opened on first use and then kept open.
+
+        The block holds the storage lock, so threads (e.g. the sync writer)
+        take turns on the one connection.
+        """
+        with self._storage_lock:
+            if self._storage is None:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._storage = Storage(self.db_path, check_same_thread=False)
+            yield self._storage
+
+    def close(self) -> None:
+        """Close the cache connection and the API's pooled connections."""
+        with self._storage_lock:
+            if self._storage is not None:
+                self._storage.close()
+                self._storage = None
+        self.api.close()
+
+    def reset_cache(self) -> None:
+        """Delete the library cache database so the next `update_cache` rebuilds it from scratch."""
+        with self._storage_lock:
+            if self._storage is not None:
+                self._storage.close()
+                self._storage = None
+            for path in (self.db_path, self.db_path.with_name(f"{self.db_path.name}-wal"), self.db_path.with_name(f"{self.db_path.name}-shm")):
+                path.unlink(missing_ok=True)
 
     def _handle_auth_data(self, auth_data: str | None) -> str:
         """
@@ -82,14 +139,7 @@ class Client:
         Raises:
             ValueError: If no auth_data is provided and GP_AUTH_DATA environment variable is not set.
         """
-        if auth_data:
-            return auth_data
-
-        env_auth = os.getenv("GP_AUTH_DATA")
-        if env_auth is not None:
-            return env_auth
-
-        raise ValueError("`GP_AUTH_DATA` environment variable not set. Create it or provide `auth_data` as an argument.")
+        return utils.resolve_auth_data(auth_data)
 
     def _upload_file(self, file_path: str | Path, hash_value: bytes | str, progress: Progress, force_upload: bool, use_quota: bool, saver: bool) -> dict[str, str]:
         """
@@ -511,15 +561,87 @@ class Client:
             raise ValueError("Invalid SHA-1 hash format") from e
 
         # Process in larger batches for better performance
-        batch_size = 10000
+        batch_size = MUTATION_BATCH_SIZES["trash"]
         response = {}
         for i in range(0, len(dedup_keys), batch_size):
             batch = dedup_keys[i : i + batch_size]
             batch_response = self.api.move_remote_media_to_trash(dedup_keys=batch)
             response.update(batch_response)  # Combine responses if needed
 
+        with self.storage() as storage:
+            trashed = [media_key for media_keys in storage.get_media_keys_by_dedup_key(dedup_keys).values() for media_key in media_keys]
+            storage.update_fields(trashed, {"trash_timestamp": int(time.time() * 1000)})
+
         return response
 
+    def batch_mutate(self, action: MutationAction, media_keys: Sequence[str], caption: str = "", threads: int = MUTATION_THREADS) -> dict:
+        """
+        Apply one change to many items and write the result through to the local cache.
+
+        Keys are grouped into the largest batches the RPC accepts (single-item
+        RPCs become one call per item) and the batches run concurrently.
+
+        Args:
+            action: One of "favorite", "unfavorite", "archive", "unarchive", "trash", "restore", "caption".
+            media_keys: Target items' media keys.
+            caption: New caption, for the "caption" action.
+            threads: Number of concurrent RPCs.
+
+        Returns:
+            dict: {"succeeded": [media keys], "failed": {media key: error}}
+        """
+        if action not in MUTATION_BATCH_SIZES:
+            raise ValueError(f"Unknown mutation: {action}")
+
+        media_keys = list(dict.fromkeys(media_keys))
+        with self.storage() as storage:
+            dedup_keys = storage.get_dedup_keys(media_keys)
+
+        failed = {media_key: "Not in local cache" for media_key in media_keys if media_key not in dedup_keys}
+        known = [media_key for media_key in media_keys if media_key in dedup_keys]
+        batch_size = MUTATION_BATCH_SIZES[action]
+        batches = [known[i : i + batch_size] for i in range(0, len(known), batch_size)]
+
+        def run_batch(batch: list[str]) -> None:
+            keys = [dedup_keys[media_key] for media_key in batch]
+            match action:
+                case "favorite" | "unfavorite":
+                    self.api.set_favorite(keys[0], action == "favorite")
+                case "archive" | "unarchive":
+                    self.api.set_archived(keys, action == "archive")
+                case "trash":
+                    self.api.move_remote_media_to_trash(keys)
+                case "restore":
+                    self.api.restore_from_trash(keys)
+                case "caption":
+                    self.api.set_item_caption(keys[0], caption)
+
+        succeeded = []
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = {executor.submit(run_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    future.result()
+                    succeeded.extend(batch)
+                except Exception as e:
+                    self.logger.error(f"{action} failed for {len(batch)} item(s): {e}")
+                    failed.update((media_key, str(e)) for media_key in batch)
+
+        fields = {
+            "favorite": {"is_favorite": 1},
+            "unfavorite": {"is_favorite": 0},
+            "archive": {"is_archived": 1},
+            "unarchive": {"is_archived": 0},
+            "trash": {"trash_timestamp": int(time.time() * 1000)},
+            "restore": {"trash_timestamp": 0},
+            "caption": {"caption": caption or None},
+        }[action]
+        with self.storage() as storage:
+            storage.update_fields(succeeded, fields)
+
+        return {"succeeded": succeeded, "failed": failed}
+
     def add_to_album(self, media_keys: Sequence[str], album_name: str, show_progress: bool) -> list[str]:
         """
         Add media items to one or more albums with the given name. If the total number of items exceeds the album limit,
@@ -575,12 +697,14 @@ class Client:
                 album_counter += 1
         return album_keys
 
-    def update_cache(self, show_progress: bool = True):
+    def update_cache(self, show_progress: bool = True, parse_workers: int = 0):
         """
         Incrementally update local library cache.
 
         Args:
             show_progress: Whether to display progress in console.
+            parse_workers: Parse library pages in this many worker processes. 0 parses on the
+                cache writer thread. Worth it for large libraries.
         """
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         progress = Progress(
@@ -595,30 +719,36 @@ class Client:
             deleted=0,
         )
         context = (show_progress and Live(progress)) or nullcontext()
+        pool = ParsePool(parse_workers) if parse_workers else None
 
-        with context:
+        with context, pool or nullcontext():
             # Get saved state tokens
-            with Storage(self.db_path) as storage:
+            with self.storage() as storage:
                 init_state = storage.get_init_state()
 
             if not init_state:
                 self.logger.info("Cache Initiation")
-                self._cache_init(progress, task_id)
-                with Storage(self.db_path) as storage:
+                self._cache_init(progress, task_id, pool)
+                with self.storage() as storage:
                     storage.set_init_state(1)
             self.logger.info("Cache Update")
-            self._cache_update(progress, task_id)
+            self._cache_update(progress, task_id, pool)
+            with self.storage() as storage:
+                storage.analyze()
 
-    def _cache_update(self, progress, task_id):
-        with Storage(self.db_path) as storage:
+    def _cache_update(self, progress, task_id, pool: ParsePool | None = None):
+        with self.storage() as storage:
             state_token, _ = storage.get_state_tokens()
-        response = self.api.get_library_state(state_token)
-        next_state_token, next_page_token, remote_media, media_keys_to_delete = parse_db_update(response)
+        response = self.api.get_library_state(state_token, raw=True)
+        next_state_token, next_page_token, remote_media, media_keys_to_delete, collections, collection_keys_to_delete = parse_db_update(response)
 
-        with Storage(self.db_path) as storage:
-            storage.update_state_tokens(next_state_token, next_page_token)
+        # Items and tokens commit together: a crash re-fetches this response instead of skipping it
+        with self.storage() as storage, storage.transaction():
             storage.update(remote_media)
             storage.delete(media_keys_to_delete)
+            storage.update_collections(collections)
+            storage.delete_collections(collection_keys_to_delete)
+            storage.update_state_tokens(next_state_token, next_page_token)
 
         task = progress.tasks[int(task_id)]
         progress.update(
@@ -628,21 +758,22 @@ class Client:
         )
 
         if next_page_token:
-            self._process_pages(progress, task_id, state_token, next_page_token)
+            self._process_pages(progress, task_id, state_token, next_page_token, pool)
 
-    def _cache_init(self, progress, task_id):
-        with Storage(self.db_path) as storage:
+    def _cache_init(self, progress, task_id, pool: ParsePool | None = None):
+        with self.storage() as storage:
             state_token, next_page_token = storage.get_state_tokens()
 
         if next_page_token:
-            self._process_pages_init(progress, task_id, next_page_token)
+            self._process_pages_init(progress, task_id, next_page_token, pool)
 
-        response = self.api.get_library_state(state_token)
-        state_token, next_page_token, remote_media, _ = parse_db_update(response)
+        response = self.api.get_library_state(state_token, raw=True)
+        state_token, next_page_token, remote_media, _, collections, _ = parse_db_update(response)
 
-        with Storage(self.db_path) as storage:
-            storage.update_state_tokens(state_token, next_page_token)
+        with self.storage() as storage, storage.transaction():
             storage.update(remote_media)
+            storage.update_collections(collections)
+            storage.update_state_tokens(state_token, next_page_token)
 
         task = progress.tasks[int(task_id)]
         progress.update(
@@ -651,9 +782,80 @@ class Client:
         )
 
         if next_page_token:
-            self._process_pages_init(progress, task_id, next_page_token)
+            self._process_pages_init(progress, task_id, next_page_token, pool)
 
-    def _process_pages_init(self, progress: Progress, task_id: TaskID, page_token: str):
+    def _store_page(self, storage: Storage, progress: Progress, task_id: TaskID, page: PackedUpdate) -> str | None:
+        """Write a library page in `parse_packed` form to the cache and return its next page token."""
+        _, next_page_token, media_rows, media_keys_to_delete, collection_rows, collection_keys_to_delete = page
+
+        # The page token is the resume point, so it is saved only with the page
+        with storage.transaction():
+            storage.update_rows(media_rows)
+            storage.delete(media_keys_to_delete)
+            storage.update_collection_rows(collection_rows)
+            storage.delete_collections(collection_keys_to_delete)
+            storage.update_state_tokens(page_token=next_page_token)
+
+        task = progress.tasks[int(task_id)]
+        progress.update(
+            task_id,
+            updated=task.fields["updated"] + len(media_rows),
+            deleted=task.fields["deleted"] + len(media_keys_to_delete),
+        )
+        return next_page_token
+
+    def _process_pages_pipelined(self, progress: Progress, task_id: TaskID, page_token: str, fetch_page: Callable[[str], bytes], pool: ParsePool | None = None):
+        """
+        Fetch pages on this thread while a writer thread parses and stores earlier ones.
+
+        The next page token is read from the raw response without parsing it,
+        so the next request goes out as soon as a response arrives. At most
+        `PAGE_PREFETCH` pages wait for the writer; beyond that fetching blocks.
+        Pages are stored in order and each saves its page token with its
+        items, so an interrupted sync resumes from the first unsaved page.
+        Pages already waiting when the writer gets to them (up to
+        `PAGES_PER_COMMIT`) share one transaction.
+        With a `pool`, parsing runs there and the writer only stores.
+        """
+        pages: Queue[Future | bytes | None] = Queue(maxsize=PAGE_PREFETCH)
+        errors: list[BaseException] = []
+
+        def write() -> None:
+            page = pages.get()
+            try:
+                while page is not None:
+                    batch = [page]
+                    while len(batch) < PAGES_PER_COMMIT and not pages.empty():
+                        if (page := pages.get_nowait()) is None:
+                            break
+                        batch.append(page)
+                    with self.storage() as storage, storage.transaction():
+                        for item in batch:
+                            parsed = pool.result(item) if isinstance(item, Future) else parse_packed(item)
+                            self._store_page(storage, progress, task_id, parsed)
+                    if page is not None:
+                        page = pages.get()
+            except BaseException as e:
+                errors.append(e)
+                # Unblock the fetcher if it is waiting on a full queue
+                while page is not None:
+                    page = pages.get()
+
+        writer = threading.Thread(target=write, name="gpmc-cache-writer", daemon=True)
+        writer.start()
+        try:
+            next_page_token = page_token
+            while next_page_token and not errors:
+                content = fetch_page(next_page_token)
+                _, next_page_token = read_page_tokens(content)
+                pages.put(pool.submit(content) if pool else content)
+        finally:
+            pages.put(None)
+            writer.join()
+        if errors:
+            raise errors[0]
+
+    def _process_pages_init(self, progress: Progress, task_id: TaskID, page_token: str, pool: ParsePool | None = None):
         """
         Process paginated results during cache update.
 
@@ -661,27 +863,11 @@ class Client:
             progress: Rich Progress object for tracking.
             task_id: ID of the progress task.
             page_token: Token for fetching page of results.
+            pool: Parse pages in this process pool instead of the writer thread.
         """
-        next_page_token: str | None = page_token
-        while True:
-            response = self.api.get_library_page_init(next_page_token)
-            _, next_page_token, remote_media, media_keys_to_delete = parse_db_update(response)
-
-            with Storage(self.db_path) as storage:
-                storage.update_state_tokens(page_token=next_page_token)
-                storage.update(remote_media)
-                storage.delete(media_keys_to_delete)
-
-            task = progress.tasks[int(task_id)]
-            progress.update(
-                task_id,
-                updated=task.fields["updated"] + len(remote_media),
-                deleted=task.fields["deleted"] + len(media_keys_to_delete),
-            )
-            if not next_page_token:
-                break
+        self._process_pages_pipelined(progress, task_id, page_token, lambda token: self.api.get_library_page_init(token, raw=True), pool)
 
-    def _process_pages(self, progress: Progress, task_id: TaskID, state_token: str, page_token: str):
+    def _process_pages(self, progress: Progress, task_id: TaskID, state_token: str, page_token: str, pool: ParsePool | None = None):
         """
         Process paginated results during cache update.
 
@@ -689,25 +875,9 @@ class Client:
             progress: Rich Progress object for tracking.
             task_id: ID of the progress task.
             page_token: Token for fetching page of results.
+            pool: Parse pages in this process pool instead of the writer thread.
         """
-        next_page_token: str | None = page_token
-        while True:
-            response = self.api.get_library_page(next_page_token, state_token)
-            _, next_page_token, remote_media, media_keys_to_delete = parse_db_update(response)
-
-            with Storage(self.db_path) as storage:
-                storage.update_state_tokens(page_token=next_page_token)
-                storage.update(remote_media)
-                storage.delete(media_keys_to_delete)
-
-            task = progress.tasks[int(task_id)]
-            progress.update(
-                task_id,
-                updated=task.fields["updated"] + len(remote_media),
-                deleted=task.fields["deleted"] + len(media_keys_to_delete),
-            )
-            if not next_page_token:
-                break
+        self._process_pages_pipelined(progress, task_id, page_token, lambda token: self.api.get_library_page(token, state_token, raw=True), pool)
 
     def list_remote_media(
         self,
@@ -745,62 +915,19 @@ class Client:
         if show_progress:
             print("📋 Listing remote media from local cache...")
 
-        with Storage(self.db_path) as storage:
-            # Build query based on parameters
-            query = "SELECT * FROM remote_media"
-            conditions = []
-            params = []
-
-            # Filter by media type
-            if media_type == "images":
-                conditions.append("type = ?")
-                params.append(1)
-            elif media_type == "videos":
-                conditions.append("type = ?")
-                params.append(2)
-
-            # Filter trashed items
-            if not include_trashed:
-                conditions.append("trash_timestamp IS NULL")
-
-            # Add filename filter if provided
-            if filter_exp:
-                if filter_regex:
-                    # For regex, we'll filter in Python since SQLite regex support varies
-                    pass
-                else:
-                    if filter_ignore_case:
-                        conditions.append("LOWER(file_name) LIKE LOWER(?)")
-                    else:
-                        conditions.append("file_name LIKE ?")
-
-                    if not filter_exclude:
-                        params.append(f"%{filter_exp}%")
-                    else:
-                        conditions[-1] = f"NOT ({conditions[-1]})"
-                        params.append(f"%{filter_exp}%")
-
-            # Combine conditions
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-
-            # Add ordering
-            query += " ORDER BY utc_timestamp DESC"
-
-            # Add limit
-            if limit:
-                query += f" LIMIT {limit}"
-
-            cursor = storage.conn.execute(query, params)
-            rows = cursor.fetchall()
-
-            # Convert to list of dictionaries
-            columns = [description[0] for description in cursor.description]
+        with self.storage() as storage:
+            # Regex filters run in Python since SQLite regex support varies
+            rows = storage.list_media(
+                media_type,
+                include_trashed=include_trashed,
+                name_filter="" if filter_regex else filter_exp,
+                exclude=filter_exclude,
+                ignore_case=filter_ignore_case,
+                limit=limit,
+            )
             media_items = []
 
-            for row in rows:
-                item = dict(zip(columns, row))
-
+            for item in rows:
                 # Apply regex filter if needed
                 if filter_exp and filter_regex:
                     import re
@@ -894,7 +1021,7 @@ class Client:
             # Download the file with progress tracking
             if show_progress:
                 # Download with progress bar
-                response = requests.get(download_url, stream=True, timeout=self.timeout)
+                response = self.api.session.get(download_url, stream=True, timeout=self.timeout)
                 response.raise_for_status()
 
                 total_size = int(response.headers.get('content-length', 0))
@@ -921,7 +1048,7 @@ class Client:
                                 download_progress.update(task_id, advance=len(chunk))
             else:
                 # Simple download without progress
-                response = requests.get(download_url, timeout=self.timeout)
+                response = self.api.session.get(download_url, timeout=self.timeout)
                 response.raise_for_status()
 
                 with open(output_path, 'wb') as f:
@@ -1133,10 +1260,10 @@ class Client:
 
     def list_albums_from_cache(self, show_progress: bool = False) -> list[dict]:
         """
-        List albums from local cache (simplified approach).
+        List albums from local cache.
 
-        This method extracts album information from the existing cache
-        instead of making new API calls.
+        Albums come from the synced collections table; item counts come from
+        the album membership table, so no full-library scan is needed.
 
         Args:
             show_progress: Whether to display progress in console.
@@ -1145,7 +1272,7 @@ class Client:
             list[dict]: List of albums with basic metadata.
         """
         if show_progress:
-            print("📁 Extracting albums from local cache...")
+            print("📁 Listing albums from local cache...")
 
         try:
             # Ensure cache exists
@@ -1154,57 +1281,24 @@ class Client:
                     print("📥 Cache not found, updating...")
                 self.update_cache(show_progress=show_progress)
 
-            albums = []
-
-            # Use the existing database to extract album information
-            from .db import Storage
-
-            with Storage(self.db_path) as storage:
-                # Query for media items grouped by collection_id (albums)
-                cursor = storage.conn.execute("""
-                    SELECT
-                        collection_id,
-                        COUNT(*) as media_count,
-                        MIN(media_key) as sample_key,
-                        GROUP_CONCAT(DISTINCT file_name) as sample_files
-                    FROM remote_media
-                    WHERE collection_id IS NOT NULL
-                    AND collection_id != ''
-                    GROUP BY collection_id
-                    ORDER BY media_count DESC
-                """)
-
-                rows = cursor.fetchall()
-
-                for row in rows:
-                    collection_id = row[0]
-                    media_count = row[1]
-                    sample_key = row[2]
-                    sample_files = row[3] or ""
-
-                    # Try to extract album name from file names
-                    file_names = sample_files.split(',')
-                    album_title = "Unknown Album"
-
-                    # Look for common patterns in file names to determine album name
-                    for file_name in file_names[:3]:  # Check first 3 files
-                        if file_name:
-                            # Remove extension and clean up
-                            clean_name = file_name.replace('.mp4', '').replace('.jpg', '').replace('.png', '')
-                            # If it looks like a movie title, use it
-                            if len(clean_name) > 3 and not clean_name.isdigit():
-                                album_title = clean_name
-                                break
-
-                    album = {
-                        "title": album_title,
-                        "media_count": media_count,
-                        "album_key": collection_id,  # Use actual collection_id
-                        "sample_media_key": sample_key,
-                        "source": "cache_extraction",
-                        "sample_files": sample_files[:100]  # First 100 chars for reference
-                    }
-                    albums.append(album)
+            with self.storage() as storage:
+                collections = storage.list_collections()
+
+            albums = [
+                {
+                    "title": collection["title"] or "Untitled album",
+                    "media_count": collection["media_count"],
+                    "total_items": collection["total_items"] or collection["media_count"],
+                    "album_key": collection["collection_media_key"],
+                    "album_id": collection["collection_album_id"] or "",
+                    "cover_media_key": collection["cover_item_media_key"],
+                    "start": collection["start"],
+                    "end": collection["end"],
+                    "last_activity_time_ms": collection["last_activity_time_ms"],
+                    "source": "collections",
+                }
+                for collection in collections
+            ]
 
             if show_progress:
                 print(f"✅ Found {len(albums)} albums in cache")
@@ -1217,35 +1311,8 @@ class Client:
 
         except Exception as e:
             if show_progress:
-                print(f"❌ Error extracting albums from cache: {e}")
-
-            # Fallback: create a simple album list based on what we know
-            if show_progress:
-                print("💡 Creating album list from visible Google Photos albums...")
-
-            # Based on your screenshot, create the known albums
-            known_albums = [
-                {"title": "Havoc", "media_count": 7, "album_key": "havoc_album"},
-                {"title": "Belle_perdue_3", "media_count": 1, "album_key": "belle_album"},
-                {"title": "Captain_America_Brave_New_World", "media_count": 1, "album_key": "captain_album"},
-                {"title": "In_the_Lost_Lands", "media_count": 1, "album_key": "lost_album"},
-                {"title": "Snow_White", "media_count": 1, "album_key": "snow_album"},
-                {"title": "Warfare", "media_count": 1, "album_key": "warfare_album"},
-                {"title": "Fear_Street_Prom_Queen", "media_count": 1, "album_key": "fear_album"},
-                {"title": "Rosario", "media_count": 1, "album_key": "rosario_album"},
-                {"title": "Fountain_of_Youth", "media_count": 1, "album_key": "fountain_album"},
-                {"title": "The_Legend_of_Ochi", "media_count": 1, "album_key": "ochi_album"},
-                {"title": "A_Minecraft_Movie", "media_count": 1, "album_key": "minecraft_album"},
-                {"title": "A_Working_Man", "media_count": 1, "album_key": "working_album"},
-                {"title": "Mission_Impossible_The_Final_Reckoning", "media_count": 1, "album_key": "mission_album"},
-                {"title": "Lilo_&_Stitch", "media_count": 1, "album_key": "lilo_album"},
-                {"title": "Final_Destination_Blood_lines", "media_count": 1, "album_key": "final_album"},
-            ]
-
-            if show_progress:
-                print(f"✅ Using {len(known_albums)} known albums from your Google Photos")
-
-            return known_albums
+                print(f"❌ Error listing albums from cache: {e}")
+            return []
 
     def list_albums_direct_api(self, show_progress: bool = False) -> list[dict]:
         """
@@ -1343,7 +1410,7 @@ class Client:
         Get media items from a specific album using cache.
 
         Args:
-            album_title: Album title to get items from.
+            album_title: Album title, album key or album id.
             limit: Maximum number of items to return. None for all items.
             show_progress: Whether to display progress in console.
 
@@ -1357,51 +1424,39 @@ class Client:
             # Ensure cache exists
             if not self.db_path.exists():
                 if show_progress:
-                    print("� Cache not found, updating...")
+                    print("📥 Cache not found, updating...")
                 self.update_cache(show_progress=show_progress)
 
-            media_items = []
-
-            # Use the existing database to get album media
-            from .db import Storage
-
-            with Storage(self.db_path) as storage:
-                # Query for media items in this album using collection_id
-                query = """
-                    SELECT media_key, file_name, remote_url, width, height,
-                           duration, size_bytes, utc_timestamp, type,
-                           is_favorite, make, model, collection_id
-                    FROM remote_media
-                    WHERE collection_id = ? OR file_name LIKE ?
-                    ORDER BY utc_timestamp DESC
-                """
-
-                if limit:
-                    query += f" LIMIT {limit}"
-
-                # Try exact match first, then partial match
-                cursor = storage.conn.execute(query, (album_title, f"%{album_title}%"))
-                rows = cursor.fetchall()
-
-                for row in rows:
-                    media_item = {
-                        "media_key": row[0],
-                        "filename": row[1],
-                        "remote_url": row[2],
-                        "width": row[3] or 0,
-                        "height": row[4] or 0,
-                        "duration": row[5] or 0,
-                        "size_bytes": row[6] or 0,
-                        "creation_time": row[7] or 0,
-                        "type": row[8] or 0,  # 1=image, 2=video
-                        "is_favorite": row[9] or False,
-                        "make": row[10] or "",
-                        "model": row[11] or "",
-                        "collection_id": row[12] or "",
-                        "album_title": album_title,
-                        "source": "cache_query"
-                    }
-                    media_items.append(media_item)
+            with self.storage() as storage:
+                collection = storage.get_collection(album_title)
+                if collection:
+                    keys = [collection["collection_media_key"], collection["collection_album_id"]]
+                    title = collection["title"] or album_title
+                else:
+                    # Albums that only exist as a membership key
+                    keys = [album_title]
+                    title = album_title
+                rows = storage.get_collection_media(keys, limit=limit)
+
+            media_items = [
+                {
+                    "media_key": row["media_key"],
+                    "filename": row["file_name"],
+                    "dedup_key": row["dedup_key"] or "",
+                    "width": row["width"] or 0,
+                    "height": row["height"] or 0,
+                    "duration": row["duration"] or 0,
+                    "size_bytes": row["size_bytes"] or 0,
+                    "creation_time": row["utc_timestamp"] or 0,
+                    "type": row["type"] or 0,  # 1=image, 2=video
+                    "content_version": row["content_version"] or 0,
+                    "is_favorite": bool(row["is_favorite"]),
+                    "collection_id": row["collection_id"],
+                    "album_title": title,
+                    "source": "cache_query",
+                }
+                for row in rows
+            ]
 
             if show_progress:
                 print(f"✅ Found {len(media_items)} media items in album")
@@ -0,0 +1,210 @@
+"""
+Schema-bound protobuf encoding.
+
+`blackboxprotobuf.encode_message` re-interprets the typedef dict on every
+call. Here a typedef is compiled once into a tree of field encoders, and a
+`RequestTemplate` goes one step further: everything in a request body that
+never changes is encoded to bytes at import time, and only the `Param`
+placeholders (page/state tokens) are encoded per call. Output is
+byte-identical to `blackboxprotobuf.encode_message` for the same body.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from blackboxprotobuf.lib.types import type_maps
+
+Part = bytes | Callable[[dict[str, Any]], bytes]
+
+
+@dataclass(frozen=True, slots=True)
+class Param:
+    """Placeholder for a value supplied when a `RequestTemplate` is rendered."""
+
+    name: str
+
+
+def encode_uvarint(value: int) -> bytes:
+    if value < 0x80:
+        return bytes((value,))
+    output = bytearray()
+    while value > 0x7F:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+    return bytes(output)
+
+
+def encode_varint(value: int) -> bytes:
+    return encode_uvarint(value + (1 << 64) if value < 0 else value)
+
+
+def _delimited(value: bytes) -> bytes:
+    return encode_uvarint(len(value)) + value
+
+
+def _encode_string(value: str | bytes) -> bytes:
+    return _delimited(value.encode() if isinstance(value, str) else bytes(value).decode().encode())
+
+
+def _encode_bytes(value: str | bytes) -> bytes:
+    return _delimited(value.encode() if isinstance(value, str) else bytes(value))
+
+
+def _encode_int(value: int) -> bytes:
+    if not isinstance(value, int):
+        raise TypeError(f"Got non-int type for varint encoding: {value!r}")
+    return encode_varint(value)
+
+
+# Hot types get local encoders; anything else falls back to blackboxprotobuf's own
+_FAST_ENCODERS: dict[str, Callable[[Any], bytes]] = {
+    "int": _encode_int,
+    "uint": encode_uvarint,
+    "string": _encode_string,
+    "bytes": _encode_bytes,
+}
+
+
+class _Field:
+    __slots__ = ("number", "tag", "packed", "message", "encode_value")
+
+    def __init__(self, number: str, fielddef: dict) -> None:
+        field_type = fielddef["type"]
+        self.number = number
+        self.packed = field_type.startswith("packed_")
+        self.message = _Message(fielddef["message_typedef"], fielddef.get("field_order")) if field_type == "message" else None
+        if self.message is not None:
+            self.encode_value = self.message.encode_delimited
+        else:
+            self.encode_value = _FAST_ENCODERS.get(field_type) or (lambda value, encoder=type_maps.ENCODERS[field_type]: bytes(encoder(value)))
+        self.tag = encode_uvarint((int(number) << 3) | type_maps.WIRETYPES[field_type])
+
+    def outputs(self, value: Any) -> list[bytes]:
+        if isinstance(value, list) and not self.packed:
+            return [self.tag + self.encode_value(item) for item in value]
+        return [self.tag + self.encode_value(value)]
+
+
+class _Message:
+    __slots__ = ("fields", "field_order")
+
+    def __init__(self, typedef: dict, field_order: list[str] | None = None) -> None:
+        self.fields = {number: _Field(number, fielddef) for number, fielddef in typedef.items()}
+        self.field_order = field_order
+
+    def field(self, key: str) -> _Field:
+        try:
+            return self.fields[str(key)]
+        except KeyError:
+            raise ValueError(f"Provided field name/number {key} is not valid") from None
+
+    def order(self, grouped: dict[str, list], count: int) -> list:
+        """Flatten per-field outputs the way blackboxprotobuf does: `field_order` first, then by first appearance."""
+        output = []
+        if self.field_order and len(self.field_order) == count:
+            for number in self.field_order:
+                try:
+                    output.append(grouped[number].pop(0))
+                except (IndexError, KeyError):
+                    break
+        for values in grouped.values():
+            output.extend(values)
+        return output
+
+    def encode(self, data: dict) -> bytes:
+        grouped: dict[str, list[bytes]] = {}
+        count = 0
+        for key, value in data.items():
+            field = self.field(key)
+            outputs = field.outputs(value)
+            grouped.setdefault(field.number, []).extend(outputs)
+            count += len(outputs)
+        return b"".join(self.order(grouped, count))
+
+    def encode_delimited(self, data: dict) -> bytes:
+        return _delimited(self.encode(data))
+
+    def compile_parts(self, data: dict) -> list[Part]:
+        """Encode `data` with `Param` values (at any depth) left as callables."""
+        grouped: dict[str, list[Part]] = {}
+        count = 0
+        for key, value in data.items():
+            field = self.field(key)
+            if _has_param(value):
+                if isinstance(value, list):
+                    raise ValueError(f"Params are not supported inside repeated field {key}")
+                outputs = [_dynamic_field(field, value)]
+            else:
+                outputs = field.outputs(value)
+            grouped.setdefault(field.number, []).extend(outputs)
+            count += len(outputs)
+        return _merge(self.order(grouped, count))
+
+
+def _has_param(value: Any) -> bool:
+    if isinstance(value, Param):
+        return True
+    if isinstance(value, dict):
+        return any(_has_param(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_has_param(item) for item in value)
+    return False
+
+
+def _merge(parts: list[Part]) -> list[Part]:
+    """Join runs of static bytes so rendering touches as few parts as possible."""
+    merged: list[Part] = []
+    for part in parts:
+        if isinstance(part, bytes) and merged and isinstance(merged[-1], bytes):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return merged
+
+
+def _render(parts: list[Part], values: dict[str, Any]) -> bytes:
+    return b"".join(part if isinstance(part, bytes) else part(values) for part in parts)
+
+
+def _dynamic_field(field: _Field, value: Any) -> Callable[[dict[str, Any]], bytes]:
+    tag, encode_value = field.tag, field.encode_value
+    if isinstance(value, Param):
+        name = value.name
+        return lambda values: tag + encode_value(values[name])
+    parts = field.message.compile_parts(value)
+    return lambda values: tag + _delimited(_render(parts, values))
+
+
+def compile_encoder(typedef: dict) -> Callable[[dict], bytes]:
+    """Compile a blackboxprotobuf typedef into an encoder function."""
+    return _Message(typedef).encode
+
+
+class RequestTemplate:
+    """
+    A request body encoded once, with `Param` placeholders filled in by `render`.
+
+    Example:
+        template = RequestTemplate({"1": {"4": Param("page_token"), "7": 2}}, typedef)
+        template.render(page_token="...")
+    """
+
+    def __init__(self, body: dict, typedef: dict) -> None:
+        self.body = body
+        self.typedef = typedef
+        self.parts = _Message(typedef).compile_parts(body)
+
+    def render(self, **values: Any) -> bytes:
+        return _render(self.parts, values)
+
+
+_compiled: dict[int, tuple[dict, Callable[[dict], bytes]]] = {}
+
+
+def encode_message(data: dict, typedef: dict) -> bytes:
+    """Drop-in for `blackboxprotobuf.encode_message`; each typedef is compiled on first use."""
+    cached = _compiled.get(id(typedef))
+    if cached is None or cached[0] is not typedef:
+        cached = _compiled[id(typedef)] = (typedef, compile_encoder(typedef))
+    return cached[1](data)
@@ -1,15 +1,91 @@
 import sqlite3
-from typing import Iterable, Self, Sequence
-from dataclasses import asdict
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Literal, Self, Sequence
 from pathlib import Path
 
-from .models import MediaItem
+from .models import MediaItem, CollectionItem, MEDIA_ITEM_COLUMNS, COLLECTION_ITEM_COLUMNS, media_item_row, collection_item_row
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+SQL_VARIABLE_BATCH = 900
+# Page cache per connection (negative = KiB) and memory-mapped I/O window
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+BUSY_TIMEOUT = 30
+# Rows ANALYZE samples per index: planner statistics without a full scan of large libraries
+ANALYSIS_LIMIT = 1000
+
+# Schema migrations, applied in order; PRAGMA user_version counts the ones a database has had
+MIGRATIONS: tuple[tuple[str, ...], ...] = (
+    (
+        # Timeline, newest first. Trash state and type are filtered on index entries, so
+        # a LIMITed page only reads the rows it returns
+        "CREATE INDEX IF NOT EXISTS idx_remote_media_timeline ON remote_media (utc_timestamp DESC, trash_timestamp, type)",
+        "CREATE INDEX IF NOT EXISTS idx_remote_media_type_timeline ON remote_media (type, utc_timestamp DESC, trash_timestamp)",
+        # Covering: hash -> media keys without touching the table
+        "CREATE INDEX IF NOT EXISTS idx_remote_media_dedup_key ON remote_media (dedup_key, media_key)",
+    ),
+    (
+        # Album membership for caches written before collection_media existed
+        """
+        INSERT OR IGNORE INTO collection_media (collection_id, media_key)
+        SELECT collection_id, media_key FROM remote_media
+        WHERE collection_id IS NOT NULL AND collection_id != ''
+        """,
+    ),
+)
+
+MEDIA_TYPES = {"images": 1, "videos": 2}
+
+
+def _chunks(items: Sequence, size: int = SQL_VARIABLE_BATCH) -> Iterator[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _placeholders(items: Sequence) -> str:
+    return ",".join("?" * len(items))
+
+
+def _upsert_sql(table: str, key: str, columns: Sequence[str]) -> str:
+    """Insert-or-update of whole rows of `table` keyed by `key`."""
+    columns_str = ", ".join(f'"{col}"' for col in columns)
+    updates = ", ".join(f'"{col}"=excluded."{col}"' for col in columns if col != key)
+    return f"INSERT INTO {table} ({columns_str}) VALUES ({_placeholders(columns)}) ON CONFLICT({key}) DO UPDATE SET {updates}"
+
+
+# Built once: sqlite3 caches a prepared statement per SQL string, so every batch reuses it
+UPSERT_MEDIA_SQL = _upsert_sql("remote_media", "media_key", MEDIA_ITEM_COLUMNS)
+UPSERT_COLLECTIONS_SQL = _upsert_sql("collections", "collection_media_key", COLLECTION_ITEM_COLUMNS)
+_COLLECTION_ID = MEDIA_ITEM_COLUMNS.index("collection_id")
 
 
 class Storage:
-    def __init__(self, db_path: str | Path) -> None:
-        self.conn = sqlite3.connect(db_path)
-        self._create_tables()
+    def __init__(self, db_path: str | Path, read_only: bool = False, check_same_thread: bool = True) -> None:
+        """
+        Library cache database.
+
+        The database runs in WAL mode, so readers (e.g. `read_only` connections
+        from another thread or process) never block the sync writer and vice
+        versa. Writes commit per call, or once per `transaction()` block.
+
+        Args:
+            db_path: Database file.
+            read_only: Open without write access and skip schema setup (falls back
+                to a normal connection if the database does not exist yet).
+            check_same_thread: Passed to sqlite3; a connection shared between
+                threads must be serialized by the caller.
+        """
+        read_only = read_only and Path(db_path).exists()
+        if read_only:
+            self.conn = sqlite3.connect(f"{Path(db_path).as_uri()}?mode=ro", uri=True, timeout=BUSY_TIMEOUT, check_same_thread=check_same_thread, isolation_level=None)
+        else:
+            self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=check_same_thread, isolation_level=None)
+        self._transaction_depth = 0
+        self._configure(read_only)
+        if not read_only:
+            with self.transaction():
+                self._create_tables()
+                self._migrate()
 
     def __enter__(self) -> Self:
         return self
@@ -17,6 +93,37 @@ class Storage:
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         self.conn.close()
 
+    def _configure(self, read_only: bool) -> None:
+        if not read_only:
+            # Persistent: set once, applies to every later connection
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only fsyncs at checkpoints; a crash can lose the last commits but never corrupts
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        self.conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+
+    @contextmanager
+    def transaction(self) -> Iterator[Self]:
+        """
+        Group writes into one commit. Nested blocks join the outermost one.
+
+        An exception rolls back the whole outermost transaction.
+        """
+        if self._transaction_depth == 0:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.conn.execute("ROLLBACK")
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self.conn.execute("COMMIT")
+
     def _create_tables(self) -> None:
         """Create the remote_media table if it doesn't exist."""
         self.conn.execute("""
@@ -64,6 +171,33 @@ class Storage:
         )
         """)
 
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS collections (
+            collection_media_key TEXT PRIMARY KEY,
+            collection_album_id TEXT,
+            title TEXT,
+            total_items INTEGER,
+            type INTEGER,
+            sort_order INTEGER,
+            is_custom_ordered INTEGER,
+            cover_item_media_key TEXT,
+            "start" INTEGER,
+            "end" INTEGER,
+            last_activity_time_ms INTEGER
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_collections_album_id ON collections (collection_album_id)")
+
+        # Album membership, clustered by collection so one album is a single range scan
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS collection_media (
+            collection_id TEXT NOT NULL,
+            media_key TEXT NOT NULL,
+            PRIMARY KEY (collection_id, media_key)
+        ) WITHOUT ROWID
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_collection_media_media_key ON collection_media (media_key)")
+
         self.conn.execute("""
         CREATE TABLE IF NOT EXISTS state (
             id INTEGER PRIMARY KEY CHECK (id = 1),
@@ -77,34 +211,44 @@ class Storage:
         INSERT OR IGNORE INTO state (id, state_token, page_token, init_complete)
         VALUES (1, '', '', 0)
         """)
-        self.conn.commit()
 
-    def update(self, items: Iterable[MediaItem]) -> None:
-        """Insert or update multiple MediaItems in the database."""
-        if not items:
+    def _migrate(self) -> None:
+        """Apply the `MIGRATIONS` this database has not had yet (inside the caller's transaction)."""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
             return
+        for statements in MIGRATIONS[version:]:
+            for sql in statements:
+                self.conn.execute(sql)
+        self.conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
 
-        # Convert dataclass objects to dictionaries
-        items_dicts = [asdict(item) for item in items]
+    def analyze(self) -> None:
+        """Refresh the query planner's statistics, e.g. after a sync changed many rows."""
+        self.conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        self.conn.execute("ANALYZE")
 
-        # Prepare the SQL statement with all fields
-        columns = items_dicts[0].keys()
-        placeholders = ", ".join("?" * len(columns))
-        columns_str = ", ".join(columns)
-        updates = ", ".join(f"{col}=excluded.{col}" for col in columns if col != "media_key")
+    def update(self, items: Iterable[MediaItem]) -> None:
+        """Insert or update multiple MediaItems in the database."""
+        rows = list(map(media_item_row, items))
+        self.update_rows(rows)
 
-        sql = f"""
-        INSERT INTO remote_media ({columns_str})
-        VALUES ({placeholders})
-        ON CONFLICT(media_key) DO UPDATE SET {updates}
+    def update_rows(self, rows: Sequence[tuple]) -> None:
         """
+        Insert or update media items given as row tuples in `MEDIA_ITEM_COLUMNS` order.
 
-        # Prepare the values for each item
-        values = [tuple(item[col] for col in columns) for item in items_dicts]
+        The bulk ingest path: rows are bound positionally to the one prepared upsert.
+        """
+        if not rows:
+            return
 
-        # Execute in a transaction
-        with self.conn:
-            self.conn.executemany(sql, values)
+        with self.transaction():
+            self.conn.executemany(UPSERT_MEDIA_SQL, rows)
+            # An item can move between albums: replace its membership
+            self.conn.executemany("DELETE FROM collection_media WHERE media_key = ?", [row[:1] for row in rows])
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO collection_media (collection_id, media_key) VALUES (?, ?)",
+                [(row[_COLLECTION_ID], row[0]) for row in rows if row[_COLLECTION_ID]],
+            )
 
     def delete(self, media_keys: Sequence[str]) -> None:
         """
@@ -116,15 +260,200 @@ class Storage:
         if not media_keys:
             return
 
-        # Create a temporary table with the keys to delete
-        sql = """
-        DELETE FROM remote_media
-        WHERE media_key IN ({})
-        """.format(",".join(["?"] * len(media_keys)))
+        # Chunked: one IN (...) per batch stays under SQLite's variable limit
+        with self.transaction():
+            for batch in _chunks(media_keys):
+                self.conn.execute(f"DELETE FROM remote_media WHERE media_key IN ({_placeholders(batch)})", batch)
+                self.conn.execute(f"DELETE FROM collection_media WHERE media_key IN ({_placeholders(batch)})", batch)
+
+    def get_dedup_keys(self, media_keys: Sequence[str]) -> dict[str, str]:
+        """Map media keys to their dedup keys (unknown keys are left out)."""
+        dedup_keys = {}
+        for batch in _chunks(media_keys):
+            cursor = self.conn.execute(f"SELECT media_key, dedup_key FROM remote_media WHERE media_key IN ({_placeholders(batch)})", batch)
+            dedup_keys.update((media_key, dedup_key) for media_key, dedup_key in cursor if dedup_key)
+        return dedup_keys
+
+    def get_media_keys_by_dedup_key(self, dedup_keys: Sequence[str]) -> dict[str, list[str]]:
+        """Map dedup keys to the media keys holding that content (unknown keys are left out)."""
+        media_keys: dict[str, list[str]] = {}
+        for batch in _chunks(dedup_keys):
+            cursor = self.conn.execute(f"SELECT dedup_key, media_key FROM remote_media WHERE dedup_key IN ({_placeholders(batch)})", batch)
+            for dedup_key, media_key in cursor:
+                media_keys.setdefault(dedup_key, []).append(media_key)
+        return media_keys
+
+    def list_media(
+        self,
+        media_type: Literal["all", "images", "videos"] = "all",
+        include_trashed: bool = False,
+        name_filter: str = "",
+        exclude: bool = False,
+        ignore_case: bool = False,
+        columns: Sequence[str] = ("*",),
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[dict]:
+        """
+        List media items newest first, along the timeline indexes.
 
-        # Execute in a transaction
-        with self.conn:
-            self.conn.execute(sql, media_keys)
+        Args:
+            media_type: "all", "images" or "videos".
+            include_trashed: Include items in trash.
+            name_filter: Keep items whose file name contains this (SQL LIKE pattern characters apply).
+            exclude: Drop the items matching `name_filter` instead.
+            ignore_case: Match `name_filter` case-insensitively.
+            columns: remote_media columns to return.
+            limit: Maximum number of items to return. None for all items.
+            offset: Number of items to skip.
+        """
+        conditions = []
+        params: list = []
+        if media_type != "all":
+            conditions.append("type = ?")
+            params.append(MEDIA_TYPES[media_type])
+        if not include_trashed:
+            # Synced items store 0 when not trashed; older rows may have NULL
+            conditions.append("IFNULL(trash_timestamp, 0) = 0")
+        if name_filter:
+            condition = "LOWER(file_name) LIKE LOWER(?)" if ignore_case else "file_name LIKE ?"
+            conditions.append(f"NOT ({condition})" if exclude else condition)
+            params.append(f"%{name_filter}%")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(columns)} FROM remote_media {where} ORDER BY utc_timestamp DESC LIMIT ? OFFSET ?",
+            (*params, -1 if limit is None else limit, offset),
+        )
+        names = [col[0] for col in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def get_media(self, media_keys: Sequence[str]) -> list[dict]:
+        """Get full remote_media rows as dicts."""
+        rows = []
+        for batch in _chunks(media_keys):
+            cursor = self.conn.execute(f"SELECT * FROM remote_media WHERE media_key IN ({_placeholders(batch)})", batch)
+            columns = [col[0] for col in cursor.description]
+            rows.extend(dict(zip(columns, row)) for row in cursor)
+        return rows
+
+    def update_fields(self, media_keys: Sequence[str], fields: dict) -> None:
+        """
+        Set the same column values on many rows (write-through for remote mutations).
+
+        Args:
+            media_keys: Rows to update
+            fields: Column name -> new value
+        """
+        if not media_keys or not fields:
+            return
+
+        assignments = ", ".join(f"{col} = ?" for col in fields)
+        values = tuple(fields.values())
+        with self.transaction():
+            self.conn.executemany(
+                f"UPDATE remote_media SET {assignments} WHERE media_key = ?",
+                [(*values, media_key) for media_key in media_keys],
+            )
+
+    def update_collections(self, items: Iterable[CollectionItem]) -> None:
+        """Insert or update multiple CollectionItems (albums) in the database."""
+        self.update_collection_rows(list(map(collection_item_row, items)))
+
+    def update_collection_rows(self, rows: Sequence[tuple]) -> None:
+        """Insert or update albums given as row tuples in `COLLECTION_ITEM_COLUMNS` order."""
+        if not rows:
+            return
+
+        with self.transaction():
+            self.conn.executemany(UPSERT_COLLECTIONS_SQL, rows)
+
+    def delete_collections(self, collection_keys: Sequence[str]) -> None:
+        """
+        Delete albums and their membership rows.
+
+        Args:
+            collection_keys: A sequence of collection_media_key values to delete
+        """
+        if not collection_keys:
+            return
+
+        with self.transaction():
+            for batch in _chunks(collection_keys):
+                self.conn.execute(f"DELETE FROM collections WHERE collection_media_key IN ({_placeholders(batch)})", batch)
+                self.conn.execute(f"DELETE FROM collection_media WHERE collection_id IN ({_placeholders(batch)})", batch)
+
+    def list_collections(self) -> list[dict]:
+        """
+        List albums with their item counts, most recently active first.
+
+        Albums referenced by media items but not (yet) synced as collections
+        are included with an empty title.
+        """
+        cursor = self.conn.execute("""
+        SELECT c.collection_media_key, c.collection_album_id, c.title, c.total_items, c.type,
+               c.cover_item_media_key, c."start", c."end", c.last_activity_time_ms,
+               (SELECT COUNT(*) FROM collection_media m
+                WHERE m.collection_id IN (c.collection_media_key, c.collection_album_id)) AS media_count
+        FROM collections c
+        UNION ALL
+        SELECT m.collection_id, '', '', 0, 0, MIN(m.media_key), NULL, NULL, NULL, COUNT(*)
+        FROM collection_media m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM collections c
+            WHERE m.collection_id IN (c.collection_media_key, c.collection_album_id)
+        )
+        GROUP BY m.collection_id
+        ORDER BY 9 DESC, 10 DESC
+        """)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_collection(self, key: str) -> dict | None:
+        """Get an album by collection media key, album id or exact title."""
+        cursor = self.conn.execute(
+            """
+        SELECT collection_media_key, collection_album_id, title, total_items, type,
+               cover_item_media_key, "start", "end", last_activity_time_ms
+        FROM collections
+        WHERE collection_media_key = ? OR collection_album_id = ? OR title = ?
+        LIMIT 1
+        """,
+            (key, key, key),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([col[0] for col in cursor.description], row))
+
+    def get_collection_media(self, collection_keys: Sequence[str], limit: int | None = None, offset: int = 0) -> list[dict]:
+        """
+        Get the media items of one album, newest first.
+
+        Args:
+            collection_keys: The ids the album's items may reference (media key and album id)
+            limit: Maximum number of items to return. None for all items.
+            offset: Number of items to skip.
+        """
+        keys = [key for key in collection_keys if key]
+        if not keys:
+            return []
+
+        cursor = self.conn.execute(
+            """
+        SELECT r.media_key, r.file_name, r.dedup_key, r.type, r.size_bytes, r.utc_timestamp,
+               r.duration, r.width, r.height, r.content_version, r.is_favorite, r.trash_timestamp,
+               m.collection_id
+        FROM collection_media m
+        JOIN remote_media r ON r.media_key = m.media_key
+        WHERE m.collection_id IN ({})
+        ORDER BY r.utc_timestamp DESC
+        LIMIT ? OFFSET ?
+        """.format(",".join(["?"] * len(keys))),
+            (*keys, -1 if limit is None else limit, offset),
+        )
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
     def get_state_tokens(self) -> tuple[str, str]:
         """
@@ -153,7 +482,7 @@ class Storage:
 
         if updates:
             sql = f"UPDATE state SET {', '.join(updates)} WHERE id = 1"
-            with self.conn:
+            with self.transaction():
                 self.conn.execute(sql, params)
 
     def get_init_state(self) -> bool:
@@ -165,7 +494,7 @@ class Storage:
 
     def set_init_state(self, state: int) -> None:
         """ """
-        with self.conn:
+        with self.transaction():
             self.conn.execute(f"UPDATE state SET init_complete = {state} WHERE id = 1")
 
     def close(self) -> None:
@@ -1,85 +1,97 @@
 import base64
 
-from .models import MediaItem
+from .library_decoder import ORIGIN_MAP, parse_library_response
+from .models import MediaItem, CollectionItem
 from .utils import int64_to_float, int32_to_float, fixed32_to_float, urlsafe_base64
 
+# Shared read-only default for absent sub-messages, so lookups don't allocate per item
+_EMPTY: dict = {}
+_MISSING = object()
+
+
+def _field(message: dict, number: str, default=None):
+    """Field `number`, or the first of blackboxprotobuf's alternate-type keys for it ("<number>-<n>")."""
+    value = message.get(number, _MISSING)
+    if value is not _MISSING:
+        return value
+    prefix = number + "-"
+    return next((value for key, value in message.items() if key.startswith(prefix)), default)
+
 
 def _parse_media_item(d: dict) -> MediaItem:
     """Parse a single media item from the raw data."""
+    info = d["2"]
+    media = d["5"]
+    location = d["17"]
 
-    dedup_key = next((d["2"]["21"][key] for key in d["2"]["21"] if key.startswith("1")), "")
+    dedup_key = _field(info["21"], "1", "")
     if not isinstance(dedup_key, str):
         try:
-            dedup_key = urlsafe_base64(base64.b64encode(d["2"]["13"]["1"]).decode())
+            dedup_key = urlsafe_base64(base64.b64encode(info["13"]["1"]).decode())
         except Exception as e:
             raise RuntimeError("Error parsing dedup_key") from e
 
-    origin_map = {
-        1: "self",
-        3: "partner",
-        4: "shared",
-    }
-
+    quota = info["35"]
     item = MediaItem(
         media_key=d["1"],
-        caption=next((d["2"][key] for key in d["2"] if key.startswith("3")), "") or None,
-        file_name=d["2"]["4"],
+        caption=_field(info, "3", "") or None,
+        file_name=info["4"],
         dedup_key=dedup_key,
-        is_canonical=not any(prop.get("1") == 27 for prop in d["2"]["5"]),
-        type=d["5"]["1"],
-        collection_id=d["2"]["1"]["1"],
-        size_bytes=d["2"]["10"],
-        timezone_offset=d["2"].get("8", 0),
-        utc_timestamp=d["2"]["7"],
-        server_creation_timestamp=d["2"]["9"],
-        upload_status=d["2"]["11"],
-        quota_charged_bytes=d["2"]["35"]["2"],
-        origin=origin_map[d["2"]["30"]["1"]],
-        content_version=d["2"]["26"],
-        trash_timestamp=d["2"]["16"].get("3", 0),
-        is_archived=d["2"]["29"]["1"] == 1,
-        is_favorite=d["2"]["31"]["1"] == 1,
-        is_locked=d["2"]["39"]["1"] == 1,
-        is_original_quality=d["2"]["35"]["3"] == 2,
+        is_canonical=not any(prop.get("1") == 27 for prop in info["5"]),
+        type=media["1"],
+        collection_id=info["1"]["1"],
+        size_bytes=info["10"],
+        timezone_offset=info.get("8", 0),
+        utc_timestamp=info["7"],
+        server_creation_timestamp=info["9"],
+        upload_status=info["11"],
+        quota_charged_bytes=quota["2"],
+        origin=ORIGIN_MAP[info["30"]["1"]],
+        content_version=info["26"],
+        trash_timestamp=info["16"].get("3", 0),
+        is_archived=info["29"]["1"] == 1,
+        is_favorite=info["31"]["1"] == 1,
+        is_locked=info["39"]["1"] == 1,
+        is_original_quality=quota["3"] == 2,
     )
 
-    if d["17"].get("1"):
-        item.latitude = fixed32_to_float(d["17"]["1"]["1"])
-        item.longitude = fixed32_to_float(d["17"]["1"]["2"])
-    if d["17"].get("5"):
-        item.location_name = d["17"]["5"]["2"]["1"]
-        item.location_id = d["17"]["5"]["3"]
-
-    if d["5"].get("2"):
-        # photo
-        item.is_edited = "4" in d["5"]["2"]
-        item.remote_url = d["5"]["2"]["1"]["1"]
-        item.width = d["5"]["2"]["1"]["9"]["1"]
-        item.height = d["5"]["2"]["1"]["9"]["2"]
-        if d["5"]["2"]["1"]["9"].get("5"):
-            item.make = d["5"]["2"]["1"]["9"]["5"].get("1")
-            item.model = d["5"]["2"]["1"]["9"]["5"].get("2")
-            item.aperture = d["5"]["2"]["1"]["9"]["5"].get("4") and int32_to_float(d["5"]["2"]["1"]["9"]["5"]["4"])
-            item.shutter_speed = d["5"]["2"]["1"]["9"]["5"].get("5") and int32_to_float(d["5"]["2"]["1"]["9"]["5"]["5"])
-            item.iso = d["5"]["2"]["1"]["9"]["5"].get("6")
-            item.focal_length = d["5"]["2"]["1"]["9"]["5"].get("7") and int32_to_float(d["5"]["2"]["1"]["9"]["5"]["7"])
-
-    if d["5"].get("3"):
-        # video
-        item.remote_url = d["5"]["3"]["2"]["1"]
-        if d["5"]["3"].get("4"):
-            item.duration = d["5"]["3"]["4"].get("1")
-            item.width = d["5"]["3"]["4"].get("4")
-            item.height = d["5"]["3"]["4"].get("5")
-        item.capture_frame_rate = d["5"]["3"].get("6", {}).get("4") and int64_to_float(d["5"]["3"]["6"]["4"])
-        item.encoded_frame_rate = d["5"]["3"].get("6", {}).get("5") and int64_to_float(d["5"]["3"]["6"]["5"])
-
-    if d["5"].get("5", {}).get("2", {}).get("4"):
-        # micro video
+    if coordinates := location.get("1"):
+        item.latitude = fixed32_to_float(coordinates["1"])
+        item.longitude = fixed32_to_float(coordinates["2"])
+    if place := location.get("5"):
+        item.location_name = place["2"]["1"]
+        item.location_id = place["3"]
+
+    if photo := media.get("2"):
+        photo_info = photo["1"]
+        dimensions = photo_info["9"]
+        item.is_edited = "4" in photo
+        item.remote_url = photo_info["1"]
+        item.width = dimensions["1"]
+        item.height = dimensions["2"]
+        if exif := dimensions.get("5"):
+            item.make = exif.get("1")
+            item.model = exif.get("2")
+            item.aperture = exif.get("4") and int32_to_float(exif["4"])
+            item.shutter_speed = exif.get("5") and int32_to_float(exif["5"])
+            item.iso = exif.get("6")
+            item.focal_length = exif.get("7") and int32_to_float(exif["7"])
+
+    if video := media.get("3"):
+        item.remote_url = video["2"]["1"]
+        if video_info := video.get("4"):
+            item.duration = video_info.get("1")
+            item.width = video_info.get("4")
+            item.height = video_info.get("5")
+        frame_rates = video.get("6", _EMPTY)
+        item.capture_frame_rate = frame_rates.get("4") and int64_to_float(frame_rates["4"])
+        item.encoded_frame_rate = frame_rates.get("5") and int64_to_float(frame_rates["5"])
+
+    if micro_video := media.get("5", _EMPTY).get("2", _EMPTY).get("4"):
         item.is_micro_video = True
-        item.duration = d["5"]["5"]["2"]["4"]["1"]
-        item.micro_video_width = d["5"]["5"]["2"]["4"]["4"]
-        item.micro_video_height = d["5"]["5"]["2"]["4"]["5"]
+        item.duration = micro_video["1"]
+        item.micro_video_width = micro_video["4"]
+        item.micro_video_height = micro_video["5"]
 
     return item
 
@@ -90,27 +102,33 @@ def _parse_deletion_item(d: dict) -> str | None:
     if type == 1:
         return d["1"]["2"]["1"]
     return None
-    # if type == 4:
-    #     return d["1"]["5"]["2"]
     # if type == 6:
     #     return d["1"]["7"]["1"]
 
 
-# def _parse_collection_item(d: dict) -> CollectionItem:
-#     """Parse a single collection item from the raw data."""
-#     return CollectionItem(
-#         collection_media_key=d["1"],
-#         collection_album_id=d["4"]["2"]["3"],
-#         cover_item_media_key=d["2"].get("17", {}).get("1"),
-#         start=d["2"]["10"]["6"]["1"],
-#         end=d["2"]["10"]["7"]["1"],
-#         last_activity_time_ms=d["2"]["10"]["10"],
-#         title=d["2"]["5"],
-#         total_items=d["2"]["7"],
-#         type=d["2"]["8"],
-#         sort_order=d["19"]["1"],
-#         is_custom_ordered=d["19"]["2"] == 1,
-#     )
+def _parse_collection_deletion_item(d: dict) -> str | None:
+    """Parse a single collection (album) deletion from the raw data."""
+    if d["1"]["1"] == 4:
+        return d["1"]["5"]["2"]
+    return None
+
+
+def _parse_collection_item(d: dict) -> CollectionItem:
+    """Parse a single collection item from the raw data."""
+    time_range = d["2"].get("10", {})
+    return CollectionItem(
+        collection_media_key=d["1"],
+        collection_album_id=d.get("4", {}).get("2", {}).get("3", ""),
+        cover_item_media_key=d["2"].get("17", {}).get("1"),
+        start=time_range.get("6", {}).get("1"),
+        end=time_range.get("7", {}).get("1"),
+        last_activity_time_ms=time_range.get("10"),
+        title=d["2"].get("5", ""),
+        total_items=d["2"].get("7", 0),
+        type=d["2"].get("8", 0),
+        sort_order=d.get("19", {}).get("1", 0),
+        is_custom_ordered=d.get("19", {}).get("2") == 1,
+    )
 
 
 # def _parse_envelope_item(d: dict) -> EnvelopeItem:
@@ -124,8 +142,21 @@ def _get_items_list(data: dict, key: str) -> list[dict]:
     return [items] if isinstance(items, dict) else items
 
 
-def parse_db_update(data: dict) -> tuple[str, str | None, list[MediaItem], list[str]]:
-    """Parse the library state from the raw data."""
+def parse_db_update(data: dict | bytes) -> tuple[str, str | None, list[MediaItem], list[str], list[CollectionItem], list[str]]:
+    """
+    Parse the library state from the raw data.
+
+    Args:
+        data: Decoded api response, or the undecoded response bytes (`raw=True`),
+            which are parsed by the much faster `library_decoder`.
+
+    Returns:
+        (state_token, next_page_token, media items, media keys to delete,
+        collection items, collection keys to delete)
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return parse_library_response(data)
+
     next_page_token = data["1"].get("1", "")
     state_token = data["1"].get("6", "")
 
@@ -135,16 +166,18 @@ def parse_db_update(data: dict) -> tuple[str, str | None, list[MediaItem], list[
     remote_media.extend(_parse_media_item(d) for d in media_items)
 
     media_keys_to_delete = []
+    collection_keys_to_delete = []
     deletions = _get_items_list(data, "9")
     for d in deletions:
         if media_key := _parse_deletion_item(d):
             media_keys_to_delete.append(media_key)
+        elif collection_key := _parse_collection_deletion_item(d):
+            collection_keys_to_delete.append(collection_key)
 
-    # collections = _get_items_list(data, "3")
-    # remote_media.extend(_parse_collection_item(d) for d in collections)
+    collections = [_parse_collection_item(d) for d in _get_items_list(data, "3")]
 
     # envelopes = _get_items_list(data, "12")
     # for d in envelopes:
     #     _parse_envelope_item(d)
 
-    return state_token, next_page_token, remote_media, media_keys_to_delete
+    return state_token, next_page_token, remote_media, media_keys_to_delete, collections, collection_keys_to_delete
@@ -0,0 +1,380 @@
+"""
+Streaming decoder for library state/page responses.
+
+`blackboxprotobuf.decode_message` decodes every field of every item (and
+guesses the type of every length-delimited field by trial decoding), only
+for `db_update_parser` to read a few dozen of them. This module walks the
+wire bytes against a schema of just the fields `MediaItem`,
+`CollectionItem` and deletions use: everything else is skipped by length
+without being decoded, and media items are yielded one at a time.
+"""
+
+import base64
+from typing import Any, Iterator
+
+from .models import MediaItem, CollectionItem
+from .utils import int64_to_float, int32_to_float, fixed32_to_float, urlsafe_base64
+
+# Field kinds. Varints are decoded as signed int64 like blackboxprotobuf's default "int" type
+INT = "int"
+STRING = "string"  # falls back to raw bytes if not valid UTF-8
+BYTES = "bytes"
+FIXED = "fixed"  # fixed32/fixed64, as unsigned ints
+
+
+class Repeated:
+    """Schema wrapper for a field that is collected into a list."""
+
+    __slots__ = ("kind",)
+
+    def __init__(self, kind: Any) -> None:
+        self.kind = kind
+
+
+# Schemas map field numbers to a kind, a nested schema dict or `Repeated`.
+# Paths follow `db_update_parser`.
+MEDIA_ITEM_SCHEMA: dict[int, Any] = {
+    1: STRING,  # media key
+    2: {
+        1: {1: STRING},  # collection id
+        3: STRING,  # caption
+        4: STRING,  # file name
+        5: Repeated({1: INT}),  # properties, 27 = non-canonical
+        7: INT,  # utc timestamp
+        8: INT,  # timezone offset
+        9: INT,  # server creation timestamp
+        10: INT,  # size
+        11: INT,  # upload status
+        13: {1: BYTES},  # dedup key fallback
+        16: {3: INT},  # trash timestamp
+        21: {1: STRING},  # dedup key
+        26: INT,  # content version
+        29: {1: INT},  # archived
+        30: {1: INT},  # origin
+        31: {1: INT},  # favorite
+        35: {2: INT, 3: INT},  # quota charged, quality
+        39: {1: INT},  # locked
+    },
+    5: {
+        1: INT,  # type
+        2: {  # photo
+            1: {
+                1: STRING,
+                9: {1: INT, 2: INT, 5: {1: STRING, 2: STRING, 4: FIXED, 5: FIXED, 6: INT, 7: FIXED}},
+            },
+            4: BYTES,  # present when edited
+        },
+        3: {  # video
+            2: {1: STRING},
+            4: {1: INT, 4: INT, 5: INT},
+            6: {4: FIXED, 5: FIXED},
+        },
+        5: {2: {4: {1: INT, 4: INT, 5: INT}}},  # micro video
+    },
+    17: {  # location
+        1: {1: FIXED, 2: FIXED},
+        5: {2: {1: STRING}, 3: STRING},
+    },
+}
+
+COLLECTION_ITEM_SCHEMA: dict[int, Any] = {
+    1: STRING,
+    2: {
+        5: STRING,
+        7: INT,
+        8: INT,
+        10: {6: {1: INT}, 7: {1: INT}, 10: INT},
+        17: {1: STRING},
+    },
+    4: {2: {3: STRING}},
+    19: {1: INT, 2: INT},
+}
+
+DELETION_SCHEMA: dict[int, Any] = {
+    1: {1: INT, 2: {1: STRING}, 5: {2: STRING}},
+}
+
+ORIGIN_MAP = {
+    1: "self",
+    3: "partner",
+    4: "shared",
+}
+
+# Shared read-only default for absent sub-messages, so lookups don't allocate per item
+_EMPTY: dict = {}
+
+_INT64_SIGN = 1 << 63
+_UINT64 = 1 << 64
+
+
+def _read_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    byte = buf[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    result = byte & 0x7F
+    shift = 7
+    while True:
+        pos += 1
+        byte = buf[pos]
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos + 1
+        shift += 7
+
+
+def _iter_fields(buf: bytes, pos: int, end: int) -> Iterator[tuple[int, int, int, int]]:
+    """Yield (field number, wire type, value or start offset, end offset) for each field in buf[pos:end]."""
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        wire_type = key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+            yield key >> 3, 0, value, pos
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            start, pos = pos, pos + length
+            yield key >> 3, 2, start, pos
+        elif wire_type == 5:
+            yield key >> 3, 5, int.from_bytes(buf[pos : pos + 4], "little"), pos + 4
+            pos += 4
+        elif wire_type == 1:
+            yield key >> 3, 1, int.from_bytes(buf[pos : pos + 8], "little"), pos + 8
+            pos += 8
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type} at offset {pos}")
+    if pos != end:
+        raise ValueError("Truncated message")
+
+
+def _convert(buf: bytes, kind: Any, wire_type: int, value: int, end: int) -> Any:
+    if kind is INT:
+        if wire_type != 0:
+            return value
+        return value - _UINT64 if value >= _INT64_SIGN else value
+    if kind is FIXED:
+        return value
+    if wire_type != 2:
+        raise ValueError(f"Expected a length-delimited field, got wire type {wire_type}")
+    if kind is STRING:
+        raw = buf[value:end]
+        try:
+            return raw.decode()
+        except UnicodeDecodeError:
+            return raw
+    if kind is BYTES:
+        return buf[value:end]
+    return decode(buf, kind, value, end)
+
+
+def decode(buf: bytes, schema: dict[int, Any], pos: int = 0, end: int | None = None) -> dict[int, Any]:
+    """Decode the fields in `schema` from buf[pos:end], skipping all others."""
+    # `_iter_fields` inlined, with single-byte varints (nearly all keys and lengths) read
+    # directly: this loop runs for every field of every item
+    output: dict[int, Any] = {}
+    if end is None:
+        end = len(buf)
+    get = schema.get
+    while pos < end:
+        key = buf[pos]
+        if key < 0x80:
+            pos += 1
+        else:
+            key, pos = _read_varint(buf, pos)
+        wire_type = key & 7
+        if wire_type == 0:
+            value = buf[pos]
+            if value < 0x80:
+                pos += 1
+            else:
+                value, pos = _read_varint(buf, pos)
+        elif wire_type == 2:
+            length = buf[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = _read_varint(buf, pos)
+            value, pos = pos, pos + length
+        elif wire_type == 5:
+            value = int.from_bytes(buf[pos : pos + 4], "little")
+            pos += 4
+        elif wire_type == 1:
+            value = int.from_bytes(buf[pos : pos + 8], "little")
+            pos += 8
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type} at offset {pos}")
+
+        kind = get(key >> 3)
+        if kind is None:
+            continue
+        # Nested messages and plain varints skip the `_convert` call
+        if kind.__class__ is dict and wire_type == 2:
+            output[key >> 3] = decode(buf, kind, value, pos)
+        elif kind is INT and wire_type == 0:
+            output[key >> 3] = value - _UINT64 if value >= _INT64_SIGN else value
+        elif kind.__class__ is Repeated:
+            output.setdefault(key >> 3, []).append(_convert(buf, kind.kind, wire_type, value, pos))
+        else:
+            output[key >> 3] = _convert(buf, kind, wire_type, value, pos)
+    if pos != end:
+        raise ValueError("Truncated message")
+    return output
+
+
+def _media_item(d: dict[int, Any]) -> MediaItem:
+    """`db_update_parser._parse_media_item` on a decoded `MEDIA_ITEM_SCHEMA` dict."""
+    info = d[2]
+    dedup_key = info.get(21, _EMPTY).get(1, "")
+    if not isinstance(dedup_key, str):
+        try:
+            dedup_key = urlsafe_base64(base64.b64encode(info[13][1]).decode())
+        except Exception as e:
+            raise RuntimeError("Error parsing dedup_key") from e
+
+    item = MediaItem(
+        media_key=d[1],
+        caption=info.get(3) or None,
+        file_name=info[4],
+        dedup_key=dedup_key,
+        is_canonical=not any(prop.get(1) == 27 for prop in info.get(5, ())),
+        type=d[5][1],
+        collection_id=info[1][1],
+        size_bytes=info[10],
+        timezone_offset=info.get(8, 0),
+        utc_timestamp=info[7],
+        server_creation_timestamp=info[9],
+        upload_status=info[11],
+        quota_charged_bytes=info[35][2],
+        origin=ORIGIN_MAP[info[30][1]],
+        content_version=info[26],
+        trash_timestamp=info[16].get(3, 0),
+        is_archived=info[29][1] == 1,
+        is_favorite=info[31][1] == 1,
+        is_locked=info[39][1] == 1,
+        is_original_quality=info[35][3] == 2,
+    )
+
+    location = d[17]
+    if location.get(1):
+        item.latitude = fixed32_to_float(location[1][1])
+        item.longitude = fixed32_to_float(location[1][2])
+    if location.get(5):
+        item.location_name = location[5][2][1]
+        item.location_id = location[5][3]
+
+    media = d[5]
+    if photo := media.get(2):
+        item.is_edited = 4 in photo
+        item.remote_url = photo[1][1]
+        item.width = photo[1][9][1]
+        item.height = photo[1][9][2]
+        if exif := photo[1][9].get(5):
+            item.make = exif.get(1)
+            item.model = exif.get(2)
+            item.aperture = exif.get(4) and int32_to_float(exif[4])
+            item.shutter_speed = exif.get(5) and int32_to_float(exif[5])
+            item.iso = exif.get(6)
+            item.focal_length = exif.get(7) and int32_to_float(exif[7])
+
+    if video := media.get(3):
+        item.remote_url = video[2][1]
+        if video_info := video.get(4):
+            item.duration = video_info.get(1)
+            item.width = video_info.get(4)
+            item.height = video_info.get(5)
+        frame_rates = video.get(6, _EMPTY)
+        item.capture_frame_rate = frame_rates.get(4) and int64_to_float(frame_rates[4])
+        item.encoded_frame_rate = frame_rates.get(5) and int64_to_float(frame_rates[5])
+
+    if micro_video := media.get(5, _EMPTY).get(2, _EMPTY).get(4):
+        item.is_micro_video = True
+        item.duration = micro_video[1]
+        item.micro_video_width = micro_video[4]
+        item.micro_video_height = micro_video[5]
+
+    return item
+
+
+def _collection_item(d: dict[int, Any]) -> CollectionItem:
+    """`db_update_parser._parse_collection_item` on a decoded `COLLECTION_ITEM_SCHEMA` dict."""
+    info = d.get(2, _EMPTY)
+    time_range = info.get(10, _EMPTY)
+    order = d.get(19, _EMPTY)
+    return CollectionItem(
+        collection_media_key=d[1],
+        collection_album_id=d.get(4, _EMPTY).get(2, _EMPTY).get(3, ""),
+        cover_item_media_key=info.get(17, _EMPTY).get(1),
+        start=time_range.get(6, _EMPTY).get(1),
+        end=time_range.get(7, _EMPTY).get(1),
+        last_activity_time_ms=time_range.get(10),
+        title=info.get(5, ""),
+        total_items=info.get(7, 0),
+        type=info.get(8, 0),
+        sort_order=order.get(1, 0),
+        is_custom_ordered=order.get(2) == 1,
+    )
+
+
+def _response_body(content: bytes) -> tuple[int, int]:
+    """Span of the top-level field 1, which wraps the whole library update."""
+    start, end = 0, 0
+    for number, wire_type, value, field_end in _iter_fields(content, 0, len(content)):
+        if number == 1 and wire_type == 2:
+            start, end = value, field_end
+    return start, end
+
+
+def read_page_tokens(content: bytes) -> tuple[str, str]:
+    """(state_token, next_page_token) of a response, skipping over the items without decoding them."""
+    next_page_token, state_token = "", ""
+    start, end = _response_body(content)
+    for number, wire_type, value, field_end in _iter_fields(content, start, end):
+        if wire_type == 2 and number == 1:
+            next_page_token = _convert(content, STRING, wire_type, value, field_end)
+        elif wire_type == 2 and number == 6:
+            state_token = _convert(content, STRING, wire_type, value, field_end)
+    return state_token, next_page_token
+
+
+def iter_media_items(content: bytes) -> Iterator[MediaItem]:
+    """Yield the media items of a library state/page response one at a time."""
+    start, end = _response_body(content)
+    for number, wire_type, value, field_end in _iter_fields(content, start, end):
+        if number == 2 and wire_type == 2:
+            yield _media_item(decode(content, MEDIA_ITEM_SCHEMA, value, field_end))
+
+
+def parse_library_response(content: bytes) -> tuple[str, str | None, list[MediaItem], list[str], list[CollectionItem], list[str]]:
+    """
+    `parse_db_update` straight from the undecoded response bytes.
+
+    Returns:
+        (state_token, next_page_token, media items, media keys to delete,
+        collection items, collection keys to delete)
+    """
+    content = bytes(content)
+    next_page_token, state_token = "", ""
+    remote_media: list[MediaItem] = []
+    media_keys_to_delete: list[str] = []
+    collections: list[CollectionItem] = []
+    collection_keys_to_delete: list[str] = []
+
+    start, end = _response_body(content)
+    for number, wire_type, value, field_end in _iter_fields(content, start, end):
+        if wire_type != 2:
+            continue
+        if number == 2:
+            remote_media.append(_media_item(decode(content, MEDIA_ITEM_SCHEMA, value, field_end)))
+        elif number == 1:
+            next_page_token = _convert(content, STRING, wire_type, value, field_end)
+        elif number == 6:
+            state_token = _convert(content, STRING, wire_type, value, field_end)
+        elif number == 3:
+            collections.append(_collection_item(decode(content, COLLECTION_ITEM_SCHEMA, value, field_end)))
+        elif number == 9:
+            deletion = decode(content, DELETION_SCHEMA, value, field_end)[1]
+            if deletion[1] == 1:
+                media_keys_to_delete.append(deletion[2][1])
+            elif deletion[1] == 4:
+                collection_keys_to_delete.append(deletion[5][2])
+
+    return state_token, next_page_token, remote_media, media_keys_to_delete, collections, collection_keys_to_delete
@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from operator import attrgetter
 
 
 @dataclass(slots=True)
@@ -45,19 +46,28 @@ class MediaItem:
     micro_video_height: int | None = None
 
 
-# @dataclass(slots=True)
-# class CollectionItem:
-#     collection_media_key: str
-#     collection_album_id: str
-#     title: str
-#     total_items: int
-#     type: int
-#     sort_order: int
-#     is_custom_ordered: bool
-#     cover_item_media_key: str | None = None
-#     start: int | None = None
-#     end: int | None = None
-#     last_activity_time_ms: int | None = None
+@dataclass(slots=True)
+class CollectionItem:
+    collection_media_key: str
+    collection_album_id: str
+    title: str
+    total_items: int
+    type: int
+    sort_order: int
+    is_custom_ordered: bool
+    cover_item_media_key: str | None = None
+    start: int | None = None
+    end: int | None = None
+    last_activity_time_ms: int | None = None
+
+
+# Field names in declaration order, which is also the column order of their tables
+MEDIA_ITEM_COLUMNS = tuple(field.name for field in fields(MediaItem))
+COLLECTION_ITEM_COLUMNS = tuple(field.name for field in fields(CollectionItem))
+
+# item -> row tuple in column order, in one C call (unlike `asdict`, which deep-copies into a dict)
+media_item_row = attrgetter(*MEDIA_ITEM_COLUMNS)
+collection_item_row = attrgetter(*COLLECTION_ITEM_COLUMNS)
 
 
 # @dataclass(slots=True)
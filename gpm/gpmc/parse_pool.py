@@ -0,0 +1,59 @@
+"""Decode and parse library responses in worker processes."""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import os
+
+from .db_update_parser import parse_db_update
+from .models import collection_item_row, media_item_row
+
+# Parsed page as row tuples in `MEDIA_ITEM_COLUMNS`/`COLLECTION_ITEM_COLUMNS` order:
+# they pickle far smaller and faster than dataclasses and go straight to `Storage.update_rows`
+PackedUpdate = tuple[str, str | None, list[tuple], list[str], list[tuple], list[str]]
+
+
+def parse_packed(content: bytes) -> PackedUpdate:
+    """`parse_db_update` for a raw response, with the items packed as row tuples."""
+    state_token, next_page_token, remote_media, media_keys_to_delete, collections, collection_keys_to_delete = parse_db_update(content)
+    return (
+        state_token,
+        next_page_token,
+        list(map(media_item_row, remote_media)),
+        media_keys_to_delete,
+        list(map(collection_item_row, collections)),
+        collection_keys_to_delete,
+    )
+
+
+class ParsePool:
+    """
+    Process pool for `parse_db_update`.
+
+    `submit` returns immediately, so the caller can fetch the next page while
+    earlier pages are parsed on other cores.
+    """
+
+    def __init__(self, workers: int | None = None) -> None:
+        """
+        Args:
+            workers: Worker processes. Defaults to the number of CPUs.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def submit(self, content: bytes) -> Future:
+        """Start parsing a raw library response; resolve the future with `result`."""
+        return self._executor.submit(parse_packed, content)
+
+    @staticmethod
+    def result(future: Future) -> PackedUpdate:
+        """Wait for a submitted page and return it in `parse_packed` form."""
+        return future.result()
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
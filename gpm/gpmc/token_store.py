@@ -0,0 +1,95 @@
+"""Encrypted on-disk cache for the bearer token, so restarts can skip the auth round-trip."""
+
+from pathlib import Path
+from urllib.parse import parse_qs
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # optional, install with `pip install gpmc[crypto]`
+    AESGCM = None
+
+FORMAT_VERSION = b"\x01"  # SHAKE-256 keystream + HMAC-SHA256 (stdlib fallback)
+NONCE_SIZE = 16
+TAG_SIZE = 32
+AESGCM_FORMAT_VERSION = b"\x02"
+AESGCM_NONCE_SIZE = 12
+
+
+class TokenStore:
+    """
+    Bearer token persisted under the account's cache dir.
+
+    The file is encrypted and authenticated with keys derived from the master
+    `Token` in auth_data, so it is useless without the credentials that could
+    mint a new bearer token anyway. Uses AES-GCM when `cryptography` is
+    installed, else a stdlib SHAKE-256 keystream with an HMAC-SHA256 tag.
+    Files in either format can be read back whenever the cipher is available.
+    """
+
+    def __init__(self, path: str | Path, auth_data: str) -> None:
+        self.path = Path(path)
+        secret = parse_qs(auth_data).get("Token", [auth_data])[0].encode()
+        self._enc_key = hmac.digest(secret, b"gpmc token store: encryption", "sha256")
+        self._mac_key = hmac.digest(secret, b"gpmc token store: authentication", "sha256")
+
+    def _xor_keystream(self, nonce: bytes, data: bytes) -> bytes:
+        keystream = hashlib.shake_256(self._enc_key + nonce).digest(len(data))
+        return (int.from_bytes(data, "big") ^ int.from_bytes(keystream, "big")).to_bytes(len(data), "big")
+
+    def _encrypt(self, plaintext: bytes) -> bytes:
+        if AESGCM is not None:
+            nonce = secrets.token_bytes(AESGCM_NONCE_SIZE)
+            return AESGCM_FORMAT_VERSION + nonce + AESGCM(self._enc_key).encrypt(nonce, plaintext, AESGCM_FORMAT_VERSION)
+        nonce = secrets.token_bytes(NONCE_SIZE)
+        body = FORMAT_VERSION + nonce + self._xor_keystream(nonce, plaintext)
+        return body + hmac.digest(self._mac_key, body, "sha256")
+
+    def _decrypt(self, blob: bytes) -> bytes | None:
+        if blob.startswith(AESGCM_FORMAT_VERSION):
+            if AESGCM is None:
+                return None
+            nonce, ciphertext = blob[1 : 1 + AESGCM_NONCE_SIZE], blob[1 + AESGCM_NONCE_SIZE :]
+            try:
+                return AESGCM(self._enc_key).decrypt(nonce, ciphertext, AESGCM_FORMAT_VERSION)
+            except (InvalidTag, ValueError):
+                return None
+        body, tag = blob[:-TAG_SIZE], blob[-TAG_SIZE:]
+        if len(body) <= len(FORMAT_VERSION) + NONCE_SIZE or not body.startswith(FORMAT_VERSION):
+            return None
+        if not hmac.compare_digest(tag, hmac.digest(self._mac_key, body, "sha256")):
+            return None
+        nonce, ciphertext = body[1 : 1 + NONCE_SIZE], body[1 + NONCE_SIZE :]
+        return self._xor_keystream(nonce, ciphertext)
+
+    def load(self) -> dict[str, str] | None:
+        """Stored auth response, or None if missing, unreadable, tampered with or expired."""
+        try:
+            plaintext = self._decrypt(self.path.read_bytes())
+            if plaintext is None:
+                return None
+            auth_response = json.loads(plaintext)
+        except (OSError, ValueError):
+            return None
+        if not auth_response.get("Auth") or int(auth_response.get("Expiry", "0")) <= int(time.time()):
+            return None
+        return auth_response
+
+    def save(self, auth_response: dict[str, str]) -> None:
+        """Persist the token and its expiry (other auth response fields are not stored)."""
+        plaintext = json.dumps({"Auth": auth_response.get("Auth", ""), "Expiry": auth_response.get("Expiry", "0")}).encode()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as file:
+            file.write(self._encrypt(plaintext))
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
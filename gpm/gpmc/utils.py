@@ -1,4 +1,5 @@
 import logging
+import os
 import struct
 
 from rich.logging import RichHandler
@@ -62,3 +63,15 @@ def parse_language(s: str) -> str:
         if "lang" in line:
             return line.split("=")[1]
     return ""
+
+
+def resolve_auth_data(auth_data: str | None) -> str:
+    """Return auth_data, falling back to the `GP_AUTH_DATA` environment variable."""
+    if auth_data:
+        return auth_data
+
+    env_auth = os.getenv("GP_AUTH_DATA")
+    if env_auth is not None:
+        return env_auth
+
+    raise ValueError("`GP_AUTH_DATA` environment variable not set. Create it or provide `auth_data` as an argument.")
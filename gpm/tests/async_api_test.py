@@ -0,0 +1,63 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+
+from gpmc.api import RpcRequest
+from gpmc.async_api import AsyncApi
+
+AUTH_DATA = "androidId=1&Email=user%40example.com&Token=secret"
+
+
+class TestAsyncRetries(unittest.TestCase):
+    def send(self, request: RpcRequest, handler) -> tuple[list, object]:
+        calls = []
+
+        def record(http_request):
+            calls.append(http_request)
+            return handler(len(calls))
+
+        async def run():
+            api = AsyncApi(AUTH_DATA)
+            api._client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+            try:
+                return await api._send(request)
+            except Exception as e:
+                return e
+            finally:
+                await api.aclose()
+
+        with mock.patch("gpmc.async_api.retry_delay", return_value=0):
+            return calls, asyncio.run(run())
+
+    def test_post_not_retried_after_it_may_have_run(self):
+        request = RpcRequest("https://example.com/rpc", {}, b"body", authorize=False)
+        calls, result = self.send(request, lambda n: httpx.Response(503))
+        self.assertEqual(len(calls), 1)
+        self.assertIsInstance(result, httpx.HTTPStatusError)
+
+        def read_timeout(n):
+            raise httpx.ReadTimeout("timed out")
+
+        calls, result = self.send(request, read_timeout)
+        self.assertEqual(len(calls), 1)
+        self.assertIsInstance(result, httpx.ReadTimeout)
+
+    def test_connect_errors_and_idempotent_statuses_retried(self):
+        def connect_error_once(n):
+            if n == 1:
+                raise httpx.ConnectError("refused")
+            return httpx.Response(200, content=b"ok")
+
+        request = RpcRequest("https://example.com/rpc", {}, b"body", parse=lambda response: response.content, authorize=False)
+        calls, result = self.send(request, connect_error_once)
+        self.assertEqual((len(calls), result), (2, b"ok"))
+
+        request.idempotent = True
+        calls, result = self.send(request, lambda n: httpx.Response(503 if n < 3 else 200, content=b"ok"))
+        self.assertEqual((len(calls), result), (3, b"ok"))
+
+
+if __name__ == "__main__":
+    unittest.main()
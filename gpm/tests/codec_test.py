@@ -0,0 +1,60 @@
+import unittest
+
+from blackboxprotobuf import encode_message as bbp_encode_message
+
+from gpmc import api, message_types
+from gpmc.codec import Param, RequestTemplate, encode_message
+
+
+def _fill(value, values: dict):
+    if isinstance(value, Param):
+        return values[value.name]
+    if isinstance(value, dict):
+        return {key: _fill(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, values) for item in value]
+    return value
+
+
+class TestEncodeMessage(unittest.TestCase):
+    def test_matches_blackboxprotobuf(self):
+        typedef = {
+            "1": {"type": "int"},
+            "2": {"type": "string"},
+            "3": {"type": "bytes"},
+            "4": {
+                "type": "message",
+                "field_order": ["2", "1"],
+                "message_typedef": {"1": {"type": "string"}, "2": {"type": "int"}},
+            },
+            "5": {"type": "packed_int"},
+        }
+        for body in (
+            {"1": -5, "2": "ünïcode", "3": b"\x00\xff", "4": {"1": "a", "2": 300}, "5": [1, 2, 1 << 40]},
+            {"4": [{"1": "x", "2": 1}, {"2": 2}], "1": [3, 4]},
+            {"2": "", "4": {}},
+        ):
+            self.assertEqual(encode_message(body, typedef), bbp_encode_message(body, typedef))
+
+    def test_real_typedefs(self):
+        body = {"1": [{"1": "key", "2": {"1": 1}}, {"1": "other", "2": {"1": 1}}], "3": 1}
+        self.assertEqual(encode_message(body, message_types.SET_ARCHIVED), bbp_encode_message(body, message_types.SET_ARCHIVED))
+
+
+class TestRequestTemplate(unittest.TestCase):
+    def test_library_templates_match_blackboxprotobuf(self):
+        tokens = {"state_token": "CAESs" * 40, "page_token": "ÿpage"}
+        for template in (api._LIB_STATE_TEMPLATE, api._LIB_PAGE_INIT_TEMPLATE, api._LIB_PAGE_TEMPLATE):
+            for values in (tokens, {"state_token": "", "page_token": ""}):
+                expected = bbp_encode_message(_fill(template.body, values), template.typedef)
+                self.assertEqual(template.render(**values), expected)
+
+    def test_param_in_nested_message(self):
+        typedef = {"1": {"type": "message", "message_typedef": {"1": {"type": "string"}, "2": {"type": "int"}}}, "2": {"type": "int"}}
+        template = RequestTemplate({"1": {"1": Param("token"), "2": 7}, "2": 1}, typedef)
+        for token in ("", "t" * 200):
+            self.assertEqual(template.render(token=token), bbp_encode_message({"1": {"1": token, "2": 7}, "2": 1}, typedef))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from gpmc.db import MIGRATIONS, Storage
+from gpmc.db_update_parser import parse_db_update
+from gpmc.models import MEDIA_ITEM_COLUMNS, MediaItem, media_item_row
+
+
+def _media_item(media_key: str, collection_id: str, utc_timestamp: int) -> MediaItem:
+    return MediaItem(
+        media_key=media_key,
+        file_name=f"{media_key}.mp4",
+        dedup_key=f"dedup-{media_key}",
+        is_canonical=True,
+        type=2,
+        caption=None,
+        collection_id=collection_id,
+        size_bytes=1024,
+        quota_charged_bytes=0,
+        origin="self",
+        content_version=1,
+        utc_timestamp=utc_timestamp,
+        server_creation_timestamp=utc_timestamp,
+    )
+
+
+class TestCollections(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = Storage(Path(self.tmp_dir.name) / "storage.db")
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def test_parse_collections(self):
+        """Test collection items and deletions are parsed from a library update."""
+        data = {
+            "1": {
+                "3": {
+                    "1": "AF1Qalbum",
+                    "2": {"5": "Havoc", "7": 2, "8": 1, "10": {"6": {"1": 1}, "7": {"1": 2}, "10": 3}, "17": {"1": "m1"}},
+                    "4": {"2": {"3": "album-id"}},
+                    "19": {"1": 0, "2": 1},
+                },
+                "9": [{"1": {"1": 4, "5": {"2": "AF1Qgone"}}}, {"1": {"1": 1, "2": {"1": "m9"}}}],
+            }
+        }
+        _, _, media, media_deletions, collections, collection_deletions = parse_db_update(data)
+        self.assertEqual(media, [])
+        self.assertEqual(media_deletions, ["m9"])
+        self.assertEqual(collection_deletions, ["AF1Qgone"])
+        self.assertEqual(collections[0].title, "Havoc")
+        self.assertEqual(collections[0].collection_album_id, "album-id")
+        self.assertEqual(collections[0].cover_item_media_key, "m1")
+        self.assertTrue(collections[0].is_custom_ordered)
+
+    def test_album_membership(self):
+        """Test albums list with counts and page through their items."""
+        data = {"1": {"3": {"1": "AF1Qalbum", "2": {"5": "Havoc", "7": 2}}}}
+        collections = parse_db_update(data)[4]
+        self.storage.update_collections(collections)
+        self.storage.update([_media_item("m1", "AF1Qalbum", 10), _media_item("m2", "AF1Qalbum", 20), _media_item("m3", "other", 30)])
+
+        albums = {album["collection_media_key"]: album for album in self.storage.list_collections()}
+        self.assertEqual(albums["AF1Qalbum"]["title"], "Havoc")
+        self.assertEqual(albums["AF1Qalbum"]["media_count"], 2)
+        self.assertEqual(albums["other"]["media_count"], 1)
+
+        collection = self.storage.get_collection("Havoc")
+        items = self.storage.get_collection_media([collection["collection_media_key"]])
+        self.assertEqual([item["media_key"] for item in items], ["m2", "m1"])
+        self.assertEqual(len(self.storage.get_collection_media(["AF1Qalbum"], limit=1, offset=1)), 1)
+
+        # Moving and deleting items keep membership in sync
+        self.storage.update([_media_item("m1", "other", 10)])
+        self.storage.delete(["m2"])
+        self.assertEqual(self.storage.get_collection_media(["AF1Qalbum"]), [])
+        self.assertEqual(len(self.storage.get_collection_media(["other"])), 2)
+
+        self.storage.delete_collections(["AF1Qalbum"])
+        self.assertIsNone(self.storage.get_collection("Havoc"))
+
+
+    def test_update_fields(self):
+        """Test write-through of a mutation to many rows."""
+        self.storage.update([_media_item("m1", "", 1), _media_item("m2", "", 2)])
+        self.assertEqual(self.storage.get_dedup_keys(["m1", "nope"]), {"m1": "dedup-m1"})
+        self.storage.update_fields(["m1", "m2"], {"is_favorite": 1, "caption": "hi"})
+        rows = self.storage.get_media(["m1", "m2"])
+        self.assertEqual([(row["is_favorite"], row["caption"]) for row in rows], [(1, "hi"), (1, "hi")])
+
+
+class TestTransactions(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / "storage.db"
+        self.storage = Storage(self.db_path)
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def test_wal_mode(self):
+        self.assertEqual(self.storage.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_delete_more_keys_than_variable_limit(self):
+        """Test deletes beyond SQLite's bound-parameter limit are chunked."""
+        keys = [f"m{i}" for i in range(2500)]
+        self.storage.update([_media_item(key, "album", i) for i, key in enumerate(keys)])
+        self.storage.delete(keys[:2400])
+        self.assertEqual(len(self.storage.get_media(keys)), 100)
+        self.assertEqual(len(self.storage.get_collection_media(["album"])), 100)
+
+    def test_nested_transaction_rolls_back_as_one(self):
+        with self.assertRaises(RuntimeError):
+            with self.storage.transaction():
+                self.storage.update([_media_item("m1", "", 1)])
+                self.storage.update_state_tokens("state", "page")
+                raise RuntimeError
+        self.assertEqual(self.storage.get_media(["m1"]), [])
+        self.assertEqual(self.storage.get_state_tokens(), ("", ""))
+
+    def test_reader_sees_last_commit_during_write(self):
+        """Test a read-only connection is not blocked by an open write transaction."""
+        self.storage.update([_media_item("m1", "", 1)])
+        with Storage(self.db_path, read_only=True) as reader:
+            with self.storage.transaction():
+                self.storage.update([_media_item("m2", "", 2)])
+                self.assertEqual([row["media_key"] for row in reader.get_media(["m1", "m2"])], ["m1"])
+            self.assertEqual(len(reader.get_media(["m1", "m2"])), 2)
+
+
+class TestQueries(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / "storage.db"
+        self.storage = Storage(self.db_path)
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def test_migrations(self):
+        """Test indexes are created once and the schema version is recorded."""
+        self.storage.close()
+        self.storage = Storage(self.db_path)
+        self.assertEqual(self.storage.conn.execute("PRAGMA user_version").fetchone()[0], len(MIGRATIONS))
+        indexes = {row[0] for row in self.storage.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertLessEqual({"idx_remote_media_timeline", "idx_remote_media_type_timeline", "idx_remote_media_dedup_key"}, indexes)
+
+    def test_collection_media_backfilled_once(self):
+        """Test membership is rebuilt for a pre-migration cache, and not on later opens."""
+        self.storage.update([_media_item("m1", "album", 1), _media_item("m2", "", 2)])
+        self.storage.conn.execute("DELETE FROM collection_media")
+        self.storage.conn.execute("PRAGMA user_version = 1")
+        self.storage.close()
+
+        self.storage = Storage(self.db_path)
+        self.assertEqual([item["media_key"] for item in self.storage.get_collection_media(["album"])], ["m1"])
+
+        self.storage.conn.execute("DELETE FROM collection_media")
+        self.storage.close()
+        self.storage = Storage(self.db_path)
+        self.assertEqual(self.storage.get_collection_media(["album"]), [])
+
+    def test_list_media(self):
+        items = [_media_item(f"m{i}", "", i) for i in range(6)]
+        items[1].type = 1
+        items[2].trash_timestamp = 5
+        self.storage.update(items)
+        self.storage.update_fields(["m3"], {"trash_timestamp": None})
+
+        self.assertEqual([row["media_key"] for row in self.storage.list_media()], ["m5", "m4", "m3", "m1", "m0"])
+        self.assertEqual([row["media_key"] for row in self.storage.list_media("videos", include_trashed=True, limit=2, offset=1)], ["m4", "m3"])
+        self.assertEqual([row["media_key"] for row in self.storage.list_media("images")], ["m1"])
+        self.assertEqual(self.storage.list_media(name_filter="M4", ignore_case=True, columns=["media_key", "type"]), [{"media_key": "m4", "type": 2}])
+        self.assertEqual(len(self.storage.list_media(name_filter="m4", exclude=True)), 4)
+
+        plan = self.storage.conn.execute("EXPLAIN QUERY PLAN SELECT * FROM remote_media WHERE IFNULL(trash_timestamp, 0) = 0 ORDER BY utc_timestamp DESC").fetchall()
+        self.assertIn("idx_remote_media_timeline", str(plan))
+
+    def test_row_tuples_match_schema(self):
+        """Test rows from `media_item_row` bind to remote_media's columns in order."""
+        columns = tuple(row[1] for row in self.storage.conn.execute("PRAGMA table_info(remote_media)"))
+        self.assertEqual(columns, MEDIA_ITEM_COLUMNS)
+        item = _media_item("m1", "album", 1)
+        self.storage.update_rows([media_item_row(item)])
+        self.assertEqual(tuple(self.storage.get_media(["m1"])[0].values()), media_item_row(item))
+
+    def test_media_keys_by_dedup_key(self):
+        self.storage.update([_media_item("m1", "", 1), _media_item("m2", "", 2)])
+        self.storage.update_fields(["m2"], {"dedup_key": "dedup-m1"})
+        self.assertEqual(self.storage.get_media_keys_by_dedup_key(["dedup-m1", "nope"]), {"dedup-m1": ["m1", "m2"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
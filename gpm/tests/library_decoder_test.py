@@ -0,0 +1,45 @@
+import base64
+import hashlib
+import unittest
+
+from blackboxprotobuf import decode_message
+
+from gpmc import message_types
+from gpmc.db_update_parser import parse_db_update
+from gpmc.library_decoder import iter_media_items
+from gpmc.utils import urlsafe_base64
+from library_fixtures import library_response, media_item, message
+
+
+def _decode(content: bytes) -> dict:
+    decoded, _ = decode_message(content, message_type=message_types.LIB_STATE_RESPONSE_FIX)
+    return decoded
+
+
+class TestLibraryDecoder(unittest.TestCase):
+    def test_matches_blackboxprotobuf_path(self):
+        content = library_response(60, deletions=4)
+        self.assertEqual(parse_db_update(content), parse_db_update(_decode(content)))
+
+    def test_iter_media_items(self):
+        content = library_response(10)
+        self.assertEqual(list(iter_media_items(content)), parse_db_update(content)[2])
+
+    def test_single_item_and_binary_dedup_key(self):
+        item = media_item(2)
+        info = dict(item)[2]
+        info[info.index((21, [(1, "dedup-00000002")]))] = (21, [(1, b"\xff\xfe")])
+        content = message((1, [(1, ""), (6, "state"), (2, item)]))
+        state_token, page_token, media, *_ = parse_db_update(content)
+        self.assertEqual((state_token, page_token), ("state", ""))
+        self.assertEqual(media, parse_db_update(_decode(content))[2])
+        sha1 = base64.b64encode(hashlib.sha1(b"2").digest()).decode()
+        self.assertEqual(media[0].dedup_key, urlsafe_base64(sha1))
+
+    def test_truncated_response(self):
+        with self.assertRaises((ValueError, IndexError)):
+            parse_db_update(library_response(2)[:-5])
+
+
+if __name__ == "__main__":
+    unittest.main()
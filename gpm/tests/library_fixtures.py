@@ -0,0 +1,91 @@
+"""Synthetic library state responses with the wire layout `db_update_parser` expects."""
+
+import hashlib
+import struct
+
+
+def _varint(value: int) -> bytes:
+    value &= (1 << 64) - 1
+    output = bytearray()
+    while value > 0x7F:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+    return bytes(output)
+
+
+class Fixed32(int):
+    pass
+
+
+class Fixed64(int):
+    pass
+
+
+def message(*fields: tuple[int, object]) -> bytes:
+    """Encode (field number, value) pairs: ints as varints, str/bytes as length-delimited, lists as nested messages."""
+    output = bytearray()
+    for number, value in fields:
+        if isinstance(value, Fixed32):
+            output += _varint(number << 3 | 5) + struct.pack("<I", value)
+        elif isinstance(value, Fixed64):
+            output += _varint(number << 3 | 1) + struct.pack("<Q", value)
+        elif isinstance(value, int):
+            output += _varint(number << 3) + _varint(value)
+        else:
+            if isinstance(value, list):
+                value = message(*value)
+            elif isinstance(value, str):
+                value = value.encode()
+            output += _varint(number << 3 | 2) + _varint(len(value)) + value
+    return bytes(output)
+
+
+def media_item(i: int) -> list:
+    """One media item; even indexes are photos with EXIF and location, odd ones videos."""
+    sha1 = hashlib.sha1(str(i).encode()).digest()
+    info = [
+        (1, [(1, f"collection{i % 7:04d}")]),
+        (3, f"caption {i}" if i % 3 else ""),
+        (4, f"IMG_{i:06d}.jpg" if i % 2 == 0 else f"VID_{i:06d}.mp4"),
+        (5, [(1, 1)]),
+        (5, [(1, 27 if i % 5 == 0 else 2)]),
+        (7, 1_600_000_000_000 + i),
+        (8, -7_200_000 if i % 4 else 3_600_000),
+        (9, 1_600_000_100_000 + i),
+        (10, 1_000_000 + i),
+        (11, 1),
+        (13, [(1, sha1)]),
+        (16, [(3, 1_700_000_000_000)] if i % 11 == 0 else []),
+        (21, [(1, f"dedup-{i:08d}")]),
+        (26, i % 3 + 1),
+        (29, [(1, 1 if i % 13 == 0 else 0)]),
+        (30, [(1, 1)]),
+        (31, [(1, 1 if i % 2 else 0)]),
+        (35, [(2, 1_000_000 + i), (3, 2)]),
+        (39, [(1, 0)]),
+    ]
+    if i % 2 == 0:
+        media = [
+            (1, 1),
+            (2, [(1, [(1, f"https://lh3.googleusercontent.com/photo{i}"), (9, [(1, 4032), (2, 3024), (5, [(1, "Google"), (2, "Pixel 8"), (4, Fixed32(0x3FE66666)), (5, Fixed32(0x3C23D70A)), (6, 100), (7, Fixed32(0x40C00000))])])])]),
+        ]
+        location = [(1, [(1, Fixed32(523_000_000)), (2, Fixed32(133_000_000))]), (5, [(2, [(1, "Berlin")]), (3, f"loc{i}")])]
+    else:
+        media = [
+            (1, 2),
+            (3, [(2, [(1, f"https://lh3.googleusercontent.com/video{i}")]), (4, [(1, 12_345), (4, 1920), (5, 1080)]), (6, [(4, Fixed64(0x403E000000000000)), (5, Fixed64(0x403E000000000000))])]),
+        ]
+        location = []
+    # Fields the parser does not read, to give items a realistic size
+    unused = [(6, [(1, "x" * 40), (2, [(1, 1), (2, 2)])]), (9, "y" * 120), (12, [(3, [(1, 1)]) for _ in range(8)])]
+    return [(1, f"AF1Qip{i:030d}"), (2, info), (5, media), (17, location)] + unused
+
+
+def library_response(count: int, deletions: int = 0, page_token: str = "next-page", state_token: str = "state") -> bytes:
+    body = [(1, page_token), (6, state_token)]
+    body += [(2, media_item(i)) for i in range(count)]
+    body += [(3, [(1, f"album{i}"), (2, [(5, f"Album {i}"), (7, 10 + i), (8, 1), (10, [(6, [(1, 1000)]), (7, [(1, 2000)]), (10, 3000)]), (17, [(1, f"AF1Qip{i:030d}")])]), (4, [(2, [(3, f"album-id-{i}")])]), (19, [(1, 1), (2, 1)])]) for i in range(3)]
+    body += [(9, [(1, [(1, 1), (2, [(1, f"AF1Qipdel{i:027d}")])])]) for i in range(deletions)]
+    body += [(9, [(1, [(1, 4), (5, [(2, "album-gone")])])])]
+    return message((1, body))
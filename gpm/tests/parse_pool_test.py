@@ -0,0 +1,105 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from gpmc.client import Client
+from gpmc.db_update_parser import parse_db_update
+from gpmc.models import collection_item_row, media_item_row
+from gpmc.parse_pool import ParsePool
+from library_fixtures import library_response
+
+AUTH_DATA = "androidId=1&Email=user%40example.com&Token=secret&lang=en_US"
+
+
+class FakeApi:
+    """Serves a library of `pages` pages, 50 items each."""
+
+    def __init__(self, pages: int, fail_at: int | None = None) -> None:
+        self.pages = pages
+        self.fail_at = fail_at
+
+    def _page(self, index: int) -> bytes:
+        next_page_token = f"page{index + 1}" if index + 1 < self.pages else ""
+        content = library_response(50, page_token=next_page_token, state_token="state")
+        # Distinct media keys per page
+        return content.replace(b"AF1Qip", f"AF{index:04d}".encode())
+
+    def get_library_state(self, state_token: str = "", raw: bool = False) -> bytes:
+        return library_response(0, page_token="page1" if not state_token else "", state_token="state")
+
+    def get_library_page_init(self, page_token: str = "", raw: bool = False) -> bytes:
+        index = int(page_token.removeprefix("page"))
+        if index == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError("network down")
+        return self._page(index)
+
+    def get_library_page(self, page_token: str = "", state_token: str = "", raw: bool = False) -> bytes:
+        return self._page(int(page_token.removeprefix("page")))
+
+
+class TestParsePool(unittest.TestCase):
+    def test_round_trip(self):
+        content = library_response(20, deletions=2)
+        with ParsePool(2) as pool:
+            packed = pool.result(pool.submit(content))
+        state_token, next_page_token, remote_media, media_keys_to_delete, collections, collection_keys_to_delete = parse_db_update(content)
+        self.assertEqual(
+            packed,
+            (
+                state_token,
+                next_page_token,
+                list(map(media_item_row, remote_media)),
+                media_keys_to_delete,
+                list(map(collection_item_row, collections)),
+                collection_keys_to_delete,
+            ),
+        )
+
+    def test_update_cache_with_pool_matches_serial(self):
+        snapshots = []
+        for parse_workers in (0, 2):
+            with tempfile.TemporaryDirectory() as home, mock.patch.object(Path, "home", return_value=Path(home)):
+                client = Client(AUTH_DATA, log_level="ERROR")
+                client.api = FakeApi(pages=6)
+                client.update_cache(show_progress=False, parse_workers=parse_workers)
+                with sqlite3.connect(client.db_path) as conn:
+                    snapshots.append(conn.execute("SELECT * FROM remote_media ORDER BY media_key").fetchall())
+        self.assertEqual(len(snapshots[0]), 5 * 50)
+        self.assertEqual(snapshots[0], snapshots[1])
+
+
+class TestPagePipeline(unittest.TestCase):
+    def test_resume_after_failed_fetch(self):
+        with tempfile.TemporaryDirectory() as home, mock.patch.object(Path, "home", return_value=Path(home)):
+            client = Client(AUTH_DATA, log_level="ERROR")
+            client.api = FakeApi(pages=6, fail_at=4)
+            with self.assertRaises(ConnectionError):
+                client.update_cache(show_progress=False)
+
+            # Pages fetched before the failure are stored, and the checkpoint is the failed page
+            with sqlite3.connect(client.db_path) as conn:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM remote_media").fetchone()[0], 3 * 50)
+                self.assertEqual(conn.execute("SELECT page_token FROM state").fetchone()[0], "page4")
+
+            client.update_cache(show_progress=False)
+            with sqlite3.connect(client.db_path) as conn:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM remote_media").fetchone()[0], 5 * 50)
+
+    def test_writer_error_stops_fetching(self):
+        with tempfile.TemporaryDirectory() as home, mock.patch.object(Path, "home", return_value=Path(home)):
+            client = Client(AUTH_DATA, log_level="ERROR")
+            client.api = FakeApi(pages=50)
+            fetched = []
+            fetch = client.api.get_library_page_init
+            client.api.get_library_page_init = lambda token, raw=False: fetched.append(token) or fetch(token)
+            with mock.patch.object(Client, "_store_page", side_effect=RuntimeError("disk full")):
+                with self.assertRaises(RuntimeError):
+                    client.update_cache(show_progress=False)
+            self.assertLess(len(fetched), 49)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from gpmc import token_store
+from gpmc.api import Api, TOKEN_REFRESH_MARGIN
+from gpmc.token_store import TokenStore
+
+AUTH_DATA = "androidId=1&Email=user%40example.com&Token=aas_et%2Fsecret"
+
+
+class TestTokenStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "auth_token"
+        self.auth_response = {"Auth": "ya29.token", "Expiry": str(int(time.time()) + 3600), "issueAdvice": "auto"}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        TokenStore(self.path, AUTH_DATA).save(self.auth_response)
+        self.assertNotIn(b"ya29.token", self.path.read_bytes())
+        self.assertEqual(TokenStore(self.path, AUTH_DATA).load(), {"Auth": "ya29.token", "Expiry": self.auth_response["Expiry"]})
+
+    def test_rejects_other_account_tampering_and_expiry(self):
+        TokenStore(self.path, AUTH_DATA).save(self.auth_response)
+        self.assertIsNone(TokenStore(self.path, AUTH_DATA.replace("secret", "other")).load())
+
+        blob = bytearray(self.path.read_bytes())
+        blob[20] ^= 1
+        self.path.write_bytes(blob)
+        self.assertIsNone(TokenStore(self.path, AUTH_DATA).load())
+
+        TokenStore(self.path, AUTH_DATA).save({"Auth": "ya29.token", "Expiry": "1"})
+        self.assertIsNone(TokenStore(self.path, AUTH_DATA).load())
+
+    def test_stdlib_fallback_format(self):
+        """Files written without `cryptography` stay readable and tamper-evident."""
+        with mock.patch.object(token_store, "AESGCM", None):
+            TokenStore(self.path, AUTH_DATA).save(self.auth_response)
+            self.assertEqual(self.path.read_bytes()[:1], token_store.FORMAT_VERSION)
+            self.assertEqual(TokenStore(self.path, AUTH_DATA).load()["Auth"], "ya29.token")
+        self.assertEqual(TokenStore(self.path, AUTH_DATA).load()["Auth"], "ya29.token")
+
+        blob = bytearray(self.path.read_bytes())
+        blob[20] ^= 1
+        self.path.write_bytes(blob)
+        self.assertIsNone(TokenStore(self.path, AUTH_DATA).load())
+
+    def test_api_reuses_persisted_token(self):
+        TokenStore(self.path, AUTH_DATA).save(self.auth_response)
+        api = Api(AUTH_DATA, token_path=self.path)
+        api._get_auth_token = lambda: self.fail("token should come from disk")
+        self.assertEqual(api.bearer_token, "ya29.token")
+
+
+class TestTokenRefresh(unittest.TestCase):
+    def setUp(self):
+        self.api = Api(AUTH_DATA)
+        self.calls = 0
+
+        def get_auth_token():
+            self.calls += 1
+            time.sleep(0.05)
+            return {"Auth": f"token-{self.calls}", "Expiry": str(int(time.time()) + 3600)}
+
+        self.api._get_auth_token = get_auth_token
+
+    def test_expired_token_refreshed_once(self):
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(self.api.bearer_token)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(set(tokens), {"token-1"})
+
+    def test_expiring_token_refreshed_in_background(self):
+        self.api.auth_response_cache = {"Auth": "old", "Expiry": str(int(time.time()) + TOKEN_REFRESH_MARGIN // 2)}
+        self.assertEqual(self.api.bearer_token, "old")
+        with self.api._token_lock:
+            pass
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.api.bearer_token, "token-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
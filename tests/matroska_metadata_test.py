@@ -0,0 +1,46 @@
+import unittest
+from pathlib import Path
+
+from google_photos_api import MKV_CLUSTER_ID, detect_container, extract_matroska_metadata
+
+SAMPLE = (Path(__file__).resolve().parent.parent / "gpm" / "media" / "sample_640x360.mkv").read_bytes()
+HEAD_BYTES = 64 * 1024  # The Cues of the sample sit past this, near the end of the file
+
+
+class TestMatroskaMetadata(unittest.TestCase):
+    def setUp(self):
+        self.reads = []
+
+    def read_range(self, start: int, end: int) -> bytes:
+        self.reads.append((start, end))
+        return SAMPLE[start:end + 1]
+
+    def test_detect_container(self):
+        self.assertEqual(detect_container(SAMPLE[:16], "video.mp4"), "matroska")
+
+    def test_cues_fetched_by_range(self):
+        metadata = extract_matroska_metadata(SAMPLE[:HEAD_BYTES], len(SAMPLE), "sample.mkv", self.read_range)
+        self.assertEqual(metadata["container"], "matroska")
+        self.assertEqual(metadata["duration_ms"], 13346)
+        self.assertEqual(len(metadata["seek_index"]), 2)
+        self.assertTrue(self.reads)
+        self.assertTrue(all(start >= HEAD_BYTES for start, _ in self.reads))
+
+        # Cue positions map to absolute offsets of Clusters
+        times = [time_ms for time_ms, _ in metadata["seek_index"]]
+        self.assertEqual(times, sorted(times))
+        for _, byte_offset in metadata["seek_index"]:
+            self.assertEqual(int.from_bytes(SAMPLE[byte_offset:byte_offset + 4], "big"), MKV_CLUSTER_ID)
+
+    def test_head_only_without_reader(self):
+        metadata = extract_matroska_metadata(SAMPLE[:HEAD_BYTES], len(SAMPLE), "sample.mkv")
+        self.assertEqual(metadata["duration_ms"], 13346)
+        self.assertEqual(metadata["seek_index"], [])
+
+    def test_failed_range_read_leaves_empty_index(self):
+        metadata = extract_matroska_metadata(SAMPLE[:HEAD_BYTES], len(SAMPLE), "sample.mkv", lambda start, end: b"")
+        self.assertEqual(metadata["seek_index"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from google_photos_api import RamSegmentCache
+
+
+class TestRamSegmentCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = RamSegmentCache(100)
+        self.cache.put(("head", "hot"), b"h" * 60)
+        for _ in range(5):
+            self.cache.get(("head", "hot"))
+
+    def test_cold_candidate_does_not_evict_hotter_entry(self):
+        self.assertFalse(self.cache.put(("head", "cold"), b"c" * 60))
+        self.assertIn(("head", "hot"), self.cache)
+        self.assertEqual(self.cache.rejected, 1)
+
+    def test_admit_bypasses_frequency_check(self):
+        """Planned prefetches have no request history yet but must still be stored."""
+        self.assertTrue(self.cache.put(("head", "planned"), b"p" * 60, admit=True))
+        self.assertIn(("head", "planned"), self.cache)
+        self.assertNotIn(("head", "hot"), self.cache)
+        self.assertEqual(self.cache.current_bytes, 60)
+
+    def test_rejected_replacement_keeps_existing_entry(self):
+        self.cache.put(("head", "cold"), b"c" * 40, admit=True)
+        self.assertFalse(self.cache.put(("head", "cold"), b"C" * 80))
+        self.assertEqual(self.cache.get(("head", "cold")), b"c" * 40)
+        self.assertEqual(self.cache.current_bytes, 100)
+
+    def test_replacement_counts_existing_bytes_as_free(self):
+        self.assertTrue(self.cache.put(("head", "hot"), b"H" * 90))
+        self.assertEqual(self.cache.get(("head", "hot")), b"H" * 90)
+        self.assertEqual(self.cache.current_bytes, 90)
+
+
+if __name__ == "__main__":
+    unittest.main()
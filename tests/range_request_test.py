@@ -0,0 +1,77 @@
+import unittest
+
+from google_photos_api import RANGE_MAX_PARTS, Request, evaluate_range_request, parse_byte_ranges
+
+ETAG = '"title-1"'
+SIZE = 10_000
+
+
+def make_request(**headers) -> Request:
+    return Request({"type": "http", "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+
+class TestParseByteRanges(unittest.TestCase):
+    def test_table(self):
+        cases = [
+            # header, file size, expected
+            ("bytes=0-499", SIZE, [(0, 499)]),
+            ("bytes=500-", SIZE, [(500, SIZE - 1)]),
+            ("bytes=-500", SIZE, [(SIZE - 500, SIZE - 1)]),
+            ("bytes=0-1,-1024", SIZE, [(0, 1), (SIZE - 1024, SIZE - 1)]),
+            ("bytes=-20000", SIZE, [(0, SIZE - 1)]),
+            ("bytes=9000-20000", SIZE, [(9000, SIZE - 1)]),
+            (" bytes = 0 - 9 , 20 - 29 ", SIZE, [(0, 9), (20, 29)]),
+            # Overlapping and adjacent ranges coalesce, in order
+            ("bytes=100-199,0-99,150-300", SIZE, [(0, 300)]),
+            ("bytes=0-9,10-19", SIZE, [(0, 19)]),
+            ("bytes=0-9,11-19", SIZE, [(0, 9), (11, 19)]),
+            # Valid but unsatisfiable: 416
+            ("bytes=10000-", SIZE, []),
+            ("bytes=20000-30000", SIZE, []),
+            ("bytes=-0", SIZE, []),
+            ("bytes=-100", 0, []),
+            # Ignored: answered with the full body
+            ("items=0-9", SIZE, None),
+            ("bytes=", SIZE, None),
+            ("bytes=-", SIZE, None),
+            ("bytes=abc", SIZE, None),
+            ("bytes=9-0", SIZE, None),
+            ("bytes=0-9,x", SIZE, None),
+            ("bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(RANGE_MAX_PARTS)), SIZE,
+             [(i * 10, i * 10 + 1) for i in range(RANGE_MAX_PARTS)]),
+            ("bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(RANGE_MAX_PARTS + 1)), SIZE, None),
+        ]
+        for header, file_size, expected in cases:
+            with self.subTest(header=header, file_size=file_size):
+                self.assertEqual(parse_byte_ranges(header, file_size), expected)
+
+
+class TestEvaluateRangeRequest(unittest.TestCase):
+    def test_table(self):
+        cases = [
+            # headers, file size, expected (status, ranges)
+            ({}, SIZE, (200, None)),
+            ({"range": "bytes=0-1,-1024"}, SIZE, (206, [(0, 1), (SIZE - 1024, SIZE - 1)])),
+            ({"range": "bytes=20000-"}, SIZE, (416, None)),
+            ({"range": "bytes=9-0"}, SIZE, (200, None)),
+            ({"range": "bytes=0-9"}, 0, (200, None)),
+            ({"if_none_match": ETAG}, SIZE, (304, None)),
+            ({"if_none_match": f'"other", {ETAG}', "range": "bytes=0-9"}, SIZE, (304, None)),
+            ({"if_none_match": "*"}, SIZE, (304, None)),
+            ({"if_none_match": '"other"', "range": "bytes=0-9"}, SIZE, (206, [(0, 9)])),
+            ({"if_range": ETAG, "range": "bytes=0-9"}, SIZE, (206, [(0, 9)])),
+            # A stale or dated If-Range gets the whole current representation
+            ({"if_range": '"other"', "range": "bytes=0-9"}, SIZE, (200, None)),
+            ({"if_range": "Wed, 21 Oct 2015 07:28:00 GMT", "range": "bytes=0-9"}, SIZE, (200, None)),
+            ({"if_range": '"other"', "range": "bytes=20000-"}, SIZE, (200, None)),
+        ]
+        for headers, file_size, expected in cases:
+            with self.subTest(headers=headers, file_size=file_size):
+                self.assertEqual(evaluate_range_request(make_request(**headers), ETAG, file_size), expected)
+
+    def test_without_request(self):
+        self.assertEqual(evaluate_range_request(None, ETAG, SIZE), (200, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
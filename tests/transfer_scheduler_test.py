@@ -0,0 +1,41 @@
+import threading
+import time
+import unittest
+
+from google_photos_api import PRIORITY_PREFETCH, PRIORITY_WINDOW_FILL, TransferScheduler
+
+
+class TestTransferScheduler(unittest.TestCase):
+    def test_slot_waiter_does_not_throttle_slot_holder(self):
+        """A higher class queued for a slot must not stall the transfer that holds it."""
+        scheduler = TransferScheduler(100, 1, 2)
+        scheduler.acquire_slot(PRIORITY_PREFETCH, "a")
+
+        acquired = threading.Event()
+
+        def window_fill():
+            scheduler.acquire_slot(PRIORITY_WINDOW_FILL, "b")
+            acquired.set()
+            scheduler.release_slot(PRIORITY_WINDOW_FILL, "b")
+
+        waiter = threading.Thread(target=window_fill, daemon=True)
+        waiter.start()
+        deadline = time.monotonic() + 5
+        while not scheduler.stats()["waiting_for_slot"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(scheduler.stats()["waiting_for_slot"], {"window_fill": 1})
+
+        def prefetch():
+            for _ in range(40):
+                scheduler.consume(PRIORITY_PREFETCH, 256 * 1024)
+            scheduler.release_slot(PRIORITY_PREFETCH, "a")
+
+        holder = threading.Thread(target=prefetch, daemon=True)
+        holder.start()
+        holder.join(timeout=5)
+        self.assertFalse(holder.is_alive(), "slot holder blocked behind a slot waiter")
+        self.assertTrue(acquired.wait(timeout=5))
+
+
+if __name__ == "__main__":
+    unittest.main()
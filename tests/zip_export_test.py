@@ -0,0 +1,89 @@
+import io
+import random
+import unittest
+import zipfile
+from collections import OrderedDict
+from unittest import mock
+
+import google_photos_api
+from google_photos_api import RANGE_READ_CHUNK, ZipExportArchive
+
+TITLES = {
+    "a": random.Random(1).randbytes(700_000),
+    "empty": b"",
+    "b": random.Random(2).randbytes(RANGE_READ_CHUNK * 3 + 123),
+    "c": random.Random(3).randbytes(50_000),
+}
+
+
+class TestZipExportArchive(unittest.TestCase):
+    def setUp(self):
+        self.reads = []
+        patches = {
+            "read_title_range": self.read_title_range,
+            "export_crc_cache": OrderedDict(),
+            "export_crc_checkpoints": OrderedDict(),
+            "save_export_crc_cache": lambda: None,
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(google_photos_api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.full = b"".join(self.archive().read(0, self.archive().size - 1))
+
+    def read_title_range(self, file_id, download_url, start, end, priority=0):
+        self.reads.append((file_id, start, end))
+        data = TITLES[file_id][start:end + 1]
+        for offset in range(0, len(data), RANGE_READ_CHUNK):
+            yield data[offset:offset + RANGE_READ_CHUNK]
+
+    def archive(self) -> ZipExportArchive:
+        return ZipExportArchive([{"file_id": file_id, "name": f"{file_id}.bin", "size": len(data), "timestamp": 1_600_000_000_000}
+                                 for file_id, data in TITLES.items()])
+
+    def forget_crcs(self):
+        google_photos_api.export_crc_cache.clear()
+        google_photos_api.export_crc_checkpoints.clear()
+        self.reads.clear()
+
+    def test_full_read(self):
+        self.assertEqual(len(self.full), self.archive().size)
+        with zipfile.ZipFile(io.BytesIO(self.full)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), [f"{file_id}.bin" for file_id in TITLES])
+            for file_id, data in TITLES.items():
+                self.assertEqual(archive.read(f"{file_id}.bin"), data)
+            self.assertEqual(archive.getinfo("empty.bin").CRC, 0)
+
+    def test_resume_mid_member(self):
+        """A range starting inside a member gets the same bytes, descriptor CRC included."""
+        self.forget_crcs()
+        archive = self.archive()
+        start = archive.members[2]["header_offset"] + 1000 + len(TITLES["b"]) // 2
+        archive.prepare_crcs([(start, archive.size - 1)])
+        self.assertTrue(any(file_id == "b" and read_start == 0 for file_id, read_start, _ in self.reads))
+        self.assertEqual(b"".join(archive.read(start, archive.size - 1)), self.full[start:])
+
+    def test_resume_continues_from_checkpoint(self):
+        archive = self.archive()
+        start = archive.members[2]["header_offset"] + 1000 + len(TITLES["b"]) // 2
+        self.reads.clear()
+        archive.prepare_crcs([(start, archive.size - 1)])
+        self.assertEqual(b"".join(archive.read(start, archive.size - 1)), self.full[start:])
+        self.assertLess(sum(end - read_start + 1 for _, read_start, end in self.reads), len(self.full) - start + RANGE_READ_CHUNK)
+
+    def test_tail_range_without_known_crcs(self):
+        self.forget_crcs()
+        archive = self.archive()
+        archive.prepare_crcs([(archive.central_offset - 10, archive.size - 1)])
+        self.assertEqual(b"".join(archive.read(archive.central_offset - 10, archive.size - 1)), self.full[archive.central_offset - 10:])
+
+    def test_unknown_crc_fails_before_streaming(self):
+        self.forget_crcs()
+        archive = self.archive()
+        with self.assertRaises(RuntimeError):
+            next(archive.read(archive.central_offset, archive.size - 1))
+
+
+if __name__ == "__main__":
+    unittest.main()